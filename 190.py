@@ -16,11 +16,16 @@ from datetime import date, datetime
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-from sqlalchemy import Date, cast, func, or_, select
+from sqlalchemy import (
+    Boolean, Integer, Select, Text, and_, case, column, false, func, literal_column, not_, null, or_, select, true,
+    values,
+)
 from sqlalchemy.orm import Session
 
 from core.database import get_session
-from core.models import Client, ClientLocation, Employee, EmployeePeriod, Payroll, PayrollLine
+from core.models import Client, ClientLocation, Concept, Employee, EmployeePeriod, Payroll, PayrollLine
+from core.normalization import normalize_concept_key, normalize_text
+from core.utils.batching import chunked
 
 
 _DECIMAL_ZERO = Decimal("0.00")
@@ -204,52 +209,6 @@ def _as_float(value: Optional[Decimal]) -> float:
     return float(_quantize_eur(_to_decimal(value)))
 
 
-_ACCENT_TRANSLATION = str.maketrans(
-    {
-        "\u00c1": "A",
-        "\u00c9": "E",
-        "\u00cd": "I",
-        "\u00d3": "O",
-        "\u00da": "U",
-        "\u00c0": "A",
-        "\u00c8": "E",
-        "\u00cc": "I",
-        "\u00d2": "O",
-        "\u00d9": "U",
-        "\u00c2": "A",
-        "\u00ca": "E",
-        "\u00ce": "I",
-        "\u00d4": "O",
-        "\u00db": "U",
-        "\u00c4": "A",
-        "\u00cb": "E",
-        "\u00cf": "I",
-        "\u00d6": "O",
-        "\u00dc": "U",
-    }
-)
-
-
-_ALLOWED_TEXT_RE = re.compile(r"[^A-Z0-9 \u00d1\u00c7]")
-
-
-def normalize_text(value: Optional[str]) -> str:
-    if not value:
-        return ""
-    text = value.upper()
-    text = text.translate(_ACCENT_TRANSLATION)
-    text = re.sub(r"[\t\n\r]+", " ", text)
-    text = _ALLOWED_TEXT_RE.sub(" ", text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
-def normalize_concept_key(concept: Optional[str]) -> str:
-    if not concept:
-        return ""
-    return normalize_text(concept)
-
-
 def fmt_alpha(value: Optional[str], length: int) -> str:
     normalized = normalize_text(value)
     if len(normalized) > length:
@@ -349,10 +308,6 @@ def _json_text(column, key: str):
     return value
 
 
-def _json_date(column, key: str):
-    return cast(_json_text(column, key), Date)
-
-
 def _put(buf: List[str], start: int, end: int, value: str) -> None:
     if len(value) != (end - start + 1):
         raise ValueError(f"Value length mismatch for positions {start}-{end}.")
@@ -494,52 +449,65 @@ def _build_employee_name(employee: EmployeeInfo) -> str:
     return " ".join(part for part in parts if part)
 
 
+def _line_concept_key(line: PayrollLine, concept_key: Optional[str] = None) -> str:
+    # concept_key is the interned key (concepts table); lines not backfilled yet have none
+    if concept_key is not None:
+        return concept_key
+    return normalize_concept_key(line.concept)
+
+
 def _classify_clave_subclave(
     line: PayrollLine,
     concept_map: Dict[str, Tuple[str, Optional[str]]],
+    concept_key: Optional[str] = None,
 ) -> Tuple[str, Optional[str]]:
     if line.is_sickpay:
         return "A", None
-    key = normalize_concept_key(line.concept)
+    key = _line_concept_key(line, concept_key)
     return concept_map.get(key, ("A", None))
 
 
-def _is_ss_tax(line: PayrollLine, ss_tax_set: set[str]) -> bool:
+def _is_ss_tax(line: PayrollLine, ss_tax_set: set[str], concept_key: Optional[str] = None) -> bool:
     if line.category != "deduccion":
         return False
-    key = normalize_concept_key(line.concept)
+    key = _line_concept_key(line, concept_key)
     return key in ss_tax_set
 
 
-def fetch_payroll_lines_for_cif_period(
-    session: Session,
+def eligible_payroll_ids(
     company_cif: str,
-    range_start: date,
-    range_end: date,
-) -> Iterable:
-    period_start = _json_date(Payroll.periodo, "desde")
-    period_end = _json_date(Payroll.periodo, "hasta")
-    payroll_start = func.coalesce(period_start, period_end)
-
-    eligible_payrolls = (
-        session.query(Payroll.id.label("payroll_id"))
+    range_start: Optional[date] = None,
+    range_end: Optional[date] = None,
+) -> Select:
+    """Ids of payrolls issued while the employee worked for `company_cif`, within the range when given."""
+    period_end = Payroll.period_end
+    payroll_start = func.coalesce(Payroll.period_start, period_end)
+    stmt = (
+        select(Payroll.id)
         .join(Employee, Payroll.employee_id == Employee.id)
         .join(EmployeePeriod, EmployeePeriod.employee_id == Employee.id)
         .join(ClientLocation, EmployeePeriod.location_id == ClientLocation.id)
         .join(Client, ClientLocation.company_id == Client.id)
-        .filter(Client.cif == company_cif)
-        .filter(period_end.isnot(None))
-        .filter(payroll_start <= range_end)
-        .filter(period_end >= range_start)
-        .filter(EmployeePeriod.period_begin_date <= period_end)
-        .filter(
+        .where(Client.cif == company_cif)
+        .where(period_end.isnot(None))
+        .where(EmployeePeriod.period_begin_date <= period_end)
+        .where(
             or_(EmployeePeriod.period_end_date.is_(None), EmployeePeriod.period_end_date >= payroll_start)
         )
         .distinct()
-        .subquery()
     )
+    if range_end is not None:
+        stmt = stmt.where(payroll_start <= range_end)
+    if range_start is not None:
+        stmt = stmt.where(period_end >= range_start)
+    return stmt
+
 
-    location_id_subq = (
+def _payroll_location_id():
+    """Location of the latest employee period overlapping the payroll (correlated to Payroll and Employee)."""
+    period_end = Payroll.period_end
+    payroll_start = func.coalesce(Payroll.period_start, period_end)
+    return (
         select(EmployeePeriod.location_id)
         .where(EmployeePeriod.employee_id == Employee.id)
         .where(EmployeePeriod.period_begin_date <= period_end)
@@ -551,6 +519,15 @@ def fetch_payroll_lines_for_cif_period(
         .scalar_subquery()
     )
 
+
+def fetch_payroll_lines_for_cif_period(
+    session: Session,
+    company_cif: str,
+    range_start: date,
+    range_end: date,
+) -> Iterable:
+    location_id_subq = _payroll_location_id()
+
     return (
         session.query(
             Payroll.id.label("payroll_id"),
@@ -569,6 +546,7 @@ def fetch_payroll_lines_for_cif_period(
             PayrollLine.id.label("line_id"),
             PayrollLine.category.label("category"),
             PayrollLine.concept.label("concept"),
+            Concept.key.label("concept_key"),
             PayrollLine.amount.label("amount"),
             PayrollLine.is_taxable_income.label("is_taxable_income"),
             PayrollLine.is_sickpay.label("is_sickpay"),
@@ -577,9 +555,10 @@ def fetch_payroll_lines_for_cif_period(
         .select_from(PayrollLine)
         .join(Payroll, PayrollLine.payroll_id == Payroll.id)
         .join(Employee, Payroll.employee_id == Employee.id)
+        .outerjoin(Concept, Concept.id == PayrollLine.concept_id)
         .outerjoin(ClientLocation, ClientLocation.id == location_id_subq)
         .outerjoin(Client, Client.id == ClientLocation.company_id)
-        .filter(Payroll.id.in_(select(eligible_payrolls.c.payroll_id)))
+        .filter(Payroll.id.in_(eligible_payroll_ids(company_cif, range_start, range_end)))
         .all()
     )
 
@@ -695,6 +674,26 @@ def _build_manual_g_perceptors(
     return perceptors
 
 
+def _rank_provincia(
+    employee_provincia: Dict[int, str],
+    employee_provincia_rank: Dict[int, int],
+    employee_id: int,
+    location_postal_code: Optional[str],
+    company_postal_code: Optional[str],
+) -> None:
+    # The first location provincia wins, else the first company provincia
+    loc_provincia = _postal_to_provincia(location_postal_code)
+    if loc_provincia:
+        if employee_provincia_rank.get(employee_id, 0) < 2:
+            employee_provincia[employee_id] = loc_provincia
+            employee_provincia_rank[employee_id] = 2
+    else:
+        company_provincia = _postal_to_provincia(company_postal_code)
+        if company_provincia and employee_provincia_rank.get(employee_id, 0) < 1:
+            employee_provincia[employee_id] = company_provincia
+            employee_provincia_rank[employee_id] = 1
+
+
 def build_perceptor_inputs(
     session: Session,
     company_cif: str,
@@ -730,16 +729,13 @@ def build_perceptor_inputs(
                 address=row.address,
             )
 
-        loc_provincia = _postal_to_provincia(getattr(row, "location_postal_code", None))
-        if loc_provincia:
-            if employee_provincia_rank.get(employee_id, 0) < 2:
-                employee_provincia[employee_id] = loc_provincia
-                employee_provincia_rank[employee_id] = 2
-        else:
-            company_provincia = _postal_to_provincia(getattr(row, "company_postal_code", None))
-            if company_provincia and employee_provincia_rank.get(employee_id, 0) < 1:
-                employee_provincia[employee_id] = company_provincia
-                employee_provincia_rank[employee_id] = 1
+        _rank_provincia(
+            employee_provincia,
+            employee_provincia_rank,
+            employee_id,
+            getattr(row, "location_postal_code", None),
+            getattr(row, "company_postal_code", None),
+        )
 
         payroll_tipo_irpf[payroll_id] = _to_decimal(row.tipo_irpf)
 
@@ -763,7 +759,7 @@ def build_perceptor_inputs(
             is_seizure=False,
         )
 
-        clave, subclave = _classify_clave_subclave(dummy_line, concept_map)
+        clave, subclave = _classify_clave_subclave(dummy_line, concept_map, row.concept_key)
         group_key = GroupKey(employee_id=employee_id, clave=clave, subclave=subclave)
         agg = groups.setdefault(group_key, Aggregation())
 
@@ -787,9 +783,34 @@ def build_perceptor_inputs(
                 taxable_base_by_payroll[key] = taxable_base_by_payroll.get(key, _DECIMAL_ZERO) + amount
 
         elif category == "deduccion":
-            if _is_ss_tax(dummy_line, ss_tax_set):
+            if _is_ss_tax(dummy_line, ss_tax_set, row.concept_key):
                 ss_tax_by_employee[employee_id] = ss_tax_by_employee.get(employee_id, _DECIMAL_ZERO) + amount
 
+    return _build_perceptors_from_aggregates(
+        groups,
+        employee_info,
+        employee_provincia,
+        taxable_base_by_payroll,
+        payroll_tipo_irpf,
+        ss_tax_by_employee,
+        config,
+        range_start,
+        range_end,
+    )
+
+
+def _build_perceptors_from_aggregates(
+    groups: Dict[GroupKey, Aggregation],
+    employee_info: Dict[int, EmployeeInfo],
+    employee_provincia: Dict[int, str],
+    taxable_base_by_payroll: Dict[Tuple[int, str, Optional[str], int, bool, bool], Decimal],
+    payroll_tipo_irpf: Dict[int, Decimal],
+    ss_tax_by_employee: Dict[int, Decimal],
+    config: MappingConfig,
+    range_start: date,
+    range_end: date,
+) -> List[PerceptorRecordInput]:
+    """Apply retentions per payroll, allocate gastos deducibles and build the perceptor records."""
     for (employee_id, clave, subclave, payroll_id, is_sickpay, is_in_kind), base in taxable_base_by_payroll.items():
         tipo_irpf = payroll_tipo_irpf.get(payroll_id, _DECIMAL_ZERO)
         retention = _quantize_eur(base * tipo_irpf / Decimal("100"))
@@ -904,6 +925,223 @@ def build_perceptor_inputs(
     return perceptors
 
 
+def _concept_rules(config: MappingConfig) -> Dict[str, Tuple[Optional[str], Optional[str], bool]]:
+    """(clave, subclave, ss_tax) per normalized concept key named in the mapping."""
+    concept_map = config.build_concept_map()
+    ss_tax_set = {normalize_concept_key(value) for value in config.ss_tax_concepts}
+    rules: Dict[str, Tuple[Optional[str], Optional[str], bool]] = {}
+    for key in sorted(set(concept_map) | ss_tax_set):
+        clave, subclave = concept_map.get(key, (None, None))
+        rules[key] = (clave, subclave, key in ss_tax_set)
+    return rules
+
+
+def _concept_rules_cte(name: str, key_column, rows: List[tuple]):
+    if not rows:
+        return None
+    return values(
+        key_column,
+        column("clave", Text),
+        column("subclave", Text),
+        column("ss_tax", Boolean),
+        name=name,
+    ).data(rows).cte(name)
+
+
+def _classified_payroll_lines(
+    session: Session,
+    company_cif: str,
+    range_start: date,
+    range_end: date,
+    config: MappingConfig,
+):
+    """Eligible payroll lines with their clave/subclave and ss_tax flag resolved in SQL."""
+    rules = _concept_rules(config)
+    eligible = eligible_payroll_ids(company_cif, range_start, range_end)
+
+    # The mapping is matched on interned concept ids; lines not backfilled yet match on their text
+    by_id_rows = []
+    if rules:
+        for concept_id, key in session.execute(select(Concept.id, Concept.key).where(Concept.key.in_(list(rules)))):
+            by_id_rows.append((concept_id, *rules[key]))
+    by_text_rows = []
+    unassigned = session.execute(
+        select(PayrollLine.concept)
+        .where(PayrollLine.concept_id.is_(None), PayrollLine.payroll_id.in_(eligible))
+        .distinct()
+    ).scalars()
+    for text in unassigned:
+        rule = rules.get(normalize_concept_key(text))
+        if rule:
+            by_text_rows.append((text, *rule))
+
+    by_id = _concept_rules_cte("concept_rules_by_id", column("concept_id", Integer), by_id_rows)
+    by_text = _concept_rules_cte("concept_rules_by_text", column("concept", Text), by_text_rows)
+    matched = [cte for cte in (by_id, by_text) if cte is not None]
+    if matched:
+        mapped_clave = case(*((cte.c.clave.isnot(None), cte.c.clave) for cte in matched), else_=literal_column("'A'"))
+        mapped_subclave = case(*((cte.c.clave.isnot(None), cte.c.subclave) for cte in matched), else_=null())
+        ss_tax = or_(*(cte.c.ss_tax.is_(True) for cte in matched))
+    else:
+        mapped_clave, mapped_subclave, ss_tax = literal_column("'A'"), null(), false()
+
+    stmt = (
+        select(
+            PayrollLine.id.label("line_id"),
+            Payroll.id.label("payroll_id"),
+            Payroll.employee_id.label("employee_id"),
+            Payroll.tipo_irpf.label("tipo_irpf"),
+            ClientLocation.postal_code.label("location_postal_code"),
+            Client.postal_code.label("company_postal_code"),
+            func.lower(PayrollLine.category).label("category"),
+            PayrollLine.amount.label("amount"),
+            PayrollLine.is_taxable_income.label("is_taxable_income"),
+            PayrollLine.is_sickpay.label("is_sickpay"),
+            PayrollLine.is_in_kind.label("is_in_kind"),
+            # Sick pay is always clave A
+            case((PayrollLine.is_sickpay, literal_column("'A'")), else_=mapped_clave).label("clave"),
+            case((PayrollLine.is_sickpay, null()), else_=mapped_subclave).label("subclave"),
+            ss_tax.label("ss_tax"),
+            (true() if config.include_in_kind else not_(PayrollLine.is_in_kind)).label("included"),
+        )
+        .select_from(PayrollLine)
+        .join(Payroll, PayrollLine.payroll_id == Payroll.id)
+        .join(Employee, Payroll.employee_id == Employee.id)
+        .outerjoin(ClientLocation, ClientLocation.id == _payroll_location_id())
+        .outerjoin(Client, Client.id == ClientLocation.company_id)
+        .where(Payroll.id.in_(eligible))
+    )
+    if by_id is not None:
+        stmt = stmt.outerjoin(by_id, by_id.c.concept_id == PayrollLine.concept_id)
+    if by_text is not None:
+        stmt = stmt.outerjoin(by_text, and_(PayrollLine.concept_id.is_(None), by_text.c.concept == PayrollLine.concept))
+    return stmt.subquery("classified")
+
+
+def build_perceptor_inputs_sql(
+    session: Session,
+    company_cif: str,
+    range_start: date,
+    range_end: date,
+    config: MappingConfig,
+) -> List[PerceptorRecordInput]:
+    """
+    Same result as build_perceptor_inputs, aggregated in the database.
+
+    Lines are classified in SQL (the concept mapping is joined as VALUES
+    CTEs) and summed with one GROUP BY employee, payroll, clave, subclave, so
+    only one row per payroll and clave/subclave comes back. Retentions are
+    still rounded per payroll here, with Decimal, so both engines produce
+    byte-identical files. Rows are read in first-line order, which is the
+    order build_perceptor_inputs sees them when the database returns lines
+    unordered by id; an employee whose payrolls point to locations in
+    different provincias gets the one of their earliest line.
+    """
+    line = _classified_payroll_lines(session, company_cif, range_start, range_end, config).c
+    devengo = and_(line.category == "devengo", line.included)
+
+    def total(*conditions):
+        return func.sum(line.amount).filter(and_(*conditions))
+
+    sick, not_sick = line.is_sickpay, not_(line.is_sickpay)
+    in_kind, not_in_kind = line.is_in_kind, not_(line.is_in_kind)
+    taxable = and_(devengo, line.is_taxable_income)
+    stmt = (
+        select(
+            line.employee_id,
+            line.payroll_id,
+            line.tipo_irpf,
+            line.location_postal_code,
+            line.company_postal_code,
+            line.clave,
+            line.subclave,
+            func.min(line.line_id).label("first_line_id"),
+            func.count().filter(line.included).label("included_lines"),
+            total(devengo, not_in_kind, not_sick).label("percepcion_no_it"),
+            total(devengo, not_in_kind, sick).label("percepcion_it"),
+            total(devengo, in_kind, not_sick).label("especie_no_it_base"),
+            total(devengo, in_kind, sick).label("especie_it_base"),
+            total(taxable, not_in_kind, not_sick).label("taxable_no_it"),
+            total(taxable, not_in_kind, sick).label("taxable_it"),
+            total(taxable, in_kind, not_sick).label("taxable_especie_no_it"),
+            total(taxable, in_kind, sick).label("taxable_especie_it"),
+            total(line.category == "deduccion", line.included, line.ss_tax).label("ss_tax"),
+        )
+        .group_by(
+            line.employee_id,
+            line.payroll_id,
+            line.tipo_irpf,
+            line.location_postal_code,
+            line.company_postal_code,
+            line.clave,
+            line.subclave,
+        )
+        .order_by(func.min(line.line_id))
+    )
+
+    employee_provincia: Dict[int, str] = {}
+    employee_provincia_rank: Dict[int, int] = {}
+    groups: Dict[GroupKey, Aggregation] = {}
+    taxable_base_by_payroll: Dict[Tuple[int, str, Optional[str], int, bool, bool], Decimal] = {}
+    payroll_tipo_irpf: Dict[int, Decimal] = {}
+    ss_tax_by_employee: Dict[int, Decimal] = {}
+
+    for row in session.execute(stmt):
+        employee_id = row.employee_id
+        _rank_provincia(
+            employee_provincia, employee_provincia_rank, employee_id, row.location_postal_code, row.company_postal_code
+        )
+        payroll_tipo_irpf[row.payroll_id] = _to_decimal(row.tipo_irpf)
+        if not row.included_lines:
+            continue
+
+        group_key = GroupKey(employee_id=employee_id, clave=row.clave, subclave=row.subclave)
+        agg = groups.setdefault(group_key, Aggregation())
+        agg.percepcion_no_it += _to_decimal(row.percepcion_no_it)
+        agg.devengo_base_no_it += _to_decimal(row.percepcion_no_it)
+        agg.percepcion_it += _to_decimal(row.percepcion_it)
+        agg.especie_no_it_base += _to_decimal(row.especie_no_it_base)
+        agg.especie_it_base += _to_decimal(row.especie_it_base)
+
+        for is_sickpay, is_in_kind, base in (
+            (False, False, row.taxable_no_it),
+            (True, False, row.taxable_it),
+            (False, True, row.taxable_especie_no_it),
+            (True, True, row.taxable_especie_it),
+        ):
+            if base is not None:
+                key = (employee_id, row.clave, row.subclave, row.payroll_id, is_sickpay, is_in_kind)
+                taxable_base_by_payroll[key] = taxable_base_by_payroll.get(key, _DECIMAL_ZERO) + _to_decimal(base)
+        if row.ss_tax is not None:
+            ss_tax_by_employee[employee_id] = ss_tax_by_employee.get(employee_id, _DECIMAL_ZERO) + _to_decimal(row.ss_tax)
+
+    employee_info: Dict[int, EmployeeInfo] = {}
+    employee_ids = sorted(employee_provincia_rank.keys() | {key.employee_id for key in groups})
+    for chunk in chunked(employee_ids):
+        for employee in session.execute(select(Employee).where(Employee.id.in_(chunk))).scalars():
+            employee_info[employee.id] = EmployeeInfo(
+                employee_id=employee.id,
+                nif=employee.identity_card_number or "",
+                first_name=employee.first_name or "",
+                last_name=employee.last_name or "",
+                last_name2=employee.last_name2,
+                birth_date=employee.birth_date,
+                address=employee.address,
+            )
+
+    return _build_perceptors_from_aggregates(
+        groups,
+        employee_info,
+        employee_provincia,
+        taxable_base_by_payroll,
+        payroll_tipo_irpf,
+        ss_tax_by_employee,
+        config,
+        range_start,
+        range_end,
+    )
+
+
 def compute_totals(perceptors: Sequence[PerceptorRecordInput]) -> Tuple[Decimal, Decimal]:
     total_percepciones = _DECIMAL_ZERO
     total_ret_ing = _DECIMAL_ZERO
@@ -1445,6 +1683,12 @@ def main() -> int:
     )
     parser.add_argument("--numero-identificativo", help="AEAT declaration ID (13 digits).")
     parser.add_argument("--id-declaracion-anterior", help="Previous AEAT declaration ID (13 digits).")
+    parser.add_argument(
+        "--engine",
+        choices=["python", "sql"],
+        default="python",
+        help="Aggregate payroll lines in Python (default) or in the database.",
+    )
     parser.add_argument("--echo-sql", action="store_true", help="Enable SQL echo.")
 
     args = parser.parse_args()
@@ -1458,7 +1702,8 @@ def main() -> int:
 
     session = get_session(echo=args.echo_sql)
     try:
-        perceptors = build_perceptor_inputs(session, args.cif, range_start, range_end, config)
+        build = build_perceptor_inputs_sql if args.engine == "sql" else build_perceptor_inputs
+        perceptors = build(session, args.cif, range_start, range_end, config)
         if args.only_clave_g:
             perceptors = [p for p in perceptors if p.clave == "G"]
         decl = build_declarant_from_cif(
@@ -1498,8 +1743,10 @@ __all__ = [
     "Incapacidad",
     "ForalSplit",
     "AdditionalData",
+    "eligible_payroll_ids",
     "fetch_payroll_lines_for_cif_period",
     "build_perceptor_inputs",
+    "build_perceptor_inputs_sql",
     "build_type1_record",
     "build_type2_record",
     "generate_190_file",
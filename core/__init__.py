@@ -19,6 +19,9 @@ from .models import (
 # Database utilities
 from .database import (
     create_database_engine,
+    get_engine,
+    get_session,
+    session_scope,
     ensure_documents_directory,
     get_client_document_path,
     get_employee_document_path,
@@ -61,6 +64,9 @@ __all__ = [
 
     # Database utilities
     'create_database_engine',
+    'get_engine',
+    'get_session',
+    'session_scope',
     'ensure_documents_directory',
     'get_client_document_path',
     'get_employee_document_path',
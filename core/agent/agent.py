@@ -23,7 +23,6 @@ import difflib
 from openai import OpenAI
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.inspection import inspect as sa_inspect
-from sqlalchemy.orm import sessionmaker
 from tqdm import tqdm
 
 from core.agent import vida_laboral
@@ -37,7 +36,8 @@ from core.agent.utils import (
     parse_spanish_name,
     period_reference_date,
 )
-from core.database import create_database_engine
+from core.database import create_database_engine, get_session
+from core.employee_coverage import load_coverage_months
 from core.models import Client, Employee, EmployeePeriod, NominaConcept, Payroll, PayrollLine
 from core.normalization import normalize_ssn
 from core.payslip_parser import process_payslip
@@ -45,6 +45,7 @@ from core.production_models import (
     ProductionCompany,
     ProductionEmployee,
     create_production_engine,
+    create_production_session,
 )
 
 
@@ -59,17 +60,14 @@ class ValeriaAgent:
 
         # Local database (for payrolls and optionally for companies/employees in dev mode)
         self.engine = create_database_engine(echo=False)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        self.session = get_session(self.engine)
 
         # Production database (read-only, for companies/employees when enabled)
         self.use_production_data = os.getenv('USE_PRODUCTION_DATA', 'false').lower() == 'true'
         self.prod_session = None
         if self.use_production_data:
             try:
-                prod_engine = create_production_engine(echo=False)
-                ProdSession = sessionmaker(bind=prod_engine)
-                self.prod_session = ProdSession()
+                self.prod_session = create_production_session(create_production_engine(echo=False))
                 print("✓ Connected to production database (read-only mode)")
             except Exception as e:
                 print(f"⚠️  Warning: Could not connect to production database: {e}")
@@ -863,6 +861,21 @@ class ValeriaAgent:
 
             print(f"🔍 Analyzing missing payslips for {len(employees)} employees...")
 
+            # Alta/baja periods in one query; expected/processed months from employee_month_coverage
+            periods_by_employee: Dict[int, List[EmployeePeriod]] = {}
+            period_rows = self.session.query(EmployeePeriod).filter(
+                EmployeePeriod.employee_id.in_([employee.id for employee in employees]),
+                EmployeePeriod.period_type.in_(['alta', 'baja'])
+            ).order_by(EmployeePeriod.employee_id, EmployeePeriod.period_begin_date)
+            for period in period_rows:
+                periods_by_employee.setdefault(period.employee_id, []).append(period)
+            coverage = load_coverage_months(
+                self.session,
+                periods_by_employee,
+                current_date=current_date,
+                cutoff_date=cutoff_date,
+            )
+
             for employee in employees:
                 # Build full name from components
                 full_name = f"{employee.first_name} {employee.last_name}"
@@ -871,39 +884,16 @@ class ValeriaAgent:
 
                 print(f"   📋 Checking {full_name} ({employee.identity_card_number})...")
 
-                # Query employment periods for this employee (alta/baja only, not vacaciones)
-                periods = self.session.query(EmployeePeriod).filter(
-                    EmployeePeriod.employee_id == employee.id,
-                    EmployeePeriod.period_type.in_(['alta', 'baja'])
-                ).order_by(EmployeePeriod.period_begin_date).all()
-
+                periods = periods_by_employee.get(employee.id)
                 if not periods:
                     print(f"      ⚠️  No employment periods found, skipping...")
                     continue
 
-                # Generate expected months across all employment periods
-                expected_months = set()
-                for period in periods:
-                    start_date = period.period_begin_date
-                    end_date = period.period_end_date or current_date
-
-                    # Cap end_date at cutoff_date if provided
-                    if cutoff_date:
-                        end_date = min(end_date, cutoff_date)
-
-                    # Generate months for this period
-                    period_months = self._generate_expected_months(start_date, end_date)
-                    expected_months.update(period_months)
-
-                processed_nominas = self.session.query(Payroll).filter_by(
-                    employee_id=employee.id
-                ).all()
-
-                processed_months, settlement_months = self._collect_payroll_months(processed_nominas)
+                expected_months, processed_months, settlement_months = coverage[employee.id]
 
                 # Find missing months
                 missing_months = []
-                for year, month in expected_months:
+                for year, month in sorted(expected_months):
                     if (year, month) not in processed_months:
                         missing_months.append(f"{year}-{month:02d}")
 
@@ -977,25 +967,6 @@ class ValeriaAgent:
                 "message": f"Failed to detect missing payslips: {e}"
             }
 
-    def _generate_expected_months(self, start_date: date, end_date: date) -> List[Tuple[int, int]]:
-        """Generate list of (year, month) tuples for expected payslip months"""
-        if not start_date:
-            return []
-
-        expected_months = []
-        current = start_date.replace(day=1)  # Start from first day of month
-        end = end_date.replace(day=1) if end_date else date.today().replace(day=1)
-
-        while current <= end:
-            expected_months.append((current.year, current.month))
-            # Move to next month
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
-            else:
-                current = current.replace(month=current.month + 1)
-
-        return expected_months
-
     def generate_missing_payslips_report(self, client_id: Optional[uuid.UUID] = None,
                                        output_format: str = "json",
                                        save_to_file: bool = False,
@@ -1158,21 +1129,6 @@ class ValeriaAgent:
 
         return "\n".join(lines)
 
-    def _collect_payroll_months(self, payrolls: List[Payroll]) -> Tuple[Set[Tuple[int, int]], Set[Tuple[int, int]]]:
-        processed_months: Set[Tuple[int, int]] = set()
-        settlement_months: Set[Tuple[int, int]] = set()
-
-        for payroll in payrolls:
-            ref_date = period_reference_date(getattr(payroll, "periodo", None))
-            if not ref_date:
-                continue
-            month_key = (ref_date.year, ref_date.month)
-            processed_months.add(month_key)
-            if payroll.type in {"settlement", "hybrid"}:
-                settlement_months.add(month_key)
-
-        return processed_months, settlement_months
-
     def _collect_finiquitos_for_window(
         self,
         *,
@@ -0,0 +1,192 @@
+"""
+Checklist items for missing payslips and finiquitos.
+
+Turns missing payslips engine output into ChecklistItem rows with one bulk
+INSERT ... ON CONFLICT per batch (keyed by client, employee, item type and
+period), and marks pending items as received once a matching payroll exists.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import case, extract, func, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from core.missing_payslips import detect_missing_payslips, detect_missing_payslips_set_based
+from core.models import ChecklistItem, Payroll
+from core.utils.batching import chunked
+
+# Conflict target of the upsert; backed by idx_unique_checklist_item
+CHECKLIST_CONFLICT_COLUMNS = ["client_id", "employee_id", "item_type", "period_year", "period_month"]
+
+CREATE_CHECKLIST_UNIQUE_INDEX_SQL = text("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_checklist_item
+    ON checklist_items (client_id, employee_id, item_type, period_year, period_month)
+""")
+
+# Payroll types that satisfy each checklist item type
+_SATISFYING_PAYROLL_TYPES = {
+    "payslip": ("payslip", "settlement", "hybrid"),
+    "settlement": ("settlement", "hybrid"),
+}
+
+
+def build_checklist_rows(client_id: str | UUID, detection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Checklist rows for every missing month and needed finiquito of a detection result."""
+    client_uuid = client_id if isinstance(client_id, UUID) else UUID(str(client_id))
+    rows: List[Dict[str, Any]] = []
+    for employee in detection.get("missing_payslips", []):
+        who = f"{employee['employee_name']} ({employee.get('identity_card_number') or '-'})"
+        for month in employee.get("missing_months", []):
+            year, month_number = (int(part) for part in month.split("-"))
+            rows.append({
+                "client_id": client_uuid,
+                "employee_id": employee["employee_id"],
+                "item_type": "payslip",
+                "description": f"Missing payslip {month} for {who}",
+                "period_year": year,
+                "period_month": month_number,
+                "status": "pending",
+                "priority": "normal",
+            })
+        for finiquito in employee.get("finiquitos", []):
+            if finiquito.get("finiquito_status") != "needed":
+                continue
+            year, month_number = (int(part) for part in finiquito["baja_month"].split("-"))
+            rows.append({
+                "client_id": client_uuid,
+                "employee_id": employee["employee_id"],
+                "item_type": "settlement",
+                "description": f"Missing finiquito for baja on {finiquito['baja_date']} for {who}",
+                "period_year": year,
+                "period_month": month_number,
+                "status": "pending",
+                "priority": "high",
+            })
+    return rows
+
+
+def upsert_checklist_items(session: Session, rows: List[Dict[str, Any]], batch_size: int = 5000) -> int:
+    """
+    Insert checklist rows, updating existing items on conflict.
+
+    Items previously marked received (their payroll disappeared) are reopened;
+    items in any other status keep it. Returns the number of rows sent.
+    """
+    if not rows:
+        return 0
+
+    dialect = session.get_bind().dialect.name
+    insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+    items = ChecklistItem.__table__
+    stmt = insert(items)
+    reopened = items.c.status == "received"
+    stmt = stmt.on_conflict_do_update(
+        index_elements=CHECKLIST_CONFLICT_COLUMNS,
+        set_={
+            "description": stmt.excluded.description,
+            "status": case((reopened, "pending"), else_=items.c.status),
+            "payroll_id": case((reopened, None), else_=items.c.payroll_id),
+            "updated_at": func.now(),
+        },
+    )
+
+    for chunk in chunked(rows, batch_size):
+        session.execute(stmt, chunk)
+    return len(rows)
+
+
+def mark_checklist_items_received(
+    session: Session,
+    client_id: Optional[str | UUID] = None,
+    employee_ids: Optional[Iterable[int]] = None,
+) -> int:
+    """
+    Mark pending payslip/settlement items whose payroll now exists as received; returns rows updated.
+
+    `client_id` and `employee_ids` limit the update to those items, e.g. to
+    the employees whose payrolls were just ingested.
+    """
+    if employee_ids is None:
+        return _mark_received(session, client_id)
+    employee_id = ChecklistItem.__table__.c.employee_id
+    return sum(
+        _mark_received(session, client_id, employee_id.in_(chunk))
+        for chunk in chunked(sorted(set(employee_ids)))
+    )
+
+
+def _mark_received(session: Session, client_id: Optional[str | UUID], *filters) -> int:
+    items = ChecklistItem.__table__
+    payrolls = Payroll.__table__
+    reference_date = func.coalesce(payrolls.c.period_end, payrolls.c.period_start)
+
+    updated = 0
+    for item_type, payroll_types in _SATISFYING_PAYROLL_TYPES.items():
+        matching_payroll = (
+            select(payrolls.c.id)
+            .where(
+                payrolls.c.employee_id == items.c.employee_id,
+                payrolls.c.type.in_(payroll_types),
+                extract("year", reference_date) == items.c.period_year,
+                extract("month", reference_date) == items.c.period_month,
+            )
+            .order_by(payrolls.c.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(items)
+            .where(
+                items.c.status == "pending",
+                items.c.item_type == item_type,
+                matching_payroll.is_not(None),
+                *filters,
+            )
+            .values(status="received", payroll_id=matching_payroll, updated_at=func.now())
+        )
+        if client_id is not None:
+            stmt = stmt.where(items.c.client_id == (client_id if isinstance(client_id, UUID) else UUID(str(client_id))))
+        updated += session.execute(stmt).rowcount
+    return updated
+
+
+def sync_missing_payslips_checklist(
+    session: Session,
+    *,
+    client_id: str | UUID,
+    last_month: Optional[str] = None,
+    start_month: Optional[str] = None,
+    set_based: bool = False,
+    batch_size: int = 5000,
+) -> Dict[str, Any]:
+    """
+    Sync a client's checklist with the missing payslips engine.
+
+    Upserts one item per missing payslip month and needed finiquito, then
+    marks pending items with an arrived payroll as received. The caller
+    commits.
+    """
+    detect = detect_missing_payslips_set_based if set_based else detect_missing_payslips
+    start = time.perf_counter()
+    detection = detect(session, client_id=client_id, last_month=last_month, start_month=start_month, verbose=False)
+    if not detection["success"]:
+        return detection
+
+    rows = build_checklist_rows(client_id, detection)
+    upserted = upsert_checklist_items(session, rows, batch_size=batch_size)
+    received = mark_checklist_items_received(session, client_id)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "success": True,
+        "items_upserted": upserted,
+        "items_received": received,
+        "elapsed_seconds": round(elapsed, 3),
+        "items_per_second": round(upserted / elapsed, 1) if elapsed else None,
+        "message": f"Synced {upserted} checklist items ({received} marked received) in {elapsed:.2f}s",
+    }
@@ -0,0 +1,109 @@
+"""
+Interned payroll concept keys.
+
+concepts holds one row per normalize_concept_key value and payroll_lines
+reference it through concept_id, so Modelo 190 aggregations and concept
+reports read the key instead of normalizing every line's free text. New
+PayrollLine objects get their concept_id on flush; Core inserts that bypass
+the unit of work call assign_concept_ids on their rows, and existing lines
+are filled by backfill_concept_ids (scripts/migrate_add_payroll_line_concepts.py).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, MutableMapping, Optional, Sequence
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from core.models import Concept, PayrollLine
+from core.normalization import normalize_concept_key
+from core.prod_sync import bulk_update_from_values
+from core.utils.batching import IN_CLAUSE_CHUNK, chunked
+
+def _dialect_name(connection) -> str:
+    bind = connection.get_bind() if isinstance(connection, Session) else connection
+    return bind.dialect.name
+
+
+def intern_concepts(connection, keys: Iterable[str]) -> Dict[str, int]:
+    """
+    Return the concept id of every non-empty key, inserting the missing ones.
+
+    `connection` may be a Connection or a Session; inserts run in its current
+    transaction with ON CONFLICT DO NOTHING, so concurrent writers agree on ids.
+    """
+    concepts = Concept.__table__
+    insert = sqlite.insert if _dialect_name(connection) == "sqlite" else postgresql.insert
+    ids: Dict[str, int] = {}
+    for chunk in chunked(sorted({key for key in keys if key})):
+        lookup = select(concepts.c.key, concepts.c.id).where(concepts.c.key.in_(chunk))
+        ids.update(connection.execute(lookup).all())
+        missing = [key for key in chunk if key not in ids]
+        if missing:
+            connection.execute(
+                insert(concepts).on_conflict_do_nothing(index_elements=["key"]),
+                [{"key": key} for key in missing],
+            )
+            ids.update(connection.execute(lookup.where(concepts.c.key.in_(missing))).all())
+    return ids
+
+
+def concept_ids_for(connection, concepts: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Map raw concept texts to concept ids, normalizing each distinct text once."""
+    keys = {concept: normalize_concept_key(concept) for concept in set(concepts) if concept}
+    ids = intern_concepts(connection, keys.values())
+    return {concept: ids[key] for concept, key in keys.items() if key}
+
+
+def assign_concept_ids(connection, line_rows: Sequence[MutableMapping[str, Any]]) -> None:
+    """Set concept_id on payroll line value dicts for Core inserts."""
+    ids = concept_ids_for(connection, (row.get("concept") for row in line_rows))
+    for row in line_rows:
+        if row.get("concept_id") is None:
+            row["concept_id"] = ids.get(row.get("concept"))
+
+
+def backfill_concept_ids(session: Session, batch_size: int = IN_CLAUSE_CHUNK) -> int:
+    """
+    Fill concept_id for payroll lines written before the column existed.
+
+    Walks the distinct concept texts still unassigned, interns their keys and
+    updates every line of a batch of texts with one statement. Concepts that
+    normalize to an empty key stay NULL. The caller commits; returns the
+    number of concept texts assigned.
+    """
+    lines = PayrollLine.__table__
+    assigned = 0
+    last: Optional[str] = None
+    while True:
+        stmt = (
+            select(lines.c.concept)
+            .where(lines.c.concept_id.is_(None))
+            .group_by(lines.c.concept)
+            .order_by(lines.c.concept)
+            .limit(batch_size)
+        )
+        if last is not None:
+            stmt = stmt.where(lines.c.concept > last)
+        texts = session.execute(stmt).scalars().all()
+        if not texts:
+            return assigned
+        last = texts[-1]
+        ids = concept_ids_for(session, texts)
+        rows = [{"concept": concept, "concept_id": concept_id} for concept, concept_id in ids.items()]
+        assigned += bulk_update_from_values(session, lines, "concept", rows, ["concept_id"], batch_size)
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_concept_ids_before_flush(session: Session, _flush_context, _instances) -> None:
+    new_lines = [
+        obj for obj in session.new
+        if isinstance(obj, PayrollLine) and obj.concept_id is None and obj.concept
+    ]
+    if not new_lines:
+        return
+    ids = concept_ids_for(session, (line.concept for line in new_lines))
+    for line in new_lines:
+        line.concept_id = ids.get(line.concept)
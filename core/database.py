@@ -9,49 +9,136 @@ from __future__ import annotations
 
 import os
 import re
+import threading
 from calendar import monthrange
+from contextlib import contextmanager
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Any, Optional, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from sqlalchemy import create_engine, func
-from sqlalchemy.engine import Row
+from sqlalchemy import (
+    Date, Integer, String, and_, column, create_engine, exists, func, insert, literal, select, text, union_all, values,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import Session, sessionmaker
 
+from core import employee_coverage  # keeps employee_month_coverage in sync on flush
+from core import concepts  # noqa: F401 - sets payroll_lines.concept_id on flush
 from core.models import Client, ClientLocation, Employee, EmployeePeriod, Payroll, PayrollLine
 from core.normalization import normalize_ssn
+from core.utils.batching import chunked
 
 from dotenv import load_dotenv
 load_dotenv()
 
 
-def create_database_engine(database_url: str = None, echo: bool = False):
-    """Create database engine from environment or default values"""
-    if database_url is None:
-        db_host = os.getenv('POSTGRES_HOST', 'localhost')
-        db_port = os.getenv('POSTGRES_PORT', '5432')
-        db_name = os.getenv('POSTGRES_DB', 'valeria')
-        db_user = os.getenv('POSTGRES_USER', 'valeria')
-        db_password = os.getenv('POSTGRES_PASSWORD', 'YourStrongPassw0rd!')
-        database_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-
-    engine = create_engine(database_url, echo=echo)
+# Engine registry: one engine (and connection pool) per URL and pool
+# configuration for the whole process, shared by every caller.
+_ENGINES: Dict[Tuple[Any, ...], Engine] = {}
+_SESSION_FACTORIES: Dict[Engine, sessionmaker] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+DEFAULT_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DEFAULT_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DEFAULT_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+
+def default_database_url() -> str:
+    """Local database URL from the POSTGRES_* environment variables."""
+    db_host = os.getenv('POSTGRES_HOST', 'localhost')
+    db_port = os.getenv('POSTGRES_PORT', '5432')
+    db_name = os.getenv('POSTGRES_DB', 'valeria')
+    db_user = os.getenv('POSTGRES_USER', 'valeria')
+    db_password = os.getenv('POSTGRES_PASSWORD', 'YourStrongPassw0rd!')
+    return f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+
+def get_engine(
+    database_url: str,
+    *,
+    echo: bool = False,
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
+    pool_pre_ping: Optional[bool] = None,
+) -> Engine:
+    """
+    Return the process-wide engine for a URL, creating it on first use.
+
+    Engines are cached by URL, echo and pool settings. pool_size and
+    max_overflow (defaults DB_POOL_SIZE/DB_MAX_OVERFLOW) only apply to
+    pooled server databases; SQLite keeps its own pool class.
+    """
+    pool_size = DEFAULT_POOL_SIZE if pool_size is None else pool_size
+    max_overflow = DEFAULT_MAX_OVERFLOW if max_overflow is None else max_overflow
+    pool_pre_ping = DEFAULT_POOL_PRE_PING if pool_pre_ping is None else pool_pre_ping
+    key = (str(database_url), echo, pool_size, max_overflow, pool_pre_ping)
+
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+    with _REGISTRY_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            kwargs: Dict[str, Any] = {"echo": echo, "pool_pre_ping": pool_pre_ping}
+            if make_url(database_url).get_backend_name() != "sqlite":
+                kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+            engine = create_engine(database_url, **kwargs)
+            _ENGINES[key] = engine
     return engine
 
-def create_prod_engine(database_url: str = None, echo: bool = True):
-    """Create database engine from environment or default values"""
-    database_url = os.getenv('PROD_URL', '')
+
+def dispose_engines() -> None:
+    """Close every pooled connection and empty the registry."""
+    with _REGISTRY_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _SESSION_FACTORIES.clear()
+
+
+def create_database_engine(database_url: str = None, echo: bool = False, **pool_options):
+    """Return the shared engine for the local database (URL from environment or default values)."""
+    if database_url is None:
+        database_url = default_database_url()
+    return get_engine(database_url, echo=echo, **pool_options)
+
+def create_prod_engine(database_url: str = None, echo: bool = True, **pool_options):
+    """Return the shared engine for the production database (PROD_URL unless given)."""
+    if database_url is None:
+        database_url = os.getenv('PROD_URL', '')
     print(f"Connecting to production database at: {database_url}")
-    engine = create_engine(url=database_url, echo=echo)
-    return engine
+    return get_engine(database_url, echo=echo, **pool_options)
 
 
-def get_session(engine=None, echo: bool = False) -> Session:
-    """Create a SQLAlchemy session bound to the given engine (or default engine)."""
+def get_sessionmaker(engine=None, echo: bool = False) -> sessionmaker:
+    """The sessionmaker bound to an engine (default: the local database engine), created once."""
     if engine is None:
         engine = create_database_engine(echo=echo)
-    SessionLocal = sessionmaker(bind=engine)
-    return SessionLocal()
+    factory = _SESSION_FACTORIES.get(engine)
+    if factory is None:
+        with _REGISTRY_LOCK:
+            factory = _SESSION_FACTORIES.setdefault(engine, sessionmaker(bind=engine))
+    return factory
+
+
+def get_session(engine=None, echo: bool = False) -> Session:
+    """Create a SQLAlchemy session bound to the given engine (or default engine)."""
+    return get_sessionmaker(engine, echo=echo)()
+
+
+@contextmanager
+def session_scope(engine=None, echo: bool = False) -> Iterator[Session]:
+    """Session that commits on success, rolls back on error and is always closed."""
+    session = get_session(engine, echo=echo)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 
 # Document Storage Utilities
@@ -181,6 +268,66 @@ BASIC_NOMINA_CONCEPTS = [
 ]
 
 
+# ============================================================================
+# Payroll inserts
+# ============================================================================
+
+# Duplicate payrolls (same employee, period and liquido) are rejected by this
+# partial unique index; payrolls with an incomplete period never conflict.
+# Payroll.__table_args__ declares it for create_all; the SQL below adds it to
+# databases created before that.
+PAYROLL_CONFLICT_COLUMNS = ["employee_id", "period_start", "period_end", "liquido_a_percibir"]
+
+CREATE_PAYROLL_UNIQUE_INDEX_SQL = text("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_employee_period_amount
+    ON payrolls (employee_id, period_start, period_end, liquido_a_percibir)
+    WHERE period_start IS NOT NULL
+      AND period_end IS NOT NULL
+      AND liquido_a_percibir IS NOT NULL
+""")
+
+
+def insert_payroll_if_new(session: Session, payroll_values: Dict[str, Any]) -> Optional[int]:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING id against idx_unique_employee_period_amount.
+
+    Returns the new payroll id, or None when the payroll already exists. One
+    round trip, and safe against concurrent inserts of the same payroll. The
+    values must include period_start/period_end (see periodo_bounds).
+    """
+    payrolls = Payroll.__table__
+    dialect_insert = sqlite.insert if session.get_bind().dialect.name == "sqlite" else postgresql.insert
+    stmt = (
+        dialect_insert(payrolls)
+        .values(**payroll_values)
+        .on_conflict_do_nothing(
+            index_elements=PAYROLL_CONFLICT_COLUMNS,
+            index_where=and_(
+                payrolls.c.period_start.is_not(None),
+                payrolls.c.period_end.is_not(None),
+                payrolls.c.liquido_a_percibir.is_not(None),
+            ),
+        )
+        .returning(payrolls.c.id)
+    )
+    payroll_id = session.execute(stmt).scalar_one_or_none()
+    if payroll_id is not None:
+        employee_coverage.employee_coverage_changed(session, [payroll_values["employee_id"]])
+    return payroll_id
+
+
+def insert_payrolls(session: Session, payroll_rows: List[Dict[str, Any]]) -> List[int]:
+    """Insert payrolls in one executemany and return their ids in row order."""
+    if not payroll_rows:
+        return []
+    payroll_ids = session.execute(
+        insert(Payroll).returning(Payroll.id, sort_by_parameter_order=True),
+        payroll_rows,
+    ).scalars().all()
+    employee_coverage.employee_coverage_changed(session, {row["employee_id"] for row in payroll_rows})
+    return payroll_ids
+
+
 # ============================================================================
 # Query endpoints
 # ============================================================================
@@ -234,6 +381,30 @@ def _parse_period_iso(period_iso: str) -> tuple[date, date]:
     return single, single
 
 
+def _payroll_overlap_filter(period_start: date, period_end: date) -> tuple:
+    """
+    SQL criteria for payrolls whose period overlaps [period_start, period_end].
+
+    Uses the typed Payroll.period_start/period_end columns; payrolls without a
+    start date are excluded and a missing end date falls back to the start.
+    """
+    return (
+        Payroll.period_start.isnot(None),
+        Payroll.period_start <= period_end,
+        func.coalesce(Payroll.period_end, Payroll.period_start) >= period_start,
+    )
+
+
+def _normalize_category(category_type: Optional[str]) -> Optional[str]:
+    """Normalize a category filter ('aportacion empresa' -> 'aportacion_empresa')."""
+    if not category_type:
+        return None
+    normalized_category = category_type.strip().lower().replace(" ", "_")
+    if normalized_category == "aportacion_empresa" or normalized_category == "aportacionempresa":
+        normalized_category = "aportacion_empresa"
+    return normalized_category
+
+
 def list_employee_ssns_for_company_period(
     session: Session,
     period_iso: str,
@@ -314,44 +485,27 @@ def get_payroll_line_aggregates(
     if not has_company_period:
         return {"employee_ssn": normalized_ssn, "company_ssn": company_ssn, "period": period_iso, "totals": {}, "total_importe": Decimal("0.00")}
 
-    # Pull payrolls for employee; filter by period overlap in Python due to mixed date formats.
-    payroll_rows: Sequence[Row[tuple[int, Any]]] = (
-        session.query(Payroll.id, Payroll.periodo)
-        .filter(Payroll.employee_id == employee.id)
-        .all()
+    matching_payrolls = select(Payroll.id).where(
+        Payroll.employee_id == employee.id,
+        *_payroll_overlap_filter(period_start, period_end),
     )
-    matching_payroll_ids: list[int] = []
-    for payroll_id, periodo in payroll_rows:
-        if not isinstance(periodo, dict):
-            continue
-        desde = periodo.get("desde")
-        hasta = periodo.get("hasta") or desde
-        if not desde:
-            continue
-        try:
-            pay_start = _parse_date_str(str(desde))
-            pay_end = _parse_date_str(str(hasta)) if hasta else pay_start
-        except Exception:
-            continue
-        if pay_start <= period_end and pay_end >= period_start:
-            matching_payroll_ids.append(payroll_id)
+    payroll_count = session.execute(
+        select(func.count()).select_from(matching_payrolls.subquery())
+    ).scalar_one()
 
-    if not matching_payroll_ids:
+    if not payroll_count:
         return {"employee_ssn": normalized_ssn, "company_ssn": company_ssn, "period": period_iso, "totals": {}, "total_importe": Decimal("0.00")}
 
     query = (
         session.query(PayrollLine.category, func.sum(PayrollLine.amount))
-        .filter(PayrollLine.payroll_id.in_(matching_payroll_ids))
+        .filter(PayrollLine.payroll_id.in_(matching_payrolls))
     )
 
     if concepto_filter:
         query = query.filter(PayrollLine.concept.ilike(f"%{concepto_filter.strip()}%"))
 
-    normalized_category = None
-    if category_type:
-        normalized_category = category_type.strip().lower().replace(" ", "_")
-        if normalized_category == "aportacion_empresa" or normalized_category == "aportacionempresa":
-            normalized_category = "aportacion_empresa"
+    normalized_category = _normalize_category(category_type)
+    if normalized_category:
         query = query.filter(PayrollLine.category == normalized_category)
 
     query = query.group_by(PayrollLine.category)
@@ -376,7 +530,7 @@ def get_payroll_line_aggregates(
         "category_type": normalized_category,
         "totals": totals,
         "total_importe": total_importe,
-        "payroll_count": len(matching_payroll_ids),
+        "payroll_count": payroll_count,
     }
 
 
@@ -419,40 +573,227 @@ def get_employee_devengo_total(
     if not has_company_period:
         return {"employee_ssn": normalized_ssn, "company_ssn": company_ssn, "period": period_iso, "devengo_total": Decimal("0.00"), "payroll_count": 0}
 
-    payroll_rows: Sequence[Row[tuple[int, Any, Decimal]]] = (
-        session.query(Payroll.id, Payroll.periodo, Payroll.devengo_total)
-        .filter(Payroll.employee_id == employee.id)
-        .all()
+    devengo_sum, payroll_count = (
+        session.query(func.sum(Payroll.devengo_total), func.count(Payroll.id))
+        .filter(
+            Payroll.employee_id == employee.id,
+            *_payroll_overlap_filter(period_start, period_end),
+        )
+        .one()
     )
-    matching_payroll_ids: list[int] = []
-    for payroll_id, periodo, _dev in payroll_rows:
-        if not isinstance(periodo, dict):
-            continue
-        desde = periodo.get("desde")
-        hasta = periodo.get("hasta") or desde
-        if not desde:
-            continue
-        try:
-            pay_start = _parse_date_str(str(desde))
-            pay_end = _parse_date_str(str(hasta)) if hasta else pay_start
-        except Exception:
-            continue
-        if pay_start <= period_end and pay_end >= period_start:
-            matching_payroll_ids.append(payroll_id)
 
-    if not matching_payroll_ids:
+    if not payroll_count:
         return {"employee_ssn": normalized_ssn, "company_ssn": company_ssn, "period": period_iso, "devengo_total": Decimal("0.00"), "payroll_count": 0}
 
-    devengo_sum = (
-        session.query(func.sum(Payroll.devengo_total))
-        .filter(Payroll.id.in_(matching_payroll_ids))
-        .scalar()
-    ) or Decimal("0.00")
-
     return {
         "employee_ssn": normalized_ssn,
         "company_ssn": company_ssn,
         "period": period_iso,
-        "devengo_total": devengo_sum,
-        "payroll_count": len(matching_payroll_ids),
+        "devengo_total": devengo_sum or Decimal("0.00"),
+        "payroll_count": payroll_count,
     }
+
+
+# ============================================================================
+# Batch query endpoints
+# ============================================================================
+
+# Requests per statement; each request binds 4 parameters in the VALUES list
+BATCH_QUERY_CHUNK = 1000
+
+PeriodRequest = Tuple[str, str, str]  # (employee_ssn, company_ssn/CCC, period_iso)
+
+
+def _first_ids_by(column, id_column):
+    """Subquery mapping each value of column to the lowest id carrying it (the row .first() resolves to)."""
+    return (
+        select(column.label("value"), func.min(id_column).label("id"))
+        .where(column.isnot(None))
+        .group_by(column)
+        .subquery()
+    )
+
+
+def _matching_payrolls_cte(requests: List[Tuple[int, str, str, date, date]]):
+    """
+    CTE of (idx, payroll_id) for every request whose employee has a period at
+    the CCC's location overlapping the request period, joined to the
+    employee's payrolls overlapping that period.
+    """
+    req = values(
+        column("idx", Integer), column("ssn", String), column("ccc", String),
+        column("period_start", Date), column("period_end", Date),
+        name="req",
+    ).data(requests).cte("req")
+    employees = _first_ids_by(Employee.ss_number, Employee.id)
+
+    has_company_period = exists().where(
+        EmployeePeriod.employee_id == employees.c.id,
+        EmployeePeriod.location_id == ClientLocation.id,
+        EmployeePeriod.period_begin_date <= req.c.period_end,
+        func.coalesce(EmployeePeriod.period_end_date, req.c.period_end) >= req.c.period_start,
+    )
+    return (
+        select(req.c.idx, Payroll.id.label("payroll_id"), Payroll.devengo_total)
+        .join(employees, employees.c.value == req.c.ssn)
+        .join(ClientLocation, ClientLocation.ccc_ss == req.c.ccc)
+        .join(Payroll, Payroll.employee_id == employees.c.id)
+        .where(
+            has_company_period,
+            Payroll.period_start.isnot(None),
+            Payroll.period_start <= req.c.period_end,
+            func.coalesce(Payroll.period_end, Payroll.period_start) >= req.c.period_start,
+        )
+        .cte("matches")
+    )
+
+
+def _prepare_requests(requests: Iterable[PeriodRequest]):
+    """Deduplicate requests and resolve SSNs/periods; returns (keys, indexed rows)."""
+    keys: List[PeriodRequest] = list(dict.fromkeys(tuple(request) for request in requests))
+    rows = []
+    for idx, (employee_ssn, company_ssn, period_iso) in enumerate(keys):
+        normalized_ssn = normalize_ssn(employee_ssn)
+        period_start, period_end = _parse_period_iso(period_iso)
+        rows.append((idx, normalized_ssn, company_ssn, period_start, period_end))
+    return keys, rows
+
+
+def get_payroll_line_aggregates_batch(
+    session: Session,
+    requests: Iterable[PeriodRequest],
+    concepto_filter: Optional[str] = None,
+    category_type: Optional[str] = None,
+) -> Dict[PeriodRequest, dict]:
+    """
+    Batch variant of get_payroll_line_aggregates.
+
+    Answers many (employee_ssn, company_ssn, period_iso) tuples with one
+    statement per BATCH_QUERY_CHUNK requests: the requests are joined as a
+    VALUES list to employees, locations, periods and payrolls, and line
+    amounts are grouped by request and category. Returns a dict keyed by
+    the input tuple with the same payload as the single-request function.
+    """
+    normalized_category = _normalize_category(category_type)
+    keys, rows = _prepare_requests(requests)
+    results: Dict[PeriodRequest, dict] = {}
+
+    for chunk in chunked(rows, BATCH_QUERY_CHUNK):
+        queryable = [row for row in chunk if row[1]]
+        counts: Dict[int, int] = {}
+        totals: Dict[int, Dict[str, Decimal]] = {}
+        if queryable:
+            matches = _matching_payrolls_cte(queryable)
+            line_filters = [PayrollLine.payroll_id == matches.c.payroll_id]
+            if concepto_filter:
+                line_filters.append(PayrollLine.concept.ilike(f"%{concepto_filter.strip()}%"))
+            if normalized_category:
+                line_filters.append(PayrollLine.category == normalized_category)
+
+            payroll_counts = select(
+                matches.c.idx, literal("count").label("kind"), literal(None, String).label("category"),
+                func.count(matches.c.payroll_id).label("value"),
+            ).group_by(matches.c.idx)
+            line_sums = (
+                select(
+                    matches.c.idx, literal("sum").label("kind"), PayrollLine.category.label("category"),
+                    func.sum(PayrollLine.amount).label("value"),
+                )
+                .join(PayrollLine, and_(*line_filters))
+                .group_by(matches.c.idx, PayrollLine.category)
+            )
+            for idx, kind, category, value in session.execute(union_all(payroll_counts, line_sums)):
+                if kind == "count":
+                    counts[idx] = int(value)
+                else:
+                    totals.setdefault(idx, {})[str(category)] = Decimal(str(value)) if value is not None else Decimal("0.00")
+
+        for idx, normalized_ssn, company_ssn, _, _ in chunk:
+            period_iso = keys[idx][2]
+            if not counts.get(idx):
+                results[keys[idx]] = {"employee_ssn": normalized_ssn, "company_ssn": company_ssn, "period": period_iso, "totals": {}, "total_importe": Decimal("0.00")}
+                continue
+            request_totals = totals.get(idx, {})
+            total_importe = sum(request_totals.values(), Decimal("0.00"))
+            if normalized_category and normalized_category not in request_totals:
+                request_totals[normalized_category] = Decimal("0.00")
+            results[keys[idx]] = {
+                "employee_ssn": normalized_ssn,
+                "company_ssn": company_ssn,
+                "period": period_iso,
+                "concepto_filter": concepto_filter,
+                "category_type": normalized_category,
+                "totals": request_totals,
+                "total_importe": total_importe,
+                "payroll_count": counts[idx],
+            }
+    return results
+
+
+def get_employee_devengo_total_batch(
+    session: Session,
+    requests: Iterable[PeriodRequest],
+) -> Dict[PeriodRequest, dict]:
+    """
+    Batch variant of get_employee_devengo_total.
+
+    One statement per BATCH_QUERY_CHUNK requests (VALUES join plus GROUP BY
+    request); returns a dict keyed by the input tuple.
+    """
+    keys, rows = _prepare_requests(requests)
+    results: Dict[PeriodRequest, dict] = {}
+
+    for chunk in chunked(rows, BATCH_QUERY_CHUNK):
+        queryable = [row for row in chunk if row[1]]
+        sums: Dict[int, Tuple[Any, int]] = {}
+        if queryable:
+            matches = _matching_payrolls_cte(queryable)
+            stmt = select(
+                matches.c.idx, func.sum(matches.c.devengo_total), func.count(matches.c.payroll_id),
+            ).group_by(matches.c.idx)
+            sums = {idx: (devengo_sum, payroll_count) for idx, devengo_sum, payroll_count in session.execute(stmt)}
+
+        for idx, normalized_ssn, company_ssn, _, _ in chunk:
+            devengo_sum, payroll_count = sums.get(idx, (None, 0))
+            results[keys[idx]] = {
+                "employee_ssn": normalized_ssn,
+                "company_ssn": company_ssn,
+                "period": keys[idx][2],
+                "devengo_total": devengo_sum if payroll_count and devengo_sum is not None else Decimal("0.00"),
+                "payroll_count": payroll_count,
+            }
+    return results
+
+
+def list_employee_ssns_for_company_periods(
+    session: Session,
+    period_iso: str,
+    company_ssns: Iterable[str],  # CCCs (ClientLocation.ccc_ss)
+) -> Dict[str, list[str]]:
+    """
+    Batch variant of list_employee_ssns_for_company_period for many CCCs.
+
+    One statement per BATCH_QUERY_CHUNK CCCs; returns {ccc: [ssn, ...]} with
+    an entry (possibly empty) for every requested CCC.
+    """
+    period_start, period_end = _parse_period_iso(period_iso)
+    cccs = list(dict.fromkeys(company_ssns))
+    results: Dict[str, list[str]] = {ccc: [] for ccc in cccs}
+
+    for chunk in chunked(cccs, BATCH_QUERY_CHUNK):
+        stmt = (
+            select(ClientLocation.ccc_ss, Employee.ss_number)
+            .join(EmployeePeriod, EmployeePeriod.location_id == ClientLocation.id)
+            .join(Employee, Employee.id == EmployeePeriod.employee_id)
+            .where(
+                ClientLocation.ccc_ss.in_(chunk),
+                EmployeePeriod.period_begin_date <= period_end,
+                func.coalesce(EmployeePeriod.period_end_date, period_end) >= period_start,
+                Employee.ss_number.isnot(None),
+            )
+            .distinct()
+        )
+        for ccc, ssn in session.execute(stmt):
+            if ssn:
+                results[ccc].append(ssn)
+    return results
@@ -0,0 +1,370 @@
+"""
+Employee/month payroll coverage maintenance.
+
+employee_month_coverage stores, per employee and month, whether a payroll is
+expected (alta/baja periods) and whether a payslip or settlement covers it.
+Rows are recomputed per employee after every ORM flush that touches Payroll
+or EmployeePeriod, so missing payslip reports read coverage instead of
+expanding periods and payrolls employee by employee.
+
+Writes that bypass the unit of work (Core inserts, raw SQL) must report the
+touched employees through employee_coverage_changed.
+
+Databases created before the table existed are migrated by
+ensure_employee_coverage (run by main.py and scripts/setup_database.py).
+Until then refreshes are skipped, and readers compute coverage from periods
+and payrolls for every employee that has no stored rows.
+"""
+
+from __future__ import annotations
+
+import weakref
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, exists, func, insert, inspect, select, union
+from sqlalchemy.orm import Session
+
+from core.models import Employee, EmployeeMonthCoverage, EmployeePeriod, Payroll
+from core.utils.batching import IN_CLAUSE_CHUNK, chunked
+
+# Attributes whose changes can move an employee's coverage
+_PAYROLL_COVERAGE_ATTRS = ("employee_id", "type", "period_start", "period_end")
+_PERIOD_COVERAGE_ATTRS = ("employee_id", "period_type", "period_begin_date", "period_end_date")
+
+# session.info keys: employee ids whose refresh is deferred / collected before a flush
+_DEFERRED_KEY = "employee_coverage_deferred"
+_PENDING_KEY = "employee_coverage_pending"
+
+MonthKey = Tuple[int, int]
+CoverageRow = Tuple[int, date, bool, bool, bool]
+
+# Engines known to have the coverage table; only positive checks are cached
+_TABLE_PRESENT: "weakref.WeakKeyDictionary[Any, bool]" = weakref.WeakKeyDictionary()
+
+
+def _iter_months(start: date, end: date) -> Iterator[date]:
+    """Yield the first day of every month between start and end (inclusive)."""
+    current = start.replace(day=1)
+    end = end.replace(day=1)
+    while current <= end:
+        yield current
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+
+
+def build_coverage_rows(
+    periods: Iterable[Any],
+    payrolls: Iterable[Any],
+    horizon: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build employee_month_coverage rows from alta/baja periods and payrolls.
+
+    periods need employee_id, period_begin_date and period_end_date; payrolls
+    need employee_id, type, period_start and period_end. Open-ended periods
+    are expanded up to `horizon` (default: today).
+    """
+    horizon = horizon or date.today()
+    rows: Dict[Tuple[int, date], Dict[str, Any]] = {}
+
+    def _row(employee_id: int, month: date) -> Dict[str, Any]:
+        key = (employee_id, month)
+        if key not in rows:
+            rows[key] = {
+                "employee_id": employee_id,
+                "month": month,
+                "expected": False,
+                "has_payslip": False,
+                "has_settlement": False,
+            }
+        return rows[key]
+
+    for period in periods:
+        if not period.period_begin_date:
+            continue
+        for month in _iter_months(period.period_begin_date, period.period_end_date or horizon):
+            _row(period.employee_id, month)["expected"] = True
+
+    for payroll in payrolls:
+        ref_date = payroll.period_end or payroll.period_start
+        if not ref_date:
+            continue
+        row = _row(payroll.employee_id, ref_date.replace(day=1))
+        if payroll.type in {"payslip", "hybrid"}:
+            row["has_payslip"] = True
+        if payroll.type in {"settlement", "hybrid"}:
+            row["has_settlement"] = True
+
+    return [rows[key] for key in sorted(rows)]
+
+
+def coverage_table_exists(connection) -> bool:
+    """Whether employee_month_coverage exists; `connection` may be a Connection or a Session."""
+    conn = connection.connection() if isinstance(connection, Session) else connection
+    if conn.engine in _TABLE_PRESENT:
+        return True
+    if not inspect(conn).has_table(EmployeeMonthCoverage.__tablename__):
+        return False
+    _TABLE_PRESENT[conn.engine] = True
+    return True
+
+
+def _compute_coverage_rows(connection, employee_ids: List[int], horizon: Optional[date] = None) -> List[Dict[str, Any]]:
+    periods = connection.execute(
+        select(EmployeePeriod.employee_id, EmployeePeriod.period_begin_date, EmployeePeriod.period_end_date)
+        .where(EmployeePeriod.employee_id.in_(employee_ids), EmployeePeriod.period_type.in_(("alta", "baja")))
+    ).all()
+    payrolls = connection.execute(
+        select(Payroll.employee_id, Payroll.type, Payroll.period_start, Payroll.period_end)
+        .where(Payroll.employee_id.in_(employee_ids))
+    ).all()
+    return build_coverage_rows(periods, payrolls, horizon)
+
+
+def refresh_employee_coverage(connection, employee_ids: Iterable[int], horizon: Optional[date] = None) -> int:
+    """
+    Recompute coverage rows for the given employees.
+
+    `connection` may be a Connection or a Session; the refresh runs in its
+    current transaction. Does nothing while the table has not been created.
+    Returns the number of coverage rows written.
+    """
+    if not coverage_table_exists(connection):
+        return 0
+    coverage = EmployeeMonthCoverage.__table__
+    written = 0
+    for chunk in chunked(sorted({e for e in employee_ids if e is not None})):
+        rows = _compute_coverage_rows(connection, chunk, horizon)
+        connection.execute(delete(coverage).where(coverage.c.employee_id.in_(chunk)))
+        if rows:
+            connection.execute(insert(coverage), rows)
+        written += len(rows)
+    return written
+
+
+def _uncovered_employee_ids():
+    """Employees with alta/baja periods or dated payrolls but no coverage rows."""
+    coverage = EmployeeMonthCoverage.__table__
+
+    def _no_coverage(employee_id):
+        return ~exists().where(coverage.c.employee_id == employee_id)
+
+    return union(
+        select(EmployeePeriod.employee_id).where(
+            EmployeePeriod.period_type.in_(("alta", "baja")),
+            EmployeePeriod.period_begin_date.is_not(None),
+            _no_coverage(EmployeePeriod.employee_id),
+        ),
+        select(Payroll.employee_id).where(
+            func.coalesce(Payroll.period_end, Payroll.period_start).is_not(None),
+            _no_coverage(Payroll.employee_id),
+        ),
+    )
+
+
+def ensure_employee_coverage(engine, batch_size: int = IN_CLAUSE_CHUNK, horizon: Optional[date] = None) -> int:
+    """
+    Create employee_month_coverage if missing and build it for employees that have none.
+
+    Covers a freshly created table as well as employees written while it did
+    not exist; employees are refreshed in batches, one transaction each.
+    Returns the number of employees refreshed.
+    """
+    EmployeeMonthCoverage.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        employee_ids = sorted(conn.execute(_uncovered_employee_ids()).scalars())
+    for chunk in chunked(employee_ids, batch_size):
+        with engine.begin() as conn:
+            refresh_employee_coverage(conn, chunk, horizon)
+    return len(employee_ids)
+
+
+def rebuild_employee_coverage(engine, batch_size: int = IN_CLAUSE_CHUNK, horizon: Optional[date] = None) -> int:
+    """Rebuild coverage for every employee, committing one batch of employees at a time."""
+    with engine.begin() as conn:
+        # Drop rows of employees that no longer have periods or payrolls
+        conn.execute(delete(EmployeeMonthCoverage.__table__))
+
+    written = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            employee_ids = conn.execute(
+                select(Employee.id).where(Employee.id > last_id).order_by(Employee.id).limit(batch_size)
+            ).scalars().all()
+            if not employee_ids:
+                break
+            written += refresh_employee_coverage(conn, employee_ids, horizon)
+        last_id = employee_ids[-1]
+        print(f"  rebuilt coverage up to employee {last_id} ({written} rows)...")
+    return written
+
+
+def load_coverage_rows(connection, employee_ids: Iterable[int], *, month: Optional[date] = None) -> List[CoverageRow]:
+    """
+    (employee_id, month, expected, has_payslip, has_settlement) rows of the given employees.
+
+    `month` limits the rows to that first-of-month date. Employees without
+    stored rows (the table was never built for them, or does not exist yet)
+    are computed from their periods and payrolls, so reports on an unmigrated
+    database match a built one instead of counting every month as missing.
+    """
+    employee_ids = sorted({e for e in employee_ids if e is not None})
+    coverage = EmployeeMonthCoverage.__table__
+    rows: List[CoverageRow] = []
+    uncovered = employee_ids
+    if coverage_table_exists(connection):
+        covered: Set[int] = set()
+        for chunk in chunked(employee_ids):
+            covered.update(connection.execute(
+                select(coverage.c.employee_id).where(coverage.c.employee_id.in_(chunk)).distinct()
+            ).scalars())
+            stmt = select(
+                coverage.c.employee_id, coverage.c.month, coverage.c.expected,
+                coverage.c.has_payslip, coverage.c.has_settlement,
+            ).where(coverage.c.employee_id.in_(chunk))
+            if month is not None:
+                stmt = stmt.where(coverage.c.month == month)
+            rows.extend(tuple(row) for row in connection.execute(stmt))
+        uncovered = [employee_id for employee_id in employee_ids if employee_id not in covered]
+
+    computed: Set[int] = set()
+    for chunk in chunked(uncovered):
+        for row in _compute_coverage_rows(connection, chunk):
+            computed.add(row["employee_id"])
+            if month is None or row["month"] == month:
+                rows.append((row["employee_id"], row["month"], row["expected"], row["has_payslip"], row["has_settlement"]))
+    if computed:
+        print(
+            f"⚠️  employee_month_coverage not built for {len(computed)} employees; computed from periods and "
+            "payrolls (run scripts/rebuild_employee_coverage.py)"
+        )
+    return rows
+
+
+def load_coverage_months(
+    session: Session,
+    periods_by_employee: Dict[int, List[Any]],
+    *,
+    current_date: date,
+    cutoff_date: Optional[date] = None,
+    start_date_cap: Optional[date] = None,
+) -> Dict[int, Tuple[Set[MonthKey], Set[MonthKey], Set[MonthKey]]]:
+    """
+    Read (expected, processed, settlement) month sets per employee from coverage.
+
+    Expected months are limited to [start_date_cap, cutoff_date]. Open-ended
+    periods are expanded up to current_date here, since stored rows only reach
+    the month of the last refresh. periods_by_employee holds each employee's
+    alta/baja periods.
+    """
+    result: Dict[int, Tuple[Set[MonthKey], Set[MonthKey], Set[MonthKey]]] = {
+        employee_id: (set(), set(), set()) for employee_id in periods_by_employee
+    }
+    first_month = start_date_cap.replace(day=1) if start_date_cap else None
+    last_month = cutoff_date.replace(day=1) if cutoff_date else None
+
+    for employee_id, month, expected, has_payslip, has_settlement in load_coverage_rows(session, periods_by_employee):
+        expected_months, processed_months, settlement_months = result[employee_id]
+        key = (month.year, month.month)
+        if expected and (not first_month or month >= first_month) and (not last_month or month <= last_month):
+            expected_months.add(key)
+        if has_payslip or has_settlement:
+            processed_months.add(key)
+        if has_settlement:
+            settlement_months.add(key)
+
+    for employee_id, periods in periods_by_employee.items():
+        expected_months = result[employee_id][0]
+        for period in periods:
+            if period.period_end_date or not period.period_begin_date:
+                continue
+            start = max(period.period_begin_date, start_date_cap) if start_date_cap else period.period_begin_date
+            expected_months.update((m.year, m.month) for m in _iter_months(start, current_date))
+
+    return result
+
+
+def employee_coverage_changed(connection, employee_ids: Iterable[int]) -> None:
+    """
+    Bring coverage in line after payroll/period writes that bypass the ORM flush.
+
+    Core inserts and raw SQL never reach the flush listeners below, so such
+    writes report their employees here. `connection` may be a Connection or a
+    Session; inside deferred_coverage_refresh the refresh is queued.
+    """
+    employee_ids = {e for e in employee_ids if e is not None}
+    if not employee_ids:
+        return
+    deferred = connection.info.get(_DEFERRED_KEY)
+    if deferred is not None:
+        deferred.update(employee_ids)
+        return
+    refresh_employee_coverage(connection, employee_ids)
+
+
+def _apply_deferred(session: Session) -> None:
+    session.flush()
+    pending = session.info.get(_DEFERRED_KEY)
+    if pending:
+        refresh_employee_coverage(session.connection(), pending)
+        pending.clear()
+
+
+@contextmanager
+def deferred_coverage_refresh(session: Session) -> Iterator[None]:
+    """
+    Collect coverage refreshes while the block runs and apply them at the end.
+
+    Use around loops that flush many times (e.g. vida laboral imports).
+    Queued refreshes are also applied before each commit inside the block.
+    """
+    if _DEFERRED_KEY in session.info:
+        yield
+        return
+    session.info[_DEFERRED_KEY] = set()
+    try:
+        yield
+        _apply_deferred(session)
+    finally:
+        session.info.pop(_DEFERRED_KEY, None)
+
+
+def _coverage_attrs(obj: Any) -> Optional[Tuple[str, ...]]:
+    if isinstance(obj, Payroll):
+        return _PAYROLL_COVERAGE_ATTRS
+    if isinstance(obj, EmployeePeriod):
+        return _PERIOD_COVERAGE_ATTRS
+    return None
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_deleted_coverage_rows(session: Session, _flush_context, _instances) -> None:
+    # Read owners of deleted rows while they can still be loaded
+    employee_ids = {obj.employee_id for obj in session.deleted if _coverage_attrs(obj)}
+    employee_ids.discard(None)
+    if employee_ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(employee_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_coverage_after_flush(session: Session, _flush_context) -> None:
+    employee_ids: Set[int] = session.info.pop(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty):
+        attrs = _coverage_attrs(obj)
+        if not attrs:
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[attr].history.has_changes() for attr in attrs):
+            continue
+        employee_ids.add(obj.employee_id)
+        # Moving a row to another employee also changes the previous owner's coverage
+        employee_ids.update(state.attrs.employee_id.history.deleted or ())
+    employee_coverage_changed(session, employee_ids)
+
+
+@event.listens_for(Session, "before_commit")
+def _refresh_deferred_before_commit(session: Session) -> None:
+    if session.info.get(_DEFERRED_KEY) is not None:
+        _apply_deferred(session)
@@ -0,0 +1,199 @@
+"""
+Declarative production -> local field syncs.
+
+A FieldSync names a local table, the column its rows are matched on, a source
+query returning production values for a chunk of those keys, and a map of
+local columns to source columns. run_field_sync loads the local keys and
+current values, streams the source rows chunk by chunk, diffs them in memory
+and writes only changed fields with core.prod_sync.bulk_update_from_values
+(one UPDATE ... FROM (VALUES ...) per batch and set of changed fields).
+
+The syncs shipped here are listed in FIELD_SYNCS.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Select, Table, select
+from sqlalchemy.orm import Session
+
+from core.models import Client, ClientLocation, Employee
+from core.normalization import normalize_ssn
+from core.prod_sync import bulk_update_from_values
+from core.production_models import ProductionCompany, ProductionEmployee, ProductionLocation
+from core.utils.batching import chunked
+
+FIELD_SYNC_BATCH = 1000
+
+
+def _strip(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+@dataclass(frozen=True)
+class FieldSync:
+    """How to copy fields of one local table from production."""
+    name: str
+    local_table: Table
+    local_key: str  # Local column matched against the source key
+    source: Callable[[List[Any]], Select]  # Source query for a chunk of normalized local keys
+    fields: Mapping[str, str]  # Local column -> source column label
+    source_key: str = "key"  # Label of the key in the source query
+    normalize_key: Callable[[Any], Any] = _strip
+    transforms: Mapping[str, Callable[[Any], Any]] = field(default_factory=dict)  # Per local column
+    skip_null: bool = True  # A NULL source value never overwrites local data
+    only_if_empty: bool = False  # Only fill local columns that are NULL
+    local_pk: str = "id"
+
+
+def run_field_sync(
+    sync: FieldSync,
+    prod_session: Session,
+    local_session: Session,
+    *,
+    batch_size: int = FIELD_SYNC_BATCH,
+) -> Dict[str, Any]:
+    """
+    Copy the fields of `sync` from production into the local table.
+
+    Local rows without a key are skipped; when a source key appears more than
+    once the last row wins. The caller commits. Returns counts per outcome,
+    changes per field and throughput.
+    """
+    start = time.perf_counter()
+    table = sync.local_table
+    local_columns = list(sync.fields)
+
+    local_rows: Dict[Any, List[Any]] = {}
+    skipped_no_key = 0
+    stmt = (
+        select(table.c[sync.local_pk], table.c[sync.local_key], *(table.c[name] for name in local_columns))
+        .where(table.c[sync.local_key].is_not(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for row in local_session.execute(stmt):
+        key = sync.normalize_key(row[1])
+        if key is None:
+            skipped_no_key += 1
+            continue
+        local_rows.setdefault(key, []).append(row)
+
+    counts = {"source_rows": 0, "matched": 0, "unmatched": 0, "matched_null": 0, "changed": 0, "unchanged": 0}
+    fields_changed = {name: 0 for name in local_columns}
+    # Pending updates grouped by the set of columns they change
+    pending: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+
+    def flush(columns: Tuple[str, ...]) -> None:
+        bulk_update_from_values(local_session, table, sync.local_pk, pending.pop(columns), columns, batch_size)
+
+    for chunk in chunked(sorted(local_rows), batch_size):
+        source_values: Dict[Any, Dict[str, Any]] = {}
+        result = prod_session.execute(sync.source(chunk).execution_options(yield_per=batch_size))
+        for row in result.mappings():
+            counts["source_rows"] += 1
+            key = sync.normalize_key(row[sync.source_key])
+            if key in local_rows:
+                source_values[key] = {
+                    name: sync.transforms.get(name, lambda value: value)(row[label])
+                    for name, label in sync.fields.items()
+                }
+
+        for key in chunk:
+            values = source_values.get(key)
+            if values is None:
+                counts["unmatched"] += len(local_rows[key])
+                continue
+            usable = {name: value for name, value in values.items() if value is not None or not sync.skip_null}
+            for row in local_rows[key]:
+                counts["matched"] += 1
+                if not usable:
+                    counts["matched_null"] += 1
+                    continue
+                current = dict(zip(local_columns, row[2:]))
+                changes = {
+                    name: value
+                    for name, value in usable.items()
+                    if current[name] != value and not (sync.only_if_empty and current[name] is not None)
+                }
+                if not changes:
+                    counts["unchanged"] += 1
+                    continue
+                counts["changed"] += 1
+                for name in changes:
+                    fields_changed[name] += 1
+                columns = tuple(sorted(changes))
+                pending.setdefault(columns, []).append({sync.local_pk: row[0], **changes})
+                if len(pending[columns]) >= batch_size:
+                    flush(columns)
+
+    for columns in list(pending):
+        flush(columns)
+
+    elapsed = time.perf_counter() - start
+    compared = sum(len(rows) for rows in local_rows.values())
+    return {
+        "name": sync.name,
+        "local_rows": compared,
+        "skipped_no_key": skipped_no_key,
+        **counts,
+        "fields_changed": fields_changed,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(compared / elapsed, 1) if elapsed else None,
+    }
+
+
+EMPLOYEE_BIRTH_DATES = FieldSync(
+    name="employee_birth_dates",
+    local_table=Employee.__table__,
+    local_key="ss_number",
+    normalize_key=normalize_ssn,
+    source=lambda ssns: select(
+        ProductionEmployee.ss_number.label("key"), ProductionEmployee.birth_date
+    ).where(ProductionEmployee.ss_number.in_(ssns)),
+    fields={"birth_date": "birth_date"},
+)
+
+# Fills SSNs of employees created without one (the vida laboral handlers never overwrite them)
+EMPLOYEE_SS_NUMBERS = FieldSync(
+    name="employee_ss_numbers",
+    local_table=Employee.__table__,
+    local_key="identity_card_number",
+    source=lambda documents: select(
+        ProductionEmployee.identity_card_number.label("key"), ProductionEmployee.ss_number
+    ).where(ProductionEmployee.identity_card_number.in_(documents)),
+    fields={"ss_number": "ss_number"},
+    transforms={"ss_number": normalize_ssn},
+    only_if_empty=True,
+)
+
+LOCATION_POSTAL_CODES = FieldSync(
+    name="location_postal_codes",
+    local_table=ClientLocation.__table__,
+    local_key="ccc_ss",
+    source=lambda cccs: select(
+        ProductionLocation.ccc.label("key"), ProductionLocation.postal_code
+    ).where(ProductionLocation.ccc.in_(cccs), ProductionLocation.deleted_at.is_(None)),
+    fields={"postal_code": "postal_code"},
+    transforms={"postal_code": _strip},
+)
+
+CLIENT_POSTAL_CODES = FieldSync(
+    name="client_postal_codes",
+    local_table=Client.__table__,
+    local_key="cif",
+    source=lambda cifs: select(
+        ProductionCompany.cif.label("key"), ProductionCompany.company_postal_code
+    ).where(ProductionCompany.cif.in_(cifs)),
+    fields={"postal_code": "company_postal_code"},
+    transforms={"postal_code": _strip},
+)
+
+FIELD_SYNCS = {
+    sync.name: sync
+    for sync in (EMPLOYEE_BIRTH_DATES, EMPLOYEE_SS_NUMBERS, LOCATION_POSTAL_CODES, CLIENT_POSTAL_CODES)
+}
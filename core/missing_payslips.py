@@ -7,17 +7,81 @@ missing payslips without requiring the ValeriaAgent or agent dependencies.
 
 from __future__ import annotations
 
+import csv
 import json
 import os
+import threading
+import time
 from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional, Set, Tuple
 from uuid import UUID
 
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session, sessionmaker
 
-from core.models import ClientLocation, Employee, EmployeePeriod, Payroll
-from core.utils.periods import period_reference_date
+from core.employee_coverage import load_coverage_months, load_coverage_rows
+from core.models import Client, ClientLocation, Employee, EmployeePeriod
+from core.utils.batching import chunked
+
+
+# Expected months are never generated before this date (applied regardless of start_month)
+DEFAULT_START_DATE_CAP = date(2025, 1, 1)
+
+
+def _parse_report_window(
+    last_month: Optional[str],
+    start_month: Optional[str],
+    verbose: bool = True,
+) -> Tuple[Optional[date], Optional[date], Optional[Dict[str, Any]]]:
+    """
+    Parse the MM/YYYY cutoff and start months of a report.
+
+    Returns (cutoff_date, start_date_cap, error); error is the failure dict to
+    return to the caller when an input is invalid.
+    """
+    # Parse last_month if provided
+    cutoff_date = None
+    if last_month:
+        try:
+            # Parse MM/YYYY format
+            cutoff_date = datetime.strptime(last_month, "%m/%Y").date()
+
+            # Set to last day of that month using monthrange
+            last_day = monthrange(cutoff_date.year, cutoff_date.month)[1]
+            cutoff_date = cutoff_date.replace(day=last_day)
+
+            if verbose:
+                print(f"📅 Cutoff date set to: {cutoff_date.strftime('%Y-%m-%d')}")
+                print(f"   Only checking for missing payslips up to {cutoff_date.strftime('%B %Y')}")
+        except (ValueError, ImportError):
+            return None, None, {
+                "success": False,
+                "error": f"Invalid last_month format: {last_month}",
+                "message": "Use MM/YYYY format (e.g., '05/2024')"
+            }
+
+    # Parse start_month if provided
+    start_date_cap = None
+    if start_month:
+        try:
+            start_date_cap = datetime.strptime(start_month, "%m/%Y").date()
+            start_date_cap = start_date_cap.replace(day=1)
+            if cutoff_date and start_date_cap > cutoff_date:
+                return None, None, {
+                    "success": False,
+                    "error": f"start_month is after last_month: {start_month} > {last_month}",
+                    "message": "Start month must be on or before the cutoff month"
+                }
+        except (ValueError, ImportError):
+            return None, None, {
+                "success": False,
+                "error": f"Invalid start_month format: {start_month}",
+                "message": "Use MM/YYYY format (e.g., '01/2025')"
+            }
+
+    return cutoff_date, start_date_cap, None
 
 
 def detect_missing_payslips(
@@ -26,6 +90,7 @@ def detect_missing_payslips(
     client_id: str | UUID,
     last_month: Optional[str] = None,
     start_month: Optional[str] = None,
+    verbose: bool = True,
 ) -> Dict[str, Any]:
     """
     Detect missing payslips by comparing vida laboral employment periods
@@ -36,49 +101,19 @@ def detect_missing_payslips(
         client_id: Client ID to analyze
         last_month: Optional cutoff month in MM/YYYY format (e.g., "05/2024")
                    to stop calculating missing payslips after this month
+        verbose: Print per-employee progress
+
+    Expected and processed months are read from employee_month_coverage
+    (see core.employee_coverage) instead of expanding every employee's periods
+    and payrolls.
 
     Returns:
         Dict with success status, summary, and list of missing payslips
     """
     try:
-        # Parse last_month if provided
-        cutoff_date = None
-        if last_month:
-            try:
-                # Parse MM/YYYY format
-                cutoff_date = datetime.strptime(last_month, "%m/%Y").date()
-
-                # Set to last day of that month using monthrange
-                last_day = monthrange(cutoff_date.year, cutoff_date.month)[1]
-                cutoff_date = cutoff_date.replace(day=last_day)
-
-                print(f"📅 Cutoff date set to: {cutoff_date.strftime('%Y-%m-%d')}")
-                print(f"   Only checking for missing payslips up to {cutoff_date.strftime('%B %Y')}")
-            except (ValueError, ImportError) as e:
-                return {
-                    "success": False,
-                    "error": f"Invalid last_month format: {last_month}",
-                    "message": "Use MM/YYYY format (e.g., '05/2024')"
-                }
-
-        # Parse start_month if provided
-        start_date_cap = None
-        if start_month:
-            try:
-                start_date_cap = datetime.strptime(start_month, "%m/%Y").date()
-                start_date_cap = start_date_cap.replace(day=1)
-                if cutoff_date and start_date_cap > cutoff_date:
-                    return {
-                        "success": False,
-                        "error": f"start_month is after last_month: {start_month} > {last_month}",
-                        "message": "Start month must be on or before the cutoff month"
-                    }
-            except (ValueError, ImportError):
-                return {
-                    "success": False,
-                    "error": f"Invalid start_month format: {start_month}",
-                    "message": "Use MM/YYYY format (e.g., '01/2025')"
-                }
+        cutoff_date, start_date_cap, window_error = _parse_report_window(last_month, start_month, verbose)
+        if window_error:
+            return window_error
 
         # Get all employees for this client with employment periods
         # CRITICAL FIX: Join through ClientLocation to filter by company
@@ -110,9 +145,20 @@ def detect_missing_payslips(
         employees_needing_finiquito = 0
         current_date = cutoff_date if cutoff_date else date.today()
 
-        print(f"🔍 Analyzing missing payslips for {len(employees)} employees...")
+        if verbose:
+            print(f"🔍 Analyzing missing payslips for {len(employees)} employees...")
+
+        start_date_cap = DEFAULT_START_DATE_CAP
 
-        start_date_cap = date(2025, 1, 1)
+        # Alta/baja periods for every employee in one query; months come from employee_month_coverage
+        periods_by_employee = _load_employment_periods(session, [employee.id for employee in employees])
+        coverage = load_coverage_months(
+            session,
+            periods_by_employee,
+            current_date=current_date,
+            cutoff_date=cutoff_date,
+            start_date_cap=start_date_cap,
+        )
 
         for employee in employees:
             # Build full name from components
@@ -120,43 +166,20 @@ def detect_missing_payslips(
             if employee.last_name2:
                 full_name += f" {employee.last_name2}"
 
-            print(f"   📋 Checking {full_name} ({employee.identity_card_number})...")
-
-            # Query employment periods for this employee (alta/baja only, not vacaciones)
-            periods = session.query(EmployeePeriod).filter(
-                EmployeePeriod.employee_id == employee.id,
-                EmployeePeriod.period_type.in_(['alta', 'baja'])
-            ).order_by(EmployeePeriod.period_begin_date).all()
+            if verbose:
+                print(f"   📋 Checking {full_name} ({employee.identity_card_number})...")
 
+            periods = periods_by_employee.get(employee.id)
             if not periods:
-                print(f"      ⚠️  No employment periods found, skipping...")
+                if verbose:
+                    print(f"      ⚠️  No employment periods found, skipping...")
                 continue
 
-            # Generate expected months across all employment periods
-            expected_months = set()
-            for period in periods:
-                start_date = period.period_begin_date
-                if start_date_cap and start_date and start_date < start_date_cap:
-                    start_date = start_date_cap
-                end_date = period.period_end_date or current_date
-
-                # Cap end_date at cutoff_date if provided
-                if cutoff_date:
-                    end_date = min(end_date, cutoff_date)
-
-                # Generate months for this period
-                period_months = _generate_expected_months(start_date, end_date)
-                expected_months.update(period_months)
-
-            processed_nominas = session.query(Payroll).filter_by(
-                employee_id=employee.id
-            ).all()
-
-            processed_months, settlement_months = _collect_payroll_months(processed_nominas)
+            expected_months, processed_months, settlement_months = coverage[employee.id]
 
             # Find missing months
             missing_months = []
-            for year, month in expected_months:
+            for year, month in sorted(expected_months):
                 if (year, month) not in processed_months:
                     missing_months.append(f"{year}-{month:02d}")
 
@@ -236,6 +259,261 @@ def detect_missing_payslips(
         }
 
 
+# Months are compared as integer indexes (year * 12 + month - 1), so the
+# query only needs a date-part and a list aggregate per dialect.
+_MONTH_INDEX_SQL = {
+    "postgresql": "(CAST(EXTRACT(YEAR FROM {0}) AS integer) * 12 + CAST(EXTRACT(MONTH FROM {0}) AS integer) - 1)",
+    "sqlite": "(CAST(strftime('%Y', {0}) AS integer) * 12 + CAST(strftime('%m', {0}) AS integer) - 1)",
+}
+_MONTH_LIST_SQL = {
+    "postgresql": "string_agg(CAST({0} AS text), ',')",
+    "sqlite": "group_concat({0}, ',')",
+}
+
+# Expected months per employee (alta/baja periods expanded with a recursive CTE)
+# anti-joined against the months covered by payrolls, for one client at a time.
+_MISSING_PAYSLIPS_SQL = """
+    WITH RECURSIVE client_employees AS (
+        SELECT DISTINCT ep.employee_id
+        FROM employee_periods ep
+        JOIN client_locations cl ON cl.id = ep.location_id
+        WHERE cl.company_id = :client_id
+          AND (:cutoff_month IS NULL OR {begin_month} <= :cutoff_month)
+    ),
+    periods AS (
+        SELECT ep.employee_id,
+               {begin_month} AS begin_month,
+               COALESCE({end_month}, :current_month) AS end_month
+        FROM employee_periods ep
+        JOIN client_employees ce ON ce.employee_id = ep.employee_id
+        WHERE ep.period_type IN ('alta', 'baja')
+          AND ep.period_begin_date IS NOT NULL
+    ),
+    employment AS (
+        SELECT employee_id,
+               CASE WHEN begin_month < :start_cap_month THEN :start_cap_month ELSE begin_month END AS start_month,
+               CASE WHEN :cutoff_month IS NOT NULL AND end_month > :cutoff_month
+                    THEN :cutoff_month ELSE end_month END AS end_month
+        FROM periods
+    ),
+    expanded(employee_id, month, end_month) AS (
+        SELECT employee_id, start_month, end_month FROM employment WHERE start_month <= end_month
+        UNION ALL
+        SELECT employee_id, month + 1, end_month FROM expanded WHERE month < end_month
+    ),
+    expected AS (
+        SELECT DISTINCT employee_id, month FROM expanded
+    ),
+    payroll_months AS (
+        SELECT p.employee_id,
+               {payroll_month} AS month,
+               MAX(CASE WHEN p.type IN ('settlement', 'hybrid') THEN 1 ELSE 0 END) AS has_settlement
+        FROM payrolls p
+        JOIN client_employees ce ON ce.employee_id = p.employee_id
+        WHERE COALESCE(p.period_end, p.period_start) IS NOT NULL
+        GROUP BY p.employee_id, {payroll_month}
+    ),
+    coverage AS (
+        SELECT x.employee_id,
+               count(*) AS expected_count,
+               {missing_months} AS missing_months
+        FROM expected x
+        LEFT JOIN payroll_months pm ON pm.employee_id = x.employee_id AND pm.month = x.month
+        GROUP BY x.employee_id
+    ),
+    processed AS (
+        SELECT employee_id,
+               count(*) AS processed_count,
+               {settlement_months} AS settlement_months
+        FROM payroll_months
+        GROUP BY employee_id
+    )
+    SELECT e.id, e.first_name, e.last_name, e.last_name2, e.identity_card_number, e.ss_number,
+           COALESCE(c.expected_count, 0) AS expected_count,
+           COALESCE(p.processed_count, 0) AS processed_count,
+           c.missing_months,
+           p.settlement_months
+    FROM client_employees ce
+    JOIN employees e ON e.id = ce.employee_id
+    LEFT JOIN coverage c ON c.employee_id = ce.employee_id
+    LEFT JOIN processed p ON p.employee_id = ce.employee_id
+    ORDER BY e.id
+"""
+
+
+def _month_index(value: date) -> int:
+    return value.year * 12 + value.month - 1
+
+
+def _month_list(value: Optional[str]) -> List[Tuple[int, int]]:
+    """Parse an aggregated month index list into sorted (year, month) tuples."""
+    if not value:
+        return []
+    months = sorted({int(index) for index in str(value).split(",")})
+    return [(index // 12, index % 12 + 1) for index in months]
+
+
+def _missing_payslips_sql(dialect_name: str):
+    dialect = "sqlite" if dialect_name == "sqlite" else "postgresql"
+    month_index = _MONTH_INDEX_SQL[dialect].format
+    month_list = _MONTH_LIST_SQL[dialect].format
+    sql = text(_MISSING_PAYSLIPS_SQL.format(
+        begin_month=month_index("ep.period_begin_date"),
+        end_month=month_index("ep.period_end_date"),
+        payroll_month=month_index("COALESCE(p.period_end, p.period_start)"),
+        missing_months=month_list("CASE WHEN pm.employee_id IS NULL THEN x.month END"),
+        settlement_months=month_list("CASE WHEN has_settlement = 1 THEN month END"),
+    ))
+    # Typed so the UUID is rendered the way each dialect stores company_id
+    return sql.bindparams(bindparam("client_id", type_=ClientLocation.__table__.c.company_id.type))
+
+
+def detect_missing_payslips_set_based(
+    session: Session,
+    *,
+    client_id: str | UUID,
+    last_month: Optional[str] = None,
+    start_month: Optional[str] = None,
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    Set-based equivalent of detect_missing_payslips (PostgreSQL and SQLite).
+
+    Expected and missing months are computed in a single query per client,
+    plus one query for the alta/baja periods used for finiquito detection,
+    instead of two queries per employee. The report has the same structure;
+    employees are ordered by id and missing months chronologically.
+    """
+    try:
+        cutoff_date, _start_date_cap, window_error = _parse_report_window(last_month, start_month, verbose)
+        if window_error:
+            return window_error
+
+        current_date = cutoff_date if cutoff_date else date.today()
+        start_date_cap = DEFAULT_START_DATE_CAP
+
+        rows = session.execute(
+            _missing_payslips_sql(session.get_bind().dialect.name),
+            {
+                "client_id": client_id if isinstance(client_id, UUID) else UUID(str(client_id)),
+                "cutoff_month": _month_index(cutoff_date) if cutoff_date else None,
+                "start_cap_month": _month_index(start_date_cap),
+                "current_month": _month_index(current_date),
+            },
+        ).all()
+
+        if not rows:
+            return {
+                "success": False,
+                "error": "No employees found with employment periods",
+                "message": "Process vida laboral CSV first to establish employment periods"
+            }
+
+        periods_by_employee: Dict[int, List[Any]] = {}
+        period_rows = (
+            session.query(
+                EmployeePeriod.employee_id,
+                EmployeePeriod.period_type,
+                EmployeePeriod.period_begin_date,
+                EmployeePeriod.period_end_date,
+            )
+            .filter(
+                EmployeePeriod.employee_id.in_([row.id for row in rows]),
+                EmployeePeriod.period_type.in_(["alta", "baja"]),
+            )
+            .order_by(EmployeePeriod.employee_id, EmployeePeriod.period_begin_date)
+        )
+        for period in period_rows:
+            periods_by_employee.setdefault(period.employee_id, []).append(period)
+
+        missing_payslips = []
+        total_missing = 0
+        employees_with_missing_payslips = 0
+        total_finiquitos_needed = 0
+        total_finiquitos_satisfied = 0
+        employees_needing_finiquito = 0
+
+        if verbose:
+            print(f"🔍 Analyzing missing payslips for {len(rows)} employees (set-based)...")
+
+        for row in rows:
+            periods = periods_by_employee.get(row.id)
+            if not periods:
+                continue
+
+            missing_months = [f"{year}-{month:02d}" for year, month in _month_list(row.missing_months)]
+            settlement_months = set(_month_list(row.settlement_months))
+
+            window_start = min(
+                (p.period_begin_date for p in periods if p.period_begin_date and p.period_begin_date >= start_date_cap),
+                default=start_date_cap,
+            )
+            finiquitos = _collect_finiquitos_for_window(
+                periods=periods,
+                window_start=window_start,
+                window_end=current_date,
+                settlement_months=settlement_months,
+            )
+
+            finiquitos_needed = [f for f in finiquitos if f.get("finiquito_status") == "needed"]
+            finiquito_needed = bool(finiquitos_needed)
+            if finiquito_needed:
+                employees_needing_finiquito += 1
+            total_finiquitos_needed += len(finiquitos_needed)
+            total_finiquitos_satisfied += len(finiquitos) - len(finiquitos_needed)
+
+            if missing_months:
+                employees_with_missing_payslips += 1
+
+            if missing_months or finiquitos_needed:
+                full_name = f"{row.first_name} {row.last_name}"
+                if row.last_name2:
+                    full_name += f" {row.last_name2}"
+                first_period = periods[0]
+                last_period = periods[-1]
+
+                missing_payslips.append({
+                    "employee_id": row.id,
+                    "employee_name": full_name,
+                    "identity_card_number": row.identity_card_number,
+                    "ss_number": row.ss_number,
+                    "documento": row.identity_card_number,  # Alias for report formatting
+                    "employment_start": first_period.period_begin_date.strftime('%Y-%m-%d'),
+                    "employment_end": last_period.period_end_date.strftime('%Y-%m-%d') if last_period.period_end_date else "Active",
+                    "expected_months": row.expected_count,
+                    "processed_months": row.processed_count,
+                    "missing_months": missing_months,
+                    "missing_count": len(missing_months),
+                    "finiquitos": finiquitos_needed,
+                    "finiquito_needed": finiquito_needed,
+                })
+                total_missing += len(missing_months)
+
+        summary = {
+            "total_employees_analyzed": len(rows),
+            "employees_with_missing_payslips": employees_with_missing_payslips,
+            "total_missing_payslips": total_missing,
+            "employees_needing_finiquito": employees_needing_finiquito,
+            "total_finiquitos_needed": total_finiquitos_needed,
+            "total_finiquitos_satisfied": total_finiquitos_satisfied,
+            "analysis_date": current_date.strftime('%Y-%m-%d')
+        }
+
+        return {
+            "success": True,
+            "summary": summary,
+            "missing_payslips": missing_payslips,
+            "message": f"Found {total_missing} missing payslips across {employees_with_missing_payslips} employees"
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": f"Failed to detect missing payslips: {e}"
+        }
+
+
 def detect_missing_payslips_for_month(
     session: Session,
     client_id: str,
@@ -301,32 +579,32 @@ def detect_missing_payslips_for_month(
 
         print(f"🔍 Analyzing missing payslips for {len(employees)} employees in {month}...")
 
+        periods_by_employee = _load_employment_periods(
+            session, [employee.id for employee in employees], first_day=first_day, last_day=last_day
+        )
+        expected_month = (target_date.year, target_date.month)
+        covered_employees = set()
+        settled_employees = set()
+        coverage_rows = load_coverage_rows(session, [employee.id for employee in employees], month=first_day)
+        for employee_id, _month, _expected, has_payslip, has_settlement in coverage_rows:
+            if has_payslip or has_settlement:
+                covered_employees.add(employee_id)
+            if has_settlement:
+                settled_employees.add(employee_id)
+
         for employee in employees:
             full_name = f"{employee.first_name} {employee.last_name}"
             if employee.last_name2:
                 full_name += f" {employee.last_name2}"
 
             # employment periods overlapping the month
-            periods = (
-                session.query(EmployeePeriod)
-                .filter(
-                    EmployeePeriod.employee_id == employee.id,
-                    EmployeePeriod.period_type.in_(["alta", "baja"]),
-                    EmployeePeriod.period_begin_date <= last_day,
-                    (EmployeePeriod.period_end_date.is_(None) | (EmployeePeriod.period_end_date >= first_day)),
-                )
-                .order_by(EmployeePeriod.period_begin_date)
-                .all()
-            )
-
+            periods = periods_by_employee.get(employee.id)
             if not periods:
                 continue  # not employed that month
 
-            expected_month = (target_date.year, target_date.month)
-
-            processed_months, settlement_months = _collect_payroll_months(
-                session.query(Payroll).filter_by(employee_id=employee.id).all()
-            )
+            # Only the target month matters for both the payslip and the finiquito checks
+            processed_months = {expected_month} if employee.id in covered_employees else set()
+            settlement_months = {expected_month} if employee.id in settled_employees else set()
 
             missing_months = []
             if expected_month not in processed_months:
@@ -409,7 +687,8 @@ def generate_missing_payslips_report(
     filename: Optional[str] = None,
     last_month: Optional[str] = None,
     start_month: Optional[str] = None,
-    reports_dir: str = "./reports"
+    reports_dir: str = "./reports",
+    set_based: bool = False,
 ) -> Dict[str, Any]:
     """
     Generate a comprehensive report of missing payslips with multiple output formats.
@@ -422,6 +701,7 @@ def generate_missing_payslips_report(
         filename: Custom filename (auto-generated if not provided)
         last_month: Optional cutoff month in MM/YYYY format (e.g., "05/2024")
         reports_dir: Directory to save reports (default: "./reports")
+        set_based: Use the single-query detection engine
 
     Returns:
         Dict with success status, report content, summary, and file path
@@ -435,7 +715,8 @@ def generate_missing_payslips_report(
             }
 
         # Get missing payslip data
-        result = detect_missing_payslips(
+        detect = detect_missing_payslips_set_based if set_based else detect_missing_payslips
+        result = detect(
             session,
             client_id=client_id,
             last_month=last_month,
@@ -508,24 +789,190 @@ def generate_missing_payslips_report(
         }
 
 
-def _generate_expected_months(start_date: date, end_date: date) -> List[Tuple[int, int]]:
-    """Generate list of (year, month) tuples for expected payslip months"""
-    if not start_date:
-        return []
+PORTFOLIO_CSV_COLUMNS = [
+    "client_id",
+    "cif",
+    "client_name",
+    "status",
+    "client_elapsed_seconds",
+    "dni_nie",
+    "ssn",
+    "missing_payslips_count",
+    "missing_payslips_months",
+    "missing_settlements_count",
+    "missing_settlements_months",
+]
 
-    expected_months = []
-    current = start_date.replace(day=1)  # Start from first day of month
-    end = end_date.replace(day=1) if end_date else date.today().replace(day=1)
 
-    while current <= end:
-        expected_months.append((current.year, current.month))
-        # Move to next month
-        if current.month == 12:
-            current = current.replace(year=current.year + 1, month=1)
-        else:
-            current = current.replace(month=current.month + 1)
+def generate_portfolio_missing_payslips_report(
+    engine,
+    *,
+    output_path: str,
+    output_format: str = "jsonl",
+    workers: int = 4,
+    last_month: Optional[str] = None,
+    start_month: Optional[str] = None,
+    set_based: bool = False,
+    target_seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Run missing payslips detection for every active client through a worker pool.
 
-    return expected_months
+    Each worker thread keeps its own session from the shared engine's
+    connection pool (size the pool for at least `workers` connections).
+    Results are streamed to `output_path` as clients finish:
+    - jsonl: one "client" record per client, then a final "summary" record
+    - csv: one row per employee with missing items (PORTFOLIO_CSV_COLUMNS),
+      plus one row for clients without missing items or that failed
+
+    Returns a summary with totals, per-client timings and the total
+    wall-clock time compared against `target_seconds`.
+    """
+    if output_format not in {"csv", "jsonl"}:
+        return {
+            "success": False,
+            "error": f"Unsupported output format: {output_format}",
+            "message": "Supported portfolio formats: csv, jsonl"
+        }
+
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as session:
+        clients = (
+            session.query(Client.id, Client.cif, Client.name)
+            .filter(Client.active.is_(True))
+            .order_by(Client.name)
+            .all()
+        )
+
+    detect = detect_missing_payslips_set_based if set_based else detect_missing_payslips
+    local = threading.local()
+    worker_sessions: List[Session] = []
+    sessions_lock = threading.Lock()
+
+    def _worker_session() -> Session:
+        if not hasattr(local, "session"):
+            local.session = SessionLocal()
+            with sessions_lock:
+                worker_sessions.append(local.session)
+        return local.session
+
+    def _analyze(client: Tuple[UUID, str, str]) -> Tuple[Tuple[UUID, str, str], Dict[str, Any], float]:
+        session = _worker_session()
+        start = time.perf_counter()
+        try:
+            result = detect(
+                session,
+                client_id=client[0],
+                last_month=last_month,
+                start_month=start_month,
+                verbose=False,
+            )
+        finally:
+            # End the read transaction so the connection goes back to the pool idle
+            session.rollback()
+        return client, result, time.perf_counter() - start
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    timings: List[Dict[str, Any]] = []
+    failed = 0
+    total_missing_payslips = 0
+    total_missing_settlements = 0
+    started = time.perf_counter()
+
+    print(f"🏢 Analyzing {len(clients)} active clients with {workers} workers...")
+    try:
+        with open(output_path, "w", encoding="utf-8", newline="") as f, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            writer = csv.DictWriter(f, fieldnames=PORTFOLIO_CSV_COLUMNS) if output_format == "csv" else None
+            if writer:
+                writer.writeheader()
+
+            futures = [pool.submit(_analyze, client) for client in clients]
+            for done, future in enumerate(as_completed(futures), start=1):
+                (client_uuid, cif, name), result, elapsed = future.result()
+                client_id = str(client_uuid)
+                focused = _build_focused_missing_items(result.get("missing_payslips", [])) if result["success"] else []
+                if result["success"]:
+                    total_missing_payslips += result["summary"]["total_missing_payslips"]
+                    total_missing_settlements += result["summary"]["total_finiquitos_needed"]
+                else:
+                    failed += 1
+                timings.append({"client_id": client_id, "cif": cif, "elapsed_seconds": round(elapsed, 3)})
+
+                if writer:
+                    base = {
+                        "client_id": client_id,
+                        "cif": cif,
+                        "client_name": name,
+                        "status": "ok" if result["success"] else f"error: {result.get('error')}",
+                        "client_elapsed_seconds": round(elapsed, 3),
+                    }
+                    for item in focused:
+                        writer.writerow({
+                            **base,
+                            "dni_nie": item["dni_nie"],
+                            "ssn": item["ssn"],
+                            "missing_payslips_count": item["missing_payslips"]["count"],
+                            "missing_payslips_months": "|".join(item["missing_payslips"]["months"]),
+                            "missing_settlements_count": item["missing_settlements"]["count"],
+                            "missing_settlements_months": "|".join(item["missing_settlements"]["months"]),
+                        })
+                    if not focused:
+                        writer.writerow(base)
+                else:
+                    record = {
+                        "type": "client",
+                        "client_id": client_id,
+                        "cif": cif,
+                        "client_name": name,
+                        "success": result["success"],
+                        "elapsed_seconds": round(elapsed, 3),
+                    }
+                    if result["success"]:
+                        record["summary"] = _format_focused_summary(result["summary"])
+                        record["missing_items"] = focused
+                    else:
+                        record["error"] = result.get("error")
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+
+                status = "✅" if result["success"] else "❌"
+                print(f"   {status} [{done}/{len(clients)}] {cif} {name} ({elapsed:.2f}s)")
+
+            wall_clock = time.perf_counter() - started
+            summary = {
+                "total_clients": len(clients),
+                "clients_failed": failed,
+                "total_missing_payslips": total_missing_payslips,
+                "total_missing_settlements": total_missing_settlements,
+                "workers": workers,
+                "wall_clock_seconds": round(wall_clock, 3),
+                "sum_client_seconds": round(sum(t["elapsed_seconds"] for t in timings), 3),
+                "slowest_clients": sorted(timings, key=lambda t: t["elapsed_seconds"], reverse=True)[:5],
+                "target_seconds": target_seconds,
+                "within_target": None if target_seconds is None else wall_clock <= target_seconds,
+            }
+            if not writer:
+                f.write(json.dumps({"type": "summary", **summary}, ensure_ascii=False) + "\n")
+    finally:
+        for session in worker_sessions:
+            session.close()
+
+    target_note = ""
+    if target_seconds is not None:
+        target_note = f" (target {target_seconds:.0f}s: {'met' if summary['within_target'] else 'EXCEEDED'})"
+    return {
+        "success": True,
+        "summary": summary,
+        "file_path": output_path,
+        "message": (
+            f"Analyzed {len(clients)} clients in {summary['wall_clock_seconds']:.1f}s{target_note}: "
+            f"{total_missing_payslips} missing payslips, {total_missing_settlements} missing settlements"
+        ),
+    }
 
 
 def _format_focused_summary(summary: Dict) -> Dict[str, Any]:
@@ -636,20 +1083,29 @@ def _format_csv_report(missing_data: List[Dict]) -> str:
     return "\n".join(lines)
 
 
-def _collect_payroll_months(payrolls: List[Payroll]) -> Tuple[Set[Tuple[int, int]], Set[Tuple[int, int]]]:
-    processed_months: Set[Tuple[int, int]] = set()
-    settlement_months: Set[Tuple[int, int]] = set()
-
-    for payroll in payrolls:
-        ref_date = period_reference_date(getattr(payroll, "periodo", None))
-        if not ref_date:
-            continue
-        month_key = (ref_date.year, ref_date.month)
-        processed_months.add(month_key)
-        if payroll.type in {"settlement", "hybrid"}:
-            settlement_months.add(month_key)
-
-    return processed_months, settlement_months
+def _load_employment_periods(
+    session: Session,
+    employee_ids: List[int],
+    *,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+) -> Dict[int, List[EmployeePeriod]]:
+    """Alta/baja periods per employee ordered by begin date, optionally only those overlapping [first_day, last_day]."""
+    periods_by_employee: Dict[int, List[EmployeePeriod]] = {}
+    for chunk in chunked(employee_ids):
+        query = session.query(EmployeePeriod).filter(
+            EmployeePeriod.employee_id.in_(chunk),
+            EmployeePeriod.period_type.in_(["alta", "baja"]),
+        )
+        if last_day:
+            query = query.filter(EmployeePeriod.period_begin_date <= last_day)
+        if first_day:
+            query = query.filter(
+                EmployeePeriod.period_end_date.is_(None) | (EmployeePeriod.period_end_date >= first_day)
+            )
+        for period in query.order_by(EmployeePeriod.employee_id, EmployeePeriod.period_begin_date):
+            periods_by_employee.setdefault(period.employee_id, []).append(period)
+    return periods_by_employee
 
 
 def _collect_finiquitos_for_window(
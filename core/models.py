@@ -9,14 +9,14 @@ from datetime import date, datetime
 from uuid import UUID as PyUUID
 from typing import Optional
 from sqlalchemy import (
-    Boolean, Column, Date, DateTime, Enum, ForeignKey, Integer, JSON, Numeric,
-    String, Text
+    Boolean, Column, Date, DateTime, Enum, ForeignKey, Index, Integer, JSON, Numeric,
+    String, Text, UniqueConstraint, text
 )
 from sqlalchemy.dialects.postgresql import ARRAY, UUID as PGUUID
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship, validates
 from sqlalchemy.sql import func
 
-from core.normalization import normalize_ssn
+from core.normalization import normalize_ssn, periodo_bounds
 
 Base = declarative_base()
 
@@ -157,6 +157,15 @@ class NominaConcept(Base):
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
 
+class Concept(Base):
+    """Interned payroll concept keys (normalize_concept_key of PayrollLine.concept)"""
+    __tablename__ = 'concepts'
+
+    id = Column(Integer, primary_key=True)
+    key = Column(Text, nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), default=func.now())
+
+
 class Document(Base):
     """Documents with simple local file storage"""
     __tablename__ = 'documents'
@@ -192,9 +201,24 @@ class Document(Base):
     payroll = relationship("Payroll", back_populates="documents")
 
 
+_PAYROLL_UNIQUE_WHERE = (
+    "period_start IS NOT NULL AND period_end IS NOT NULL AND liquido_a_percibir IS NOT NULL"
+)
+
+
 class Payroll(Base):
     """Minimal payroll snapshot extracted from payslips"""
     __tablename__ = 'payrolls'
+    # Duplicate guard used by INSERT ... ON CONFLICT DO NOTHING (core.database.insert_payroll_if_new)
+    __table_args__ = (
+        Index(
+            'idx_unique_employee_period_amount',
+            'employee_id', 'period_start', 'period_end', 'liquido_a_percibir',
+            unique=True,
+            postgresql_where=text(_PAYROLL_UNIQUE_WHERE),
+            sqlite_where=text(_PAYROLL_UNIQUE_WHERE),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     employee_id = Column(Integer, ForeignKey('employees.id', ondelete='CASCADE'), nullable=False)
@@ -207,7 +231,9 @@ class Payroll(Base):
 
     # Period information stored as delivered by the extractor
     periodo = Column(JSON, nullable=False)
-
+    # Typed copies of periodo desde/hasta for indexed period filters (synced on write)
+    period_start = Column(Date)
+    period_end = Column(Date)
 
     # Totals captured explicitly to avoid nested JSON
     devengo_total = Column(Numeric(12, 2), nullable=False)
@@ -236,6 +262,11 @@ class Payroll(Base):
     documents = relationship("Document", back_populates="payroll", cascade="all, delete-orphan")
     checklist_items = relationship("ChecklistItem", back_populates="payroll")
 
+    @validates("periodo")
+    def _sync_period_columns(self, _key, value):
+        self.period_start, self.period_end = periodo_bounds(value)
+        return value
+
 
 class PayrollLine(Base):
     """Simple payroll line item mirroring the extracted JSON arrays"""
@@ -246,6 +277,7 @@ class PayrollLine(Base):
     category = Column(String, nullable=False)  # devengo, deduccion, aportacion_empresa
     concept = Column(Text, nullable=False)
     raw_concept = Column(Text)
+    concept_id = Column(Integer, ForeignKey('concepts.id'))  # Set from concept on write (core.concepts)
     amount = Column(Numeric(12, 2), nullable=False)
     is_taxable_income = Column(Boolean, nullable=False)
     is_taxable_ss = Column(Boolean, nullable=False)
@@ -262,6 +294,73 @@ class PayrollLine(Base):
     payroll = relationship("Payroll", back_populates="payroll_lines")
 
 
+class EmployeeMonthCoverage(Base):
+    """
+    Materialized payroll coverage per employee and month.
+
+    One row per month in which the employee is employed (expected) or has a
+    payroll. Maintained by core.employee_coverage when Payroll or EmployeePeriod
+    rows are flushed; open-ended periods are expanded up to the month of the
+    last refresh.
+    """
+    __tablename__ = 'employee_month_coverage'
+
+    employee_id = Column(Integer, ForeignKey('employees.id', ondelete='CASCADE'), primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    expected = Column(Boolean, nullable=False, default=False)  # Within an alta/baja period
+    has_payslip = Column(Boolean, nullable=False, default=False)  # payslip or hybrid payroll
+    has_settlement = Column(Boolean, nullable=False, default=False)  # settlement or hybrid payroll
+
+
+class VidaLaboralMovement(Base):
+    """
+    Vida laboral movements already imported, for delta re-imports.
+
+    One row per movement identity (CCC, NAF, movement type and dates) with a
+    hash of the full row, so a re-import only processes new or changed
+    movements and can report the ones missing from the new file.
+    """
+    __tablename__ = 'vida_laboral_movements'
+    __table_args__ = (UniqueConstraint('client_id', 'movement_key', name='uq_vida_laboral_movement_key'),)
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(PGUUID(as_uuid=True), ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
+    ccc = Column(Text, nullable=False)
+    movement_key = Column(String(64), nullable=False)  # sha256 of (ccc, naf, situacion, dates)
+    content_hash = Column(String(64), nullable=False)  # sha256 of every imported field
+
+    # Identity fields as read from the file, for reporting
+    naf = Column(Text)
+    documento = Column(Text)
+    situacion = Column(Text)
+    f_real_alta = Column(Text)
+    f_efecto_alta = Column(Text)
+    f_real_sit = Column(Text)
+
+    first_seen_at = Column(DateTime(timezone=True), default=func.now())
+    last_seen_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
+
+class ProdSyncState(Base):
+    """
+    High-water marks of incremental production syncs.
+
+    One row per CIF and scope (company locations, employees) holding the
+    latest production change timestamp applied locally, so the next sync only
+    fetches rows changed after it. Timestamps are naive, as in production.
+    """
+    __tablename__ = 'prod_sync_state'
+    __table_args__ = (UniqueConstraint('cif', 'scope', name='uq_prod_sync_state_cif_scope'),)
+
+    id = Column(Integer, primary_key=True)
+    cif = Column(Text, nullable=False)
+    scope = Column(String(32), nullable=False)
+    watermark = Column(DateTime)  # Latest updated_at/created_at applied
+    last_sync_at = Column(DateTime)
+    last_full_sync_at = Column(DateTime)  # Last full reconciliation
+    rows_synced = Column(Integer)  # Rows fetched by the last sync
+
+
 class ChecklistItem(Base):
     """Track missing documents and reminders"""
     __tablename__ = 'checklist_items'
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import re
+from collections.abc import Mapping
+from datetime import date, datetime
 from typing import Any, Optional
 
 
@@ -15,3 +17,82 @@ def normalize_ssn(value: Any) -> Optional[str]:
         return None
     normalized = _WHITESPACE_RE.sub("", text)
     return normalized or None
+
+
+_PERIOD_DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+
+
+def parse_period_date(value: Any) -> Optional[date]:
+    """Parse a periodo 'desde'/'hasta' value (ISO or Spanish formats, ISO datetimes)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    for fmt in _PERIOD_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date()
+    except ValueError:
+        return None
+
+
+def periodo_bounds(periodo: Any) -> tuple[Optional[date], Optional[date]]:
+    """Return (desde, hasta) of a payroll periodo as dates; None where missing or unparseable."""
+    if not isinstance(periodo, Mapping):
+        return None, None
+    return parse_period_date(periodo.get("desde")), parse_period_date(periodo.get("hasta"))
+
+
+_ACCENT_TRANSLATION = str.maketrans(
+    {
+        "\u00c1": "A",
+        "\u00c9": "E",
+        "\u00cd": "I",
+        "\u00d3": "O",
+        "\u00da": "U",
+        "\u00c0": "A",
+        "\u00c8": "E",
+        "\u00cc": "I",
+        "\u00d2": "O",
+        "\u00d9": "U",
+        "\u00c2": "A",
+        "\u00ca": "E",
+        "\u00ce": "I",
+        "\u00d4": "O",
+        "\u00db": "U",
+        "\u00c4": "A",
+        "\u00cb": "E",
+        "\u00cf": "I",
+        "\u00d6": "O",
+        "\u00dc": "U",
+    }
+)
+
+
+_ALLOWED_TEXT_RE = re.compile(r"[^A-Z0-9 \u00d1\u00c7]")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    text = value.upper()
+    text = text.translate(_ACCENT_TRANSLATION)
+    text = re.sub(r"[\t\n\r]+", " ", text)
+    text = _ALLOWED_TEXT_RE.sub(" ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def normalize_concept_key(concept: Optional[str]) -> str:
+    """Key payroll concepts are matched on (Modelo 190 mappings, the concepts table)."""
+    if not concept:
+        return ""
+    return normalize_text(concept)
@@ -7,7 +7,9 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from core.agent.utils import format_periodo
+from core.database import insert_payroll_if_new
 from core.models import Employee, Payroll, PayrollLine
+from core.normalization import periodo_bounds
 
 
 def _decimal(value: Any, default: Decimal = Decimal("0.00")) -> Decimal:
@@ -46,6 +48,10 @@ def create_payroll(
       base_irpf, tipo_irpf
 
     Each line in `payroll_lines` must include: category, concept, amount.
+
+    Duplicates (same employee, period and liquido_a_percibir) are rejected by
+    the idx_unique_employee_period_amount index through INSERT ... ON
+    CONFLICT DO NOTHING RETURNING id; no lines are written for them.
     """
     totals = totals or {}
     payroll_lines = list(payroll_lines or [])
@@ -67,19 +73,6 @@ def create_payroll(
             return {"success": False, "error": "Periodo must be a mapping"}
 
         periodo_clean = {k: v for k, v in periodo.items() if v is not None}
-        target_desde = periodo_clean.get("desde")
-        target_hasta = periodo_clean.get("hasta")
-        if target_desde or target_hasta:
-            clash = (
-                session.query(Payroll)
-                .filter_by(employee_id=employee_id)
-                .filter(Payroll.periodo["desde"].as_string() == target_desde)
-                .filter(Payroll.periodo["hasta"].as_string() == target_hasta)
-                .first()
-            )
-            if clash:
-                period_label = format_periodo(periodo_clean)
-                return {"success": False, "error": f"Payroll already exists for {period_label}"}
 
         warnings_text: Optional[str]
         if warnings is None:
@@ -89,23 +82,27 @@ def create_payroll(
         else:
             warnings_text = "\n".join(str(w) for w in warnings)
 
-        payroll = Payroll(
-            employee_id=employee_id,
-            type=_normalize_payroll_type(payroll_type),
-            periodo=periodo_clean,
-            devengo_total=_decimal(totals.get("devengo_total")),
-            deduccion_total=_decimal(totals.get("deduccion_total")),
-            aportacion_empresa_total=_decimal(totals.get("aportacion_empresa_total")),
-            liquido_a_percibir=_decimal(totals.get("liquido_a_percibir")),
-            prorrata_pagas_extra=_decimal(totals.get("prorrata_pagas_extra")),
-            base_cc=_decimal(totals.get("base_cc")),
-            base_at_ep=_decimal(totals.get("base_at_ep")),
-            base_irpf=_decimal(totals.get("base_irpf")),
-            tipo_irpf=_decimal(totals.get("tipo_irpf")),
-            warnings=warnings_text,
-        )
-        session.add(payroll)
-        session.flush()  # obtain payroll.id
+        period_start, period_end = periodo_bounds(periodo_clean)
+        payroll_id = insert_payroll_if_new(session, {
+            "employee_id": employee_id,
+            "type": _normalize_payroll_type(payroll_type),
+            "periodo": periodo_clean,
+            "period_start": period_start,
+            "period_end": period_end,
+            "devengo_total": _decimal(totals.get("devengo_total")),
+            "deduccion_total": _decimal(totals.get("deduccion_total")),
+            "aportacion_empresa_total": _decimal(totals.get("aportacion_empresa_total")),
+            "liquido_a_percibir": _decimal(totals.get("liquido_a_percibir")),
+            "prorrata_pagas_extra": _decimal(totals.get("prorrata_pagas_extra")),
+            "base_cc": _decimal(totals.get("base_cc")),
+            "base_at_ep": _decimal(totals.get("base_at_ep")),
+            "base_irpf": _decimal(totals.get("base_irpf")),
+            "tipo_irpf": _decimal(totals.get("tipo_irpf")),
+            "warnings": warnings_text,
+        })
+        if payroll_id is None:
+            period_label = format_periodo(periodo_clean)
+            return {"success": False, "error": f"Payroll already exists for {period_label}"}
 
         line_objects = []
         for item in payroll_lines:
@@ -118,7 +115,7 @@ def create_payroll(
                 continue
 
             line = PayrollLine(
-                payroll_id=payroll.id,
+                payroll_id=payroll_id,
                 category=str(category),
                 concept=str(concept),
                 raw_concept=str(item.get("raw_concept") or concept),
@@ -134,6 +131,7 @@ def create_payroll(
             line_objects.append(line)
 
         session.commit()
+        payroll = session.get(Payroll, payroll_id)
 
         period_label = format_periodo(periodo_clean)
         return {
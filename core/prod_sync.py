@@ -0,0 +1,166 @@
+"""
+Incremental production -> local syncs.
+
+prod_sync_state keeps, per CIF and scope, the latest production change
+timestamp (updated_at, created_at or deleted_at, whichever the table has)
+applied by the last sync. Incremental syncs only fetch rows changed after it;
+a full reconciliation runs when there is no state yet, when forced, once
+FULL_RECONCILE_INTERVAL has passed since the previous one, or when a synced
+table has no updated_at (created_at and deleted_at miss in-place edits).
+
+bulk_update_from_values writes synced field values back set-based, one
+UPDATE ... FROM (VALUES ...) statement per batch.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+from sqlalchemy import Table, cast, column, false, or_, update, values
+from sqlalchemy.orm import Session
+
+from core.models import ProdSyncState
+from core.utils.batching import chunked
+
+SCOPE_LOCATIONS = "locations"
+SCOPE_EMPLOYEES = "employees"
+
+CHANGE_COLUMNS = ("updated_at", "created_at", "deleted_at")
+
+# Rows per UPDATE ... FROM (VALUES ...) statement
+BULK_UPDATE_BATCH = 1000
+
+FULL_RECONCILE_INTERVAL = timedelta(days=int(os.getenv("PROD_SYNC_FULL_RECONCILE_DAYS", "7")))
+# Rows committed in prod slightly out of timestamp order are re-read instead of missed
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class SyncWindow:
+    """Rows to fetch for one sync: everything changed after `since`, or all rows when it is None."""
+    cif: str
+    scope: str
+    since: Optional[datetime]
+    watermark: Optional[datetime]
+
+    @property
+    def full(self) -> bool:
+        return self.since is None
+
+
+def tracks_updates(table: Table) -> bool:
+    """Whether in-place edits of `table` rows move a change column (only updated_at does)."""
+    return "updated_at" in table.c
+
+
+def changed_since(table: Table, since: datetime):
+    """Filter for production rows whose change columns are later than `since`."""
+    columns = [table.c[name] for name in CHANGE_COLUMNS if name in table.c]
+    if not columns:
+        return false()
+    return or_(*(column > since for column in columns))
+
+
+def row_changed_at(row: Any) -> Optional[datetime]:
+    """Latest change timestamp of a production row (ORM object or result mapping)."""
+    if isinstance(row, Mapping):
+        values = [row.get(name) for name in CHANGE_COLUMNS]
+    else:
+        values = [getattr(row, name, None) for name in CHANGE_COLUMNS]
+    values = [value for value in values if isinstance(value, datetime)]
+    return max(values) if values else None
+
+
+def latest_change(rows: Iterable[Any], watermark: Optional[datetime] = None) -> Optional[datetime]:
+    """Highest of `watermark` and the change timestamps of `rows`."""
+    for row in rows:
+        changed_at = row_changed_at(row)
+        if changed_at is not None and (watermark is None or changed_at > watermark):
+            watermark = changed_at
+    return watermark
+
+
+def begin_sync(
+    session: Session,
+    cif: str,
+    scope: str,
+    *,
+    full: bool = False,
+    tables: Sequence[Table] = (),
+    now: Optional[datetime] = None,
+) -> SyncWindow:
+    """
+    Return the window for the next sync of `cif`/`scope`, full when a reconciliation is due.
+
+    `tables` are the production tables the sync reads; if any of them lacks
+    updated_at the window is always full, since edits would go unnoticed.
+    """
+    now = now or _utcnow()
+    state = session.query(ProdSyncState).filter_by(cif=cif, scope=scope).first()
+    watermark = state.watermark if state else None
+    if (
+        full
+        or not all(tracks_updates(table) for table in tables)
+        or watermark is None
+        or state.last_full_sync_at is None
+        or now - state.last_full_sync_at >= FULL_RECONCILE_INTERVAL
+    ):
+        return SyncWindow(cif=cif, scope=scope, since=None, watermark=watermark)
+    return SyncWindow(cif=cif, scope=scope, since=watermark - WATERMARK_OVERLAP, watermark=watermark)
+
+
+def finish_sync(session: Session, window: SyncWindow, watermark: Optional[datetime], rows: int,
+                *, now: Optional[datetime] = None) -> ProdSyncState:
+    """Record a finished sync; the watermark never moves backwards. The caller commits."""
+    now = now or _utcnow()
+    state = session.query(ProdSyncState).filter_by(cif=window.cif, scope=window.scope).first()
+    if state is None:
+        state = ProdSyncState(cif=window.cif, scope=window.scope)
+        session.add(state)
+    if watermark is not None and (state.watermark is None or watermark > state.watermark):
+        state.watermark = watermark
+    state.last_sync_at = now
+    state.rows_synced = rows
+    if window.full:
+        state.last_full_sync_at = now
+    return state
+
+
+def bulk_update_from_values(
+    session: Session,
+    table: Table,
+    key: str,
+    rows: Sequence[Mapping[str, Any]],
+    fields: Sequence[str],
+    batch_size: int = BULK_UPDATE_BATCH,
+) -> int:
+    """
+    Set `fields` on the rows of `table` matching each row's `key`, one statement per batch.
+
+    Renders WITH v(key, fields...) AS (VALUES ...) UPDATE table SET ... FROM v
+    WHERE table.key = v.key, which PostgreSQL and SQLite both accept. The
+    caller commits. Returns the number of rows sent.
+    """
+    if not rows:
+        return 0
+    names = [key, *fields]
+    # Casts keep all-NULL VALUES columns from being typed as text in PostgreSQL;
+    # SQLite would apply numeric affinity to CAST(... AS DATE), so it gets none
+    typed = session.get_bind().dialect.name != "sqlite"
+    for chunk in chunked(rows, batch_size):
+        data = values(*(column(name, table.c[name].type) for name in names), name="v").data(
+            [tuple(row[name] for name in names) for row in chunk]
+        ).cte("v")
+        session.execute(
+            update(table)
+            .where(table.c[key] == data.c[key])
+            .values({name: cast(data.c[name], table.c[name].type) if typed else data.c[name] for name in fields})
+        )
+    return len(rows)
@@ -6,13 +6,20 @@ These models are READ-ONLY and should never be used for writes.
 """
 
 import os
+import time
+from typing import List, Literal, Union
 from uuid import uuid4
 
-from sqlalchemy import Column, Date, DateTime, Integer, Numeric, String, Text, create_engine
+from sqlalchemy import Column, Date, DateTime, Integer, Numeric, String, Text, func, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.dialects.postgresql import ENUM, JSONB
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import declarative_base
 
 from core.models import Client, ClientLocation
+from core.prod_sync import (
+    SCOPE_LOCATIONS, begin_sync, changed_since as changed_since_filter, finish_sync, latest_change, row_changed_at
+)
+from core.utils.batching import chunked
 
 ProductionBase = declarative_base()
 
@@ -201,28 +208,32 @@ class ProductionEmploymentContract(ProductionBase):
         )
 
 
-def create_production_engine(database_url: str = None, echo: bool = False):
+def create_production_engine(database_url: str = None, echo: bool = False, **pool_options):
     """
-    Create read-only engine for production database.
-    Uses PROD_URL from environment if not provided.
+    Return the shared read-only engine for the production database.
+    Uses PROD_URL from environment if not provided; engines are cached
+    per URL by core.database.get_engine.
     """
+    from core.database import get_engine
+
     if database_url is None:
         database_url = os.getenv('PROD_URL')
         if not database_url:
             raise ValueError("PROD_URL not found in environment variables")
 
-    # Create engine with read-only intent
-    engine = create_engine(database_url, echo=echo, pool_pre_ping=True)
-    return engine
+    # Read-only intent; pre-ping so long-lived pooled connections survive restarts
+    pool_options.setdefault("pool_pre_ping", True)
+    return get_engine(database_url, echo=echo, **pool_options)
 
 
 def create_production_session(engine=None):
     """Create a session for production database queries"""
+    from core.database import get_sessionmaker
+
     if engine is None:
         engine = create_production_engine()
 
-    Session = sessionmaker(bind=engine)
-    return Session()
+    return get_sessionmaker(engine)()
 
 
 # Utility functions for common queries
@@ -247,11 +258,13 @@ def list_production_employees_for_company(session, company_id: str):
     return session.query(ProductionEmployee).filter_by(company_id=company_id).all()
 
 
-def list_production_locations_for_company(session, company_id: str, include_deleted: bool = False):
-    """List all locations for a company in production."""
+def list_production_locations_for_company(session, company_id: str, include_deleted: bool = False, changed_since=None):
+    """List all locations for a company in production, optionally only those changed after `changed_since`."""
     query = session.query(ProductionLocation).filter_by(company_id=company_id)
     if not include_deleted:
         query = query.filter(ProductionLocation.deleted_at.is_(None))
+    if changed_since is not None:
+        query = query.filter(changed_since_filter(ProductionLocation.__table__, changed_since))
     return query.all()
 
 
@@ -270,6 +283,40 @@ def _coerce_prod_bool(value) -> bool:
     return True
 
 
+# Local Client column -> production company attribute, copied on every sync
+_CLIENT_FIELDS_FROM_PROD = {
+    "name": "name",
+    "fiscal_address": "fiscal_address",
+    "email": "email",
+    "phone": "phone",
+    "begin_date": "begin_date",
+    "managed_by": "managed_by",
+    "postal_code": "company_postal_code",
+    "legal_repr_first_name": "legal_repr_first_name",
+    "legal_repr_last_name1": "legal_repr_last_name1",
+    "legal_repr_last_name2": "legal_repr_last_name2",
+    "legal_repr_nif": "legal_repr_nif",
+    "legal_repr_role": "legal_repr_role",
+    "legal_repr_phone": "legal_repr_phone",
+    "legal_repr_email": "legal_repr_email",
+    "status": "status",
+}
+CLIENT_SYNC_COLUMNS = (*_CLIENT_FIELDS_FROM_PROD, "payslips")
+
+
+def _prod_company_values(prod_company: ProductionCompany) -> dict:
+    """Local Client column values (CLIENT_SYNC_COLUMNS) for a production company."""
+    values = {column: getattr(prod_company, attr) for column, attr in _CLIENT_FIELDS_FROM_PROD.items()}
+    values["payslips"] = _coerce_prod_bool(getattr(prod_company, "payslips", True))
+    return values
+
+
+def _apply_prod_company(client: Client, prod_company: ProductionCompany) -> None:
+    """Copy the production company fields onto the local Client."""
+    for name, value in _prod_company_values(prod_company).items():
+        setattr(client, name, value)
+
+
 def insert_company_locations_into_local_clients(
     prod_session,
     cif: str,
@@ -278,6 +325,8 @@ def insert_company_locations_into_local_clients(
     commit: bool = True,
     skip_existing: bool = True,
     include_deleted_locations: bool = False,
+    incremental: bool = False,
+    full_reconcile: bool = False,
 ):
     """Insert a production company into local Client and ClientLocation tables.
 
@@ -286,6 +335,12 @@ def insert_company_locations_into_local_clients(
     - Create or update ONE Client record (unique by CIF)
     - Fetch all production locations for that company ID
     - For each location, create a ClientLocation with the CCC
+
+    With `incremental`, the company and locations are only re-applied when
+    changed since the high-water mark recorded in prod_sync_state (see
+    core.prod_sync); `full_reconcile` forces a full pass and resets the
+    reconciliation clock. companies and company_locations declare no
+    updated_at here, so until they do every sync is a full one.
     """
 
     owns_local_session = local_session is None
@@ -302,31 +357,24 @@ def insert_company_locations_into_local_clients(
         prod_company = prod_companies[0]
         company_id = prod_company.id
 
+        window = None
+        if incremental:
+            window = begin_sync(
+                local_session, cif, SCOPE_LOCATIONS, full=full_reconcile,
+                tables=(ProductionCompany.__table__, ProductionLocation.__table__),
+            )
+        changed_since = window.since if window else None
+
         # Get or create the Client record (one per CIF)
         client = local_session.query(Client).filter_by(cif=cif).first()
+        client_is_new = client is None
         if client is None:
             client = Client(id=uuid4(), cif=cif)
             local_session.add(client)
 
-        # Update client data from production
-        client.name = prod_company.name
-        client.fiscal_address = prod_company.fiscal_address
-        client.email = prod_company.email
-        client.phone = prod_company.phone
-        client.begin_date = prod_company.begin_date
-        client.managed_by = prod_company.managed_by
-        client.payslips = _coerce_prod_bool(getattr(prod_company, "payslips", True))
-        client.postal_code = prod_company.company_postal_code
-
-        client.legal_repr_first_name = prod_company.legal_repr_first_name
-        client.legal_repr_last_name1 = prod_company.legal_repr_last_name1
-        client.legal_repr_last_name2 = prod_company.legal_repr_last_name2
-        client.legal_repr_nif = prod_company.legal_repr_nif
-        client.legal_repr_role = prod_company.legal_repr_role
-        client.legal_repr_phone = prod_company.legal_repr_phone
-        client.legal_repr_email = prod_company.legal_repr_email
-
-        client.status = prod_company.status
+        company_changed_at = row_changed_at(prod_company) if window else None
+        if changed_since is None or client_is_new or (company_changed_at and company_changed_at > changed_since):
+            _apply_prod_company(client, prod_company)
 
         local_session.flush()  # Ensure client.id is available
 
@@ -335,6 +383,7 @@ def insert_company_locations_into_local_clients(
             prod_session,
             company_id,
             include_deleted=include_deleted_locations,
+            changed_since=changed_since,
         )
 
         locations_created = []
@@ -361,15 +410,161 @@ def insert_company_locations_into_local_clients(
                 local_session.add(location)
                 locations_created.append(location)
 
+        result = {"client": client, "locations_created": len(locations_created)}
+        if window is not None:
+            watermark = latest_change([prod_company, *prod_locations], window.watermark)
+            finish_sync(local_session, window, watermark, rows=len(prod_locations))
+            result.update(full_sync=window.full, locations_synced=len(prod_locations))
+
         if commit:
             local_session.commit()
         else:
             local_session.flush()
 
-        return {"client": client, "locations_created": len(locations_created)}
+        return result
+    finally:
+        if owns_local_session:
+            local_session.close()
+
+
+# Companies per IN-batched fetch, upsert and commit in sync_companies
+SYNC_COMPANIES_CHUNK = 500
+
+
+def _upsert_insert(session):
+    return sqlite.insert if session.get_bind().dialect.name == "sqlite" else postgresql.insert
+
+
+def sync_companies(
+    cifs: Union[List[str], Literal["all"]],
+    prod_session=None,
+    local_session=None,
+    *,
+    chunk_size: int = SYNC_COMPANIES_CHUNK,
+    skip_existing: bool = False,
+    include_deleted_locations: bool = False,
+    commit: bool = True,
+):
+    """Sync many production companies and their locations into Client/ClientLocation.
+
+    Same mapping as `insert_company_locations_into_local_clients`, but per
+    chunk of `chunk_size` CIFs: production companies and locations are read
+    with one IN query each, Client rows are upserted on cif and
+    ClientLocation rows on ccc_ss with INSERT ... ON CONFLICT, and the chunk
+    is committed. `cifs="all"` syncs every production company. With
+    `skip_existing`, existing locations are left untouched. Returns counts
+    and rows/sec.
+    """
+    owns_prod_session = prod_session is None
+    owns_local_session = local_session is None
+    if prod_session is None:
+        prod_session = create_production_session()
+    if local_session is None:
+        from core.database import get_session
+
+        local_session = get_session(echo=False)
+
+    try:
+        if cifs == "all":
+            targets = sorted(set(prod_session.scalars(
+                select(ProductionCompany.cif).where(ProductionCompany.cif.is_not(None))
+            )))
+        else:
+            targets = sorted({cif.strip() for cif in cifs if cif and cif.strip()})
+
+        insert = _upsert_insert(local_session)
+        clients = Client.__table__
+        locations = ClientLocation.__table__
+        client_stmt = insert(clients)
+        client_stmt = client_stmt.on_conflict_do_update(
+            index_elements=[clients.c.cif],
+            set_={
+                **{name: client_stmt.excluded[name] for name in CLIENT_SYNC_COLUMNS},
+                "updated_at": func.now(),
+            },
+        )
+        location_stmt = insert(locations)
+        if skip_existing:
+            location_stmt = location_stmt.on_conflict_do_nothing(index_elements=[locations.c.ccc_ss])
+        else:
+            location_stmt = location_stmt.on_conflict_do_update(
+                index_elements=[locations.c.ccc_ss],
+                set_={
+                    "company_id": location_stmt.excluded.company_id,
+                    "postal_code": location_stmt.excluded.postal_code,
+                    "updated_at": func.now(),
+                },
+            )
+
+        companies_synced = locations_synced = 0
+        missing: List[str] = []
+        start = time.perf_counter()
+        for chunk in chunked(targets, chunk_size):
+            # One company per CIF: the earliest created, as get_production_company_by_cif callers take the first
+            prod_companies = {}
+            for company in prod_session.scalars(
+                select(ProductionCompany)
+                .where(ProductionCompany.cif.in_(chunk))
+                .order_by(ProductionCompany.created_at, ProductionCompany.id)
+            ):
+                prod_companies.setdefault(company.cif, company)
+            missing += [cif for cif in chunk if cif not in prod_companies]
+            if not prod_companies:
+                continue
+
+            local_session.execute(
+                client_stmt,
+                [{"id": uuid4(), "cif": cif, **_prod_company_values(company)} for cif, company in prod_companies.items()],
+            )
+            client_ids = dict(local_session.execute(
+                select(clients.c.cif, clients.c.id).where(clients.c.cif.in_(list(prod_companies)))
+            ).all())
+
+            company_cifs = {company.id: cif for cif, company in prod_companies.items()}
+            location_query = (
+                select(ProductionLocation)
+                .where(ProductionLocation.company_id.in_(list(company_cifs)))
+                .order_by(ProductionLocation.id)
+            )
+            if not include_deleted_locations:
+                location_query = location_query.where(ProductionLocation.deleted_at.is_(None))
+            # Keyed by CCC so a CCC repeated in prod is written once (the last location wins)
+            location_rows = {}
+            for loc in prod_session.scalars(location_query):
+                ccc = (loc.ccc or "").strip()
+                if ccc:
+                    location_rows[ccc] = {
+                        "company_id": client_ids[company_cifs[loc.company_id]],
+                        "ccc_ss": ccc,
+                        "postal_code": loc.postal_code,
+                    }
+            if location_rows:
+                local_session.execute(location_stmt, list(location_rows.values()))
+
+            if commit:
+                local_session.commit()
+            else:
+                local_session.flush()
+            companies_synced += len(prod_companies)
+            locations_synced += len(location_rows)
+
+        elapsed = time.perf_counter() - start
+        rows = companies_synced + locations_synced
+        return {
+            "companies_synced": companies_synced,
+            "locations_synced": locations_synced,
+            "missing_cifs": missing,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+        }
+    except Exception:
+        local_session.rollback()
+        raise
     finally:
         if owns_local_session:
             local_session.close()
+        if owns_prod_session:
+            prod_session.close()
 
 
 if __name__ == "__main__":
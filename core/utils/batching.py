@@ -0,0 +1,19 @@
+"""
+Batching helpers for set-based queries and bulk writes.
+"""
+
+from __future__ import annotations
+
+from typing import Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# Values per IN (...) list / rows per multi-row statement; keeps statements
+# well under the bind parameter limits of PostgreSQL and SQLite
+IN_CLAUSE_CHUNK = 1000
+
+
+def chunked(values: List[T], size: int = IN_CLAUSE_CHUNK) -> Iterator[List[T]]:
+    """Yield consecutive slices of at most `size` values."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
@@ -8,15 +8,16 @@ without requiring the ValeriaAgent or any agent-specific dependencies.
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from uuid import UUID
 
-from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from core.normalization import normalize_ssn
 from core.vida_laboral_utils import parse_date, parse_spanish_name
 from core.models import ClientLocation, Employee, EmployeePeriod
+from core.utils.batching import chunked
 
 
 @dataclass
@@ -29,12 +30,190 @@ class VidaLaboralContext:
     create_employees: bool = True  # Set to False to only match existing employees
     periods_created: int = 0  # Track EmployeePeriod records created
     employees_not_found: int = 0  # Track skipped records when create_employees=False
+    index: Optional[VidaLaboralIndex] = None  # Created on first row when not preloaded
 
 
-def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> None:
-    """Create or find employee and create ALTA period."""
+def _normalize_documento(raw: str) -> str:
     # Remove only the first leading zero if present (not all zeros)
-    documento = row['documento'][1:] if row['documento'].startswith('0') else row['documento']
+    return raw[1:] if raw.startswith('0') else raw
+
+
+class VidaLaboralIndex:
+    """
+    In-memory lookups for one vida laboral run.
+
+    Holds employees keyed by SSN and DNI/NIE, locations keyed by CCC and
+    employment periods keyed by (employee, location), so the row handlers
+    work without per-row queries. New employees, locations and periods are
+    only added to the session; they are written by the caller's final flush
+    or commit. Keys that were not preloaded fall back to a query whose result
+    (hit or miss) is cached.
+    """
+
+    def __init__(self, session: Session, client_id: UUID):
+        self.session = session
+        self.client_id = client_id
+        self.employees_by_ssn: Dict[str, Employee] = {}
+        self.employees_by_dni: Dict[str, Employee] = {}
+        self.locations_by_ccc: Dict[str, ClientLocation] = {}
+        self.periods: Dict[Tuple[Employee, ClientLocation], List[EmployeePeriod]] = {}
+        # Keys already looked up in the database, found or not
+        self._resolved_ssns: Set[str] = set()
+        self._resolved_dnis: Set[str] = set()
+        self._resolved_cccs: Set[str] = set()
+
+    @classmethod
+    def load(cls, session: Session, client_id: UUID, rows: Optional[Iterable[Dict[str, str]]] = None) -> VidaLaboralIndex:
+        """
+        Preload the client's locations, their periods and employees.
+
+        When the rows about to be processed are given, employees and locations
+        referenced by their NAF, documento and CCC are preloaded too.
+        """
+        index = cls(session, client_id)
+        with session.no_autoflush:
+            index._add_locations(session.query(ClientLocation).filter(ClientLocation.company_id == client_id).all())
+        index.preload(rows or [])
+        return index
+
+    def preload(self, rows: Iterable[Dict[str, str]]) -> None:
+        """Preload employees and locations referenced by rows that were not looked up yet."""
+        ssns: Set[str] = set()
+        dnis: Set[str] = set()
+        cccs: Set[str] = set()
+        for row in rows:
+            ss_number = normalize_ssn(row.get('naf'))
+            if ss_number:
+                ssns.add(ss_number)
+            if row.get('documento'):
+                dnis.add(_normalize_documento(row['documento']))
+            ccc = (row.get('ccc') or '').strip()
+            if ccc:
+                cccs.add(ccc)
+        ssns -= self._resolved_ssns
+        dnis -= self._resolved_dnis
+        cccs -= self._resolved_cccs | set(self.locations_by_ccc)
+
+        session = self.session
+        with session.no_autoflush:
+            locations: List[ClientLocation] = []
+            for chunk in chunked(sorted(cccs)):
+                locations += session.query(ClientLocation).filter(ClientLocation.ccc_ss.in_(chunk)).all()
+            self._add_locations(locations)
+            self._resolved_cccs.update(cccs)
+
+            for chunk in chunked(sorted(ssns)):
+                self._add_employees(
+                    session.query(Employee).filter(Employee.ss_number.in_(chunk)).order_by(Employee.id)
+                )
+            for chunk in chunked(sorted(dnis)):
+                self._add_employees(
+                    session.query(Employee).filter(Employee.identity_card_number.in_(chunk)).order_by(Employee.id)
+                )
+            self._resolved_ssns.update(ssns)
+            self._resolved_dnis.update(dnis)
+
+    def _add_employees(self, employees: Iterable[Employee]) -> None:
+        for employee in employees:
+            if employee.ss_number:
+                self.employees_by_ssn.setdefault(employee.ss_number, employee)
+            if employee.identity_card_number:
+                self.employees_by_dni.setdefault(employee.identity_card_number, employee)
+
+    def _add_locations(self, locations: List[ClientLocation]) -> None:
+        """Index locations and load every period (with its employee) recorded at them."""
+        new_locations = {}
+        for location in sorted(locations, key=lambda loc: loc.id):
+            if location.ccc_ss not in self.locations_by_ccc:
+                self.locations_by_ccc[location.ccc_ss] = location
+                new_locations[location.id] = location
+
+        location_ids = sorted(new_locations)
+        for chunk in chunked(location_ids):
+            rows = (
+                self.session.query(EmployeePeriod, Employee)
+                .join(Employee, Employee.id == EmployeePeriod.employee_id)
+                .filter(EmployeePeriod.location_id.in_(chunk))
+                .order_by(Employee.id, EmployeePeriod.id)
+            )
+            for period, employee in rows:
+                self._add_employees([employee])
+                self.periods.setdefault((employee, new_locations[period.location_id]), []).append(period)
+
+    def find_employee(self, ss_number: Optional[str], documento: str) -> Optional[Employee]:
+        """Match by SSN first (stable across NIE→DNI changes), then by DNI/NIE."""
+        employee = None
+        if ss_number:
+            if ss_number not in self._resolved_ssns:
+                self._resolved_ssns.add(ss_number)
+                with self.session.no_autoflush:
+                    self._add_employees(
+                        self.session.query(Employee).filter_by(ss_number=ss_number).order_by(Employee.id).limit(1)
+                    )
+            employee = self.employees_by_ssn.get(ss_number)
+
+        if not employee:
+            if documento not in self._resolved_dnis:
+                self._resolved_dnis.add(documento)
+                with self.session.no_autoflush:
+                    self._add_employees(
+                        self.session.query(Employee).filter_by(identity_card_number=documento).order_by(Employee.id).limit(1)
+                    )
+            employee = self.employees_by_dni.get(documento)
+        return employee
+
+    def add_employee(self, employee: Employee) -> None:
+        self.session.add(employee)
+        self._add_employees([employee])
+
+    def get_or_create_location(self, ccc: str) -> ClientLocation:
+        if ccc not in self.locations_by_ccc and ccc not in self._resolved_cccs:
+            self._resolved_cccs.add(ccc)
+            with self.session.no_autoflush:
+                self._add_locations(self.session.query(ClientLocation).filter_by(ccc_ss=ccc).all())
+
+        location = self.locations_by_ccc.get(ccc)
+        if not location:
+            location = ClientLocation(company_id=self.client_id, ccc_ss=ccc)
+            self.session.add(location)
+            self.locations_by_ccc[ccc] = location
+        return location
+
+    def periods_for(self, employee: Employee, location: ClientLocation) -> List[EmployeePeriod]:
+        return self.periods.get((employee, location), [])
+
+    def add_period(self, period: EmployeePeriod, employee: Employee, location: ClientLocation) -> None:
+        # Relationships (not ids) so new employees/locations get their keys at flush time
+        period.employee = employee
+        period.location = location
+        self.session.add(period)
+        self.periods.setdefault((employee, location), []).append(period)
+
+    def flush(self) -> None:
+        """Write every pending employee, location and period in one flush."""
+        self.session.flush()
+
+
+def _get_index(session: Session, client_id: UUID, context: VidaLaboralContext) -> VidaLaboralIndex:
+    if context.index is None or context.index.session is not session:
+        context.index = VidaLaboralIndex(session, client_id)
+    return context.index
+
+
+def _on_or_before(value: Optional[date], limit: Optional[date]) -> bool:
+    """SQL `value <= limit` (false when either side is NULL)."""
+    return value is not None and limit is not None and value <= limit
+
+
+def _on_or_after(value: Optional[date], limit: Optional[date]) -> bool:
+    """SQL `value >= limit` (false when either side is NULL)."""
+    return value is not None and limit is not None and value >= limit
+
+
+def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> bool:
+    """Create or find employee and create ALTA period."""
+    index = _get_index(session, client_id, context)
+    documento = _normalize_documento(row['documento'])
     # Prefer structured fields when provided (from prod DB); fallback to parsing full name
     if row.get('first_name_raw') or row.get('surname1_raw'):
         first_name = row.get('first_name_raw') or "Unknown"
@@ -48,15 +227,8 @@ def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context:
     location_ccc = row.get('ccc', '').strip()  # CCC for the company location
     birth_date = parse_date(row.get('birth_date'))
 
-    # Try to find existing employee using priority-based matching
-    employee = None
-    # Priority 1: Try SSN match (if available) - more reliable across NIE→DNI transitions
-    if ss_number:
-        employee = session.query(Employee).filter_by(ss_number=ss_number).first()
-
-    # Priority 2: Fall back to DNI/NIE match
-    if not employee:
-        employee = session.query(Employee).filter_by(identity_card_number=documento).first()
+    # Try to find existing employee using priority-based matching (SSN, then DNI/NIE)
+    employee = index.find_employee(ss_number, documento)
 
     # If not found and we're allowed to create employees
     if not employee and context.create_employees:
@@ -69,8 +241,7 @@ def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context:
             ss_number=ss_number,
             birth_date=birth_date,
         )
-        session.add(employee)
-        session.flush()  # Get the employee ID
+        index.add_employee(employee)
         context.employees_created += 1
         print(f"✅ Created new employee: {row['nombre']} ({documento})")
 
@@ -78,7 +249,7 @@ def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context:
     if not employee:
         context.employees_not_found += 1
         print(f"⚠️  Skipping ALTA for {row['nombre']} ({documento}) - employee not found")
-        return
+        return False
 
     if birth_date and employee.birth_date != birth_date:
         employee.birth_date = birth_date
@@ -87,27 +258,24 @@ def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context:
     # Require CCC; skip rows without it (no fallback creation)
     if not location_ccc:
         print(f"⚠️  Skipping ALTA for {row['nombre']} ({documento}) - missing CCC")
-        return
+        return False
 
-    location = session.query(ClientLocation).filter_by(ccc_ss=location_ccc).first()
-    if not location:
-        location = ClientLocation(company_id=client_id, ccc_ss=location_ccc)
-        session.add(location)
-        session.flush()
+    location = index.get_or_create_location(location_ccc)
+    periods = index.periods_for(employee, location)
 
     # Merge: if there's already an open/overlapping ALTA for this employee+location, reuse it
     existing_alta = None
     if begin_date:
-        existing_alta = session.query(EmployeePeriod).filter(
-            EmployeePeriod.employee_id == employee.id,
-            EmployeePeriod.location_id == location.id,
-            EmployeePeriod.period_type == 'alta',
-            or_(
-                EmployeePeriod.period_end_date.is_(None),
-                EmployeePeriod.period_end_date >= begin_date
+        existing_alta = min(
+            (
+                p for p in periods
+                if p.period_type == 'alta'
+                and (p.period_end_date is None or _on_or_after(p.period_end_date, begin_date))
+                and _on_or_before(p.period_begin_date, begin_date)
             ),
-            EmployeePeriod.period_begin_date <= begin_date
-        ).order_by(EmployeePeriod.period_begin_date.asc()).first()
+            key=lambda p: p.period_begin_date,
+            default=None,
+        )
 
     if existing_alta:
         # Expand existing period if new begin is earlier
@@ -118,25 +286,20 @@ def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context:
             existing_alta.tipo_contrato = row.get('codigo_contrato', '')
         context.employees_updated += 1
         print(f"ℹ️  Merged ALTA for {row['nombre']} (reuse existing period starting {existing_alta.period_begin_date})")
-        return
+        return True
 
     # Idempotency: skip if an identical open ALTA already exists (e.g., re-import runs)
     if begin_date:
-        identical_open_alta = session.query(EmployeePeriod).filter(
-            EmployeePeriod.employee_id == employee.id,
-            EmployeePeriod.location_id == location.id,
-            EmployeePeriod.period_type == 'alta',
-            EmployeePeriod.period_begin_date == begin_date,
-            EmployeePeriod.period_end_date.is_(None),
-        ).first()
+        identical_open_alta = any(
+            p.period_type == 'alta' and p.period_begin_date == begin_date and p.period_end_date is None
+            for p in periods
+        )
         if identical_open_alta:
             print(f"ℹ️  Skipping duplicate ALTA for {row['nombre']} starting {begin_date}")
-            return
+            return True
 
     # Create the ALTA period
     period = EmployeePeriod(
-        employee_id=employee.id,
-        location_id=location.id,
         period_begin_date=begin_date,
         period_end_date=None,
         period_type='alta',
@@ -145,15 +308,16 @@ def handle_alta(session: Session, client_id: UUID, row: Dict[str, str], context:
         role="Empleado",  # Default role
         notes=f"ALTA from vida laboral: {row['nombre']}"
     )
-    session.add(period)
+    index.add_period(period, employee, location)
     context.periods_created += 1
     print(f"✅ Created ALTA period for {row['nombre']} starting {begin_date}")
+    return True
 
 
-def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> None:
+def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> bool:
     """Find active ALTA period and close it (change to BAJA)."""
-    # Remove only the first leading zero if present (not all zeros)
-    documento = row['documento'][1:] if row['documento'].startswith('0') else row['documento']
+    index = _get_index(session, client_id, context)
+    documento = _normalize_documento(row['documento'])
     if row.get('first_name_raw') or row.get('surname1_raw'):
         first_name = row.get('first_name_raw') or "Unknown"
         last_name = row.get('surname1_raw') or "Unknown"
@@ -166,15 +330,8 @@ def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context:
     end_date = parse_date(row.get('f_real_sit'))
     birth_date = parse_date(row.get('birth_date'))
 
-    # Find employee using priority-based matching
-    employee = None
-    # Priority 1: Try SSN match (if available) - more reliable across NIE→DNI transitions
-    if ss_number:
-        employee = session.query(Employee).filter_by(ss_number=ss_number).first()
-
-    # Priority 2: Fall back to DNI/NIE match
-    if not employee:
-        employee = session.query(Employee).filter_by(identity_card_number=documento).first()
+    # Find employee using priority-based matching (SSN, then DNI/NIE)
+    employee = index.find_employee(ss_number, documento)
 
     if not employee:
         if context.create_employees:
@@ -187,14 +344,13 @@ def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context:
                 ss_number=ss_number,
                 birth_date=birth_date,
             )
-            session.add(employee)
-            session.flush()
+            index.add_employee(employee)
             context.employees_created += 1
             print(f"✅ Created employee from BAJA fallback: {row['nombre']} ({documento})")
         else:
             context.employees_not_found += 1
             print(f"⚠️  Skipping BAJA for {row['nombre']} ({documento}) - employee not found")
-            return
+            return False
 
     if birth_date and employee.birth_date != birth_date:
         employee.birth_date = birth_date
@@ -203,38 +359,31 @@ def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context:
     # Require CCC; skip rows without it (no fallback creation)
     if not location_ccc:
         print(f"⚠️  Skipping BAJA for {row['nombre']} ({documento}) - missing CCC")
-        return
+        return False
 
-    location = session.query(ClientLocation).filter_by(ccc_ss=location_ccc).first()
-    if not location:
-        location = ClientLocation(company_id=client_id, ccc_ss=location_ccc)
-        session.add(location)
-        session.flush()
+    location = index.get_or_create_location(location_ccc)
+    periods = index.periods_for(employee, location)
 
     # Idempotency: if an identical BAJA period already exists, skip.
     # This prevents duplication when re-importing or when the same logical BAJA row is processed twice.
     baja_begin_date = parse_date(row.get('f_real_alta'))
-    existing_baja = session.query(EmployeePeriod).filter(
-        EmployeePeriod.employee_id == employee.id,
-        EmployeePeriod.location_id == location.id,
-        EmployeePeriod.period_type == 'baja',
-        EmployeePeriod.period_end_date == end_date,
-        EmployeePeriod.period_begin_date == baja_begin_date,
-    ).first()
+    existing_baja = any(
+        p.period_type == 'baja' and p.period_end_date == end_date and p.period_begin_date == baja_begin_date
+        for p in periods
+    )
     if existing_baja:
         print(
             f"ℹ️  Skipping duplicate BAJA for {row['nombre']} "
             f"(begin: {baja_begin_date}, end: {end_date})"
         )
-        return
+        return True
 
-    # Find active ALTA period for this employee and location
-    active_period = session.query(EmployeePeriod).filter_by(
-        employee_id=employee.id,
-        location_id=location.id,
-        period_type='alta',
-        period_end_date=None
-    ).order_by(EmployeePeriod.period_begin_date.desc()).first()
+    # Find active ALTA period for this employee and location (latest begin date first)
+    active_period = max(
+        (p for p in periods if p.period_type == 'alta' and p.period_end_date is None),
+        key=lambda p: p.period_begin_date or date.min,
+        default=None,
+    )
 
     # If an active ALTA exists but starts after the BAJA end date, it's not the one to close.
     if active_period and end_date and active_period.period_begin_date and active_period.period_begin_date > end_date:
@@ -246,13 +395,11 @@ def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context:
         active_period.period_type = 'baja'
         context.employees_updated += 1
         print(f"✅ Closed ALTA period for {row['nombre']} → BAJA ending {end_date}")
-        return
+        return True
 
     # If no active ALTA found, create a terminated period (BAJA without prior ALTA in our system)
     begin_date = baja_begin_date
     period = EmployeePeriod(
-        employee_id=employee.id,
-        location_id=location.id,
         period_begin_date=begin_date,
         period_end_date=end_date,
         period_type='baja',
@@ -261,77 +408,63 @@ def handle_baja(session: Session, client_id: UUID, row: Dict[str, str], context:
         role="Empleado",
         notes=f"BAJA without prior ALTA: {row['nombre']}"
     )
-    session.add(period)
+    index.add_period(period, employee, location)
     context.periods_created += 1
     print(f"⚠️  BAJA without matching ALTA for {row['nombre']} ({documento})")
     print(f"✅ Created terminated period for {row['nombre']} (begin: {begin_date}, end: {end_date})")
+    return True
 
 
-def handle_vacacion(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> None:
+def handle_vacacion(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> bool:
     """Record a VAC.RETRIB.NO vacation period."""
-    # Remove only the first leading zero if present (not all zeros)
-    documento = row['documento'][1:] if row['documento'].startswith('0') else row['documento']
+    index = _get_index(session, client_id, context)
+    documento = _normalize_documento(row['documento'])
     ss_number = normalize_ssn(row.get('naf'))
     location_ccc = row.get('ccc', '').strip()  # CCC for the company location
 
-    # Find employee using priority-based matching
-    employee = None
-    # Priority 1: Try SSN match (if available) - more reliable across NIE→DNI transitions
-    if ss_number:
-        employee = session.query(Employee).filter_by(ss_number=ss_number).first()
-
-    # Priority 2: Fall back to DNI/NIE match
-    if not employee:
-        employee = session.query(Employee).filter_by(identity_card_number=documento).first()
+    # Find employee using priority-based matching (SSN, then DNI/NIE)
+    employee = index.find_employee(ss_number, documento)
 
     if not employee:
         context.employees_not_found += 1
         print(f"⚠️  Skipping VAC.RETRIB.NO for {row['nombre']} ({documento}) - employee not found")
-        return
+        return False
 
     vacation_start = parse_date(row.get('f_efecto_alta'))
     vacation_end = parse_date(row.get('f_real_sit'))
 
     if not vacation_start or not vacation_end:
         print(f"⚠️  Skipping VAC.RETRIB.NO for {row['nombre']} ({documento}): missing dates")
-        return
+        return False
 
     # Require CCC; skip rows without it (no fallback creation)
     if not location_ccc:
         print(f"⚠️  Skipping VAC.RETRIB.NO for {row['nombre']} ({documento}) - missing CCC")
-        return
+        return False
 
-    location = session.query(ClientLocation).filter_by(ccc_ss=location_ccc).first()
-    if not location:
-        location = ClientLocation(company_id=client_id, ccc_ss=location_ccc)
-        session.add(location)
-        session.flush()
+    location = index.get_or_create_location(location_ccc)
 
     # Idempotency: skip if an identical vacation period already exists.
-    existing_vacation = session.query(EmployeePeriod).filter(
-        EmployeePeriod.employee_id == employee.id,
-        EmployeePeriod.location_id == location.id,
-        EmployeePeriod.period_type == 'vacaciones',
-        EmployeePeriod.period_begin_date == vacation_start,
-        EmployeePeriod.period_end_date == vacation_end,
-    ).first()
+    existing_vacation = any(
+        p.period_type == 'vacaciones' and p.period_begin_date == vacation_start and p.period_end_date == vacation_end
+        for p in index.periods_for(employee, location)
+    )
     if existing_vacation:
         print(f"ℹ️  Skipping duplicate vacation for {row['nombre']} ({vacation_start} to {vacation_end})")
-        return
+        return True
 
     # Create vacation period using EmployeePeriod model
     vacation_period = EmployeePeriod(
-        employee_id=employee.id,
-        location_id=location.id,
         period_begin_date=vacation_start,
         period_end_date=vacation_end,
         period_type='vacaciones',
         notes=f"VAC.RETRIB.NO from vida laboral: {row['nombre']}",
     )
-    session.add(vacation_period)
+    index.add_period(vacation_period, employee, location)
     context.vacation_periods_created += 1
     context.periods_created += 1
     print(f"✅ Added vacation period for {row['nombre']} ({vacation_start} to {vacation_end})")
+    return True
 
 
 HANDLERS = {
@@ -341,14 +474,49 @@ HANDLERS = {
 }
 
 
-def process_row(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> None:
-    """Dispatch vida laboral rows to the appropriate handler."""
+def process_row(session: Session, client_id: UUID, row: Dict[str, str], context: VidaLaboralContext) -> bool:
+    """
+    Dispatch vida laboral rows to the appropriate handler.
+
+    Returns whether the row was applied; rows without a handler and rows the
+    handler skipped (unknown employee, missing CCC or dates) return False.
+    """
     situacion = row.get('situacion')
     if not situacion:
-        return
+        return False
 
     handler = HANDLERS.get(situacion)
     if handler is None:
-        return
-
-    handler(session, client_id, row, context)
+        return False
+
+    return handler(session, client_id, row, context)
+
+
+def process_rows(
+    session: Session,
+    client_id: UUID,
+    rows: Iterable[Dict[str, str]],
+    context: VidaLaboralContext,
+    applied: Optional[List[bool]] = None,
+) -> int:
+    """
+    Process a batch of vida laboral rows with a preloaded VidaLaboralIndex.
+
+    Everything the handlers create or change is written in one flush at the
+    end; the caller commits. An index already held by the context for the
+    same session and client is extended rather than reloaded, so a stream can
+    be processed in consecutive batches. When `applied` is given, process_row's
+    result for each row is appended to it. Returns the number of rows processed.
+    """
+    rows = list(rows)
+    index = context.index
+    if index is not None and index.session is session and index.client_id == client_id:
+        index.preload(rows)
+    else:
+        context.index = VidaLaboralIndex.load(session, client_id, rows)
+    for row in rows:
+        result = process_row(session, client_id, row, context)
+        if applied is not None:
+            applied.append(result)
+    context.index.flush()
+    return len(rows)
@@ -0,0 +1,167 @@
+"""
+Delta-aware vida laboral re-imports.
+
+Monthly vida laboral files are mostly a superset of the previous month's.
+Every imported movement is recorded in vida_laboral_movements under a key
+hashed from its identity (CCC, NAF, movement type and dates) together with a
+hash of the whole row. A re-import then sends only new or changed movements
+through the row handlers, and reports movements of the file's CCCs that are
+no longer present.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+import core.vida_laboral as vida_laboral
+from core.models import VidaLaboralMovement
+from core.utils.batching import chunked
+from core.vida_laboral import VidaLaboralContext
+
+# Fields that identify a movement; the NAF falls back to the documento when missing
+MOVEMENT_KEY_FIELDS = ("ccc", "naf", "situacion", "f_real_alta", "f_efecto_alta", "f_real_sit")
+# Fields covered by the content hash
+MOVEMENT_CONTENT_FIELDS = (
+    "ccc", "naf", "documento", "nombre", "situacion", "f_real_alta", "f_efecto_alta", "f_real_sit",
+    "codigo_contrato", "birth_date",
+)
+
+
+def _field(row: Dict[str, Any], name: str) -> str:
+    value = row.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def _sha256(parts: Iterable[str]) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def movement_key(row: Dict[str, Any]) -> str:
+    """Hash of the movement identity: CCC, NAF (or documento), movement type and dates."""
+    parts = [_field(row, name) for name in MOVEMENT_KEY_FIELDS]
+    if not parts[1]:
+        parts[1] = "doc:" + _field(row, "documento")
+    return _sha256(parts)
+
+
+def movement_content_hash(row: Dict[str, Any]) -> str:
+    """Hash of every imported field; changes when a known movement is re-issued with other data."""
+    return _sha256(_field(row, name) for name in MOVEMENT_CONTENT_FIELDS)
+
+
+def _movement_values(row: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    return {
+        "ccc": _field(row, "ccc"),
+        "naf": _field(row, "naf") or None,
+        "documento": _field(row, "documento") or None,
+        "situacion": _field(row, "situacion") or None,
+        "f_real_alta": _field(row, "f_real_alta") or None,
+        "f_efecto_alta": _field(row, "f_efecto_alta") or None,
+        "f_real_sit": _field(row, "f_real_sit") or None,
+    }
+
+
+def _describe(movement: Any) -> Dict[str, Optional[str]]:
+    return {
+        "ccc": movement.ccc,
+        "naf": movement.naf,
+        "documento": movement.documento,
+        "situacion": movement.situacion,
+        "f_real_alta": movement.f_real_alta,
+        "f_efecto_alta": movement.f_efecto_alta,
+        "f_real_sit": movement.f_real_sit,
+    }
+
+
+def process_rows_delta(
+    session: Session,
+    client_id: UUID,
+    rows: Iterable[Dict[str, Any]],
+    context: VidaLaboralContext,
+) -> Dict[str, Any]:
+    """
+    Process only the vida laboral rows not imported before (or changed since).
+
+    Rows sharing a movement key are compared as a group, so repeated lines
+    of one movement don't flip between versions. New and changed rows keep
+    their file order and go through vida_laboral.process_rows; movement
+    records are inserted or updated only for movements a handler applied, so
+    skipped rows (unknown employee, missing CCC) are retried on the next
+    import and counted as skipped. Unchanged movements only get last_seen_at
+    bumped. Movements recorded for the same CCCs but absent
+    from rows are reported, not deleted. The caller commits.
+    """
+    rows = list(rows)
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    content_hashes: Dict[str, List[str]] = {}
+    row_keys: List[str] = []
+    for row in rows:
+        key = movement_key(row)
+        row_keys.append(key)
+        groups.setdefault(key, []).append(row)
+        content_hashes.setdefault(key, []).append(movement_content_hash(row))
+    group_hashes = {
+        key: hashes[0] if len(hashes) == 1 else _sha256(hashes)
+        for key, hashes in content_hashes.items()
+    }
+    cccs = sorted({_field(row, "ccc") for row in rows})
+
+    movements = VidaLaboralMovement.__table__
+    known: Dict[str, Any] = {}
+    for chunk in chunked(cccs):
+        stmt = select(
+            movements.c.id, movements.c.movement_key, movements.c.content_hash, movements.c.ccc,
+            movements.c.naf, movements.c.documento, movements.c.situacion, movements.c.f_real_alta,
+            movements.c.f_efecto_alta, movements.c.f_real_sit,
+        ).where(movements.c.client_id == client_id, movements.c.ccc.in_(chunk))
+        known.update((movement.movement_key, movement) for movement in session.execute(stmt))
+
+    new = [key for key in groups if key not in known]
+    changed = [key for key in groups if key in known and known[key].content_hash != group_hashes[key]]
+    unchanged_ids = sorted(known[key].id for key in groups if key in known and known[key].content_hash == group_hashes[key])
+
+    pending_keys = set(new) | set(changed)
+    pending_rows = [(key, row) for key, row in zip(row_keys, rows) if key in pending_keys]
+    applied: List[bool] = []
+    if pending_rows:
+        vida_laboral.process_rows(session, client_id, [row for _, row in pending_rows], context, applied)
+    applied_keys = {key for (key, _), result in zip(pending_rows, applied) if result}
+    skipped = pending_keys - applied_keys
+
+    new_applied = [key for key in new if key in applied_keys]
+    if new_applied:
+        session.execute(
+            insert(movements),
+            [
+                {"client_id": client_id, "movement_key": key, "content_hash": group_hashes[key],
+                 **_movement_values(groups[key][0])}
+                for key in new_applied
+            ],
+        )
+    for key in changed:
+        if key in skipped:
+            continue
+        session.execute(
+            update(movements)
+            .where(movements.c.id == known[key].id)
+            .values(content_hash=group_hashes[key], last_seen_at=func.now(), **_movement_values(groups[key][0]))
+        )
+    for chunk in chunked(unchanged_ids):
+        session.execute(update(movements).where(movements.c.id.in_(chunk)).values(last_seen_at=func.now()))
+
+    disappeared = [_describe(movement) for key, movement in known.items() if key not in groups]
+
+    return {
+        "rows": len(rows),
+        "new": len(new),
+        "changed": len(changed),
+        "unchanged": len(unchanged_ids),
+        "processed": len(pending_rows),
+        "skipped": len(skipped),
+        "disappeared": disappeared,
+    }
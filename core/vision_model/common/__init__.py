@@ -6,6 +6,7 @@ from core.vision_model.common.pricing_config import (
     get_openai_pricing,
     get_gemini_pricing,
     calculate_cost,
+    calculate_usage_cost,
     OPENAI_PRICING,
     GEMINI_PRICING,
 )
@@ -14,6 +15,20 @@ from core.vision_model.common.compare_json import (
     compare_json,
 )
 
+from core.vision_model.common.prompt_cache import (
+    GeminiContextCache,
+    openai_prompt_cache_key,
+    cache_hit_ratio,
+    summarize_cache_usage,
+)
+
+from core.vision_model.common.json_parsing import (
+    parse_json_response,
+    parse_json_model,
+    get_json_parse_stats,
+    JSON_PARSE_STATS,
+)
+
 from core.vision_model.common.utils import (
     get_page_as_pdf,
     get_pdf_bytes_and_text,
@@ -27,10 +42,21 @@ __all__ = [
     "get_openai_pricing",
     "get_gemini_pricing",
     "calculate_cost",
+    "calculate_usage_cost",
     "OPENAI_PRICING",
     "GEMINI_PRICING",
     # JSON comparison
     "compare_json",
+    # Prompt caching
+    "GeminiContextCache",
+    "openai_prompt_cache_key",
+    "cache_hit_ratio",
+    "summarize_cache_usage",
+    # JSON decoding
+    "parse_json_response",
+    "parse_json_model",
+    "get_json_parse_stats",
+    "JSON_PARSE_STATS",
     # Utilities
     "get_page_as_pdf",
     "get_pdf_bytes_and_text",
@@ -0,0 +1,143 @@
+"""
+Fast-path JSON decoding for LLM responses.
+
+Most model responses are already valid JSON, so a strict decode is tried
+first and `json_repair` only runs when that fails. Every decode is counted
+so the repair frequency can be reported at the end of a run.
+"""
+
+import json
+import threading
+from typing import Any, Dict, Type, TypeVar
+
+from json_repair import repair_json
+from pydantic import BaseModel, ValidationError
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class JsonParseStats:
+    """Thread-safe counters for strict vs repaired JSON decodes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.fast = 0
+            self.repaired = 0
+            self.failed = 0
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @property
+    def total(self) -> int:
+        return self.fast + self.repaired + self.failed
+
+    @property
+    def repair_rate(self) -> float:
+        """Fraction of decodes that needed `json_repair` (0.0 when nothing parsed)."""
+        return (self.repaired / self.total) if self.total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fast": self.fast,
+            "repaired": self.repaired,
+            "failed": self.failed,
+            "total": self.total,
+            "repair_rate": round(self.repair_rate, 4),
+        }
+
+
+JSON_PARSE_STATS = JsonParseStats()
+
+
+def get_json_parse_stats() -> Dict[str, Any]:
+    """Return a snapshot of the process-wide JSON decode counters."""
+    return JSON_PARSE_STATS.to_dict()
+
+
+def clean_json_string(json_str: str) -> str:
+    """Clean JSON string by removing markdown code blocks."""
+    return json_str.strip().replace("```json", "").replace("```", "").strip()
+
+
+def _strict_loads(json_str: str) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(json_str)
+    return json.loads(json_str)
+
+
+def _repair_loads(json_str: str) -> Any:
+    repaired = repair_json(json_str, skip_json_loads=True, ensure_ascii=False)
+    return json.loads(repaired)
+
+
+def parse_json_response(json_str: str) -> Dict:
+    """
+    Decode an LLM JSON response, repairing it only if strict decoding fails.
+
+    Args:
+        json_str: Raw response text (markdown fences are stripped)
+
+    Returns:
+        Decoded JSON value
+
+    Raises:
+        ValueError: If the response cannot be decoded even after repair
+    """
+    cleaned = clean_json_string(json_str)
+    try:
+        data = _strict_loads(cleaned)
+        JSON_PARSE_STATS.record("fast")
+        return data
+    except ValueError:
+        # orjson.JSONDecodeError and json.JSONDecodeError both subclass ValueError
+        pass
+
+    try:
+        data = _repair_loads(cleaned)
+    except (json.JSONDecodeError, ValueError) as e:
+        JSON_PARSE_STATS.record("failed")
+        raise ValueError(f"Failed to parse JSON response: {e}") from e
+    JSON_PARSE_STATS.record("repaired")
+    return data
+
+
+def parse_json_model(json_str: str, model: Type[ModelT]) -> ModelT:
+    """
+    Validate an LLM JSON response straight into a pydantic model.
+
+    Uses `model_validate_json` (single pass, no intermediate dict) and only
+    falls back to `json_repair` + `model_validate` when that fails.
+
+    Raises:
+        ValueError: If the response cannot be decoded or validated
+    """
+    cleaned = clean_json_string(json_str)
+    try:
+        parsed = model.model_validate_json(cleaned)
+        JSON_PARSE_STATS.record("fast")
+        return parsed
+    except ValidationError:
+        pass
+
+    try:
+        parsed = model.model_validate(_repair_loads(cleaned))
+    except (ValidationError, ValueError) as e:
+        JSON_PARSE_STATS.record("failed")
+        raise ValueError(f"Failed to parse {model.__name__}: {e}") from e
+    JSON_PARSE_STATS.record("repaired")
+    return parsed
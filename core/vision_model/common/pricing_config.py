@@ -5,6 +5,8 @@ Update these values with the latest pricing from provider websites.
 Prices are per 1,000 tokens unless otherwise noted.
 """
 
+from typing import Optional
+
 # OpenAI Pricing (per 1,000 tokens)
 # Update these values from: https://openai.com/api/pricing/
 # Note: Prices are per 1,000 tokens (convert from per 1M: divide by 1000)
@@ -35,21 +37,26 @@ OPENAI_PRICING = {
 # Update these values from: https://ai.google.dev/pricing
 # Note: Prices are per 1,000 tokens (convert from per 1M: divide by 1000)
 # For prompts ≤ 200k tokens (standard pricing)
+# cached_input is the context-cache read price; explicit cache storage (per hour) is not included
 GEMINI_PRICING = {
     "gemini-2.5-pro": {
         "input": 0.00125,  # $1.25 per 1M tokens = $0.00125 per 1K tokens (prompts ≤ 200k)
+        "cached_input": 0.000125,  # $0.125 per 1M tokens = $0.000125 per 1K tokens (prompts ≤ 200k)
         "output": 0.01,  # $10.00 per 1M tokens = $0.01 per 1K tokens (output includes thinking tokens)
     },
     "gemini-2.5-flash": {
         "input": 0.0003,  # $0.30 per 1M tokens = $0.0003 per 1K tokens (prompts ≤ 200k)
+        "cached_input": 0.00003,  # $0.03 per 1M tokens = $0.00003 per 1K tokens
         "output": 0.0025,  # $2.50 per 1M tokens = $0.0025 per 1K tokens (output includes thinking tokens)
     },
     "gemini-3-pro-preview": {
         "input": 0.002,  # $2.00 per 1M tokens = $0.002 per 1K tokens (prompts ≤ 200k)
+        "cached_input": 0.0002,  # $0.20 per 1M tokens = $0.0002 per 1K tokens (prompts ≤ 200k)
         "output": 0.012,  # $12.00 per 1M tokens = $0.012 per 1K tokens (output includes thinking tokens)
     },
     "gemini-3-flash-preview": {
         "input": 0.0005,  # $0.50 per 1M tokens = $0.0005 per 1K tokens
+        "cached_input": 0.00005,  # $0.05 per 1M tokens = $0.00005 per 1K tokens
         "output": 0.003,  # $3.00 per 1M tokens = $0.003 per 1K tokens
     },
 }
@@ -65,22 +72,53 @@ def get_gemini_pricing(model: str) -> dict:
     return GEMINI_PRICING.get(model, {"input": 0.0, "output": 0.0})
 
 
-def calculate_cost(input_tokens: int, output_tokens: int, input_price: float, output_price: float) -> float:
+def calculate_cost(
+    input_tokens: int,
+    output_tokens: int,
+    input_price: float,
+    output_price: float,
+    cached_input_tokens: int = 0,
+    cached_input_price: Optional[float] = None,
+) -> float:
     """
     Calculate cost based on token counts and pricing.
     
     Args:
-        input_tokens: Number of input tokens
+        input_tokens: Number of input tokens (including cached ones, as reported by providers)
         output_tokens: Number of output tokens
         input_price: Price per 1,000 input tokens
         output_price: Price per 1,000 output tokens
+        cached_input_tokens: Number of input tokens served from the prompt cache
+        cached_input_price: Price per 1,000 cached input tokens (defaults to input_price)
     
     Returns:
         Total cost in USD
     """
-    input_cost = (input_tokens / 1000.0) * input_price
+    if cached_input_price is None:
+        cached_input_price = input_price
+    cached_input_tokens = min(cached_input_tokens, input_tokens)
+    uncached_input_tokens = input_tokens - cached_input_tokens
+    input_cost = (uncached_input_tokens / 1000.0) * input_price
+    cached_cost = (cached_input_tokens / 1000.0) * cached_input_price
     output_cost = (output_tokens / 1000.0) * output_price
-    return input_cost + output_cost
+    return input_cost + cached_cost + output_cost
+
+
+def calculate_usage_cost(usage_info: dict, pricing: dict) -> float:
+    """
+    Calculate cost for a parser `usage_info` dict using a pricing entry.
+
+    Cached input tokens are billed at the `cached_input` price when the
+    pricing entry has one.
+    """
+    return calculate_cost(
+        usage_info.get("input_tokens", 0),
+        usage_info.get("output_tokens", 0),
+        pricing.get("input", 0.0),
+        pricing.get("output", 0.0),
+        cached_input_tokens=usage_info.get("cached_input_tokens", 0),
+        cached_input_price=pricing.get("cached_input"),
+    )
 
 
 
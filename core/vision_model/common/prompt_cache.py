@@ -0,0 +1,131 @@
+"""
+Prompt-prefix caching helpers.
+
+The system prompts are large and identical for every request, so they are
+sent as a stable prefix that providers can cache:
+
+- OpenAI caches prompt prefixes automatically; a stable `prompt_cache_key`
+  routes requests that share a prompt to the same cache.
+- Gemini caches stable prefixes implicitly on 2.5+ models, and can also hold
+  the system prompt in an explicit `CachedContent` (see GeminiContextCache).
+
+Cached-token counts are read back from the usage metadata so cost accounting
+can price them at the provider's cached-input rate.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL_SECONDS = 3600
+# Recreate explicit caches slightly before they expire server-side
+CACHE_REFRESH_MARGIN_SECONDS = 60
+
+
+def prompt_fingerprint(prompt: str) -> str:
+    """Short, stable hash of a prompt (used for cache keys and display names)."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def openai_prompt_cache_key(prompt: str) -> str:
+    """Return the `prompt_cache_key` for requests that share `prompt` as prefix."""
+    return f"valeria-{prompt_fingerprint(prompt)}"
+
+
+def extract_openai_cached_tokens(usage: Any) -> int:
+    """Cached input tokens from an OpenAI Responses `usage` object."""
+    details = getattr(usage, "input_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def extract_gemini_cached_tokens(usage_metadata: Any) -> int:
+    """Cached input tokens from a Gemini `usage_metadata` object."""
+    return getattr(usage_metadata, "cached_content_token_count", 0) or 0
+
+
+def cache_hit_ratio(input_tokens: int, cached_input_tokens: int) -> float:
+    """Fraction of input tokens served from the provider cache."""
+    return (cached_input_tokens / input_tokens) if input_tokens else 0.0
+
+
+class GeminiContextCache:
+    """
+    Explicit Gemini context cache holding a static system prompt.
+
+    The cache is created lazily on first use and recreated when its TTL is
+    about to expire. If creation fails (prompt below the model's minimum
+    cacheable size, missing permissions, ...) the cache disables itself and
+    callers fall back to sending the system prompt inline.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        system_prompt: str,
+        ttl_seconds: int = DEFAULT_CACHE_TTL_SECONDS,
+    ):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.ttl_seconds = ttl_seconds
+        self._name: Optional[str] = None
+        self._expires_at = 0.0
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return not self._disabled
+
+    def get_name(self) -> Optional[str]:
+        """Return the cached content name, creating the cache if needed."""
+        if self._disabled:
+            return None
+        with self._lock:
+            if self._name and time.time() < self._expires_at - CACHE_REFRESH_MARGIN_SECONDS:
+                return self._name
+            try:
+                from google.genai import types
+
+                cached = self.client.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"valeria-{prompt_fingerprint(self.system_prompt)}",
+                        system_instruction=self.system_prompt,
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+            except Exception as e:
+                logger.warning(f"Gemini context cache disabled, sending system prompt inline: {e}")
+                self._disabled = True
+                self._name = None
+                return None
+            self._name = cached.name
+            self._expires_at = time.time() + self.ttl_seconds
+            return self._name
+
+    def delete(self) -> None:
+        """Delete the server-side cache (storage is billed until TTL expiry)."""
+        with self._lock:
+            if not self._name:
+                return
+            try:
+                self.client.caches.delete(name=self._name)
+            except Exception as e:
+                logger.warning(f"Failed to delete Gemini context cache {self._name}: {e}")
+            self._name = None
+            self._expires_at = 0.0
+
+
+def summarize_cache_usage(input_tokens: int, cached_input_tokens: int) -> Dict[str, Any]:
+    """Summary dict with cached-token totals and hit ratio for run reports."""
+    return {
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "cache_hit_ratio": round(cache_hit_ratio(input_tokens, cached_input_tokens), 4),
+    }
@@ -0,0 +1,83 @@
+"""
+Compact output schema for the unified parser.
+
+Wraps the compact payslip/settlement layouts in a short-key logical document
+list; `expand_unified` rebuilds a regular UnifiedExtractionResponse.
+"""
+
+from typing import Any, List, Literal, Union
+
+from pydantic import BaseModel, Field, model_validator
+
+from core.vision_model.document_parser.models import LogicalDocument, UnifiedExtractionResponse
+from core.vision_model.payslips.compact_models import (
+    COMPACT_OUTPUT_INSTRUCTIONS as PAYSLIP_COMPACT_INSTRUCTIONS,
+    CompactPayslipData,
+    compact_payslip,
+    expand_payslip,
+)
+from core.vision_model.payslips.payslip_models import PayslipData
+from core.vision_model.settlements.compact_models import (
+    CompactSettlementData,
+    compact_settlement,
+    expand_settlement,
+)
+
+
+class CompactLogicalDocument(BaseModel):
+    k: Literal["payslip", "settlement"] = Field(..., description="type")
+    d: Union[CompactPayslipData, CompactSettlementData] = Field(..., description="data")
+    pg: List[int] = Field(default_factory=list, description="pages")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _route_by_kind(cls, values: Any) -> Any:
+        """Validate `d` against the layout named by `k` instead of guessing from the keys."""
+        if isinstance(values, dict) and isinstance(values.get("d"), dict):
+            target = CompactSettlementData if values.get("k") == "settlement" else CompactPayslipData
+            values = {**values, "d": target.model_validate(values["d"])}
+        return values
+
+
+class CompactUnifiedResponse(BaseModel):
+    """Short-key equivalent of UnifiedExtractionResponse."""
+
+    docs: List[CompactLogicalDocument] = Field(default_factory=list, description="logical_documents")
+    wr: List[str] = Field(default_factory=list, description="warnings")
+
+
+COMPACT_OUTPUT_INSTRUCTIONS = PAYSLIP_COMPACT_INSTRUCTIONS + """
+Top level: {`docs`: [{`k`: "payslip"|"settlement", `pg`: pages, `d`: <compact data>}], `wr`: warnings}.
+Settlement data uses the same keys plus `fc` fecha_cese, `ca` causa, `fl` fecha_liquidacion,
+`lu` lugar, and has no `p` or `ap`.
+"""
+
+
+def expand_unified(compact: CompactUnifiedResponse) -> UnifiedExtractionResponse:
+    """Rebuild the full UnifiedExtractionResponse from its compact form."""
+    documents = []
+    for doc in compact.docs:
+        if doc.k == "settlement":
+            documents.append(
+                LogicalDocument(type="settlement", data=expand_settlement(doc.d), pages=list(doc.pg))
+            )
+        else:
+            documents.append(
+                LogicalDocument(type="payslip", data=expand_payslip(doc.d), pages=list(doc.pg))
+            )
+    return UnifiedExtractionResponse(logical_documents=documents, warnings=list(compact.wr))
+
+
+def compact_unified(response: UnifiedExtractionResponse) -> CompactUnifiedResponse:
+    """Encode a UnifiedExtractionResponse in the compact layout."""
+    docs = []
+    for doc in response.logical_documents:
+        if isinstance(doc.data, PayslipData):
+            docs.append(
+                CompactLogicalDocument(k=doc.type, d=compact_payslip(doc.data), pg=list(doc.pages))
+            )
+        else:
+            docs.append(
+                CompactLogicalDocument(k=doc.type, d=compact_settlement(doc.data), pg=list(doc.pages))
+            )
+    return CompactUnifiedResponse(docs=docs, wr=list(response.warnings))
@@ -9,6 +9,10 @@ class LogicalDocument(BaseModel):
     """
     type: Literal["payslip", "settlement"] = Field(..., description="Type of the logical document")
     data: Union[PayslipData, SettlementData] = Field(..., description="The actual extracted data for this document")
+    pages: List[int] = Field(
+        default_factory=list,
+        description="1-based page numbers of the provided PDF where this document appears"
+    )
 
 class UnifiedExtractionResponse(BaseModel):
     """
@@ -26,6 +26,7 @@ A single PDF file can contain:
 3. **Language**: All generated text strings (especially the warnings in the `warnings` array) must be **in English**.
 4. **Accuracy**: Do not hallucinate. If a value is missing and not calculable by rules, use `null`.
 5. **Multiple Documents**: Process ALL logical documents found in the document.
+6. **Page Mapping**: For every logical document, list in `pages` the 1-based page numbers of the provided PDF where it appears (e.g. `[3]`, or `[1, 2]` if it spans two pages).
 
 ---
 
@@ -35,6 +36,7 @@ A single PDF file can contain:
  "logical_documents": [
   {
    "type": "payslip",
+   "pages": [1],
    "data": {
      "empresa": { "razon_social": "string|null", "cif": "string|null" },
      "trabajador": { "nombre": "string|null", "dni": "string|null", "ss_number": "string|null" },
@@ -60,6 +62,7 @@ A single PDF file can contain:
   },
   {
    "type": "settlement",
+   "pages": [2],
    "data": {
      "empresa": { ... },
      "trabajador": { ... },
@@ -1,13 +1,22 @@
 import base64
-import json
 import logging
 import time
 import os
 from typing import Dict, List, Optional, Tuple, Union, Literal
 
+from core.vision_model.document_parser.compact_models import (
+    COMPACT_OUTPUT_INSTRUCTIONS,
+    CompactUnifiedResponse,
+    expand_unified,
+)
 from core.vision_model.document_parser.models import UnifiedExtractionResponse
 from core.vision_model.document_parser.prompt import unified_system_prompt
-from json_repair import repair_json
+from core.vision_model.common.json_parsing import clean_json_string, parse_json_model
+from core.vision_model.common.prompt_cache import (
+    DEFAULT_CACHE_TTL_SECONDS,
+    GeminiContextCache,
+    extract_gemini_cached_tokens,
+)
 
 try:
     from google import genai
@@ -29,12 +38,21 @@ class UnifiedParser:
         api_key: Optional[str] = None,
         project: str = "valeria-test-474315",
         location: str = "europe-southwest1",
+        use_context_cache: bool = False,
+        cache_ttl_seconds: int = DEFAULT_CACHE_TTL_SECONDS,
+        compact_output: bool = False,
     ):
         self.provider = provider
         self.model = model
         self.api_key = api_key
         self.project = project
         self.location = "global" if model.startswith("gemini-3") else location
+        self.context_cache: Optional[GeminiContextCache] = None
+        # Compact mode: short-key schema for the model, expanded locally after parsing
+        self.compact_output = compact_output
+        self.system_prompt = (
+            unified_system_prompt + COMPACT_OUTPUT_INSTRUCTIONS if compact_output else unified_system_prompt
+        )
         
         if self.provider == "gemini":
             if not GEMINI_AVAILABLE:
@@ -46,12 +64,20 @@ class UnifiedParser:
                 self.client = genai.Client(
                     vertexai=True, project=self.project, location=self.location
                 )
+            # Optional explicit cache for the static unified system prompt
+            self.context_cache = (
+                GeminiContextCache(
+                    self.client, model, self.system_prompt, ttl_seconds=cache_ttl_seconds
+                )
+                if use_context_cache
+                else None
+            )
         elif self.provider == "openai":
             import openai
             self.client = openai.OpenAI(api_key=self.api_key or os.getenv("OPENAI_API_KEY"))
 
     def _clean_json_string(self, json_str: str) -> str:
-        return json_str.strip().replace("```json", "").replace("```", "").strip()
+        return clean_json_string(json_str)
 
     def parse_with_usage(
         self, 
@@ -82,15 +108,23 @@ class UnifiedParser:
 
         generate_config = types.GenerateContentConfig(
             temperature=0.1,
-            system_instruction=[types.Part.from_text(text=unified_system_prompt)],
             response_mime_type="application/json",
-            response_schema=UnifiedExtractionResponse.model_json_schema(),
+            response_schema=(
+                CompactUnifiedResponse if self.compact_output else UnifiedExtractionResponse
+            ).model_json_schema(),
             thinking_config=types.ThinkingConfig(thinking_level="low"),
         )
 
         if self.model.startswith("gemini-3"):
             generate_config.thinking_config = types.ThinkingConfig(thinking_level="low")
 
+        # System prompt goes first (cached or inline) so the request prefix stays stable
+        cached_content = self.context_cache.get_name() if self.context_cache else None
+        if cached_content:
+            generate_config.cached_content = cached_content
+        else:
+            generate_config.system_instruction = [types.Part.from_text(text=self.system_prompt)]
+
         start_time = time.time()
         response = self.client.models.generate_content(
             model=self.model,
@@ -101,8 +135,11 @@ class UnifiedParser:
 
         result_text = self._clean_json_string(response.text or "{}")
         try:
-            data_dict = json.loads(repair_json(result_text))
-            parsed_response = UnifiedExtractionResponse(**data_dict)
+            # Strict model_validate_json first; json_repair only on failure
+            if self.compact_output:
+                parsed_response = expand_unified(parse_json_model(result_text, CompactUnifiedResponse))
+            else:
+                parsed_response = parse_json_model(result_text, UnifiedExtractionResponse)
         except Exception as e:
             logging.error(f"Failed to parse UnifiedExtractionResponse: {e}")
             raise ValueError(f"Invalid LLM response for Unified parser: {e}")
@@ -112,6 +149,7 @@ class UnifiedParser:
             "input_tokens": usage.prompt_token_count if usage else 0,
             "output_tokens": usage.candidates_token_count if usage else 0,
             "total_tokens": usage.total_token_count if usage else 0,
+            "cached_input_tokens": extract_gemini_cached_tokens(usage) if usage else 0,
             "parsing_time_seconds": elapsed
         }
 
@@ -124,6 +162,14 @@ class UnifiedParser:
 def create_unified_parser(
     provider: str = "gemini",
     model: str = "gemini-3-flash-preview",
-    api_key: Optional[str] = None
+    api_key: Optional[str] = None,
+    use_context_cache: bool = False,
+    compact_output: bool = False,
 ) -> UnifiedParser:
-    return UnifiedParser(provider=provider, model=model, api_key=api_key)
+    return UnifiedParser(
+        provider=provider,
+        model=model,
+        api_key=api_key,
+        use_context_cache=use_context_cache,
+        compact_output=compact_output,
+    )
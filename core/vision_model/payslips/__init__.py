@@ -21,6 +21,12 @@ from core.vision_model.payslips.payslip_models import (
     Totales,
 )
 
+from core.vision_model.payslips.compact_models import (
+    CompactPayslipData,
+    expand_payslip,
+    compact_payslip,
+)
+
 __all__ = [
     # Parsers
     "BasePayslipParser",
@@ -37,5 +43,8 @@ __all__ = [
     "DeduccionItem",
     "AportacionEmpresaItem",
     "Totales",
+    # Compact output schema
+    "CompactPayslipData",
+    "expand_payslip",
+    "compact_payslip",
 ]
-
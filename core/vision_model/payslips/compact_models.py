@@ -0,0 +1,246 @@
+"""
+Compact output schema for payslip extraction.
+
+Output tokens are the expensive side of LLM pricing, so in compact mode the
+model answers with short keys and positional line-item arrays instead of the
+verbose `PayslipData` layout. `expand_payslip` rebuilds the full model
+deterministically and `compact_payslip` is its inverse (used for
+measurements and tests).
+
+Line items are encoded as:
+    devengo/deduccion:  [concepto_raw, concepto_standardized, importe, tipo, flags]
+    aportacion empresa: [concepto_raw, concepto_standardized, base, tipo, importe]
+
+`flags` is a string holding one letter per `ItemType` indicator that is true
+(see ITEM_FLAG_LETTERS), or null when the indicators are unknown.
+"""
+
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from core.vision_model.payslips.payslip_models import (
+    AportacionEmpresaItem,
+    DeduccionItem,
+    DevengoItem,
+    Empresa,
+    ItemType,
+    PayslipData,
+    Periodo,
+    Totales,
+    Trabajador,
+)
+
+
+# One letter per ItemType indicator; a letter present in `flags` means True
+ITEM_FLAG_LETTERS = {
+    "E": "ind_is_especie",
+    "I": "ind_is_IT_IL",
+    "A": "ind_is_anticipo",
+    "M": "ind_is_embargo",
+    "T": "ind_tributa_IRPF",
+    "S": "ind_cotiza_ss",
+    "F": "ind_settlement_item",
+}
+
+CompactValue = Union[str, float, None]
+
+
+class CompactEmpresa(BaseModel):
+    n: Optional[str] = Field(None, description="razon_social")
+    c: Optional[str] = Field(None, description="cif")
+
+
+class CompactTrabajador(BaseModel):
+    n: Optional[str] = Field(None, description="nombre")
+    d: Optional[str] = Field(None, description="dni")
+    ss: Optional[str] = Field(None, description="ss_number")
+
+
+class CompactPeriodo(BaseModel):
+    d: Optional[str] = Field(None, description="desde")
+    h: Optional[str] = Field(None, description="hasta")
+    n: int = Field(0, description="dias")
+
+
+class CompactTotales(BaseModel):
+    dv: Optional[float] = Field(None, description="devengo_total")
+    dd: Optional[float] = Field(None, description="deduccion_total")
+    lq: Optional[float] = Field(None, description="liquido_a_percibir")
+    ap: Optional[float] = Field(None, description="aportacion_empresa_total")
+    pp: Optional[float] = Field(None, description="prorrata_pagas_extra_total")
+    bcc: Optional[float] = Field(None, description="base_contingencias_comunes_total")
+    bat: Optional[float] = Field(None, description="base_accidente_de_trabajo_y_desempleo_total")
+    bir: Optional[float] = Field(None, description="base_retencion_irpf_total")
+    pir: Optional[float] = Field(None, description="porcentaje_retencion_irpf")
+    fin: Optional[bool] = Field(None, description="contains_settlement")
+
+
+class CompactPayslipData(BaseModel):
+    """Short-key equivalent of PayslipData."""
+
+    e: CompactEmpresa = Field(..., description="empresa")
+    w: CompactTrabajador = Field(..., description="trabajador")
+    p: CompactPeriodo = Field(..., description="periodo")
+    dv: List[List[CompactValue]] = Field(
+        default_factory=list,
+        description="devengo_items as [concepto_raw, concepto_standardized, importe, tipo, flags]",
+    )
+    dd: List[List[CompactValue]] = Field(
+        default_factory=list,
+        description="deduccion_items as [concepto_raw, concepto_standardized, importe, tipo, flags]",
+    )
+    ap: List[List[CompactValue]] = Field(
+        default_factory=list,
+        description="aportacion_empresa_items as [concepto_raw, concepto_standardized, base, tipo, importe]",
+    )
+    t: CompactTotales = Field(..., description="totales")
+    fd: Optional[str] = Field(None, description="fecha_documento")
+    wr: List[str] = Field(default_factory=list, description="warnings")
+
+
+COMPACT_OUTPUT_INSTRUCTIONS = """
+
+### **COMPACT OUTPUT FORMAT (OVERRIDES THE JSON LAYOUT ABOVE)**
+
+Apply every extraction rule above, but write the JSON with these short keys:
+- `e` = empresa {`n` razon_social, `c` cif}
+- `w` = trabajador {`n` nombre, `d` dni, `ss` ss_number}
+- `p` = periodo {`d` desde, `h` hasta, `n` dias}
+- `dv` = devengo_items, `dd` = deduccion_items: each item is an ARRAY
+  `[concepto_raw, concepto_standardized, importe, tipo, flags]`
+- `ap` = aportacion_empresa_items: each item is an ARRAY
+  `[concepto_raw, concepto_standardized, base, tipo, importe]`
+- `t` = totales {`dv` devengo_total, `dd` deduccion_total, `lq` liquido_a_percibir,
+  `ap` aportacion_empresa_total, `pp` prorrata_pagas_extra_total,
+  `bcc` base_contingencias_comunes_total, `bat` base_accidente_de_trabajo_y_desempleo_total,
+  `bir` base_retencion_irpf_total, `pir` porcentaje_retencion_irpf, `fin` contains_settlement}
+- `fd` = fecha_documento, `wr` = warnings
+
+`flags` replaces item_type: a string with one letter for each indicator that is TRUE
+(E=ind_is_especie, I=ind_is_IT_IL, A=ind_is_anticipo, M=ind_is_embargo,
+T=ind_tributa_IRPF, S=ind_cotiza_ss, F=ind_settlement_item), e.g. "TS" for a normal
+salary item, "" when all are false, null when unknown.
+"""
+
+
+def _at(values: List[CompactValue], idx: int) -> CompactValue:
+    return values[idx] if idx < len(values) else None
+
+
+def expand_flags(flags: Optional[str]) -> Optional[ItemType]:
+    if flags is None:
+        return None
+    letters = str(flags).upper()
+    return ItemType(**{field: letter in letters for letter, field in ITEM_FLAG_LETTERS.items()})
+
+
+def compact_flags(item_type: Optional[ItemType]) -> Optional[str]:
+    if item_type is None:
+        return None
+    return "".join(
+        letter for letter, field in ITEM_FLAG_LETTERS.items() if getattr(item_type, field)
+    )
+
+
+def _expand_line(values: List[CompactValue], model):
+    return model(
+        concepto_raw=_at(values, 0) or "",
+        concepto_standardized=_at(values, 1) or "",
+        importe=_at(values, 2),
+        tipo=_at(values, 3),
+        item_type=expand_flags(_at(values, 4)),
+    )
+
+
+def expand_devengo(values: List[CompactValue]) -> DevengoItem:
+    return _expand_line(values, DevengoItem)
+
+
+def expand_deduccion(values: List[CompactValue]) -> DeduccionItem:
+    return _expand_line(values, DeduccionItem)
+
+
+def expand_aportacion(values: List[CompactValue]) -> AportacionEmpresaItem:
+    return AportacionEmpresaItem(
+        concepto_raw=_at(values, 0) or "",
+        concepto_standardized=_at(values, 1) or "",
+        base=_at(values, 2),
+        tipo=_at(values, 3),
+        importe=_at(values, 4),
+    )
+
+
+def expand_totales(t: CompactTotales) -> Totales:
+    return Totales(
+        devengo_total=t.dv,
+        deduccion_total=t.dd,
+        liquido_a_percibir=t.lq,
+        aportacion_empresa_total=t.ap,
+        prorrata_pagas_extra_total=t.pp,
+        base_contingencias_comunes_total=t.bcc,
+        base_accidente_de_trabajo_y_desempleo_total=t.bat,
+        base_retencion_irpf_total=t.bir,
+        porcentaje_retencion_irpf=t.pir,
+        contains_settlement=t.fin,
+    )
+
+
+def expand_payslip(compact: CompactPayslipData) -> PayslipData:
+    """Rebuild the full PayslipData from its compact form."""
+    return PayslipData(
+        empresa=Empresa(razon_social=compact.e.n, cif=compact.e.c),
+        trabajador=Trabajador(nombre=compact.w.n, dni=compact.w.d, ss_number=compact.w.ss),
+        periodo=Periodo(desde=compact.p.d, hasta=compact.p.h, dias=compact.p.n),
+        devengo_items=[expand_devengo(v) for v in compact.dv],
+        deduccion_items=[expand_deduccion(v) for v in compact.dd],
+        aportacion_empresa_items=[expand_aportacion(v) for v in compact.ap],
+        totales=expand_totales(compact.t),
+        fecha_documento=compact.fd,
+        warnings=list(compact.wr),
+    )
+
+
+def compact_line(item: Union[DevengoItem, DeduccionItem]) -> List[CompactValue]:
+    return [
+        item.concepto_raw,
+        item.concepto_standardized,
+        item.importe,
+        item.tipo,
+        compact_flags(item.item_type),
+    ]
+
+
+def compact_totales(t: Totales) -> CompactTotales:
+    return CompactTotales(
+        dv=t.devengo_total,
+        dd=t.deduccion_total,
+        lq=t.liquido_a_percibir,
+        ap=t.aportacion_empresa_total,
+        pp=t.prorrata_pagas_extra_total,
+        bcc=t.base_contingencias_comunes_total,
+        bat=t.base_accidente_de_trabajo_y_desempleo_total,
+        bir=t.base_retencion_irpf_total,
+        pir=t.porcentaje_retencion_irpf,
+        fin=t.contains_settlement,
+    )
+
+
+def compact_payslip(payslip: PayslipData) -> CompactPayslipData:
+    """Encode a PayslipData in the compact layout (inverse of expand_payslip)."""
+    return CompactPayslipData(
+        e=CompactEmpresa(n=payslip.empresa.razon_social, c=payslip.empresa.cif),
+        w=CompactTrabajador(
+            n=payslip.trabajador.nombre, d=payslip.trabajador.dni, ss=payslip.trabajador.ss_number
+        ),
+        p=CompactPeriodo(d=payslip.periodo.desde, h=payslip.periodo.hasta, n=payslip.periodo.dias),
+        dv=[compact_line(i) for i in payslip.devengo_items],
+        dd=[compact_line(i) for i in payslip.deduccion_items],
+        ap=[
+            [i.concepto_raw, i.concepto_standardized, i.base, i.tipo, i.importe]
+            for i in payslip.aportacion_empresa_items
+        ],
+        t=compact_totales(payslip.totales),
+        fd=payslip.fecha_documento,
+        wr=list(payslip.warnings),
+    )
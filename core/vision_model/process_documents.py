@@ -10,11 +10,13 @@ from core.vision_model.payslips.payslip_models import PayslipData
 from core.vision_model.common import (
     get_openai_pricing,
     get_gemini_pricing,
-    calculate_cost,
+    calculate_usage_cost,
     find_pdf_files,
     get_page_as_pdf,
     get_pdf_bytes_and_text,
     generate_output_filename,
+    get_json_parse_stats,
+    summarize_cache_usage,
 )
 
 
@@ -91,7 +93,7 @@ def process_document(
                         pricing = get_openai_pricing(parser.parsing_model)
                     else:
                         pricing = get_gemini_pricing(parser.parsing_model)
-                    cost = calculate_cost(usage_info.get('input_tokens', 0), usage_info.get('output_tokens', 0), pricing.get("input", 0.0), pricing.get("output", 0.0))
+                    cost = calculate_usage_cost(usage_info, pricing)
                 else:
                     cost = 0.0
                 
@@ -204,9 +206,10 @@ def process_document(
                 input_tokens = usage_info.get('input_tokens', 0)
                 output_tokens = usage_info.get('output_tokens', 0)
                 total_tokens = usage_info.get('total_tokens', 0)
+                cached_input_tokens = usage_info.get('cached_input_tokens', 0)
                 
                 if total_tokens > 0:
-                    print(f"     🔢 Tokens: Input: {input_tokens:,} | Output: {output_tokens:,} | Total: {total_tokens:,}")
+                    print(f"     🔢 Tokens: Input: {input_tokens:,} (cached: {cached_input_tokens:,}) | Output: {output_tokens:,} | Total: {total_tokens:,}")
                     
                     # Calculate and display cost
                     if parser.parsing_provider == "openai":
@@ -216,7 +219,7 @@ def process_document(
                     
                     input_price_per_1k = pricing.get("input", 0.0)
                     output_price_per_1k = pricing.get("output", 0.0)
-                    cost = calculate_cost(input_tokens, output_tokens, input_price_per_1k, output_price_per_1k)
+                    cost = calculate_usage_cost(usage_info, pricing)
                     
                     # Show per-1M-token prices in formula (convert from per-1K)
                     input_price_per_1m = input_price_per_1k * 1000
@@ -525,7 +528,12 @@ def main(config: Optional[Dict[str, Any]] = None):
         sum(p.get("parsing_usage", {}).get("output_tokens", 0) for p in r.get("pages", []))
         for r in all_results
     )
+    total_cached_input_tokens = sum(
+        sum(p.get("parsing_usage", {}).get("cached_input_tokens", 0) for p in r.get("pages", []))
+        for r in all_results
+    )
     total_tokens = total_input_tokens + total_output_tokens
+    cache_usage = summarize_cache_usage(total_input_tokens, total_cached_input_tokens)
     
     print(f"📊 Total PDFs processed: {total_pdfs}")
     print(f"📄 Total pages processed: {total_pages}")
@@ -541,7 +549,10 @@ def main(config: Optional[Dict[str, Any]] = None):
     print(f"   - Classification: {total_classification_time:.2f}s ({total_classification_time/60:.2f} min)")
     print(f"   - Parsing: {total_parsing_time:.2f}s ({total_parsing_time/60:.2f} min)")
     print(f"🔢 Total parsing tokens: {total_tokens:,} (Input: {total_input_tokens:,}, Output: {total_output_tokens:,})")
+    print(f"🗄️  Cached input tokens: {total_cached_input_tokens:,} (cache hit ratio: {cache_usage['cache_hit_ratio']:.1%})")
     print(f"💰 Total parsing cost: ${total_cost:.4f}")
+    json_stats = get_json_parse_stats()
+    print(f"🧩 JSON decodes: {json_stats['total']} (fast: {json_stats['fast']}, repaired: {json_stats['repaired']}, failed: {json_stats['failed']}, repair rate: {json_stats['repair_rate']:.1%})")
     print(f"\n📁 Results saved to: {output_dir}")
     
     # Save processing summary
@@ -573,7 +584,10 @@ def main(config: Optional[Dict[str, Any]] = None):
             "total_parsing_tokens": total_tokens,
             "total_parsing_input_tokens": total_input_tokens,
             "total_parsing_output_tokens": total_output_tokens,
+            "total_parsing_cached_input_tokens": total_cached_input_tokens,
+            "cache_hit_ratio": cache_usage["cache_hit_ratio"],
             "total_parsing_cost_usd": total_cost,
+            "json_parse_stats": json_stats,
         },
         "results": all_results
     }
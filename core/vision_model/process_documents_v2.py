@@ -2,19 +2,79 @@ import json
 import time
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from time import sleep
 
 from core.vision_model.document_parser.unified_parser import create_unified_parser
 from core.vision_model.common import (
     get_gemini_pricing,
-    calculate_cost,
+    calculate_usage_cost,
     find_pdf_files,
     generate_output_filename,
+    get_json_parse_stats,
+    summarize_cache_usage,
 )
 # Ensure we import get_pdf_bytes_and_text safely
 from core.vision_model.common.utils import get_pdf_bytes_and_text
 
+# Request packing: long PDFs are sent K consecutive pages at a time instead of
+# page by page, so the system prompt is paid once per K pages. The token bound
+# is a rough input estimate: Gemini bills each PDF page as a fixed number of
+# image tokens, plus the raw text sent alongside it.
+PDF_PAGE_IMAGE_TOKENS = 258
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_PACK_TOKENS = 20000
+
+
+def estimate_page_tokens(page_text: str) -> int:
+    """Estimated input tokens for one PDF page (image + raw text)."""
+    return PDF_PAGE_IMAGE_TOKENS + len(page_text) // CHARS_PER_TOKEN
+
+
+def plan_page_batches(
+    page_tokens: List[int], max_pages: int, max_tokens: int = DEFAULT_MAX_PACK_TOKENS
+) -> List[Tuple[int, int]]:
+    """
+    Group consecutive pages into (start_page, end_page) batches (0-indexed, inclusive).
+
+    A batch holds at most `max_pages` pages and at most `max_tokens` estimated
+    tokens; a single page above the token bound still gets its own batch.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for page_num, tokens in enumerate(page_tokens):
+        batch_len = page_num - start
+        if batch_len and (batch_len >= max_pages or batch_tokens + tokens > max_tokens):
+            batches.append((start, page_num - 1))
+            start = page_num
+            batch_tokens = 0
+        batch_tokens += tokens
+    if page_tokens:
+        batches.append((start, len(page_tokens) - 1))
+    return batches
+
+
+def map_documents_to_pages(logical_documents: List[Any], start_page: int, end_page: int) -> List[List[int]]:
+    """
+    Map each logical document of a request back to absolute page indices (0-indexed).
+
+    Uses the 1-based `pages` reported by the model when they fall inside the
+    request. Otherwise, if there is one document per page they are assigned in
+    order, and as a last resort the document is attributed to the whole range.
+    """
+    page_count = end_page - start_page + 1
+    mapping = []
+    for i, doc in enumerate(logical_documents):
+        reported = [p for p in (getattr(doc, "pages", None) or []) if 1 <= p <= page_count]
+        if reported:
+            mapping.append([start_page + p - 1 for p in sorted(set(reported))])
+        elif len(logical_documents) == page_count:
+            mapping.append([start_page + i])
+        else:
+            mapping.append(list(range(start_page, end_page + 1)))
+    return mapping
+
 def _process_and_save_chunk(
     pdf_path: Path,
     parser: Any,
@@ -35,7 +95,7 @@ def _process_and_save_chunk(
         
     print(f"📄 Processing pages {page_range_str} as a unified set...")
     
-    result = {"page_range": page_range_str}
+    result = {"page_range": page_range_str, "pages_in_request": end_page - start_page + 1}
     
     try:
         # Get PDF content
@@ -47,6 +107,7 @@ def _process_and_save_chunk(
         processing_time = time.time() - start_time
         
         doc_count = len(parsed_response.logical_documents)
+        page_map = map_documents_to_pages(parsed_response.logical_documents, start_page, end_page)
         print(f"     ✅ Found {doc_count} logical document(s)")
         
         doc_types_found = set()
@@ -65,16 +126,12 @@ def _process_and_save_chunk(
         input_tokens = usage_info.get('input_tokens', 0)
         output_tokens = usage_info.get('output_tokens', 0)
         total_tokens = usage_info.get('total_tokens', 0)
+        cached_input_tokens = usage_info.get('cached_input_tokens', 0)
         
-        cost = calculate_cost(
-            input_tokens, 
-            output_tokens, 
-            pricing.get("input", 0.0), 
-            pricing.get("output", 0.0)
-        )
+        cost = calculate_usage_cost(usage_info, pricing)
         
         if total_tokens > 0:
-            print(f"     🔢 Tokens: Input: {input_tokens:,} | Output: {output_tokens:,} | Total: {total_tokens:,}")
+            print(f"     🔢 Tokens: Input: {input_tokens:,} (cached: {cached_input_tokens:,}) | Output: {output_tokens:,} | Total: {total_tokens:,}")
             input_price_per_1k = pricing.get("input", 0.0)
             output_price_per_1k = pricing.get("output", 0.0)
             input_price_per_1m = input_price_per_1k * 1000
@@ -163,8 +220,9 @@ def _process_and_save_chunk(
             "logical_documents": [
                 {
                     "type": doc.type,
+                    "pages": [p + 1 for p in pages],
                     "data": doc.data.model_dump()
-                } for doc in parsed_response.logical_documents
+                } for doc, pages in zip(parsed_response.logical_documents, page_map)
             ],
             "global_warnings": parsed_response.warnings
         }
@@ -174,6 +232,8 @@ def _process_and_save_chunk(
             
         print(f"     💾 Saved to: {output_path.name}")
         result["logical_documents"] = output_data["logical_documents"]
+        result["parsing_usage"] = usage_info
+        result["parsing_cost_usd"] = cost
         
     except Exception as e:
         print(f"  ❌ Unified parsing failed: {e}")
@@ -190,9 +250,14 @@ def process_document_v2(
     doc_index: int,
     total_docs: int,
     delay_seconds: float = 1.0,
+    pack_pages: int = 1,
+    max_pack_tokens: int = DEFAULT_MAX_PACK_TOKENS,
 ) -> Dict[str, Any]:
     """
     Process a PDF document using the Unified Parser (V2).
+
+    Long PDFs are processed page by page, or `pack_pages` consecutive pages per
+    request (bounded by `max_pack_tokens`) when packing is enabled.
     """
     print(f"\n{'='*80}")
     print(f"Processing document {doc_index}/{total_docs} (V2): {pdf_path.name}")
@@ -202,6 +267,7 @@ def process_document_v2(
     try:
         doc = pymupdf.open(str(pdf_path))
         total_pages = doc.page_count
+        page_tokens = [estimate_page_tokens(page.get_text("text")) for page in doc] if pack_pages > 1 else []
         doc.close()
     except Exception as e:
         print(f"❌ Error opening PDF: {e}")
@@ -210,6 +276,8 @@ def process_document_v2(
     results = {
         "pdf": pdf_path.name,
         "total_pages": total_pages,
+        # Requests the page-by-page strategy would need, for packing savings
+        "baseline_requests": 1 if total_pages <= 5 else total_pages,
         "chunks": []
     }
 
@@ -226,6 +294,17 @@ def process_document_v2(
         )
         results["chunks"].append(result)
         sleep(delay_seconds)
+    elif pack_pages > 1:
+        batches = plan_page_batches(page_tokens, pack_pages, max_pack_tokens)
+        print(f"📚 Document is long ({total_pages} pages). Packing into {len(batches)} request(s) of up to {pack_pages} pages.")
+        for start_page, end_page in batches:
+            result = _process_and_save_chunk(
+                pdf_path, parser, output_dir,
+                start_page=start_page, end_page=end_page,
+                total_pages=total_pages, is_chunked=True
+            )
+            results["chunks"].append(result)
+            sleep(delay_seconds)
     else:
         print(f"📚 Document is long ({total_pages} pages). Processing page by page.")
         for page_num in range(total_pages):
@@ -246,6 +325,10 @@ def main_v2(config: Optional[Dict[str, Any]] = None):
         "provider": "gemini",
         "model": "gemini-3-flash-preview",
         "delay": 2.0,
+        "context_cache": False,  # Explicit Gemini context cache for the system prompt
+        "compact_output": False,  # Short-key response schema, expanded locally
+        "pack_pages": 1,  # Pages per request for long PDFs (1 = page by page)
+        "max_pack_tokens": DEFAULT_MAX_PACK_TOKENS,  # Estimated input token bound per packed request
     }
     
     if config:
@@ -288,18 +371,51 @@ def main_v2(config: Optional[Dict[str, Any]] = None):
 
     parser = create_unified_parser(
         provider=config["provider"],
-        model=config["model"]
+        model=config["model"],
+        use_context_cache=config["context_cache"],
+        compact_output=config["compact_output"],
     )
 
+    all_results = []
     for i, pdf_path in enumerate(pdf_files_to_process, 1):
-        process_document_v2(
+        result = process_document_v2(
             pdf_path, 
             parser, 
             output_dir, 
             i, 
             len(pdf_files_to_process), 
-            delay_seconds=config["delay"]
+            delay_seconds=config["delay"],
+            pack_pages=config["pack_pages"],
+            max_pack_tokens=config["max_pack_tokens"],
         )
+        all_results.append(result)
+
+    # Explicit cache storage is billed until TTL expiry, so drop it once the run is done
+    if parser.context_cache:
+        parser.context_cache.delete()
+
+    chunks = [c for r in all_results for c in r.get("chunks", [])]
+    total_input_tokens = sum(c.get("parsing_usage", {}).get("input_tokens", 0) for c in chunks)
+    total_cached_input_tokens = sum(c.get("parsing_usage", {}).get("cached_input_tokens", 0) for c in chunks)
+    total_output_tokens = sum(c.get("parsing_usage", {}).get("output_tokens", 0) for c in chunks)
+    total_cost = sum(c.get("parsing_cost_usd", 0.0) for c in chunks)
+    cache_usage = summarize_cache_usage(total_input_tokens, total_cached_input_tokens)
+    print(f"\n🔢 Total tokens: Input: {total_input_tokens:,} (cached: {total_cached_input_tokens:,}) | Output: {total_output_tokens:,}")
+    print(f"🗄️  Cache hit ratio: {cache_usage['cache_hit_ratio']:.1%}")
+    print(f"💰 Total parsing cost: ${total_cost:.4f}")
+
+    total_pages = sum(r.get("total_pages", 0) for r in all_results)
+    total_requests = len(chunks)
+    baseline_requests = sum(r.get("baseline_requests", 0) for r in all_results)
+    if total_pages:
+        print(f"📨 Requests: {total_requests} for {total_pages} pages ({total_requests / total_pages * 1000:.0f} per 1,000 pages; page-by-page: {baseline_requests / total_pages * 1000:.0f})")
+        # Each avoided request saves one copy of the system prompt (uncached input price)
+        prompt_tokens = len(parser.system_prompt) // CHARS_PER_TOKEN
+        saved_tokens = max(baseline_requests - total_requests, 0) * prompt_tokens
+        saved_cost = saved_tokens / 1000.0 * get_gemini_pricing(parser.model).get("input", 0.0)
+        print(f"💸 Estimated packing saving: {saved_tokens:,} prompt tokens (~${saved_cost:.4f})")
+    json_stats = get_json_parse_stats()
+    print(f"\n🧩 JSON decodes: {json_stats['total']} (fast: {json_stats['fast']}, repaired: {json_stats['repaired']}, failed: {json_stats['failed']}, repair rate: {json_stats['repair_rate']:.1%})")
 
 if __name__ == "__main__":
 
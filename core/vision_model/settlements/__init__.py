@@ -16,6 +16,12 @@ from core.vision_model.settlements.settlement_models import (
     Trabajador,
 )
 
+from core.vision_model.settlements.compact_models import (
+    CompactSettlementData,
+    expand_settlement,
+    compact_settlement,
+)
+
 __all__ = [
     # Parsers
     "BaseSettlementParser",
@@ -27,5 +33,8 @@ __all__ = [
     "SettlementData",
     "Empresa",
     "Trabajador",
+    # Compact output schema
+    "CompactSettlementData",
+    "expand_settlement",
+    "compact_settlement",
 ]
-
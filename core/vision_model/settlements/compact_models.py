@@ -0,0 +1,110 @@
+"""
+Compact output schema for settlement (finiquito) extraction.
+
+Same encoding as the payslip compact schema (short keys, positional line
+items, flag letters); see core.vision_model.payslips.compact_models.
+"""
+
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from core.vision_model.payslips.compact_models import (
+    CompactEmpresa,
+    CompactTotales,
+    CompactTrabajador,
+    CompactValue,
+    compact_line,
+    compact_totales,
+    expand_deduccion,
+    expand_devengo,
+    expand_totales,
+)
+from core.vision_model.settlements.settlement_models import (
+    Empresa,
+    SettlementData,
+    Trabajador,
+)
+
+
+class CompactSettlementData(BaseModel):
+    """Short-key equivalent of SettlementData."""
+
+    e: CompactEmpresa = Field(..., description="empresa")
+    w: CompactTrabajador = Field(..., description="trabajador")
+    fc: Optional[str] = Field(None, description="fecha_cese")
+    ca: Optional[str] = Field(None, description="causa")
+    fl: Optional[str] = Field(None, description="fecha_liquidacion")
+    lu: Optional[str] = Field(None, description="lugar")
+    dv: List[List[CompactValue]] = Field(
+        default_factory=list,
+        description="devengo_items as [concepto_raw, concepto_standardized, importe, tipo, flags]",
+    )
+    dd: List[List[CompactValue]] = Field(
+        default_factory=list,
+        description="deduccion_items as [concepto_raw, concepto_standardized, importe, tipo, flags]",
+    )
+    t: CompactTotales = Field(..., description="totales")
+    fd: Optional[str] = Field(None, description="fecha_documento")
+    wr: List[str] = Field(default_factory=list, description="warnings")
+
+
+COMPACT_OUTPUT_INSTRUCTIONS = """
+
+### **COMPACT OUTPUT FORMAT (OVERRIDES THE JSON LAYOUT ABOVE)**
+
+Apply every extraction rule above, but write the JSON with these short keys:
+- `e` = empresa {`n` razon_social, `c` cif}
+- `w` = trabajador {`n` nombre, `d` dni, `ss` ss_number}
+- `fc` = fecha_cese, `ca` = causa, `fl` = fecha_liquidacion, `lu` = lugar
+- `dv` = devengo_items, `dd` = deduccion_items: each item is an ARRAY
+  `[concepto_raw, concepto_standardized, importe, tipo, flags]`
+- `t` = totales {`dv` devengo_total, `dd` deduccion_total, `lq` liquido_a_percibir,
+  `ap` aportacion_empresa_total, `pp` prorrata_pagas_extra_total,
+  `bcc` base_contingencias_comunes_total, `bat` base_accidente_de_trabajo_y_desempleo_total,
+  `bir` base_retencion_irpf_total, `pir` porcentaje_retencion_irpf, `fin` contains_settlement}
+- `fd` = fecha_documento, `wr` = warnings
+
+`flags` replaces item_type: a string with one letter for each indicator that is TRUE
+(E=ind_is_especie, I=ind_is_IT_IL, A=ind_is_anticipo, M=ind_is_embargo,
+T=ind_tributa_IRPF, S=ind_cotiza_ss, F=ind_settlement_item), "" when all are false,
+null when unknown.
+"""
+
+
+def expand_settlement(compact: CompactSettlementData) -> SettlementData:
+    """Rebuild the full SettlementData from its compact form."""
+    return SettlementData(
+        empresa=Empresa(razon_social=compact.e.n, cif=compact.e.c),
+        trabajador=Trabajador(nombre=compact.w.n, dni=compact.w.d, ss_number=compact.w.ss),
+        fecha_cese=compact.fc,
+        causa=compact.ca,
+        fecha_liquidacion=compact.fl,
+        lugar=compact.lu,
+        devengo_items=[expand_devengo(v) for v in compact.dv],
+        deduccion_items=[expand_deduccion(v) for v in compact.dd],
+        totales=expand_totales(compact.t),
+        fecha_documento=compact.fd,
+        warnings=list(compact.wr),
+    )
+
+
+def compact_settlement(settlement: SettlementData) -> CompactSettlementData:
+    """Encode a SettlementData in the compact layout (inverse of expand_settlement)."""
+    return CompactSettlementData(
+        e=CompactEmpresa(n=settlement.empresa.razon_social, c=settlement.empresa.cif),
+        w=CompactTrabajador(
+            n=settlement.trabajador.nombre,
+            d=settlement.trabajador.dni,
+            ss=settlement.trabajador.ss_number,
+        ),
+        fc=settlement.fecha_cese,
+        ca=settlement.causa,
+        fl=settlement.fecha_liquidacion,
+        lu=settlement.lugar,
+        dv=[compact_line(i) for i in settlement.devengo_items],
+        dd=[compact_line(i) for i in settlement.deduccion_items],
+        t=compact_totales(settlement.totales),
+        fd=settlement.fecha_documento,
+        wr=list(settlement.warnings),
+    )
@@ -1,11 +1,21 @@
 from abc import ABC, abstractmethod
 import base64
-import json
 import os
 from typing import Dict, Optional, Tuple
 
-from json_repair import repair_json
-
+from core.vision_model.common.json_parsing import clean_json_string, parse_json_response
+from core.vision_model.common.prompt_cache import (
+    DEFAULT_CACHE_TTL_SECONDS,
+    GeminiContextCache,
+    extract_gemini_cached_tokens,
+    extract_openai_cached_tokens,
+    openai_prompt_cache_key,
+)
+from core.vision_model.settlements.compact_models import (
+    COMPACT_OUTPUT_INSTRUCTIONS,
+    CompactSettlementData,
+    expand_settlement,
+)
 from core.vision_model.settlements.settlement_models import SettlementData
 from core.vision_model.settlements.prompt import system_prompt
 
@@ -35,13 +45,18 @@ class BaseSettlementParser(ABC):
     and optional extracted text, and returns a JSON string.
     """
     
-    def __init__(self, system_prompt: str):
+    def __init__(self, system_prompt: str, compact_output: bool = False):
         """
         Initialize the parser with a system prompt.
         
         Args:
             system_prompt: The system prompt to use for extraction
+            compact_output: Ask the model for the compact short-key schema and
+                expand it locally (fewer output tokens)
         """
+        self.compact_output = compact_output
+        if compact_output:
+            system_prompt = system_prompt + COMPACT_OUTPUT_INSTRUCTIONS
         self.system_prompt = system_prompt
     
     @abstractmethod
@@ -60,18 +75,17 @@ class BaseSettlementParser(ABC):
     
     def _clean_json_string(self, json_str: str) -> str:
         """Clean JSON string by removing markdown code blocks."""
-        return json_str.strip().replace('```json', '').replace('```', '').strip()
+        return clean_json_string(json_str)
     
     def _repair_and_parse_json(self, json_str: str) -> Dict:
         """
-        Repair and parse JSON string, handling errors.
+        Parse JSON string, falling back to json_repair only if strict decoding fails.
         """
-        try:
-            cleaned = self._clean_json_string(json_str)
-            repaired = repair_json(cleaned, skip_json_loads=True, ensure_ascii=False)
-            return json.loads(repaired)
-        except (json.JSONDecodeError, ValueError) as e:
-            raise ValueError(f"Failed to parse JSON response: {e}") from e
+        data = parse_json_response(json_str)
+        if self.compact_output:
+            # Rebuild the full layout so callers never see the compact keys
+            return expand_settlement(CompactSettlementData.model_validate(data)).model_dump()
+        return data
     
     def parse_to_dict(self, pdf_bytes: bytes, text_pdf: str = "") -> Dict:
         """
@@ -153,19 +167,22 @@ class OpenAISettlementParser(BaseSettlementParser):
         self,
         system_prompt: str,
         model: str = "gpt-5.1",
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        compact_output: bool = False,
     ):
 
         if not OPENAI_AVAILABLE:
             raise ImportError("openai package is required for OpenAISettlementParser")
         
-        super().__init__(system_prompt)
+        super().__init__(system_prompt, compact_output=compact_output)
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key must be provided or set in OPENAI_API_KEY env var")
         
         self.model = model
         self.client = openai.OpenAI(api_key=self.api_key)
+        # Same key for every request sharing this system prompt, so they hit the same prefix cache
+        self.prompt_cache_key = openai_prompt_cache_key(self.system_prompt)
     
     def parse(self, pdf_bytes: bytes, text_pdf: str = "") -> str:
         """Parse settlement using OpenAI API."""
@@ -197,6 +214,7 @@ class OpenAISettlementParser(BaseSettlementParser):
             model=self.model,
             text={"format": {"type": "json_object"}},
             input=messages,
+            prompt_cache_key=self.prompt_cache_key,
         )
         
         json_str = response.output[0].content[0].text
@@ -207,6 +225,7 @@ class OpenAISettlementParser(BaseSettlementParser):
             "input_tokens": 0,
             "output_tokens": 0,
             "total_tokens": 0,
+            "cached_input_tokens": 0,
         }
         
         if hasattr(response, "usage") and response.usage is not None:
@@ -216,6 +235,9 @@ class OpenAISettlementParser(BaseSettlementParser):
             if hasattr(usage, "input_tokens"):
                 usage_info["input_tokens"] = usage.input_tokens
             
+            # Extract cached input tokens (part of input_tokens served from the prompt cache)
+            usage_info["cached_input_tokens"] = extract_openai_cached_tokens(usage)
+
             # Extract output_tokens (OpenAI uses output_tokens, not completion_tokens)
             if hasattr(usage, "output_tokens"):
                 usage_info["output_tokens"] = usage.output_tokens
@@ -255,11 +277,14 @@ class GeminiSettlementParser(BaseSettlementParser):
         max_output_tokens: int = 65535,
         thinking_budget: int = 300,
         api_key: Optional[str] = None,
+        use_context_cache: bool = False,
+        compact_output: bool = False,
+        cache_ttl_seconds: int = DEFAULT_CACHE_TTL_SECONDS,
     ):
         if not GEMINI_AVAILABLE:
             raise ImportError("google-genai package is required for GeminiSettlementParser")
         
-        super().__init__(system_prompt)
+        super().__init__(system_prompt, compact_output=compact_output)
         self.project = project
         # Force location to "global" for gemini-3 models
         self.location = "global" if _is_gemini_3_model(model) else location
@@ -280,6 +305,13 @@ class GeminiSettlementParser(BaseSettlementParser):
                 project=project,
                 location=self.location
             )
+
+        # Optional explicit cache for the static system prompt
+        self.context_cache = (
+            GeminiContextCache(self.client, model, self.system_prompt, ttl_seconds=cache_ttl_seconds)
+            if use_context_cache
+            else None
+        )
     
     def _check_gcloud_authentication(self) -> None:
         """
@@ -354,10 +386,22 @@ class GeminiSettlementParser(BaseSettlementParser):
             top_p=self.top_p,
             max_output_tokens=self.max_output_tokens,
             safety_settings=self._get_safety_settings(),
-            system_instruction=[types.Part.from_text(text=self.system_prompt)],
             thinking_config=thinking_config,
         )
-        
+        if self.compact_output:
+            # Enforce the compact layout; the full layout is described by the prompt only
+            generate_content_config.response_mime_type = "application/json"
+            generate_content_config.response_schema = CompactSettlementData.model_json_schema()
+        
+        # Use the cached system prompt when available, otherwise send it inline
+        cached_content = self.context_cache.get_name() if self.context_cache else None
+        if cached_content:
+            generate_content_config.cached_content = cached_content
+        else:
+            generate_content_config.system_instruction = [
+                types.Part.from_text(text=self.system_prompt)
+            ]
+
         # Generate content (non-streaming)
         response = self.client.models.generate_content(
             model=self.model,
@@ -374,6 +418,7 @@ class GeminiSettlementParser(BaseSettlementParser):
             "input_tokens": 0,
             "output_tokens": 0,
             "total_tokens": 0,
+            "cached_input_tokens": 0,
         }
         
         if usage_metadata:
@@ -381,6 +426,9 @@ class GeminiSettlementParser(BaseSettlementParser):
             if hasattr(usage_metadata, "prompt_token_count"):
                 usage_info["input_tokens"] = usage_metadata.prompt_token_count
             
+            # Extract cached_content_token_count (part of prompt tokens served from cache)
+            usage_info["cached_input_tokens"] = extract_gemini_cached_tokens(usage_metadata)
+
             # Extract candidates_token_count (output tokens)
             if hasattr(usage_metadata, "candidates_token_count"):
                 usage_info["output_tokens"] = usage_metadata.candidates_token_count
@@ -402,6 +450,7 @@ class GeminiSettlementParser(BaseSettlementParser):
 def create_openai_settlement_parser(
     api_key: Optional[str] = None,
     model: str = "gpt-5.1",
+    compact_output: bool = False,
 ) -> OpenAISettlementParser:
     """
     Create an OpenAI settlement parser with default prompts.
@@ -409,6 +458,7 @@ def create_openai_settlement_parser(
     Args:
         api_key: OpenAI API key (defaults to OPENAI_API_KEY env var)
         model: Model name to use
+        compact_output: Use the compact short-key output schema
     
     Returns:
         Configured OpenAISettlementParser instance
@@ -416,7 +466,8 @@ def create_openai_settlement_parser(
     return OpenAISettlementParser(
         system_prompt=system_prompt,
         api_key=api_key,
-        model=model
+        model=model,
+        compact_output=compact_output,
     )
 
 
@@ -424,6 +475,8 @@ def create_gemini_settlement_parser(
     project: str="valeria-test-474315",
     location: str = "europe-southwest1",
     model: str = "gemini-2.5-pro",
+    use_context_cache: bool = False,
+    compact_output: bool = False,
 ) -> GeminiSettlementParser:
     """
     Create a Gemini settlement parser with default prompts.
@@ -433,6 +486,8 @@ def create_gemini_settlement_parser(
         location: Google Cloud location
         api_key: Optional API key (uses vertexai=True if not provided)
         model: Model name to use
+        use_context_cache: Hold the system prompt in an explicit Gemini context cache
+        compact_output: Use the compact short-key output schema
             
     Returns:
         Configured GeminiSettlementParser instance
@@ -441,6 +496,8 @@ def create_gemini_settlement_parser(
         system_prompt=system_prompt,
         project=project,
         location=location,
-        model=model
+        model=model,
+        use_context_cache=use_context_cache,
+        compact_output=compact_output,
     )
 
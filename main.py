@@ -1,15 +1,14 @@
 from requests import session
 import argparse
 import json
-import tempfile
 from pathlib import Path
 
 import core.a3.tools as a3_tools
-from core.models import get_id_by_CIF
+from core.models import ProdSyncState, VidaLaboralMovement, get_id_by_CIF
 import core.production_models as prod_models
 import core.database as database
-from scripts.extract_vida_ccc import import_vida_laboral
-from scripts.reprocess_vida_laboral import process_vida_laboral_csv
+from core.employee_coverage import ensure_employee_coverage
+from scripts.extract_vida_ccc import import_vida_laboral_to_db
 from scripts.reprocess_prod_query import process_prod_query
 from scripts.generate_missing_payslips_report import generate_missing_payslips_report_programmatically
 from scripts.ingest_payrolls_mapped import ingest_payrolls_mapped_from_file
@@ -71,6 +70,9 @@ def _resolve_mapping_files(mappings_dir: Path | None) -> list[Path]:
 
 parser = argparse.ArgumentParser(description="Process MSJ files for a parsing folder.")
 parser.add_argument("folder", help="Folder name under parsing/ (e.g. danik)")
+parser.add_argument("--full-vida-laboral", action="store_true", help="Re-process every MSJ movement, not only new ones")
+parser.add_argument("--full-sync", action="store_true", help="Reconcile every production row, not only rows changed since the last sync")
+parser.add_argument("--debug-csv-dir", default=None, help="Also write each parsed .msj as CSV into this directory")
 args = parser.parse_args()
 
 CIF, START_MONTH, END_MONTH, msj_dir, mappings_dir = _load_config(args.folder)
@@ -84,45 +86,47 @@ print("Connected.")
 # CONNECTING TO Local DATABASE
 print("Connecting to local database...")
 local_session = database.get_session(echo=False)
+ProdSyncState.__table__.create(local_session.get_bind(), checkfirst=True)
+# CREATE employee_month_coverage ON DATABASES THAT PREDATE IT AND FILL EMPLOYEES WITHOUT ROWS
+covered = ensure_employee_coverage(local_session.get_bind())
+if covered:
+    print(f"Built payroll coverage for {covered} employees.")
 print("Connected.")
 
 # INSERTING COMPANY LOCATIONS INTO LOCAL DATABASE CLIENTS TABLE
 print(f"Inserting company locations for CIF {CIF} into local clients...")
-prod_models.insert_company_locations_into_local_clients(prod_session, CIF)
-print("Done.")
+# ONLY ROWS CHANGED SINCE THE LAST SYNC, WITH A PERIODIC FULL RECONCILIATION
+locations_sync = prod_models.insert_company_locations_into_local_clients(
+    prod_session, CIF, incremental=True, full_reconcile=args.full_sync
+)
+print(f"Done ({'full' if locations_sync['full_sync'] else 'incremental'}: {locations_sync['locations_synced']} locations fetched).")
 
 if MSJ_PATHS:
-    # CREATE A TEMPORARY DIRECTORY FOR PROCESSING FILES
-    with tempfile.TemporaryDirectory() as temp_dir:
-        print(f"Using temporary directory: {temp_dir}")
-        temp_dir_path = str(Path(temp_dir).resolve())
-
-        # PARSE MSJ FILE
-        for msj_file in MSJ_PATHS:
-            import_vida_laboral(msj_file, temp_dir_path)
-
-        # NOW GET THE LIST OF ALL THE CSV FILES GENERATED
-        csv_files = list(Path(temp_dir_path).glob("*.csv"))
-
-        # PROCESS EACH CSV FILE
-        for csv_file in csv_files:
-            result = process_vida_laboral_csv(
-                csv_path=str(csv_file),
-                client_identifier=CIF,
-                create_employees=True
-            )
-
-            if result["success"]:
-                print(f"Successfully processed {csv_file}")
-            else:
-                print(f"Failed to process {csv_file}: {result.get('error', 'Unknown error')}")
+    # STREAM EACH MSJ FILE STRAIGHT INTO THE LOCAL DATABASE (ONE TRANSACTION PER FILE)
+    # ONLY MOVEMENTS NOT SEEN IN A PREVIOUS IMPORT ARE PROCESSED
+    VidaLaboralMovement.__table__.create(local_session.get_bind(), checkfirst=True)
+    local_client = get_id_by_CIF(CIF, local_session)
+    for msj_file in MSJ_PATHS:
+        result = import_vida_laboral_to_db(
+            local_session,
+            msj_file,
+            local_client.id,
+            create_employees=True,
+            debug_csv=str(Path(args.debug_csv_dir) / f"{Path(msj_file).stem}.csv") if args.debug_csv_dir else None,
+            delta=not args.full_vida_laboral,
+        )
+
+        if result["success"]:
+            print(f"Successfully processed {msj_file} ({result['rows_processed']} movements)")
+        else:
+            print(f"Failed to process {msj_file}: {result.get('error', 'Unknown error')}")
 else:
     print(f"No .msj files found in: {msj_dir}. Skipping MSJ processing.")
     
 
 # IMPORT EMPLOYEES AND EMPLOYEE PERIODS FROM PRODUCTION DATABASE
 
-prod_logs = process_prod_query(client_identifier=CIF)
+prod_logs = process_prod_query(client_identifier=CIF, incremental=True, full_reconcile=args.full_sync)
 print(f"Production data import result: {prod_logs}")
 
 uuid_client = str(get_id_by_CIF(CIF, local_session).id)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Measure output-token savings and accuracy parity of the compact output schema.
+
+Two modes:
+- Offline (default): re-encode already processed V1/V2 JSON outputs in the
+  compact layout, estimate output tokens for both layouts and check that
+  expanding the compact form gives back the same data.
+- Live (--live): parse each PDF of a directory with the unified parser in
+  full and compact mode, and compare the reported output tokens and the
+  extracted data (compact expanded locally).
+
+Usage:
+    python scripts/benchmark_compact_schema.py processed_documents_v2/
+    python scripts/benchmark_compact_schema.py core/vision_model/tests/sample_docs --live
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Allow running as a script from repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.vision_model.common.compare_json import compare_json
+from core.vision_model.document_parser.compact_models import compact_unified, expand_unified
+from core.vision_model.document_parser.models import UnifiedExtractionResponse
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else the usual ~4 chars/token estimate."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _normalize_flags(data):
+    """Unknown (None) item_type flags expand to False in compact mode; compare them as equal."""
+    if isinstance(data, dict):
+        return {
+            k: (False if k.startswith("ind_") and v is None else _normalize_flags(v))
+            for k, v in data.items()
+        }
+    if isinstance(data, list):
+        return [_normalize_flags(v) for v in data]
+    return data
+
+
+def _load_response(path: Path) -> UnifiedExtractionResponse | None:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "logical_documents" in data:
+        return UnifiedExtractionResponse.model_validate(
+            {"logical_documents": data["logical_documents"], "warnings": data.get("global_warnings", [])}
+        )
+    if "data" in data and "document_type" in data:
+        doc_type = "settlement" if data["document_type"] == "settlement" else "payslip"
+        return UnifiedExtractionResponse.model_validate(
+            {"logical_documents": [{"type": doc_type, "data": data["data"]}]}
+        )
+    return None
+
+
+def run_offline(directory: Path) -> None:
+    full_total = compact_total = files = mismatches = 0
+    for path in sorted(directory.rglob("*.json")):
+        if path.name.startswith("processing_summary_"):
+            continue
+        try:
+            response = _load_response(path)
+        except Exception as e:
+            print(f"⚠️  Skipping {path.name}: {e}")
+            continue
+        if response is None:
+            continue
+
+        full_json = response.model_dump_json()
+        compact_json = compact_unified(response).model_dump_json()
+        roundtrip = expand_unified(compact_unified(response))
+        diffs = compare_json(
+            _normalize_flags(response.model_dump()), _normalize_flags(roundtrip.model_dump())
+        )
+
+        full_tokens = estimate_tokens(full_json)
+        compact_tokens = estimate_tokens(compact_json)
+        full_total += full_tokens
+        compact_total += compact_tokens
+        files += 1
+        mismatches += bool(diffs)
+        status = "✅" if not diffs else f"❌ {len(diffs)} diffs"
+        print(f"{path.name[:60]:<60} {full_tokens:>7,} → {compact_tokens:>7,}  {status}")
+
+    if not files:
+        print("❌ No processed JSON files found")
+        return
+    saving = 1 - compact_total / full_total if full_total else 0.0
+    print(f"\n📊 Files: {files} | Output tokens: {full_total:,} → {compact_total:,} ({saving:.1%} saved)")
+    print(f"🎯 Round-trip parity: {files - mismatches}/{files}")
+
+
+def run_live(directory: Path, model: str) -> None:
+    from core.vision_model.common.utils import find_pdf_files, get_pdf_bytes_and_text
+    from core.vision_model.document_parser.unified_parser import create_unified_parser
+
+    full_parser = create_unified_parser(model=model)
+    compact_parser = create_unified_parser(model=model, compact_output=True)
+
+    full_total = compact_total = docs = exact = 0
+    for pdf_path in find_pdf_files(directory):
+        pdf_bytes, text_pdf = get_pdf_bytes_and_text(str(pdf_path))
+        try:
+            full, full_usage = full_parser.parse_with_usage(pdf_bytes, text_pdf)
+            compact, compact_usage = compact_parser.parse_with_usage(pdf_bytes, text_pdf)
+        except Exception as e:
+            print(f"❌ {pdf_path.name}: {e}")
+            continue
+        diffs = compare_json(
+            _normalize_flags(full.model_dump()),
+            _normalize_flags(compact.model_dump()),
+            ignore_array_order=True,
+            object_list_key="concepto_raw",
+        )
+        full_total += full_usage.get("output_tokens", 0)
+        compact_total += compact_usage.get("output_tokens", 0)
+        docs += 1
+        exact += not diffs
+        print(
+            f"{pdf_path.name[:50]:<50} output tokens {full_usage.get('output_tokens', 0):>7,} → "
+            f"{compact_usage.get('output_tokens', 0):>7,}  diffs: {len(diffs)}"
+        )
+        for diff in diffs[:5]:
+            print(f"    {diff}")
+
+    if not docs:
+        print("❌ No PDFs parsed")
+        return
+    saving = 1 - compact_total / full_total if full_total else 0.0
+    print(f"\n📊 PDFs: {docs} | Output tokens: {full_total:,} → {compact_total:,} ({saving:.1%} saved)")
+    print(f"🎯 Identical extractions: {exact}/{docs} (LLM runs are not deterministic; review diffs)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact output schema savings and parity")
+    parser.add_argument("path", help="Directory of processed JSON outputs (or PDFs with --live)")
+    parser.add_argument("--live", action="store_true", help="Parse PDFs with the unified parser in both modes")
+    parser.add_argument("--model", default="gemini-3-flash-preview")
+    args = parser.parse_args()
+
+    directory = Path(args.path)
+    if args.live:
+        run_live(directory, args.model)
+    else:
+        run_offline(directory)
+
+
+if __name__ == "__main__":
+    main()
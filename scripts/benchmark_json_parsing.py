@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for LLM response decoding.
+
+Compares the previous always-repair path (json_repair + json.loads) with the
+strict fast path (orjson/json and pydantic model_validate_json) on synthetic
+payslip and unified responses of typical sizes.
+
+Usage:
+    python scripts/benchmark_json_parsing.py [--iterations 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+# Allow running as a script from repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import repair_json
+
+from core.vision_model.common.json_parsing import (
+    ORJSON_AVAILABLE,
+    parse_json_model,
+    parse_json_response,
+)
+from core.vision_model.document_parser.models import UnifiedExtractionResponse
+from core.vision_model.payslips.payslip_models import PayslipData
+
+
+def _item(idx: int) -> dict:
+    return {
+        "concepto_raw": f"CONCEPTO RETRIBUTIVO {idx}",
+        "concepto_standardized": f"Concepto {idx}",
+        "importe": 100.0 + idx,
+        "tipo": None,
+        "item_type": {
+            "ind_is_especie": False,
+            "ind_is_IT_IL": False,
+            "ind_is_anticipo": False,
+            "ind_is_embargo": False,
+            "ind_tributa_IRPF": True,
+            "ind_cotiza_ss": True,
+            "ind_settlement_item": False,
+        },
+    }
+
+
+def build_payslip(n_items: int) -> dict:
+    return {
+        "empresa": {"razon_social": "EMPRESA DE PRUEBA SL", "cif": "B12345678"},
+        "trabajador": {"nombre": "GARCIA LOPEZ JUAN", "dni": "12345678Z", "ss_number": "281234567890"},
+        "periodo": {"desde": "2025-01-01", "hasta": "2025-01-31", "dias": 30},
+        "devengo_items": [_item(i) for i in range(n_items)],
+        "deduccion_items": [_item(i) for i in range(n_items // 2)],
+        "aportacion_empresa_items": [
+            {
+                "concepto_raw": f"APORTACION {i}",
+                "concepto_standardized": f"Aportacion {i}",
+                "base": 2000.0,
+                "tipo": 23.6,
+                "importe": 472.0,
+            }
+            for i in range(n_items // 2)
+        ],
+        "totales": {
+            "devengo_total": 2500.0,
+            "deduccion_total": 400.0,
+            "liquido_a_percibir": 2100.0,
+            "aportacion_empresa_total": 700.0,
+        },
+        "fecha_documento": "2025-01-31",
+        "warnings": [],
+    }
+
+
+def build_unified(n_docs: int, n_items: int) -> dict:
+    return {
+        "logical_documents": [
+            {"type": "payslip", "data": build_payslip(n_items)} for _ in range(n_docs)
+        ],
+        "warnings": [],
+    }
+
+
+def _legacy_dict(text: str) -> dict:
+    return json.loads(repair_json(text, skip_json_loads=True, ensure_ascii=False))
+
+
+def _legacy_unified(text: str) -> UnifiedExtractionResponse:
+    return UnifiedExtractionResponse(**json.loads(repair_json(text)))
+
+
+def _time(fn, iterations: int) -> float:
+    """Return mean milliseconds per call."""
+    return timeit.timeit(fn, number=iterations) / iterations * 1000
+
+
+def run(iterations: int) -> list[dict]:
+    cases = [
+        ("payslip small (10 items)", build_payslip(10), PayslipData),
+        ("payslip large (60 items)", build_payslip(60), PayslipData),
+        ("unified 5 docs", build_unified(5, 20), UnifiedExtractionResponse),
+        ("unified 25 docs", build_unified(25, 20), UnifiedExtractionResponse),
+    ]
+    rows = []
+    for label, payload, model in cases:
+        text = json.dumps(payload, ensure_ascii=False)
+        if model is UnifiedExtractionResponse:
+            legacy = _time(lambda: _legacy_unified(text), iterations)
+            fast = _time(lambda: parse_json_model(text, model), iterations)
+        else:
+            legacy = _time(lambda: _legacy_dict(text), iterations)
+            fast = _time(lambda: parse_json_response(text), iterations)
+        rows.append({
+            "case": label,
+            "bytes": len(text.encode("utf-8")),
+            "legacy_ms": legacy,
+            "fast_ms": fast,
+            "speedup": legacy / fast if fast else 0.0,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark LLM JSON decoding paths")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"orjson available: {ORJSON_AVAILABLE}")
+    print(f"{'case':<28}{'bytes':>10}{'repair ms':>12}{'fast ms':>10}{'speedup':>10}")
+    for row in run(args.iterations):
+        print(
+            f"{row['case']:<28}{row['bytes']:>10,}{row['legacy_ms']:>12.3f}"
+            f"{row['fast_ms']:>10.3f}{row['speedup']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
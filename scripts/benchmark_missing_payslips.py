@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the set-based missing payslips engine against detect_missing_payslips.
+
+Runs both engines for one or more clients, reports wall-clock time and checks
+that the reports match (employees compared by id, months as sets).
+
+Usage:
+    python scripts/benchmark_missing_payslips.py --client-id UUID [--client-id UUID ...]
+    python scripts/benchmark_missing_payslips.py --all-clients --last-month 12/2025
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import get_session
+from core.missing_payslips import detect_missing_payslips, detect_missing_payslips_set_based
+from core.models import Client
+
+
+def _normalize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Order-insensitive view of a detection result."""
+    if not result.get("success"):
+        return {"success": False, "error": result.get("error")}
+    employees = {}
+    for emp in result["missing_payslips"]:
+        employees[emp["employee_id"]] = {
+            **emp,
+            "missing_months": sorted(emp["missing_months"]),
+            "finiquitos": sorted(emp["finiquitos"], key=lambda f: f["baja_date"]),
+        }
+    return {"success": True, "summary": result["summary"], "employees": employees}
+
+
+def _timed(fn: Callable[..., Dict[str, Any]], **kwargs) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    # The per-employee engine prints a line per employee; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(**kwargs)
+    return result, time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark missing payslips detection engines")
+    parser.add_argument("--client-id", action="append", default=[], help="Client UUID (repeatable)")
+    parser.add_argument("--all-clients", action="store_true", help="Benchmark every active client")
+    parser.add_argument("--last-month", default=None, help="Cutoff month MM/YYYY")
+    args = parser.parse_args()
+
+    session = get_session()
+    try:
+        client_ids: List[str] = list(args.client_id)
+        if args.all_clients:
+            client_ids += [str(c.id) for c in session.query(Client.id).filter(Client.active.is_(True))]
+        if not client_ids:
+            parser.error("pass --client-id or --all-clients")
+
+        total_before = total_after = 0.0
+        mismatches = 0
+        for client_id in client_ids:
+            kwargs = {"session": session, "client_id": client_id, "last_month": args.last_month}
+            before, before_s = _timed(detect_missing_payslips, **kwargs)
+            after, after_s = _timed(detect_missing_payslips_set_based, **kwargs)
+            total_before += before_s
+            total_after += after_s
+
+            same = _normalize(before) == _normalize(after)
+            mismatches += not same
+            employees = before.get("summary", {}).get("total_employees_analyzed", 0)
+            print(
+                f"{client_id}  employees={employees:<6} per-employee={before_s:>8.2f}s  "
+                f"set-based={after_s:>7.2f}s  x{before_s / after_s if after_s else 0:>6.1f}  "
+                f"{'✅ identical' if same else '❌ differs'}"
+            )
+
+        print(
+            f"\n📊 {len(client_ids)} client(s): {total_before:.2f}s → {total_after:.2f}s "
+            f"({total_before / total_after if total_after else 0:.1f}x), parity {len(client_ids) - mismatches}/{len(client_ids)}"
+        )
+        return 1 if mismatches else 0
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
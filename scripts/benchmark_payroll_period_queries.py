@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Benchmark payroll period filters: JSON periodo extraction vs typed period columns.
+
+Seeds a synthetic dataset (default: 5,000 employees x 12 months x 17 lines,
+about 1M payroll lines) into a scratch PostgreSQL database, then times:
+- the Modelo 190 eligible-payroll filter (JSON casts vs period_start/period_end)
+- get_employee_devengo_total / get_payroll_line_aggregates for a sample of
+  employees (Python-side periodo filtering vs SQL filters vs the batch
+  variants answering the whole sample in one statement)
+
+Synthetic rows are tagged with the BENCH prefix and removed afterwards unless
+--keep is passed. Do not point this at a production database.
+
+Usage:
+    python scripts/benchmark_payroll_period_queries.py --db-url postgresql://.../valeria_bench
+    python scripts/benchmark_payroll_period_queries.py --db-url ... --employees 500 --keep
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, text
+
+from core.database import (
+    _parse_date_str,
+    create_database_engine,
+    get_employee_devengo_total,
+    get_employee_devengo_total_batch,
+    get_payroll_line_aggregates,
+    get_payroll_line_aggregates_batch,
+    get_session,
+)
+from core.models import Base, Payroll, PayrollLine
+
+BENCH_CIF = "BENCH-PERIODS"
+BENCH_CCC = "BENCH-PERIODS-CCC"
+BENCH_PREFIX = "BENCH"
+
+def _json_date(key: str) -> str:
+    """periodo->>key as a date, accepting ISO and DD-MM-YYYY like the previous Python parsing."""
+    value = f"(p.periodo->>'{key}')"
+    return (
+        f"to_date({value}, CASE WHEN {value} ~ '^\\d{{2}}-\\d{{2}}-\\d{{4}}$' "
+        f"THEN 'DD-MM-YYYY' ELSE 'YYYY-MM-DD' END)"
+    )
+
+
+_DESDE = _json_date("desde")
+_HASTA = _json_date("hasta")
+
+ELIGIBLE_JSON_SQL = f"""
+    SELECT count(DISTINCT p.id)
+    FROM payrolls p
+    JOIN employee_periods ep ON ep.employee_id = p.employee_id
+    JOIN client_locations cl ON cl.id = ep.location_id
+    JOIN clients c ON c.id = cl.company_id
+    WHERE c.cif = :cif
+      AND {_HASTA} IS NOT NULL
+      AND COALESCE({_DESDE}, {_HASTA}) <= :range_end
+      AND {_HASTA} >= :range_start
+      AND ep.period_begin_date <= {_HASTA}
+      AND (ep.period_end_date IS NULL
+           OR ep.period_end_date >= COALESCE({_DESDE}, {_HASTA}))
+"""
+
+ELIGIBLE_TYPED_SQL = """
+    SELECT count(DISTINCT p.id)
+    FROM payrolls p
+    JOIN employee_periods ep ON ep.employee_id = p.employee_id
+    JOIN client_locations cl ON cl.id = ep.location_id
+    JOIN clients c ON c.id = cl.company_id
+    WHERE c.cif = :cif
+      AND p.period_end IS NOT NULL
+      AND COALESCE(p.period_start, p.period_end) <= :range_end
+      AND p.period_end >= :range_start
+      AND ep.period_begin_date <= p.period_end
+      AND (ep.period_end_date IS NULL OR ep.period_end_date >= COALESCE(p.period_start, p.period_end))
+"""
+
+
+def seed(engine, employees: int, months: int, lines_per_payroll: int) -> None:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_payrolls_employee_period
+            ON payrolls (employee_id, period_start, period_end)
+        """))
+        conn.execute(text("""
+            INSERT INTO clients (id, name, cif, active)
+            VALUES (gen_random_uuid(), 'BENCH PERIODS SL', :cif, true)
+        """), {"cif": BENCH_CIF})
+        conn.execute(text("""
+            INSERT INTO client_locations (company_id, ccc_ss)
+            SELECT id, :ccc FROM clients WHERE cif = :cif
+        """), {"ccc": BENCH_CCC, "cif": BENCH_CIF})
+        conn.execute(text("""
+            INSERT INTO employees (first_name, last_name, identity_card_number, ss_number)
+            SELECT 'BENCH', 'EMPLOYEE', :prefix || g, :prefix || lpad(g::text, 8, '0')
+            FROM generate_series(1, :n) AS g
+        """), {"prefix": BENCH_PREFIX, "n": employees})
+        conn.execute(text("""
+            INSERT INTO employee_periods (employee_id, location_id, period_begin_date, period_type)
+            SELECT e.id, cl.id, DATE '2024-01-01', 'alta'
+            FROM employees e, client_locations cl
+            WHERE e.identity_card_number LIKE :prefix || '%' AND cl.ccc_ss = :ccc
+        """), {"prefix": BENCH_PREFIX, "ccc": BENCH_CCC})
+        # Half of the payrolls use Spanish date formatting, as delivered by some extractors
+        conn.execute(text("""
+            INSERT INTO payrolls (
+                employee_id, type, periodo, period_start, period_end,
+                devengo_total, deduccion_total, aportacion_empresa_total, liquido_a_percibir,
+                prorrata_pagas_extra, base_cc, base_at_ep, base_irpf, tipo_irpf
+            )
+            SELECT
+                e.id, 'payslip',
+                json_build_object(
+                    'desde', to_char(m, CASE WHEN e.id % 2 = 0 THEN 'YYYY-MM-DD' ELSE 'DD-MM-YYYY' END),
+                    'hasta', to_char(m + interval '1 month' - interval '1 day',
+                                     CASE WHEN e.id % 2 = 0 THEN 'YYYY-MM-DD' ELSE 'DD-MM-YYYY' END)
+                ),
+                m::date, (m + interval '1 month' - interval '1 day')::date,
+                2000, 300, 600, 1700, 0, 2000, 2000, 2000, 12
+            FROM employees e,
+                 generate_series(DATE '2025-01-01', DATE '2025-01-01' + (:months - 1) * interval '1 month',
+                                 interval '1 month') AS m
+            WHERE e.identity_card_number LIKE :prefix || '%'
+        """), {"prefix": BENCH_PREFIX, "months": months})
+        conn.execute(text("""
+            INSERT INTO payroll_lines (
+                payroll_id, category, concept, amount, is_taxable_income, is_taxable_ss,
+                is_sickpay, is_in_kind, is_pay_advance, is_seizure
+            )
+            SELECT p.id,
+                   CASE WHEN g % 3 = 0 THEN 'deduccion' ELSE 'devengo' END,
+                   'CONCEPTO ' || g, 100 + g, true, true, false, false, false, false
+            FROM payrolls p
+            JOIN employees e ON e.id = p.employee_id
+            CROSS JOIN generate_series(1, :lines) AS g
+            WHERE e.identity_card_number LIKE :prefix || '%'
+        """), {"prefix": BENCH_PREFIX, "lines": lines_per_payroll})
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+
+
+def cleanup(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM employees WHERE identity_card_number LIKE :prefix || '%'"),
+                     {"prefix": BENCH_PREFIX})
+        conn.execute(text("DELETE FROM clients WHERE cif = :cif"), {"cif": BENCH_CIF})
+
+
+def _legacy_matching_payroll_ids(session, employee_id: int, period_start: date, period_end: date) -> List[int]:
+    """Previous approach: load every payroll of the employee and filter periodo in Python."""
+    matching = []
+    rows = session.query(Payroll.id, Payroll.periodo).filter(Payroll.employee_id == employee_id).all()
+    for payroll_id, periodo in rows:
+        if not isinstance(periodo, dict) or not periodo.get("desde"):
+            continue
+        pay_start = _parse_date_str(str(periodo["desde"]))
+        hasta = periodo.get("hasta")
+        pay_end = _parse_date_str(str(hasta)) if hasta else pay_start
+        if pay_start <= period_end and pay_end >= period_start:
+            matching.append(payroll_id)
+    return matching
+
+
+def _timed(label: str, fn: Callable[[], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<48} {elapsed * 1000:>10.1f} ms")
+    return elapsed
+
+
+def run(engine, sample: int, repeat: int) -> None:
+    session = get_session(engine)
+    try:
+        line_count = session.query(func.count(PayrollLine.id)).scalar()
+        print(f"📊 payroll_lines in database: {line_count:,}")
+        sample_rows = session.execute(text("""
+            SELECT e.id, e.ss_number FROM employees e
+            WHERE e.identity_card_number LIKE :prefix || '%' ORDER BY e.id LIMIT :n
+        """), {"prefix": BENCH_PREFIX, "n": sample}).all()
+
+        params = {"cif": BENCH_CIF, "range_start": date(2025, 1, 1), "range_end": date(2025, 12, 31)}
+        print("\n🧾 Modelo 190 eligible payrolls (one CIF, one year)")
+        before = _timed("JSON periodo casts", lambda: session.execute(text(ELIGIBLE_JSON_SQL), params).scalar(), repeat)
+        after = _timed("typed period columns", lambda: session.execute(text(ELIGIBLE_TYPED_SQL), params).scalar(), repeat)
+        print(f"  speedup: {before / after:.1f}x")
+
+        period_start, period_end = date(2025, 3, 1), date(2025, 3, 31)
+
+        def legacy_devengo():
+            for employee_id, _ssn in sample_rows:
+                ids = _legacy_matching_payroll_ids(session, employee_id, period_start, period_end)
+                if ids:
+                    session.query(func.sum(Payroll.devengo_total)).filter(Payroll.id.in_(ids)).scalar()
+
+        def typed_devengo():
+            for _employee_id, ssn in sample_rows:
+                get_employee_devengo_total(session, ssn, BENCH_CCC, "2025-03")
+
+        def legacy_aggregates():
+            for employee_id, _ssn in sample_rows:
+                ids = _legacy_matching_payroll_ids(session, employee_id, period_start, period_end)
+                if ids:
+                    (
+                        session.query(PayrollLine.category, func.sum(PayrollLine.amount))
+                        .filter(PayrollLine.payroll_id.in_(ids))
+                        .group_by(PayrollLine.category)
+                        .all()
+                    )
+
+        def typed_aggregates():
+            for _employee_id, ssn in sample_rows:
+                get_payroll_line_aggregates(session, ssn, BENCH_CCC, "2025-03")
+
+        batch_requests = [(ssn, BENCH_CCC, "2025-03") for _employee_id, ssn in sample_rows]
+
+        def batch_devengo():
+            get_employee_devengo_total_batch(session, batch_requests)
+
+        def batch_aggregates():
+            get_payroll_line_aggregates_batch(session, batch_requests)
+
+        # Sanity check: both approaches select the same payrolls
+        employee_id, ssn = sample_rows[0]
+        legacy_ids = _legacy_matching_payroll_ids(session, employee_id, period_start, period_end)
+        typed = get_employee_devengo_total(session, ssn, BENCH_CCC, "2025-03")
+        assert typed["payroll_count"] == len(legacy_ids), "period filters disagree"
+        assert typed["devengo_total"] == Decimal("2000.00") * len(legacy_ids)
+        assert get_employee_devengo_total_batch(session, batch_requests[:1])[batch_requests[0]] == typed
+
+        print(f"\n👤 get_employee_devengo_total x {len(sample_rows)} employees")
+        before = _timed("Python periodo filter (previous)", legacy_devengo, repeat)
+        after = _timed("SQL period filter", typed_devengo, repeat)
+        batch = _timed("batch (one VALUES statement)", batch_devengo, repeat)
+        print(f"  speedup: {before / after:.1f}x (per request), {before / batch:.1f}x (batch)")
+
+        print(f"\n📑 get_payroll_line_aggregates x {len(sample_rows)} employees")
+        before = _timed("Python periodo filter (previous)", legacy_aggregates, repeat)
+        after = _timed("SQL period filter", typed_aggregates, repeat)
+        batch = _timed("batch (one VALUES statement)", batch_aggregates, repeat)
+        print(f"  speedup: {before / after:.1f}x (per request), {before / batch:.1f}x (batch)")
+    finally:
+        session.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs typed payroll period filters")
+    parser.add_argument("--db-url", required=True, help="Scratch PostgreSQL database URL")
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--lines-per-payroll", type=int, default=17)
+    parser.add_argument("--sample", type=int, default=200, help="Employees queried per timing run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic rows afterwards")
+    args = parser.parse_args()
+
+    engine = create_database_engine(database_url=args.db_url)
+    print(f"🌱 Seeding {args.employees * args.months * args.lines_per_payroll:,} synthetic payroll lines...")
+    start = time.perf_counter()
+    seed(engine, args.employees, args.months, args.lines_per_payroll)
+    print(f"   done in {time.perf_counter() - start:.1f}s")
+    try:
+        run(engine, args.sample, args.repeat)
+    finally:
+        if not args.keep:
+            cleanup(engine)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vida laboral .msj parser.
+
+Generates a synthetic MSJ file (100k lines by default) and compares the
+previous parser (patterns compiled per call, employee list flattened at the
+end) with the single-pass streaming parser read via buffered text I/O and
+via mmap. Reports lines/sec and peak Python memory (tracemalloc), then
+times parse_vida_laboral_files over several copies of the file with and
+without the process pool.
+
+Usage:
+    python scripts/benchmark_vida_laboral_parser.py [--lines 100000] [--files 8] [--workers 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Allow running as a script from repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.normalization import normalize_ssn
+from scripts.extract_vida_ccc import parse_vida_laboral, parse_vida_laboral_files
+
+
+def write_synthetic_msj(path: str, n_lines: int, seed: int = 1) -> None:
+    """Write an MSJ-like latin-1 file with employee headers, movements and noise lines."""
+    rng = random.Random(seed)
+    lines = ["INFORME DE TRABAJADORES EN ALTA", "Codigo Cuenta Cotizacion  28 111111111", ""]
+    employee = 0
+    while len(lines) < n_lines - 1:
+        employee += 1
+        lines.append(
+            f"   28 {1000000000 + employee:010d} 10 0{10000000 + employee}Z GARCÍA LÓPEZ JUAN{employee}"
+            f"                      100"
+        )
+        for _ in range(rng.randint(1, 6)):
+            day = f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.choice([2023, 2024, 2025])}"
+            kind = rng.random()
+            if kind < 0.4:
+                lines.append(f"      ALTA          {day} {day}                   {rng.choice(['100', '401', '502'])}")
+            elif kind < 0.7:
+                lines.append(f"      BAJA          {day} {day} {day} {day} 100")
+            elif kind < 0.85:
+                lines.append(f"      VAC.RETRIB.NO {day} {day}")
+            else:
+                lines.append(f"      SITUACION ADICIONAL {day} texto libre")
+    lines = lines[:n_lines - 1] + [f"TOTAL TRABAJADORES EN ALTA {employee}"]
+    with open(path, "w", encoding="latin1", newline="\r\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _legacy_parse(filepath):
+    """Previous parser: per-line re calls, employee list flattened at the end."""
+    employees = []
+    current_employee = None
+    total_trabajadores_alta_reportado = None
+    ccc = None  # Codigo Cuenta Cotizacion (company location code)
+
+    with open(filepath, 'r', encoding='latin1') as f:
+        for line in f:
+            line = line.rstrip("\n")
+
+            # Extract CCC from header (format: "Codigo Cuenta Cotizacion  07 132297640")
+            if ccc is None:
+                match_ccc = re.search(r'Codigo Cuenta Cotizacion\s+(\d{2})\s+(\d+)', line)
+                if match_ccc:
+                    # Join province code and CCC number without spaces
+                    ccc = match_ccc.group(1) + match_ccc.group(2)
+
+            # Buscar línea que reporte "TOTAL TRABAJADORES EN ALTA"
+            match_total = re.search(r'TOTAL TRABAJADORES EN ALTA\s+(\d+)', line)
+            if match_total:
+                total_trabajadores_alta_reportado = int(match_total.group(1))
+
+            # Detectar cabecera de empleado:
+            # Se espera que la línea comience (opcionalmente con espacios) con 2 dígitos, un número de 10 dígitos, otro número y más texto.
+            if re.match(r'^\s*\d{2}\s+\d{10}\s+\d+\s+', line):
+                tokens = line.split()
+                if len(tokens) >= 5:
+                    # Extract NAF (Social Security Number): provincia code + NAF number
+                    naf = normalize_ssn(f"{tokens[0]} {tokens[1]}") or ""
+                    doc = tokens[3]
+                    # Si el último token tiene exactamente 3 caracteres, se asume que no forma parte del nombre.
+                    if len(tokens[-1]) == 3:
+                        name_tokens = tokens[4:-1]
+                    else:
+                        name_tokens = tokens[4:]
+                    nombre = " ".join(name_tokens)
+                    current_employee = {'documento': doc, 'nombre': nombre, 'naf': naf, 'movimientos': []}
+                    employees.append(current_employee)
+                # No se procesan logs individuales.
+
+            # Detectar línea de movimiento: aquellas que empiezan (ignorando espacios) con ALTA, BAJA o VAC.RETRIB.NO
+            elif current_employee is not None and re.match(r'^\s*(ALTA|BAJA|VAC\.?RETRIB\.?NO)', line, re.IGNORECASE):
+                movement_type_match = re.match(r'^\s*(\S+)', line)
+                movement_type = movement_type_match.group(1).upper() if movement_type_match else None
+                dates = re.findall(r'\d{2}-\d{2}-\d{4}', line)
+                if len(dates) == 2:
+                    if movement_type == "VAC.RETRIB.NO":
+                        f_real_alta = None
+                        f_efecto_alta = dates[0]
+                        f_real_sit = dates[1]
+                    else:
+                        f_real_alta = dates[0]
+                        f_efecto_alta = dates[1]
+                        f_real_sit = None
+                elif len(dates) >= 4:
+                    f_real_alta = dates[0]
+                    f_efecto_alta = dates[1]
+                    f_real_sit = dates[2]
+                else:
+                    f_real_alta = f_efecto_alta = f_real_sit = None
+
+                # Extraer TC (codigo_contrato) - buscar un número de 3 dígitos después de las fechas
+                codigo_contrato = None
+                tc_match = re.search(r'\b(\d{3})\b', line)
+                if tc_match:
+                    codigo_contrato = tc_match.group(1)
+
+                movement = {
+                    'situacion': movement_type,
+                    'f_real_alta': f_real_alta,
+                    'f_efecto_alta': f_efecto_alta,
+                    'f_real_sit': f_real_sit,
+                    'codigo_contrato': codigo_contrato
+                }
+                current_employee['movimientos'].append(movement)
+            # Las líneas que no coinciden se ignoran.
+
+    # Aplanar la estructura: cada movimiento se asocia a los datos del empleado
+    movimientos = []
+    for emp in employees:
+        for mov in emp['movimientos']:
+            record = {
+                'ccc': ccc,  # Company location CCC (same for all employees in this file)
+                'naf': emp['naf'],
+                'documento': emp['documento'],
+                'nombre': emp['nombre'],
+                'situacion': mov['situacion'],
+                'f_real_alta': mov['f_real_alta'],
+                'f_efecto_alta': mov['f_efecto_alta'],
+                'f_real_sit': mov['f_real_sit'],
+                'codigo_contrato': mov['codigo_contrato']
+            }
+            movimientos.append(record)
+
+    return movimientos, total_trabajadores_alta_reportado, employees
+
+
+def _measure(fn, n_lines: int) -> dict:
+    # Timed without tracing; tracemalloc slows allocation-heavy code several-fold
+    start = time.perf_counter()
+    movements = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "movements": movements,
+        "seconds": elapsed,
+        "lines_per_sec": n_lines / elapsed if elapsed else 0.0,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def run(n_lines: int, n_files: int, workers: int) -> None:
+    tmp_dir = tempfile.mkdtemp(prefix="msj_bench_")
+    try:
+        path = os.path.join(tmp_dir, "vida_0.msj")
+        write_synthetic_msj(path, n_lines)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"Synthetic MSJ: {n_lines:,} lines, {size_mb:.1f} MB")
+
+        cases = [
+            ("legacy (eager lists)", lambda: len(_legacy_parse(path)[0])),
+            ("streaming, text I/O", lambda: sum(1 for _ in parse_vida_laboral(path, use_mmap=False))),
+            ("streaming, mmap", lambda: sum(1 for _ in parse_vida_laboral(path, use_mmap=True))),
+        ]
+        print(f"{'parser':<24}{'movements':>11}{'seconds':>10}{'lines/sec':>13}{'peak MB':>10}")
+        for label, fn in cases:
+            row = _measure(fn, n_lines)
+            print(
+                f"{label:<24}{row['movements']:>11,}{row['seconds']:>10.3f}"
+                f"{row['lines_per_sec']:>13,.0f}{row['peak_mb']:>10.1f}"
+            )
+
+        paths = [path]
+        for idx in range(1, n_files):
+            copy = os.path.join(tmp_dir, f"vida_{idx}.msj")
+            shutil.copyfile(path, copy)
+            paths.append(copy)
+
+        print(f"\n{n_files} files x {n_lines:,} lines")
+        for label, pool_workers in (("sequential", 1), (f"process pool ({workers} workers)", workers)):
+            start = time.perf_counter()
+            movements = sum(len(rows) for _, rows, _ in parse_vida_laboral_files(paths, workers=pool_workers))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label:<32}{movements:>11,} movements {elapsed:>8.3f}s "
+                f"{n_lines * n_files / elapsed:>13,.0f} lines/sec"
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the vida laboral MSJ parser")
+    parser.add_argument("--lines", type=int, default=100_000, help="Lines in the synthetic MSJ file")
+    parser.add_argument("--files", type=int, default=8, help="Files for the process pool comparison")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Process pool size")
+    args = parser.parse_args()
+    run(args.lines, args.files, args.workers)
+
+
+if __name__ == "__main__":
+    main()
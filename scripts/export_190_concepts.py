@@ -4,7 +4,8 @@ Export payroll concepts for Modelo 190 mapping.
 
 Outputs a JSON report grouping by normalized concept to ease mapping.
 Optionally exports a YAML bucket template with all concepts in clave A and
-empty buckets for commonly-used subclaves.
+empty buckets for commonly-used subclaves. --cif/--year restrict both to the
+payrolls of one company and/or year.
 """
 
 from __future__ import annotations
@@ -14,7 +15,7 @@ import json
 import os
 import sys
 from collections import defaultdict
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from decimal import Decimal, InvalidOperation
 from typing import Any, Iterable
 
@@ -23,8 +24,11 @@ REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if REPO_ROOT not in sys.path:
     sys.path.insert(0, REPO_ROOT)
 
+from sqlalchemy import case, distinct, func, select
+
 from core.database import get_session
-from core.models import PayrollLine
+from core.models import Concept, Payroll, PayrollLine
+from core.utils.batching import chunked
 import importlib
 
 _modelo_190 = importlib.import_module("190")
@@ -124,23 +128,71 @@ def _to_decimal(value: Any, field_name: str) -> Decimal:
         raise ValueError(f"Invalid numeric value for '{field_name}': {value!r}") from exc
 
 
-def _collect_concepts() -> tuple[int, list[dict[str, Any]]]:
+def _variants_agg(dialect: str, column):
+    # SQLite has no array_agg; json_group_array returns the same list as JSON text
+    if dialect == "sqlite":
+        return func.json_group_array(distinct(column))
+    return func.array_agg(distinct(column))
+
+
+def _concept_scope_filter(cif: str | None, year: int | None):
+    """Payroll filter for a per-client and/or per-year export; None for the whole table."""
+    range_start = date(year, 1, 1) if year else None
+    range_end = date(year, 12, 31) if year else None
+    if cif:
+        return PayrollLine.payroll_id.in_(_modelo_190.eligible_payroll_ids(cif, range_start, range_end))
+    if year:
+        in_range = select(Payroll.id).where(
+            Payroll.period_end.isnot(None),
+            Payroll.period_end >= range_start,
+            func.coalesce(Payroll.period_start, Payroll.period_end) <= range_end,
+        )
+        return PayrollLine.payroll_id.in_(in_range)
+    return None
+
+
+def _collect_concepts(cif: str | None = None, year: int | None = None) -> tuple[int, list[dict[str, Any]]]:
+    """
+    Aggregate payroll lines per normalized concept with one GROUP BY.
+
+    Lines are grouped by concept_id and category; lines without an interned
+    concept (not backfilled yet) are grouped by their raw text, which is
+    normalized once per distinct value and merged here.
+    """
     session = get_session()
     try:
-        query = session.query(
-            PayrollLine.concept,
-            PayrollLine.category,
-            PayrollLine.is_taxable_income,
-            PayrollLine.is_sickpay,
-            PayrollLine.is_in_kind,
+        dialect = session.get_bind().dialect.name
+        unassigned_text = case((PayrollLine.concept_id.is_(None), PayrollLine.concept))
+        category = func.lower(PayrollLine.category)
+        stmt = (
+            select(
+                PayrollLine.concept_id,
+                unassigned_text,
+                category,
+                func.count(),
+                func.count().filter(PayrollLine.is_taxable_income),
+                func.count().filter(PayrollLine.is_sickpay),
+                func.count().filter(PayrollLine.is_in_kind),
+                _variants_agg(dialect, PayrollLine.concept),
+            )
+            .group_by(PayrollLine.concept_id, unassigned_text, category)
         )
+        scope = _concept_scope_filter(cif, year)
+        if scope is not None:
+            stmt = stmt.where(scope)
+        rows = session.execute(stmt).all()
+
+        concept_ids = sorted({row[0] for row in rows if row[0] is not None})
+        keys: dict[int, str] = {}
+        for chunk in chunked(concept_ids):
+            keys.update(session.execute(select(Concept.id, Concept.key).where(Concept.id.in_(chunk))).all())
 
         aggregates: dict[str, dict[str, Any]] = {}
         total_lines = 0
 
-        for concept, category, is_taxable_income, is_sickpay, is_in_kind in query.yield_per(10000):
-            total_lines += 1
-            normalized = normalize_concept_key(concept)
+        for concept_id, text, category, count, taxable, sickpay, in_kind, variants in rows:
+            total_lines += count
+            normalized = keys[concept_id] if concept_id is not None else normalize_concept_key(text)
             if normalized not in aggregates:
                 aggregates[normalized] = {
                     "normalized": normalized,
@@ -158,15 +210,12 @@ def _collect_concepts() -> tuple[int, list[dict[str, Any]]]:
                 }
 
             entry = aggregates[normalized]
-            entry["count"] += 1
-            entry["raw_variants"].add(concept or "")
-            entry["category_counts"][str(category or "").lower()] += 1
-            if is_taxable_income:
-                entry["taxable_income_count"] += 1
-            if is_sickpay:
-                entry["sickpay_count"] += 1
-            if is_in_kind:
-                entry["in_kind_count"] += 1
+            entry["count"] += count
+            entry["raw_variants"].update(json.loads(variants) if isinstance(variants, str) else variants)
+            entry["category_counts"][category] += count
+            entry["taxable_income_count"] += taxable
+            entry["sickpay_count"] += sickpay
+            entry["in_kind_count"] += in_kind
 
         concepts: list[dict[str, Any]] = []
         for entry in aggregates.values():
@@ -180,11 +229,17 @@ def _collect_concepts() -> tuple[int, list[dict[str, Any]]]:
         session.close()
 
 
-def export_concepts(output_path: str | None) -> None:
-    total_lines, concepts = _collect_concepts()
+def _scope_payload(cif: str | None, year: int | None) -> dict:
+    scope = {key: value for key, value in (("cif", cif), ("year", year)) if value}
+    return {"scope": scope} if scope else {}
+
+
+def export_concepts(output_path: str | None, cif: str | None = None, year: int | None = None) -> None:
+    total_lines, concepts = _collect_concepts(cif, year)
 
     payload = {
         "generated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        **_scope_payload(cif, year),
         "total_lines": total_lines,
         "concepts": concepts,
     }
@@ -197,8 +252,8 @@ def export_concepts(output_path: str | None) -> None:
         print(output)
 
 
-def export_bucket_template(output_path: str | None) -> None:
-    total_lines, concepts = _collect_concepts()
+def export_bucket_template(output_path: str | None, cif: str | None = None, year: int | None = None) -> None:
+    total_lines, concepts = _collect_concepts(cif, year)
     default_devengo: list[str] = []
     default_deduccion: list[str] = []
 
@@ -219,6 +274,7 @@ def export_bucket_template(output_path: str | None) -> None:
 
     payload = {
         "generated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        **_scope_payload(cif, year),
         "total_lines": total_lines,
         "default_provincia": DEFAULT_PROVINCIA,
         "default_clave": "A",
@@ -413,6 +469,8 @@ def main() -> int:
         action="store_true",
         help="Export YAML bucket template with all concepts in clave A.",
     )
+    parser.add_argument("--cif", help="Only concepts of payrolls of this company (CIF).")
+    parser.add_argument("--year", type=int, help="Only concepts of payrolls overlapping this year (YYYY).")
     parser.add_argument("--mapping-from", help="Input mapping file (JSON report or YAML buckets).")
     parser.add_argument("--mapping-out", help="Output mapping JSON path.")
     args = parser.parse_args()
@@ -422,9 +480,9 @@ def main() -> int:
             raise ValueError("--mapping-out is required when using --mapping-from.")
         build_mapping_from_report(args.mapping_from, args.mapping_out)
     elif args.bucket_template:
-        export_bucket_template(args.out)
+        export_bucket_template(args.out, args.cif, args.year)
     else:
-        export_concepts(args.out)
+        export_concepts(args.out, args.cif, args.year)
     return 0
 
 
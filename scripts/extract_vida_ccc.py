@@ -1,126 +1,178 @@
+import os
 import re
 import json
+import mmap
 import sys
 import csv
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.vida_laboral as vida_laboral
+from core.employee_coverage import deferred_coverage_refresh
 from core.normalization import normalize_ssn
+from core.vida_laboral import VidaLaboralContext
+from core.vida_laboral_delta import process_rows_delta
 
 
-def parse_vida_laboral(filepath):
-    employees = []
-    current_employee = None
-    total_trabajadores_alta_reportado = None
-    ccc = None  # Codigo Cuenta Cotizacion (company location code)
+VIDA_LABORAL_FIELDNAMES = ["ccc", "naf", "documento", "nombre", "situacion", "f_real_alta", "f_efecto_alta", "f_real_sit", "codigo_contrato"]
 
-    with open(filepath, 'r', encoding='latin1') as f:
-        for line in f:
-            line = line.rstrip("\n")
+# Files at least this large are read through mmap instead of buffered text I/O
+MMAP_THRESHOLD_BYTES = 64 * 1024 * 1024
 
-            # Extract CCC from header (format: "Codigo Cuenta Cotizacion  07 132297640")
-            if ccc is None:
-                match_ccc = re.search(r'Codigo Cuenta Cotizacion\s+(\d{2})\s+(\d+)', line)
-                if match_ccc:
-                    # Join province code and CCC number without spaces
-                    ccc = match_ccc.group(1) + match_ccc.group(2)
+# Header: "Codigo Cuenta Cotizacion  07 132297640"
+_CCC_RE = re.compile(r'Codigo Cuenta Cotizacion\s+(\d{2})\s+(\d+)')
+_TOTAL_RE = re.compile(r'TOTAL TRABAJADORES EN ALTA\s+(\d+)')
+# Cabecera de empleado: 2 dígitos, un número de 10 dígitos, otro número y más texto
+_EMPLOYEE_RE = re.compile(r'\s*\d{2}\s+\d{10}\s+\d+\s+')
+# Movimiento: ALTA, BAJA o VAC.RETRIB.NO; el grupo captura el primer token completo
+_MOVEMENT_RE = re.compile(r'\s*((?:ALTA|BAJA|VAC\.?RETRIB\.?NO)\S*)', re.IGNORECASE)
+_DATE_RE = re.compile(r'\d{2}-\d{2}-\d{4}')
+# TC (codigo_contrato): primer número de 3 dígitos de la línea
+_TC_RE = re.compile(r'\b(\d{3})\b')
 
-            # Buscar línea que reporte "TOTAL TRABAJADORES EN ALTA"
-            match_total = re.search(r'TOTAL TRABAJADORES EN ALTA\s+(\d+)', line)
-            if match_total:
-                total_trabajadores_alta_reportado = int(match_total.group(1))
-
-            # Detectar cabecera de empleado:
-            # Se espera que la línea comience (opcionalmente con espacios) con 2 dígitos, un número de 10 dígitos, otro número y más texto.
-            if re.match(r'^\s*\d{2}\s+\d{10}\s+\d+\s+', line):
-                tokens = line.split()
-                if len(tokens) >= 5:
-                    # Extract NAF (Social Security Number): provincia code + NAF number
-                    naf = normalize_ssn(f"{tokens[0]} {tokens[1]}") or ""
-                    doc = tokens[3]
-                    # Si el último token tiene exactamente 3 caracteres, se asume que no forma parte del nombre.
-                    if len(tokens[-1]) == 3:
-                        name_tokens = tokens[4:-1]
-                    else:
-                        name_tokens = tokens[4:]
-                    nombre = " ".join(name_tokens)
-                    current_employee = {'documento': doc, 'nombre': nombre, 'naf': naf, 'movimientos': []}
-                    employees.append(current_employee)
-                # No se procesan logs individuales.
-
-            # Detectar línea de movimiento: aquellas que empiezan (ignorando espacios) con ALTA, BAJA o VAC.RETRIB.NO
-            elif current_employee is not None and re.match(r'^\s*(ALTA|BAJA|VAC\.?RETRIB\.?NO)', line, re.IGNORECASE):
-                movement_type_match = re.match(r'^\s*(\S+)', line)
-                movement_type = movement_type_match.group(1).upper() if movement_type_match else None
-                dates = re.findall(r'\d{2}-\d{2}-\d{4}', line)
-                if len(dates) == 2:
-                    if movement_type == "VAC.RETRIB.NO":
-                        f_real_alta = None
-                        f_efecto_alta = dates[0]
-                        f_real_sit = dates[1]
-                    else:
-                        f_real_alta = dates[0]
-                        f_efecto_alta = dates[1]
-                        f_real_sit = None
-                elif len(dates) >= 4:
-                    f_real_alta = dates[0]
-                    f_efecto_alta = dates[1]
-                    f_real_sit = dates[2]
+
+def _iter_lines(filepath, use_mmap=None):
+    """Yield the lines of a latin-1 file without their newline."""
+    if use_mmap is None:
+        use_mmap = os.path.getsize(filepath) >= MMAP_THRESHOLD_BYTES
+    if not use_mmap:
+        with open(filepath, 'r', encoding='latin1') as f:
+            for line in f:
+                yield line.rstrip("\n")
+        return
+
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for raw in iter(mm.readline, b''):
+                line = raw.decode('latin1')
+                if '\r' in line:
+                    # Universal newlines, as text mode would apply them
+                    yield from line.replace('\r\n', '\n').replace('\r', '\n').rstrip('\n').split('\n')
                 else:
-                    f_real_alta = f_efecto_alta = f_real_sit = None
-
-                # Extraer TC (codigo_contrato) - buscar un número de 3 dígitos después de las fechas
-                codigo_contrato = None
-                tc_match = re.search(r'\b(\d{3})\b', line)
-                if tc_match:
-                    codigo_contrato = tc_match.group(1)
-
-                movement = {
-                    'situacion': movement_type,
-                    'f_real_alta': f_real_alta,
-                    'f_efecto_alta': f_efecto_alta,
-                    'f_real_sit': f_real_sit,
-                    'codigo_contrato': codigo_contrato
-                }
-                current_employee['movimientos'].append(movement)
+                    yield line.rstrip("\n")
+
+
+def parse_vida_laboral(filepath, summary=None, use_mmap=None):
+    """
+    Stream the movements of a vida laboral .msj file.
+
+    Single pass over the file with precompiled patterns; yields one dict per
+    ALTA/BAJA/VAC.RETRIB.NO movement (keys as in VIDA_LABORAL_FIELDNAMES) as
+    soon as its line is read. If a summary dict is given it is filled with
+    the file's 'ccc', the reported 'total_reportado' and the set of employee
+    'documentos' seen. Files over MMAP_THRESHOLD_BYTES are read via mmap
+    unless use_mmap says otherwise.
+    """
+    if summary is None:
+        summary = {}
+    summary.setdefault('ccc', None)
+    summary.setdefault('total_reportado', None)
+    documentos = summary.setdefault('documentos', set())
+    ccc = summary['ccc']
+    naf = documento = nombre = None
+
+    for line in _iter_lines(filepath, use_mmap):
+        if ccc is None and 'Codigo Cuenta' in line:
+            match_ccc = _CCC_RE.search(line)
+            if match_ccc:
+                # Join province code and CCC number without spaces
+                ccc = summary['ccc'] = match_ccc.group(1) + match_ccc.group(2)
+
+        if 'TOTAL TRABAJADORES' in line:
+            match_total = _TOTAL_RE.search(line)
+            if match_total:
+                summary['total_reportado'] = int(match_total.group(1))
+
+        if _EMPLOYEE_RE.match(line):
+            tokens = line.split()
+            if len(tokens) >= 5:
+                # NAF (Social Security Number): provincia code + NAF number
+                naf = normalize_ssn(f"{tokens[0]} {tokens[1]}") or ""
+                documento = tokens[3]
+                # Si el último token tiene exactamente 3 caracteres, se asume que no forma parte del nombre.
+                nombre = " ".join(tokens[4:-1] if len(tokens[-1]) == 3 else tokens[4:])
+                documentos.add(documento)
+            continue
+
+        if documento is None:
+            continue
+        match_movement = _MOVEMENT_RE.match(line)
+        if not match_movement:
             # Las líneas que no coinciden se ignoran.
+            continue
 
-    # Aplanar la estructura: cada movimiento se asocia a los datos del empleado
-    movimientos = []
-    for emp in employees:
-        for mov in emp['movimientos']:
-            record = {
-                'ccc': ccc,  # Company location CCC (same for all employees in this file)
-                'naf': emp['naf'],
-                'documento': emp['documento'],
-                'nombre': emp['nombre'],
-                'situacion': mov['situacion'],
-                'f_real_alta': mov['f_real_alta'],
-                'f_efecto_alta': mov['f_efecto_alta'],
-                'f_real_sit': mov['f_real_sit'],
-                'codigo_contrato': mov['codigo_contrato']
-            }
-            movimientos.append(record)
-
-    return movimientos, total_trabajadores_alta_reportado, employees
+        movement_type = match_movement.group(1).upper()
+        dates = _DATE_RE.findall(line)
+        if len(dates) == 2:
+            if movement_type == "VAC.RETRIB.NO":
+                f_real_alta, f_efecto_alta, f_real_sit = None, dates[0], dates[1]
+            else:
+                f_real_alta, f_efecto_alta, f_real_sit = dates[0], dates[1], None
+        elif len(dates) >= 4:
+            f_real_alta, f_efecto_alta, f_real_sit = dates[0], dates[1], dates[2]
+        else:
+            f_real_alta = f_efecto_alta = f_real_sit = None
 
-def import_vida_laboral(filepath:str, tmp_path:str):
+        tc_match = _TC_RE.search(line)
 
-    movimientos, total_reportado, employees = parse_vida_laboral(filepath)
+        # Cada movimiento se asocia a los datos del empleado y al CCC del fichero
+        yield {
+            'ccc': ccc,
+            'naf': naf,
+            'documento': documento,
+            'nombre': nombre,
+            'situacion': movement_type,
+            'f_real_alta': f_real_alta,
+            'f_efecto_alta': f_efecto_alta,
+            'f_real_sit': f_real_sit,
+            'codigo_contrato': tc_match.group(1) if tc_match else None,
+        }
+
+
+def _parse_file(filepath, use_mmap=None):
+    summary = {}
+    movimientos = list(parse_vida_laboral(filepath, summary, use_mmap))
+    return filepath, movimientos, summary
+
+
+def parse_vida_laboral_files(filepaths, workers=None, use_mmap=None):
+    """
+    Parse many .msj files across a process pool.
+
+    Yields (filepath, movimientos, summary) tuples in input order; each
+    worker parses whole files, so a file's movements arrive as one list.
+    With workers=1 (or a single file) everything runs in this process.
+    """
+    filepaths = [str(path) for path in filepaths]
+    if workers == 1 or len(filepaths) <= 1:
+        for filepath in filepaths:
+            yield _parse_file(filepath, use_mmap)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_parse_file, filepaths, [use_mmap] * len(filepaths))
 
-    # Name the output CSV with a random name in the tmp_path every time
-    tmp_file = tempfile.NamedTemporaryFile(dir=tmp_path, prefix="vida_", suffix=".csv", delete=False)
-    output_csv = tmp_file.name
-    tmp_file.close()
 
-    fieldnames = ["ccc", "naf", "documento", "nombre", "situacion", "f_real_alta", "f_efecto_alta", "f_real_sit", "codigo_contrato"]
+def write_vida_laboral_csv(movimientos, output_csv):
+    """Write movement dicts to a CSV; returns the number of rows written."""
+    count = 0
     with open(output_csv, "w", newline='', encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=VIDA_LABORAL_FIELDNAMES)
         writer.writeheader()
         for row in movimientos:
             writer.writerow(row)
+            count += 1
+    return count
 
+
+def _print_totals_check(summary):
     # Final check: cada DNI único cuenta como un trabajador en alta
-    unique_trabajadores = len({emp['documento'] for emp in employees})
+    unique_trabajadores = len(summary['documentos'])
+    total_reportado = summary['total_reportado']
     print(f"\nTrabajadores en alta extraídos (únicos por DNI): {unique_trabajadores}")
     if total_reportado is not None:
         print(f"Total TRABAJADORES EN ALTA reportado: {total_reportado}")
@@ -131,7 +183,100 @@ def import_vida_laboral(filepath:str, tmp_path:str):
     else:
         print("No se encontró la línea 'TOTAL TRABAJADORES EN ALTA' en el archivo.")
 
-    print(f"\nDatos exportados en {output_csv}") 
+
+def import_vida_laboral(filepath:str, tmp_path:str):
+    """Convert an .msj file to a randomly named CSV in tmp_path; returns the CSV path."""
+    summary = {}
+
+    # Name the output CSV with a random name in the tmp_path every time
+    tmp_file = tempfile.NamedTemporaryFile(dir=tmp_path, prefix="vida_", suffix=".csv", delete=False)
+    output_csv = tmp_file.name
+    tmp_file.close()
+
+    write_vida_laboral_csv(parse_vida_laboral(filepath, summary), output_csv)
+    _print_totals_check(summary)
+    print(f"\nDatos exportados en {output_csv}")
+    return output_csv
+
+
+def _debug_tee(movimientos, debug_csv):
+    with open(debug_csv, "w", newline='', encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=VIDA_LABORAL_FIELDNAMES)
+        writer.writeheader()
+        for row in movimientos:
+            writer.writerow(row)
+            yield row
+
+
+def _print_delta_report(delta):
+    print(
+        f"\nDelta: {delta['new']} nuevos, {delta['changed']} modificados, "
+        f"{delta['unchanged']} sin cambios, {delta['skipped']} omitidos, {len(delta['disappeared'])} desaparecidos"
+    )
+    for movement in delta['disappeared']:
+        print(
+            f"  ⚠️  Movimiento desaparecido: {movement['situacion']} {movement['naf'] or movement['documento']} "
+            f"(CCC {movement['ccc']}, alta {movement['f_real_alta']}, efecto {movement['f_efecto_alta']}, "
+            f"sit {movement['f_real_sit']})"
+        )
+
+
+def import_vida_laboral_to_db(session, filepath, client_id, create_employees=True, debug_csv=None, delta=False):
+    """
+    Stream an .msj file straight into the database.
+
+    Movements go from the parser to vida_laboral.process_row without an
+    intermediate CSV, and the whole file is written in one transaction:
+    committed at the end, rolled back on error. When debug_csv is given the
+    parsed movements are also written there.
+
+    With delta=True only movements not imported before (or changed since)
+    are processed, and movements missing from the file are reported under
+    'delta' (see core.vida_laboral_delta).
+
+    Returns a dict with processing results.
+    """
+    summary = {}
+    context = VidaLaboralContext(create_employees=create_employees)
+    movimientos = parse_vida_laboral(filepath, summary)
+    if debug_csv:
+        movimientos = _debug_tee(movimientos, debug_csv)
+    # Same shape process_row gets from the CSV: missing values as ''
+    movimientos = ({key: value if value is not None else '' for key, value in row.items()} for row in movimientos)
+
+    row_count = 0
+    delta_report = None
+    try:
+        with deferred_coverage_refresh(session):
+            if delta:
+                rows = list(movimientos)
+                delta_report = process_rows_delta(session, client_id, rows, context)
+                row_count = len(rows)
+            else:
+                for row in movimientos:
+                    vida_laboral.process_row(session, client_id, row, context)
+                    row_count += 1
+            session.flush()
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        return {"success": False, "file": filepath, "rows_processed": row_count, "error": str(e)}
+
+    _print_totals_check(summary)
+    if delta_report is not None:
+        _print_delta_report(delta_report)
+    return {
+        "success": True,
+        "file": filepath,
+        "ccc": summary['ccc'],
+        "rows_processed": row_count,
+        "employees_created": context.employees_created,
+        "employees_updated": context.employees_updated,
+        "periods_created": context.periods_created,
+        "vacation_periods_created": context.vacation_periods_created,
+        "employees_not_found": context.employees_not_found,
+        "delta": delta_report,
+    }
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
@@ -139,27 +284,10 @@ if __name__ == '__main__':
         sys.exit(1)
     filepath = sys.argv[1]
 
-    movimientos, total_reportado, employees = parse_vida_laboral(filepath)
-
     # Generar archivo CSV
+    summary = {}
     output_csv = "output.csv"
-    fieldnames = ["ccc", "naf", "documento", "nombre", "situacion", "f_real_alta", "f_efecto_alta", "f_real_sit", "codigo_contrato"]
-    with open(output_csv, "w", newline='', encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in movimientos:
-            writer.writerow(row)
-
-    # Final check: cada DNI único cuenta como un trabajador en alta
-    unique_trabajadores = len({emp['documento'] for emp in employees})
-    print(f"\nTrabajadores en alta extraídos (únicos por DNI): {unique_trabajadores}")
-    if total_reportado is not None:
-        print(f"Total TRABAJADORES EN ALTA reportado: {total_reportado}")
-        if unique_trabajadores == total_reportado:
-            print("El total coincide con la extracción.")
-        else:
-            print("¡Atención! El total extraído no coincide con el reportado.")
-    else:
-        print("No se encontró la línea 'TOTAL TRABAJADORES EN ALTA' en el archivo.")
+    write_vida_laboral_csv(parse_vida_laboral(filepath, summary), output_csv)
+    _print_totals_check(summary)
 
     print(f"\nDatos exportados en {output_csv}")
@@ -13,8 +13,13 @@ sys.path.insert(0, str(project_root))
 import uuid
 from dotenv import load_dotenv
 
-from core.database import get_session
-from core.missing_payslips import generate_missing_payslips_report
+from datetime import datetime
+
+from core.database import DEFAULT_POOL_SIZE, create_database_engine, get_session
+from core.missing_payslips import (
+    generate_missing_payslips_report,
+    generate_portfolio_missing_payslips_report,
+)
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +33,7 @@ def generate_missing_payslips_report_programmatically(
     filename: str | None = None,
     last_month: str | None = None,
     start_month: str | None = None,
+    set_based: bool = False,
 ) -> dict:
     """
     Run the missing payslips report without the CLI.
@@ -39,6 +45,7 @@ def generate_missing_payslips_report_programmatically(
         filename: Optional custom filename when saving.
         last_month: Optional cutoff month in MM/YYYY (e.g., "05/2024").
         start_month: Optional start month in MM/YYYY (e.g., "01/2025").
+        set_based: Use the single-query detection engine.
 
     Returns dict with success status, report content, summary, and file path.
     """
@@ -61,6 +68,7 @@ def generate_missing_payslips_report_programmatically(
             filename=filename,
             last_month=last_month,
             start_month=start_month,
+            set_based=set_based,
         )
     finally:
         session.close()
@@ -76,6 +84,11 @@ def main():
     filename = None
     last_month = None
     start_month = None
+    set_based = False
+    all_clients = False
+    workers = 4
+    output_path = None
+    target_seconds = None
 
     args = sys.argv[1:]
     i = 0
@@ -101,11 +114,36 @@ def main():
         elif args[i] == "--start-month":
             i += 1
             start_month = args[i]
+        elif args[i] == "--set-based":
+            set_based = True
+        elif args[i] == "--all-clients":
+            all_clients = True
+        elif args[i] == "--workers":
+            i += 1
+            workers = int(args[i])
+        elif args[i] == "--output":
+            i += 1
+            output_path = args[i]
+        elif args[i] == "--target-seconds":
+            i += 1
+            target_seconds = float(args[i])
         elif args[i] == "--help":
             print_usage()
             return
         i += 1
 
+    if all_clients:
+        run_portfolio_report(
+            output_format=output_format if output_format in ("csv", "jsonl") else "jsonl",
+            output_path=output_path,
+            workers=workers,
+            last_month=last_month,
+            start_month=start_month,
+            set_based=set_based,
+            target_seconds=target_seconds,
+        )
+        return
+
     # Validate client_id is provided
     if not client_id:
         print("Error: --client-id is required")
@@ -133,6 +171,7 @@ def main():
             filename=filename,
             last_month=last_month,
             start_month=start_month,
+            set_based=set_based,
         )
     finally:
         session.close()
@@ -154,10 +193,50 @@ def main():
         print(f"\nReport saved to: {result['file_path']}")
 
 
+def run_portfolio_report(
+    *,
+    output_format: str,
+    output_path: str | None,
+    workers: int,
+    last_month: str | None,
+    start_month: str | None,
+    set_based: bool,
+    target_seconds: float | None,
+) -> None:
+    """Run the report for every active client and stream it to one file."""
+    if not output_path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = os.path.join("./reports", f"missing_payslips_portfolio_{timestamp}.{output_format}")
+
+    # Workers share the registry engine's pool; size it for one connection per worker
+    engine = create_database_engine(echo=False, pool_size=max(workers, DEFAULT_POOL_SIZE))
+    result = generate_portfolio_missing_payslips_report(
+        engine,
+        output_path=output_path,
+        output_format=output_format,
+        workers=workers,
+        last_month=last_month,
+        start_month=start_month,
+        set_based=set_based,
+        target_seconds=target_seconds,
+    )
+
+    if not result["success"]:
+        print(f"Error: {result.get('error', 'Unknown error')}")
+        print(f"Message: {result.get('message', '')}")
+        sys.exit(1)
+
+    print(f"\n{result['message']}")
+    print(f"Report saved to: {result['file_path']}")
+    if result["summary"]["within_target"] is False:
+        sys.exit(2)
+
+
 def print_usage():
     """Print usage instructions."""
     print("""
 Usage: python generate_missing_payslips_report.py --client-id UUID [OPTIONS]
+       python generate_missing_payslips_report.py --all-clients [OPTIONS]
 
 Required:
   --client-id UUID       Client ID to analyze (required)
@@ -168,6 +247,13 @@ Options:
   --filename FILENAME    Custom filename for saved report
   --last-month MM/YYYY   Cutoff month (e.g., "05/2024")
   --start-month MM/YYYY  Start month (e.g., "01/2025")
+  --set-based            Compute the report with one SQL query per client
+  --all-clients          Analyze every active client in parallel into one file
+                         (format csv or jsonl, default jsonl)
+  --workers N            Parallel workers for --all-clients (default: 4)
+  --output PATH          Output file for --all-clients
+                         (default: ./reports/missing_payslips_portfolio_<timestamp>.<format>)
+  --target-seconds S     Wall-clock target for --all-clients; exit code 2 when exceeded
   --help                 Show this help message
 
 Examples:
@@ -183,6 +269,9 @@ Examples:
   # Generate report with start date cap
   python scripts/generate_missing_payslips_report.py --client-id 12345678-1234-1234-1234-123456789abc --start-month 01/2025
 
+  # Portfolio-wide report for all active clients, 8 workers, 15 minute target
+  python scripts/generate_missing_payslips_report.py --all-clients --set-based --workers 8 --format csv --target-seconds 900
+
   # Generate JSON report with custom filename
   python scripts/generate_missing_payslips_report.py --client-id 12345678-1234-1234-1234-123456789abc --format json --save --filename my_report.json
 """)
@@ -5,6 +5,7 @@ Ingest payrolls from payrolls_mapped.json into the local database.
 Usage:
     python scripts/ingest_payrolls_mapped.py payrolls_mapped.json
     python scripts/ingest_payrolls_mapped.py payrolls_mapped.json --dry-run
+    python scripts/ingest_payrolls_mapped.py payrolls_mapped.json --bulk
 """
 
 from __future__ import annotations
@@ -13,18 +14,26 @@ import argparse
 import json
 import os
 import sys
+import time
 from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
 
 # Add repo root to path to import core modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.database import create_database_engine, get_session
-from core.normalization import normalize_ssn
+from core.checklist import mark_checklist_items_received
+from core.concepts import assign_concept_ids
+from core.database import (
+    CREATE_PAYROLL_UNIQUE_INDEX_SQL, create_database_engine, get_session, insert_payroll_if_new, insert_payrolls,
+)
+from core.employee_coverage import deferred_coverage_refresh
+from core.normalization import normalize_ssn, periodo_bounds
 from core.models import Client, ClientLocation, Employee, EmployeePeriod, Payroll, PayrollLine
+from core.utils.batching import chunked
 
 
 PAYROLL_REQUIRED_FIELDS = [
@@ -328,20 +337,64 @@ def _find_or_create_employee(session, trabajador: Dict[str, Any]) -> Optional[Em
     return None
 
 
-def _payroll_exists(session, employee_id: int, periodo: Dict[str, Any], liquido: Decimal) -> bool:
-    desde = (periodo or {}).get("desde")
-    hasta = (periodo or {}).get("hasta")
-    if not (desde and hasta):
-        return False
-    return (
-        session.query(Payroll)
-        .filter(Payroll.employee_id == employee_id)
-        .filter(Payroll.periodo["desde"].as_string() == str(desde))
-        .filter(Payroll.periodo["hasta"].as_string() == str(hasta))
-        .filter(Payroll.liquido_a_percibir == liquido)
-        .first()
-        is not None
-    )
+def _payroll_values(payroll: Dict[str, Any], employee_id: int, liquido: Decimal) -> Dict[str, Any]:
+    periodo = payroll.get("periodo") or {}
+    period_start, period_end = periodo_bounds(periodo)
+    return {
+        "employee_id": employee_id,
+        "type": payroll.get("type"),
+        "periodo": periodo,
+        "period_start": period_start,
+        "period_end": period_end,
+        "devengo_total": _as_decimal(payroll.get("devengo_total")),
+        "deduccion_total": _as_decimal(payroll.get("deduccion_total")),
+        "aportacion_empresa_total": _as_decimal(payroll.get("aportacion_empresa_total")),
+        "liquido_a_percibir": liquido,
+        "prorrata_pagas_extra": _as_decimal(payroll.get("prorrata_pagas_extra")),
+        "base_cc": _as_decimal(payroll.get("base_cc")),
+        "base_at_ep": _as_decimal(payroll.get("base_at_ep")),
+        "base_irpf": _as_decimal(payroll.get("base_irpf")),
+        "tipo_irpf": _as_decimal(payroll.get("tipo_irpf")),
+        "warnings": _normalize_warnings(payroll.get("warnings")),
+    }
+
+
+def _line_values(line: Dict[str, Any], payroll_id: int) -> Dict[str, Any]:
+    return {
+        "payroll_id": payroll_id,
+        "category": line.get("category"),
+        "concept": line.get("concept"),
+        "raw_concept": line.get("raw_concept"),
+        "amount": _as_decimal(line.get("amount")),
+        "is_taxable_income": line.get("is_taxable_income"),
+        "is_taxable_ss": line.get("is_taxable_ss"),
+        "is_sickpay": line.get("is_sickpay"),
+        "is_in_kind": line.get("is_in_kind"),
+        "is_pay_advance": line.get("is_pay_advance"),
+        "is_seizure": line.get("is_seizure"),
+    }
+
+
+def _skipped_record(
+    idx: int,
+    reason: str,
+    payroll: Dict[str, Any],
+    ss_number: str,
+    dni: str,
+) -> Dict[str, Any]:
+    empresa = payroll.get("empresa") or {}
+    periodo = payroll.get("periodo") or {}
+    return {
+        "index": idx,
+        "reason": reason,
+        "ss_number": ss_number,
+        "dni": dni,
+        "empresa_cif": (empresa.get("cif") or "").strip(),
+        "empresa_razon_social": (empresa.get("razon_social") or "").strip(),
+        "periodo_desde": periodo.get("desde"),
+        "periodo_hasta": periodo.get("hasta"),
+        "type": payroll.get("type"),
+    }
 
 
 def _ingest_payrolls(
@@ -349,105 +402,322 @@ def _ingest_payrolls(
     payrolls: List[Dict[str, Any]],
     dry_run: bool = False,
     batch_size: int = 200,
+    created_employee_ids: Optional[set] = None,
 ) -> Tuple[int, int, int, List[Dict[str, Any]]]:
     created = 0
     skipped = 0
     lines_created = 0
     skipped_records: List[Dict[str, Any]] = []
 
+    # Coverage of the inserted payrolls is refreshed once per committed batch
+    with deferred_coverage_refresh(session):
+        for idx, payroll in enumerate(payrolls, start=1):
+            trabajador = payroll["trabajador"]
+            employee = _find_or_create_employee(session, trabajador)
+            ss_number = normalize_ssn(trabajador.get("ss_number"))
+            dni = _normalize_id(trabajador.get("dni"))
+            empresa = payroll.get("empresa") or {}
+
+            if employee is None:
+                skipped += 1
+                skipped_records.append(
+                    _skipped_record(idx, "employee_not_found", payroll, ss_number, dni)
+                )
+                continue
+
+            if employee.id is None:
+                raise RuntimeError("Employee id is None after creation/lookup.")
+            employee_id = int(employee.id)
+
+            periodo = payroll.get("periodo") or {}
+            client = _resolve_client(session, empresa)
+            if client is None or not _has_valid_employee_period(session, employee_id, periodo, client.id):
+                skipped += 1
+                skipped_records.append(
+                    _skipped_record(idx, "invalid_employee_period", payroll, ss_number, dni)
+                )
+                continue
+
+            # Duplicates are detected by idx_unique_employee_period_amount: no id, no lines
+            liquido = _as_decimal(payroll.get("liquido_a_percibir"))
+            payroll_id = insert_payroll_if_new(session, _payroll_values(payroll, employee_id, liquido))
+            if payroll_id is None:
+                skipped += 1
+                continue
+
+            line_rows = [_line_values(line, payroll_id) for line in payroll.get("payroll_lines", [])]
+            if line_rows:
+                assign_concept_ids(session, line_rows)
+                session.execute(insert(PayrollLine), line_rows)
+            lines_created += len(line_rows)
+            created += 1
+            if created_employee_ids is not None:
+                created_employee_ids.add(employee_id)
+
+            if not dry_run and idx % batch_size == 0:
+                session.commit()
+
+    if not dry_run:
+        session.commit()
+    else:
+        session.rollback()
+
+    return created, skipped, lines_created, skipped_records
+
+
+# ---------------------------------------------------------------------------
+# Bulk mode: same lookups and skip rules as _ingest_payrolls, but resolved
+# against in-memory indexes preloaded with a handful of set-based queries,
+# and payrolls/lines written with multi-row INSERT ... RETURNING per batch.
+# ---------------------------------------------------------------------------
+
+PeriodIndex = Dict[Tuple[int, Any], List[Tuple[date, Optional[date]]]]
+PayrollKey = Tuple[int, date, date, Decimal]
+
+
+def _payroll_key(
+    employee_id: int,
+    period_start: Optional[date],
+    period_end: Optional[date],
+    liquido: Decimal,
+) -> Optional[PayrollKey]:
+    """Key of idx_unique_employee_period_amount; None when the period is incomplete (never a duplicate)."""
+    if period_start is None or period_end is None:
+        return None
+    return (employee_id, period_start, period_end, liquido)
+
+
+def _preload_employees(
+    session, payrolls: List[Dict[str, Any]]
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Employee ids by ss_number and by DNI for every worker in the payload."""
+    ssns = set()
+    dnis = set()
+    for payroll in payrolls:
+        trabajador = payroll.get("trabajador") or {}
+        ss_number = normalize_ssn(trabajador.get("ss_number"))
+        dni = _normalize_id(trabajador.get("dni"))
+        if ss_number:
+            ssns.add(ss_number)
+        if dni:
+            dnis.add(dni)
+
+    by_ssn: Dict[str, int] = {}
+    by_dni: Dict[str, int] = {}
+    for chunk in chunked(sorted(ssns)):
+        rows = (
+            session.query(Employee.id, Employee.ss_number)
+            .filter(Employee.ss_number.in_(chunk))
+            .order_by(Employee.id)
+        )
+        for employee_id, ss_number in rows:
+            by_ssn.setdefault(ss_number, int(employee_id))
+    for chunk in chunked(sorted(dnis)):
+        rows = (
+            session.query(Employee.id, Employee.identity_card_number)
+            .filter(Employee.identity_card_number.in_(chunk))
+            .order_by(Employee.id)
+        )
+        for employee_id, dni in rows:
+            by_dni.setdefault(dni, int(employee_id))
+    return by_ssn, by_dni
+
+
+def _preload_clients(session, payrolls: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Client ids by CIF and by name for every empresa in the payload."""
+    cifs = set()
+    names = set()
+    for payroll in payrolls:
+        empresa = payroll.get("empresa")
+        if not isinstance(empresa, dict):
+            continue
+        cif = (empresa.get("cif") or "").strip()
+        name = (empresa.get("razon_social") or "").strip()
+        if cif:
+            cifs.add(cif)
+        if name:
+            names.add(name)
+
+    by_cif: Dict[str, Any] = {}
+    by_name: Dict[str, Any] = {}
+    for chunk in chunked(sorted(cifs)):
+        for client_id, cif in session.query(Client.id, Client.cif).filter(Client.cif.in_(chunk)):
+            by_cif[cif] = client_id
+    for chunk in chunked(sorted(names)):
+        for client_id, name in session.query(Client.id, Client.name).filter(Client.name.in_(chunk)):
+            by_name.setdefault(name, client_id)
+    return by_cif, by_name
+
+
+def _lookup_client_id(empresa: Any, by_cif: Dict[str, Any], by_name: Dict[str, Any]) -> Optional[Any]:
+    """In-memory equivalent of _resolve_client."""
+    if not isinstance(empresa, dict):
+        return None
+    cif = (empresa.get("cif") or "").strip()
+    name = (empresa.get("razon_social") or "").strip()
+    if cif and cif in by_cif:
+        return by_cif[cif]
+    if name:
+        return by_name.get(name)
+    return None
+
+
+def _preload_employee_periods(session, employee_ids: List[int]) -> PeriodIndex:
+    """Employment periods by (employee_id, client_id)."""
+    index: PeriodIndex = {}
+    for chunk in chunked(sorted(set(employee_ids))):
+        rows = (
+            session.query(
+                EmployeePeriod.employee_id,
+                ClientLocation.company_id,
+                EmployeePeriod.period_begin_date,
+                EmployeePeriod.period_end_date,
+            )
+            .join(ClientLocation, ClientLocation.id == EmployeePeriod.location_id)
+            .filter(EmployeePeriod.employee_id.in_(chunk))
+        )
+        for employee_id, company_id, begin, end in rows:
+            index.setdefault((int(employee_id), company_id), []).append((begin, end))
+    return index
+
+
+def _has_valid_period_indexed(
+    periods: PeriodIndex,
+    employee_id: int,
+    periodo: Dict[str, Any],
+    client_id,
+) -> bool:
+    """In-memory equivalent of _has_valid_employee_period."""
+    desde = _parse_date((periodo or {}).get("desde"))
+    hasta = _parse_date((periodo or {}).get("hasta"))
+    if hasta is None:
+        return False
+    period_start = desde or hasta
+    period_end = hasta
+    return any(
+        begin <= period_end and (end is None or end >= period_start)
+        for begin, end in periods.get((employee_id, client_id), [])
+    )
+
+
+def _preload_payroll_keys(session, employee_ids_by_client: Dict[Any, List[int]]) -> set:
+    """Existing payroll keys, one query per client for the employees seen in the payload."""
+    keys = set()
+    for employee_ids in employee_ids_by_client.values():
+        rows = (
+            session.query(
+                Payroll.employee_id,
+                Payroll.period_start,
+                Payroll.period_end,
+                Payroll.liquido_a_percibir,
+            )
+            .filter(Payroll.employee_id.in_(sorted(set(employee_ids))))
+        )
+        for employee_id, period_start, period_end, liquido in rows:
+            key = _payroll_key(int(employee_id), period_start, period_end, liquido)
+            if key is not None:
+                keys.add(key)
+    return keys
+
+
+def _insert_payroll_batch(
+    session,
+    payroll_rows: List[Dict[str, Any]],
+    lines_per_payroll: List[List[Dict[str, Any]]],
+) -> int:
+    """Insert a batch of payrolls and their lines; returns the number of lines written."""
+    if not payroll_rows:
+        return 0
+    payroll_ids = insert_payrolls(session, payroll_rows)
+    line_rows = [
+        _line_values(line, payroll_id)
+        for payroll_id, lines in zip(payroll_ids, lines_per_payroll)
+        for line in lines
+    ]
+    if line_rows:
+        assign_concept_ids(session, line_rows)
+        session.execute(insert(PayrollLine), line_rows)
+    return len(line_rows)
+
+
+def _ingest_payrolls_bulk(
+    session,
+    payrolls: List[Dict[str, Any]],
+    dry_run: bool = False,
+    batch_size: int = 1000,
+    created_employee_ids: Optional[set] = None,
+) -> Tuple[int, int, int, List[Dict[str, Any]]]:
+    """Bulk equivalent of _ingest_payrolls (same counts, skip reasons and records)."""
+    created = 0
+    skipped = 0
+    lines_created = 0
+    skipped_records: List[Dict[str, Any]] = []
+
+    by_ssn, by_dni = _preload_employees(session, payrolls)
+    by_cif, by_name = _preload_clients(session, payrolls)
+
+    # Resolve employee and client for every payroll
+    resolved: List[Tuple[int, Dict[str, Any], Optional[int], Any, str, str]] = []
     for idx, payroll in enumerate(payrolls, start=1):
         trabajador = payroll["trabajador"]
-        employee = _find_or_create_employee(session, trabajador)
         ss_number = normalize_ssn(trabajador.get("ss_number"))
         dni = _normalize_id(trabajador.get("dni"))
-        empresa = payroll.get("empresa") or {}
-
-        if employee is None:
+        employee_id = by_ssn.get(ss_number) if ss_number else None
+        if employee_id is None and dni:
+            employee_id = by_dni.get(dni)
+        client_id = _lookup_client_id(payroll.get("empresa") or {}, by_cif, by_name)
+        resolved.append((idx, payroll, employee_id, client_id, ss_number, dni))
+
+    employee_ids = [r[2] for r in resolved if r[2] is not None]
+    periods = _preload_employee_periods(session, employee_ids)
+
+    candidates: List[Tuple[Dict[str, Any], int, Decimal]] = []
+    employee_ids_by_client: Dict[Any, List[int]] = {}
+    for idx, payroll, employee_id, client_id, ss_number, dni in resolved:
+        if employee_id is None:
             skipped += 1
             skipped_records.append(
-                {
-                    "index": idx,
-                    "reason": "employee_not_found",
-                    "ss_number": ss_number,
-                    "dni": dni,
-                    "empresa_cif": (empresa.get("cif") or "").strip(),
-                    "empresa_razon_social": (empresa.get("razon_social") or "").strip(),
-                    "periodo_desde": (payroll.get("periodo") or {}).get("desde"),
-                    "periodo_hasta": (payroll.get("periodo") or {}).get("hasta"),
-                    "type": payroll.get("type"),
-                }
+                _skipped_record(idx, "employee_not_found", payroll, ss_number, dni)
             )
             continue
 
-        if employee.id is None:
-            raise RuntimeError("Employee id is None after creation/lookup.")
-        employee_id = int(employee.id)
-
         periodo = payroll.get("periodo") or {}
-        client = _resolve_client(session, empresa)
-        if client is None or not _has_valid_employee_period(session, employee_id, periodo, client.id):
+        if client_id is None or not _has_valid_period_indexed(periods, employee_id, periodo, client_id):
             skipped += 1
             skipped_records.append(
-                {
-                    "index": idx,
-                    "reason": "invalid_employee_period",
-                    "ss_number": ss_number,
-                    "dni": dni,
-                    "empresa_cif": (empresa.get("cif") or "").strip(),
-                    "empresa_razon_social": (empresa.get("razon_social") or "").strip(),
-                    "periodo_desde": periodo.get("desde"),
-                    "periodo_hasta": periodo.get("hasta"),
-                    "type": payroll.get("type"),
-                }
+                _skipped_record(idx, "invalid_employee_period", payroll, ss_number, dni)
             )
             continue
 
-        liquido = _as_decimal(payroll.get("liquido_a_percibir"))
-        if _payroll_exists(session, employee_id, periodo, liquido):
-            skipped += 1
-            continue
+        candidates.append((payroll, employee_id, _as_decimal(payroll.get("liquido_a_percibir"))))
+        employee_ids_by_client.setdefault(client_id, []).append(employee_id)
 
-        warnings_text = _normalize_warnings(payroll.get("warnings"))
-
-        payroll_row = Payroll(
-            employee_id=employee_id,
-            type=payroll.get("type"),
-            periodo=periodo,
-            devengo_total=_as_decimal(payroll.get("devengo_total")),
-            deduccion_total=_as_decimal(payroll.get("deduccion_total")),
-            aportacion_empresa_total=_as_decimal(payroll.get("aportacion_empresa_total")),
-            liquido_a_percibir=liquido,
-            prorrata_pagas_extra=_as_decimal(payroll.get("prorrata_pagas_extra")),
-            base_cc=_as_decimal(payroll.get("base_cc")),
-            base_at_ep=_as_decimal(payroll.get("base_at_ep")),
-            base_irpf=_as_decimal(payroll.get("base_irpf")),
-            tipo_irpf=_as_decimal(payroll.get("tipo_irpf")),
-            warnings=warnings_text,
-        )
-        session.add(payroll_row)
-        session.flush()
-
-        for line in payroll.get("payroll_lines", []):
-            payroll_line = PayrollLine(
-                payroll_id=payroll_row.id,
-                category=line.get("category"),
-                concept=line.get("concept"),
-                raw_concept=line.get("raw_concept"),
-                amount=_as_decimal(line.get("amount")),
-                is_taxable_income=line.get("is_taxable_income"),
-                is_taxable_ss=line.get("is_taxable_ss"),
-                is_sickpay=line.get("is_sickpay"),
-                is_in_kind=line.get("is_in_kind"),
-                is_pay_advance=line.get("is_pay_advance"),
-                is_seizure=line.get("is_seizure"),
-            )
-            session.add(payroll_line)
-            lines_created += 1
+    existing_keys = _preload_payroll_keys(session, employee_ids_by_client)
+
+    payroll_rows: List[Dict[str, Any]] = []
+    lines_per_payroll: List[List[Dict[str, Any]]] = []
+    for payroll, employee_id, liquido in candidates:
+        key = _payroll_key(employee_id, *periodo_bounds(payroll.get("periodo") or {}), liquido)
+        if key is not None:
+            if key in existing_keys:
+                skipped += 1
+                continue
+            # Later duplicates within the same payload are skipped too
+            existing_keys.add(key)
 
+        payroll_rows.append(_payroll_values(payroll, employee_id, liquido))
+        lines_per_payroll.append(payroll.get("payroll_lines", []))
         created += 1
+        if created_employee_ids is not None:
+            created_employee_ids.add(employee_id)
 
-        if not dry_run and idx % batch_size == 0:
-            session.commit()
+        if len(payroll_rows) >= batch_size:
+            lines_created += _insert_payroll_batch(session, payroll_rows, lines_per_payroll)
+            payroll_rows, lines_per_payroll = [], []
+            if not dry_run:
+                session.commit()
+
+    lines_created += _insert_payroll_batch(session, payroll_rows, lines_per_payroll)
 
     if not dry_run:
         session.commit()
@@ -461,11 +731,15 @@ def ingest_payrolls_mapped_from_file(
     input_path: str,
     dry_run: bool = False,
     db_url: Optional[str] = None,
+    bulk: bool = False,
 ) -> Dict[str, Any]:
     with open(input_path, "r", encoding="utf-8") as f:
         payload = json.load(f)
 
     engine = create_database_engine(database_url=db_url, echo=False)
+    # Conflict target of the payroll inserts
+    with engine.begin() as conn:
+        conn.execute(CREATE_PAYROLL_UNIQUE_INDEX_SQL)
     session = get_session(engine)
 
     try:
@@ -477,11 +751,21 @@ def ingest_payrolls_mapped_from_file(
                 "errors": errors,
             }
 
-        created, skipped, lines_created, skipped_records = _ingest_payrolls(
+        ingest = _ingest_payrolls_bulk if bulk else _ingest_payrolls
+        start_time = time.perf_counter()
+        created_employee_ids: set = set()
+        created, skipped, lines_created, skipped_records = ingest(
             session,
             payload["payrolls"],
             dry_run=dry_run,
+            created_employee_ids=created_employee_ids,
         )
+        elapsed = time.perf_counter() - start_time
+        checklist_received = 0
+        if created and not dry_run:
+            # Close checklist items satisfied by the payrolls just ingested
+            checklist_received = mark_checklist_items_received(session, employee_ids=created_employee_ids)
+            session.commit()
         skipped_log_path = None
         if skipped_records:
             input_dir = os.path.dirname(input_path) or "."
@@ -494,8 +778,11 @@ def ingest_payrolls_mapped_from_file(
             "created": created,
             "skipped": skipped,
             "lines_created": lines_created,
+            "checklist_items_received": checklist_received,
             "skipped_log_path": skipped_log_path,
             "dry_run": dry_run,
+            "elapsed_seconds": round(elapsed, 3),
+            "payrolls_per_second": round(len(payload["payrolls"]) / elapsed, 1) if elapsed else None,
         }
     except IntegrityError as exc:
         session.rollback()
@@ -516,12 +803,18 @@ def main() -> int:
         default=None,
         help="Database URL (defaults to POSTGRES_* env vars)",
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Preload lookups and insert payrolls/lines in multi-row batches",
+    )
     args = parser.parse_args()
 
     result = ingest_payrolls_mapped_from_file(
         args.input,
         dry_run=args.dry_run,
         db_url=args.db_url,
+        bulk=args.bulk,
     )
 
     if not result.get("success"):
@@ -539,6 +832,7 @@ def main() -> int:
         f"{mode} complete: payrolls created={result['created']}, "
         f"skipped={result['skipped']}, lines created={result['lines_created']}"
     )
+    print(f"Elapsed: {result['elapsed_seconds']}s ({result['payrolls_per_second']} payrolls/s)")
     return 0
 
 
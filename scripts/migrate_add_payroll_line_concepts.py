@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Add the concepts table and payroll_lines.concept_id, and backfill it.
+
+Each distinct concept text is normalized once (normalize_concept_key),
+interned into concepts and assigned to its lines with set-based updates.
+New lines get their concept_id on write (core.concepts). Safe to re-run.
+
+Usage:
+    python scripts/migrate_add_payroll_line_concepts.py
+    python scripts/migrate_add_payroll_line_concepts.py --batch-size 5000
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from core.concepts import backfill_concept_ids
+from core.database import create_database_engine, get_session
+from core.models import Concept
+from core.utils.batching import IN_CLAUSE_CHUNK
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Add and backfill payroll_lines.concept_id.")
+    parser.add_argument("--batch-size", type=int, default=IN_CLAUSE_CHUNK, help="Concept texts per batch")
+    parser.add_argument("--db-url", default=None, help="Database URL (defaults to POSTGRES_* env vars)")
+    args = parser.parse_args()
+
+    engine = create_database_engine(database_url=args.db_url)
+    Concept.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE payroll_lines ADD COLUMN IF NOT EXISTS concept_id INTEGER REFERENCES concepts(id);"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_payroll_lines_concept_id ON payroll_lines (concept_id)"))
+    print("Added concepts table and payroll_lines.concept_id (if missing).")
+
+    session = get_session(engine)
+    try:
+        assigned = backfill_concept_ids(session, batch_size=args.batch_size)
+        session.commit()
+        concepts = session.query(Concept).count()
+    finally:
+        session.close()
+    print(f"Backfilled {assigned} concept texts into {concepts} concepts.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Add typed period_start/period_end columns to payrolls and backfill them from periodo.
+
+Also creates the (employee_id, period_start, period_end) index, rebuilds the
+payroll unique index on the typed columns and refreshes the reporting views.
+Payrolls that only differed in periodo date format collide on the typed key;
+they are reported before the index is touched (--dedupe deletes all but the
+lowest id). Safe to re-run.
+
+Usage:
+    python scripts/migrate_add_payroll_period_columns.py
+    python scripts/migrate_add_payroll_period_columns.py --batch-size 10000
+    python scripts/migrate_add_payroll_period_columns.py --dedupe
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from core.database import create_database_engine
+from core.employee_coverage import employee_coverage_changed
+from core.normalization import periodo_bounds
+from scripts.setup_database import create_basic_views
+
+
+def backfill_period_columns(engine, batch_size: int = 5000) -> int:
+    """Fill period_start/period_end for every payroll, parsing periodo like the ORM does on write."""
+    update = text(
+        "UPDATE payrolls SET period_start = :period_start, period_end = :period_end WHERE id = :payroll_id"
+    )
+
+    updated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, employee_id, periodo FROM payrolls WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+            if not rows:
+                break
+            params = []
+            for payroll_id, _employee_id, periodo in rows:
+                period_start, period_end = periodo_bounds(periodo)
+                params.append(
+                    {"payroll_id": payroll_id, "period_start": period_start, "period_end": period_end}
+                )
+            conn.execute(update, params)
+            employee_coverage_changed(conn, {row[1] for row in rows})
+        updated += len(rows)
+        last_id = rows[-1][0]
+        print(f"  backfilled {updated} payrolls...")
+    return updated
+
+
+DUPLICATE_PAYROLLS_SQL = text("""
+    SELECT employee_id, period_start, period_end, liquido_a_percibir, count(*) AS copies, min(id) AS keep_id
+    FROM payrolls
+    WHERE period_start IS NOT NULL
+      AND period_end IS NOT NULL
+      AND liquido_a_percibir IS NOT NULL
+    GROUP BY employee_id, period_start, period_end, liquido_a_percibir
+    HAVING count(*) > 1
+    ORDER BY employee_id, period_start
+""")
+
+DEDUPE_PAYROLLS_SQL = text("""
+    DELETE FROM payrolls p
+    USING payrolls keep
+    WHERE keep.employee_id = p.employee_id
+      AND keep.period_start = p.period_start
+      AND keep.period_end = p.period_end
+      AND keep.liquido_a_percibir = p.liquido_a_percibir
+      AND keep.id < p.id
+""")
+
+
+def find_duplicate_payrolls(engine) -> list:
+    """
+    Payrolls that collide on the typed unique key.
+
+    Rows whose periodo only differed in date format ("2024-01-31" vs
+    "31-01-2024") were distinct under the JSON index but not after the backfill.
+    """
+    with engine.connect() as conn:
+        return conn.execute(DUPLICATE_PAYROLLS_SQL).all()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Add and backfill payrolls.period_start/period_end.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--db-url", default=None, help="Database URL (defaults to POSTGRES_* env vars)")
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Delete duplicate payrolls (keeping the lowest id) instead of stopping before the unique index",
+    )
+    args = parser.parse_args()
+
+    engine = create_database_engine(database_url=args.db_url)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE payrolls ADD COLUMN IF NOT EXISTS period_start DATE;"))
+        conn.execute(text("ALTER TABLE payrolls ADD COLUMN IF NOT EXISTS period_end DATE;"))
+    print("Added period_start/period_end columns (if missing).")
+
+    updated = backfill_period_columns(engine, batch_size=args.batch_size)
+    print(f"Backfilled {updated} payrolls.")
+
+    duplicates = find_duplicate_payrolls(engine)
+    if duplicates:
+        print(f"Found {len(duplicates)} payroll keys with duplicates on the typed period columns:")
+        for employee_id, period_start, period_end, liquido, copies, keep_id in duplicates[:50]:
+            print(f"  employee {employee_id} {period_start}..{period_end} liquido {liquido}: "
+                  f"{copies} payrolls (lowest id {keep_id})")
+        if len(duplicates) > 50:
+            print(f"  ... and {len(duplicates) - 50} more")
+        if not args.dedupe:
+            print("Unique index not rebuilt. Resolve the duplicates or re-run with --dedupe.")
+            return 1
+        with engine.begin() as conn:
+            deleted = conn.execute(DEDUPE_PAYROLLS_SQL).rowcount
+            employee_coverage_changed(conn, {row[0] for row in duplicates})
+        print(f"Deleted {deleted} duplicate payrolls (their lines cascade).")
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_payrolls_employee_period
+            ON payrolls (employee_id, period_start, period_end)
+        """))
+        conn.execute(text("DROP INDEX IF EXISTS idx_unique_employee_period_amount"))
+        conn.execute(text("""
+            CREATE UNIQUE INDEX idx_unique_employee_period_amount
+            ON payrolls (employee_id, period_start, period_end, liquido_a_percibir)
+            WHERE period_start IS NOT NULL
+              AND period_end IS NOT NULL
+              AND liquido_a_percibir IS NOT NULL
+        """))
+    print("Rebuilt payroll period indexes.")
+
+    # Reporting views read the typed columns now
+    create_basic_views(engine)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Create (if missing) and fully rebuild the employee_month_coverage table.
+
+Coverage is kept current on every ORM flush of Payroll/EmployeePeriod rows;
+run this after the initial deploy, after writes made with raw SQL, or
+periodically to roll open-ended employment periods forward.
+
+Usage:
+    python scripts/rebuild_employee_coverage.py
+    python scripts/rebuild_employee_coverage.py --batch-size 5000 --db-url postgresql://...
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import create_database_engine
+from core.employee_coverage import rebuild_employee_coverage
+from core.models import EmployeeMonthCoverage
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the employee_month_coverage table.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Employees refreshed per transaction")
+    parser.add_argument("--db-url", default=None, help="Database URL (defaults to POSTGRES_* env vars)")
+    args = parser.parse_args()
+
+    engine = create_database_engine(database_url=args.db_url)
+    EmployeeMonthCoverage.__table__.create(engine, checkfirst=True)
+
+    start = time.perf_counter()
+    written = rebuild_employee_coverage(engine, batch_size=args.batch_size)
+    print(f"Rebuilt employee_month_coverage: {written} rows in {time.perf_counter() - start:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
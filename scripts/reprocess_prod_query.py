@@ -12,31 +12,64 @@ Notes:
     - Writes into the local/target database using create_database_engine.
     - Creates employees when missing and applies the merge logic in
       core.vida_laboral to avoid overlapping ALTA periods.
+    - Prod rows are streamed with a server-side cursor and written in
+      batches of PROD_BATCH_SIZE through the vida laboral index.
+    - With incremental=True only employees changed since the last sync
+      (core.prod_sync high-water mark) are fetched; a full reconciliation
+      still runs periodically, with full_reconcile=True, or on every run
+      when prod company_employees has no updated_at column.
 """
 
 import os
 import sys
-from typing import Mapping, Any
+from datetime import datetime
+from typing import Any, Dict, Mapping, Tuple
 
 # Allow running as a script from repo root
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy import MetaData, Table, String, cast, select, or_
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import Engine
 
-from core.database import create_database_engine, create_prod_engine
+from core.database import create_database_engine, create_prod_engine, get_session
+from core.employee_coverage import deferred_coverage_refresh
 from core.normalization import normalize_ssn
 import core.vida_laboral as vida_laboral
 from core.vida_laboral import VidaLaboralContext
 from core.models import Client
+from core.prod_sync import (
+    SCOPE_EMPLOYEES, begin_sync, changed_since as changed_since_filter, finish_sync, latest_change
+)
 
+# Rows fetched per server-side cursor round trip and written per index batch
+PROD_BATCH_SIZE = int(os.getenv("PROD_BATCH_SIZE", "2000"))
 
-def build_prod_query(prod_engine, company_identifier: str, employee_identifier: str | None = None):
-    """SQLAlchemy Core query with required company filter and optional employee filter."""
-    md = MetaData()
-    company_employees = Table("company_employees", md, schema="public", autoload_with=prod_engine)
-    companies = Table("companies", md, schema="public", autoload_with=prod_engine)
-    company_locations = Table("company_locations", md, schema="public", autoload_with=prod_engine)
+PROD_TABLES = ("company_employees", "companies", "company_locations")
+
+# Reflected production tables per database URL, kept for the life of the process
+_REFLECTED_TABLES: Dict[str, Tuple[Table, ...]] = {}
+
+
+def reflect_prod_tables(prod_engine: Engine) -> Tuple[Table, ...]:
+    """Reflect the production tables used by the query once per process and database."""
+    key = prod_engine.url.render_as_string(hide_password=False)
+    tables = _REFLECTED_TABLES.get(key)
+    if tables is None:
+        md = MetaData()
+        md.reflect(bind=prod_engine, schema="public", only=PROD_TABLES)
+        tables = tuple(md.tables[f"public.{name}"] for name in PROD_TABLES)
+        _REFLECTED_TABLES[key] = tables
+    return tables
+
+
+def build_prod_query(
+    prod_engine,
+    company_identifier: str,
+    employee_identifier: str | None = None,
+    changed_since: datetime | None = None,
+):
+    """SQLAlchemy Core query with required company filter and optional employee and change filters."""
+    company_employees, companies, company_locations = reflect_prod_tables(prod_engine)
 
     excluded_statuses = ("Test", "Error", "enrollment_cancelled", "cancelling_casia", "Canceled")
 
@@ -65,6 +98,12 @@ def build_prod_query(prod_engine, company_identifier: str, employee_identifier:
             companies.c.cif.label("Companies__cif"),
             companies.c.begin_date.label("Companies__begin_date"),
             companies.c.payslips.label("Companies__payslips"),
+            # Change timestamps for the sync high-water mark, where prod has them
+            *[
+                company_employees.c[name].label(name)
+                for name in ("updated_at", "deleted_at")
+                if name in company_employees.c
+            ],
         )
         .select_from(
             company_employees
@@ -92,6 +131,8 @@ def build_prod_query(prod_engine, company_identifier: str, employee_identifier:
                 company_employees.c.ss_number == employee_identifier,
             )
         )
+    if changed_since is not None:
+        stmt = stmt.where(changed_since_filter(company_employees, changed_since))
     return stmt
 
 
@@ -134,13 +175,18 @@ def _normalize_identity_card(value: Any) -> str:
     return raw
 
 
-def process_prod_query(client_identifier: str, employee_identifier: str | None = None) -> dict:
+def process_prod_query(
+    client_identifier: str,
+    employee_identifier: str | None = None,
+    *,
+    incremental: bool = False,
+    full_reconcile: bool = False,
+) -> dict:
     """Fetch filtered rows from prod, process into local DB."""
     target_engine = create_database_engine()
     prod_engine = create_prod_engine(echo=False)
 
-    TargetSession = sessionmaker(bind=target_engine)
-    target_session = TargetSession()
+    target_session = get_session(target_engine)
 
     try:
         client = target_session.query(Client).filter(
@@ -149,49 +195,74 @@ def process_prod_query(client_identifier: str, employee_identifier: str | None =
         if not client:
             return {"success": False, "error": f"Client '{client_identifier}' not found in target DB"}
 
+        # Single-employee reruns are ad hoc and leave the sync state alone
+        window = None
+        if incremental and not employee_identifier:
+            company_employees = reflect_prod_tables(prod_engine)[0]
+            window = begin_sync(
+                target_session, client.cif, SCOPE_EMPLOYEES, full=full_reconcile, tables=(company_employees,)
+            )
+        watermark = window.watermark if window else None
+        rows_fetched = 0
+
         ctx = VidaLaboralContext(create_employees=True)
         row_count = 0
         rows_skipped_missing_location_ccc = 0
         seen_company_employee_ids: set[object] = set()
 
-        with prod_engine.connect() as conn:
-            stmt = build_prod_query(prod_engine, company_identifier=client_identifier, employee_identifier=employee_identifier)
-            result = conn.execute(stmt)
-            for row in result.mappings():  # returns RowMapping
-                # Optional: skip if row company doesn't match selected client
-                if row.get("Companies__cif") and row["Companies__cif"] != client.cif:
-                    continue
-
-                company_employee_id = row.get("id")
-                if company_employee_id is not None:
-                    if company_employee_id in seen_company_employee_ids:
-                        raise ValueError(
-                            "Prod query returned duplicate rows for the same company_employees.id="
-                            f"{company_employee_id!r}. This usually indicates a join fan-out."
+        with prod_engine.connect() as conn, deferred_coverage_refresh(target_session):
+            stmt = build_prod_query(
+                prod_engine,
+                company_identifier=client_identifier,
+                employee_identifier=employee_identifier,
+                changed_since=window.since if window else None,
+            )
+            result = conn.execution_options(yield_per=PROD_BATCH_SIZE).execute(stmt)
+            for partition in result.mappings().partitions():
+                rows_fetched += len(partition)
+                watermark = latest_change(partition, watermark)
+                batch = []
+                for row in partition:  # RowMapping
+                    # Optional: skip if row company doesn't match selected client
+                    if row.get("Companies__cif") and row["Companies__cif"] != client.cif:
+                        continue
+
+                    company_employee_id = row.get("id")
+                    if company_employee_id is not None:
+                        if company_employee_id in seen_company_employee_ids:
+                            raise ValueError(
+                                "Prod query returned duplicate rows for the same company_employees.id="
+                                f"{company_employee_id!r}. This usually indicates a join fan-out."
+                            )
+                        seen_company_employee_ids.add(company_employee_id)
+
+                    # Option A1: skip rows that cannot be tied to a single CCC via employee_location.
+                    ccc = (row.get("ccc_ss") or "").strip()
+                    if not ccc:
+                        rows_skipped_missing_location_ccc += 1
+                        print(
+                            "⚠️  Skipping prod employment record with missing CCC/location: "
+                            f"company_employees.id={company_employee_id!r}, "
+                            f"identity={row.get('identity_card_number')!r}, "
+                            f"ss_number={row.get('ss_number')!r}, "
+                            f"employee_location={row.get('employee_location')!r}, "
+                            f"location_id={row.get('location_id')!r}"
                         )
-                    seen_company_employee_ids.add(company_employee_id)
-
-                # Option A1: skip rows that cannot be tied to a single CCC via employee_location.
-                ccc = (row.get("ccc_ss") or "").strip()
-                if not ccc:
-                    rows_skipped_missing_location_ccc += 1
-                    print(
-                        "⚠️  Skipping prod employment record with missing CCC/location: "
-                        f"company_employees.id={company_employee_id!r}, "
-                        f"identity={row.get('identity_card_number')!r}, "
-                        f"ss_number={row.get('ss_number')!r}, "
-                        f"employee_location={row.get('employee_location')!r}, "
-                        f"location_id={row.get('location_id')!r}"
-                    )
-                    continue
-
-                mapped = map_row(dict(row))
-                vida_laboral.process_row(target_session, client.id, mapped, ctx)
-                row_count += 1
+                        continue
+
+                    batch.append(map_row(dict(row)))
+
+                # One index (held by ctx) spans the batches; each batch is preloaded and flushed
+                row_count += vida_laboral.process_rows(target_session, client.id, batch, ctx)
+
+        if window is not None:
+            finish_sync(target_session, window, watermark, rows=rows_fetched)
 
         target_session.commit()
         return {
             "success": True,
+            "full_sync": window.full if window else True,
+            "rows_fetched": rows_fetched,
             "rows_processed": row_count,
             "rows_skipped_missing_location_ccc": rows_skipped_missing_location_ccc,
             "employees_created": ctx.employees_created,
@@ -14,6 +14,9 @@ Usage:
 
     # Skip mode - only match existing employees, don't create new ones
     python scripts/reprocess_vida_laboral.py path/to/vida_laboral.csv "Company Name" --skip-create-employees
+
+    # Delta mode - only movements not seen in a previous import
+    python scripts/reprocess_vida_laboral.py path/to/vida_laboral.csv "Company Name" --delta
 """
 
 import os
@@ -25,18 +28,19 @@ from pathlib import Path
 # Add parent directory to path to import core module
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy.orm import sessionmaker
-
-from core.database import create_database_engine
-from core.models import Client
+from core.database import create_database_engine, get_session
+from core.employee_coverage import deferred_coverage_refresh
+from core.models import Client, VidaLaboralMovement
 import core.vida_laboral as vida_laboral
 from core.vida_laboral import VidaLaboralContext
+from core.vida_laboral_delta import process_rows_delta
 
 
 def process_vida_laboral_csv(
     csv_path: str,
     client_identifier: str,
-    create_employees: bool = True
+    create_employees: bool = True,
+    delta: bool = False
 ) -> dict:
     """
     Process vida laboral CSV file and create employee periods.
@@ -45,6 +49,7 @@ def process_vida_laboral_csv(
         csv_path: Path to the vida laboral CSV file
         client_identifier: Client name or CIF to assign employees to
         create_employees: If True, create new employees; if False, only match existing
+        delta: If True, only process movements not imported before (or changed since)
 
     Returns:
         Dict with processing results
@@ -58,8 +63,9 @@ def process_vida_laboral_csv(
 
     # Create database connection
     engine = create_database_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    if delta:
+        VidaLaboralMovement.__table__.create(engine, checkfirst=True)
+    session = get_session(engine)
 
     try:
         # Find client by name or CIF
@@ -79,7 +85,8 @@ def process_vida_laboral_csv(
         print(f"{'='*70}")
         print(f"File: {csv_path}")
         print(f"Client: {client.name} ({client.cif})")
-        print(f"Mode: {'CREATE EMPLOYEES' if create_employees else 'MATCH EXISTING ONLY'}")
+        print(f"Mode: {'CREATE EMPLOYEES' if create_employees else 'MATCH EXISTING ONLY'}"
+              f"{' (DELTA)' if delta else ''}")
         print(f"{'='*70}\n")
 
         # Create context
@@ -87,13 +94,16 @@ def process_vida_laboral_csv(
             create_employees=create_employees
         )
 
-        # Process CSV
-        row_count = 0
-        with open(csv_path, 'r', encoding='utf-8') as f:
+        # Process CSV against a preloaded index; one flush and one coverage
+        # refresh for the whole file
+        with open(csv_path, 'r', encoding='utf-8') as f, deferred_coverage_refresh(session):
             reader = csv.DictReader(f)
-            for row in reader:
-                vida_laboral.process_row(session, client.id, row, context)
-                row_count += 1
+            if delta:
+                delta_report = process_rows_delta(session, client.id, reader, context)
+                row_count = delta_report["rows"]
+            else:
+                delta_report = None
+                row_count = vida_laboral.process_rows(session, client.id, reader, context)
 
         # Commit changes
         session.commit()
@@ -108,6 +118,17 @@ def process_vida_laboral_csv(
         print(f"Vacation periods: {context.vacation_periods_created}")
         if not create_employees:
             print(f"Employees not found (skipped): {context.employees_not_found}")
+        if delta_report is not None:
+            print(
+                f"Delta: {delta_report['new']} new, {delta_report['changed']} changed, "
+                f"{delta_report['unchanged']} unchanged, {delta_report['skipped']} skipped movements"
+            )
+            for movement in delta_report["disappeared"]:
+                print(
+                    f"⚠️  Disappeared: {movement['situacion']} {movement['naf'] or movement['documento']} "
+                    f"(CCC {movement['ccc']}, {movement['f_real_alta']} / {movement['f_efecto_alta']} / "
+                    f"{movement['f_real_sit']})"
+                )
         print(f"{'='*70}\n")
 
         return {
@@ -119,7 +140,8 @@ def process_vida_laboral_csv(
             "employees_updated": context.employees_updated,
             "periods_created": context.periods_created,
             "vacation_periods_created": context.vacation_periods_created,
-            "employees_not_found": context.employees_not_found
+            "employees_not_found": context.employees_not_found,
+            "delta": delta_report
         }
 
     except Exception as e:
@@ -169,13 +191,20 @@ Examples:
         help='Only match existing employees, do not create new ones'
     )
 
+    parser.add_argument(
+        '--delta',
+        action='store_true',
+        help='Only process movements not imported before (or changed since); report disappeared ones'
+    )
+
     args = parser.parse_args()
 
     # Process the CSV
     result = process_vida_laboral_csv(
         csv_path=args.csv_path,
         client_identifier=args.client,
-        create_employees=not args.skip_create_employees
+        create_employees=not args.skip_create_employees,
+        delta=args.delta
     )
 
     # Exit with appropriate code
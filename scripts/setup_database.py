@@ -21,8 +21,10 @@ from core.models import (
 )
 from core.database import (
     create_database_engine, ensure_documents_directory,
-    BASIC_NOMINA_CONCEPTS
+    BASIC_NOMINA_CONCEPTS, CREATE_PAYROLL_UNIQUE_INDEX_SQL
 )
+from core.checklist import CREATE_CHECKLIST_UNIQUE_INDEX_SQL
+from core.employee_coverage import ensure_employee_coverage
 
 
 def create_tables(engine):
@@ -48,10 +50,12 @@ def create_indexes(engine):
         Index('idx_documents_employee_id', Document.employee_id),
         Index('idx_documents_status', Document.status),
         Index('idx_payrolls_employee_id', Payroll.employee_id),
+        Index('idx_payrolls_employee_period', Payroll.employee_id, Payroll.period_start, Payroll.period_end),
         Index('idx_payrolls_created_at', Payroll.created_at),
         Index('idx_payroll_lines_payroll_id', PayrollLine.payroll_id),
         Index('idx_payroll_lines_category', PayrollLine.category),
         Index('idx_payroll_lines_concept', PayrollLine.concept),
+        Index('idx_payroll_lines_concept_id', PayrollLine.concept_id),
         Index('idx_checklist_items_client_id', ChecklistItem.client_id),
         Index('idx_checklist_items_status', ChecklistItem.status),
         Index('idx_checklist_items_due_date', ChecklistItem.due_date),
@@ -77,14 +81,8 @@ def create_indexes(engine):
             conn.commit()
 
             # Create new constraint including liquido_a_percibir
-            conn.execute(text("""
-                CREATE UNIQUE INDEX idx_unique_employee_period_amount
-                ON payrolls (employee_id, (periodo->>'desde'), (periodo->>'hasta'), liquido_a_percibir)
-                WHERE periodo IS NOT NULL
-                  AND periodo->>'desde' IS NOT NULL
-                  AND periodo->>'hasta' IS NOT NULL
-                  AND liquido_a_percibir IS NOT NULL
-            """))
+            # Also the conflict target of insert_payroll_if_new
+            conn.execute(CREATE_PAYROLL_UNIQUE_INDEX_SQL)
             conn.commit()
             print("✓ Unique payroll constraint created successfully!")
             print("   (Allows same period with different liquido_a_percibir)")
@@ -92,6 +90,16 @@ def create_indexes(engine):
             if 'already exists' not in str(e).lower():
                 print(f"Warning: Could not create unique payroll constraint: {e}")
 
+        # Conflict target of the missing payslips checklist upsert
+        print("Creating unique constraint for checklist items...")
+        try:
+            conn.execute(CREATE_CHECKLIST_UNIQUE_INDEX_SQL)
+            conn.commit()
+            print("✓ Unique checklist item constraint created successfully!")
+        except Exception as e:
+            conn.rollback()
+            print(f"Warning: Could not create unique checklist item constraint: {e}")
+
     print("✓ Database indexes created successfully!")
 
 
@@ -123,6 +131,13 @@ def seed_nomina_concepts(engine):
         session.close()
 
 
+def build_employee_coverage(engine):
+    """Build employee_month_coverage for employees that have none (new table or existing database)"""
+    print("Building employee month coverage...")
+    refreshed = ensure_employee_coverage(engine)
+    print(f"✓ Employee month coverage built for {refreshed} employees!")
+
+
 def create_basic_views(engine):
     """Create essential views for reporting"""
     print("Creating database views...")
@@ -135,7 +150,7 @@ def create_basic_views(engine):
             SELECT
                 p.id,
                 p.employee_id,
-                COALESCE((p.periodo->>'hasta')::date, (p.periodo->>'desde')::date) AS period_date
+                COALESCE(p.period_end, p.period_start) AS period_date
             FROM payrolls p
         ),
         active_employees AS (
@@ -169,7 +184,7 @@ def create_basic_views(engine):
             SELECT
                 p.id,
                 p.employee_id,
-                COALESCE((p.periodo->>'hasta')::date, (p.periodo->>'desde')::date) AS period_date,
+                COALESCE(p.period_end, p.period_start) AS period_date,
                 p.devengo_total,
                 p.deduccion_total,
                 p.aportacion_empresa_total,
@@ -212,7 +227,9 @@ def create_basic_views(engine):
         for view_sql in views:
             try:
                 conn.execute(text(view_sql))
+                conn.commit()
             except Exception as e:
+                conn.rollback()
                 print(f"Warning: Could not create view: {e}")
 
     print("✓ Database views created successfully!")
@@ -241,6 +258,7 @@ def main():
         create_tables(engine)
         create_indexes(engine)
         seed_nomina_concepts(engine)
+        build_employee_coverage(engine)
         create_basic_views(engine)
 
         # Create documents directory (optional)
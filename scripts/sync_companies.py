@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Sync production companies and their locations into the local database.
+
+Fetches the companies and locations of every requested CIF with IN-batched
+queries, upserts Client/ClientLocation rows with INSERT ... ON CONFLICT and
+commits per chunk, instead of one main.py run per CIF.
+
+Usage:
+    python scripts/sync_companies.py --cif B12345678 [--cif B87654321 ...]
+    python scripts/sync_companies.py --all --chunk-size 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import create_database_engine, get_session
+from core.production_models import (
+    SYNC_COMPANIES_CHUNK,
+    create_production_engine,
+    create_production_session,
+    sync_companies,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Upsert production companies and locations into local clients")
+    parser.add_argument("--cif", action="append", default=[], help="Company CIF (repeatable)")
+    parser.add_argument("--cifs-file", default=None, help="File with one CIF per line")
+    parser.add_argument("--all", action="store_true", help="Sync every production company")
+    parser.add_argument("--chunk-size", type=int, default=SYNC_COMPANIES_CHUNK, help="Companies per batch and commit")
+    parser.add_argument("--skip-existing", action="store_true", help="Leave existing locations untouched")
+    parser.add_argument("--include-deleted-locations", action="store_true", help="Also sync deleted locations")
+    parser.add_argument("--db-url", default=None, help="Local database URL (defaults to POSTGRES_* env vars)")
+    parser.add_argument("--prod-url", default=None, help="Production database URL (defaults to PROD_URL)")
+    args = parser.parse_args()
+
+    cifs = list(args.cif)
+    if args.cifs_file:
+        with open(args.cifs_file, encoding="utf-8") as handle:
+            cifs += [line.strip() for line in handle if line.strip()]
+    if not args.all and not cifs:
+        parser.error("pass --cif, --cifs-file or --all")
+
+    prod_session = create_production_session(create_production_engine(args.prod_url))
+    local_session = get_session(create_database_engine(database_url=args.db_url))
+    try:
+        result = sync_companies(
+            "all" if args.all else cifs,
+            prod_session,
+            local_session,
+            chunk_size=args.chunk_size,
+            skip_existing=args.skip_existing,
+            include_deleted_locations=args.include_deleted_locations,
+        )
+    finally:
+        local_session.close()
+        prod_session.close()
+
+    for cif in result["missing_cifs"]:
+        print(f"⚠️  {cif}: not found in production")
+    print(
+        f"🏢 {result['companies_synced']} companies, {result['locations_synced']} locations upserted "
+        f"in {result['elapsed_seconds']:.1f}s ({result['rows_per_second'] or 0:,.0f} rows/s)"
+    )
+    return 1 if result["missing_cifs"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Sync checklist items with the missing payslips report.
+
+For each client, upserts one checklist item per missing payslip month and
+needed finiquito, and marks pending items whose payroll has arrived as
+received. Commits once per client.
+
+Usage:
+    python scripts/sync_missing_payslips_checklist.py --client-id UUID [--client-id UUID ...]
+    python scripts/sync_missing_payslips_checklist.py --all-clients --last-month 12/2025 --set-based
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.checklist import CREATE_CHECKLIST_UNIQUE_INDEX_SQL, sync_missing_payslips_checklist
+from core.database import create_database_engine, get_session
+from core.models import Client
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Upsert checklist items from the missing payslips report")
+    parser.add_argument("--client-id", action="append", default=[], help="Client UUID (repeatable)")
+    parser.add_argument("--all-clients", action="store_true", help="Sync every active client")
+    parser.add_argument("--last-month", default=None, help="Cutoff month MM/YYYY")
+    parser.add_argument("--start-month", default=None, help="Start month MM/YYYY")
+    parser.add_argument("--set-based", action="store_true", help="Use the single-query detection engine")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per upsert batch")
+    parser.add_argument("--dry-run", action="store_true", help="Roll back instead of committing")
+    parser.add_argument("--db-url", default=None, help="Database URL (defaults to POSTGRES_* env vars)")
+    args = parser.parse_args()
+
+    engine = create_database_engine(database_url=args.db_url)
+    with engine.begin() as conn:
+        conn.execute(CREATE_CHECKLIST_UNIQUE_INDEX_SQL)
+
+    session = get_session(engine)
+    try:
+        client_ids = list(args.client_id)
+        if args.all_clients:
+            client_ids += [str(c.id) for c in session.query(Client.id).filter(Client.active.is_(True))]
+        if not client_ids:
+            parser.error("pass --client-id or --all-clients")
+
+        total_items = total_received = failed = 0
+        start = time.perf_counter()
+        for client_id in client_ids:
+            result = sync_missing_payslips_checklist(
+                session,
+                client_id=client_id,
+                last_month=args.last_month,
+                start_month=args.start_month,
+                set_based=args.set_based,
+                batch_size=args.batch_size,
+            )
+            if not result["success"]:
+                session.rollback()
+                failed += 1
+                print(f"❌ {client_id}: {result.get('error')}")
+                continue
+
+            if args.dry_run:
+                session.rollback()
+            else:
+                session.commit()
+            total_items += result["items_upserted"]
+            total_received += result["items_received"]
+            print(f"✅ {client_id}: {result['message']}")
+
+        elapsed = time.perf_counter() - start
+        rate = total_items / elapsed if elapsed else 0
+        print(
+            f"\n📋 {len(client_ids)} client(s), {failed} failed: {total_items} items upserted, "
+            f"{total_received} received in {elapsed:.1f}s ({rate:,.0f} items/s)"
+            f"{' [dry run]' if args.dry_run else ''}"
+        )
+        return 1 if failed else 0
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
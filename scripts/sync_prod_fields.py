@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Copy fields from production into the local database.
+
+Runs the declarative syncs in core.field_sync (birth dates, SSNs, postal
+codes): production rows are streamed per chunk of local keys, diffed in
+memory and only changed fields are written with bulk updates. Commits once
+per sync.
+
+Usage:
+    python scripts/sync_prod_fields.py --sync employee_birth_dates --sync location_postal_codes
+    python scripts/sync_prod_fields.py --all --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import create_database_engine, get_session
+from core.field_sync import FIELD_SYNC_BATCH, FIELD_SYNCS, run_field_sync
+from core.production_models import create_production_engine, create_production_session
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Copy changed fields from production into local tables")
+    parser.add_argument("--sync", action="append", default=[], choices=sorted(FIELD_SYNCS), help="Sync to run (repeatable)")
+    parser.add_argument("--all", action="store_true", help="Run every sync")
+    parser.add_argument("--batch-size", type=int, default=FIELD_SYNC_BATCH, help="Keys per source query and rows per update")
+    parser.add_argument("--dry-run", action="store_true", help="Roll back instead of committing")
+    parser.add_argument("--db-url", default=None, help="Local database URL (defaults to POSTGRES_* env vars)")
+    parser.add_argument("--prod-url", default=None, help="Production database URL (defaults to PROD_URL)")
+    args = parser.parse_args()
+
+    names = sorted(FIELD_SYNCS) if args.all else args.sync
+    if not names:
+        parser.error("pass --sync or --all")
+
+    prod_session = create_production_session(create_production_engine(args.prod_url))
+    local_session = get_session(create_database_engine(database_url=args.db_url))
+    try:
+        for name in names:
+            result = run_field_sync(FIELD_SYNCS[name], prod_session, local_session, batch_size=args.batch_size)
+            if args.dry_run:
+                local_session.rollback()
+            else:
+                local_session.commit()
+            fields = ", ".join(f"{field}={count}" for field, count in result["fields_changed"].items())
+            print(
+                f"🔄 {name}: {result['changed']} changed ({fields}), {result['unchanged']} unchanged, "
+                f"{result['unmatched']} without prod match, {result['matched_null']} with empty prod values "
+                f"- {result['local_rows']} rows in {result['elapsed_seconds']:.1f}s "
+                f"({result['rows_per_second'] or 0:,.0f} rows/s){' [dry run]' if args.dry_run else ''}"
+            )
+        return 0
+    finally:
+        local_session.close()
+        prod_session.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+"""
+Shared fixtures for the SQLite-backed tests: migrated engines and sessions,
+the EMPRESA SL client seed and a Payroll factory.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import core.database  # noqa: F401 - registers the flush hooks
+from core.models import Base, Client, ClientLocation, Employee, Payroll
+
+CLIENT_ID = uuid.UUID("5f0c6a1e-8b7d-4c2a-9e3f-a1b2c3d4e5f6")
+
+
+@pytest.fixture
+def make_engine():
+    """Create an engine with every local table; in memory unless a URL is given."""
+    engines = []
+
+    def make(url="sqlite:///:memory:"):
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def engine(make_engine):
+    return make_engine()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client_id():
+    """Id of the EMPRESA SL client added by seed_client."""
+    return CLIENT_ID
+
+
+@pytest.fixture
+def seed_client(client_id):
+    """
+    Add EMPRESA SL (B12345678) to a session, with location 1 (CCC 28111111111)
+    and employee 1, JUAN GARCIA (12345678Z, NAF 281234567890), unless turned off.
+
+    Flushes and returns the client.
+    """
+    def seed(session, location=True, employee=True):
+        client = Client(id=client_id, name="EMPRESA SL", cif="B12345678")
+        session.add(client)
+        if location:
+            session.add(ClientLocation(id=1, company_id=client_id, ccc_ss="28111111111"))
+        if employee:
+            session.add(Employee(id=1, first_name="JUAN", last_name="GARCIA", identity_card_number="12345678Z",
+                                 ss_number="281234567890"))
+        session.flush()
+        return client
+
+    return seed
+
+
+@pytest.fixture
+def make_payroll():
+    """Build a Payroll whose NOT NULL totals default to a devengo == liquido payslip."""
+    def make(employee_id=1, desde=None, hasta=None, type_="payslip", devengo=1000, **values):
+        return Payroll(**{
+            "employee_id": employee_id, "type": type_, "periodo": {"desde": desde, "hasta": hasta},
+            "devengo_total": devengo, "deduccion_total": 0, "aportacion_empresa_total": 0,
+            "liquido_a_percibir": devengo, "prorrata_pagas_extra": 0, "base_cc": 0, "base_at_ep": 0,
+            "base_irpf": 0, "tipo_irpf": 0, **values,
+        })
+
+    return make
@@ -0,0 +1,97 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from core.database import (
+    get_employee_devengo_total,
+    get_employee_devengo_total_batch,
+    get_payroll_line_aggregates,
+    get_payroll_line_aggregates_batch,
+    list_employee_ssns_for_company_period,
+    list_employee_ssns_for_company_periods,
+)
+from core.models import ClientLocation, Employee, EmployeePeriod, PayrollLine
+
+
+def _line(payroll_id, category, concept, amount):
+    return PayrollLine(payroll_id=payroll_id, category=category, concept=concept, amount=amount,
+                       is_taxable_income=True, is_taxable_ss=True, is_sickpay=False, is_in_kind=False,
+                       is_pay_advance=False, is_seizure=False)
+
+
+def _seed(session, seed_client, make_payroll):
+    client = seed_client(session)
+    session.add(ClientLocation(id=2, company_id=client.id, ccc_ss="28222222222"))
+    session.add(Employee(id=2, first_name="ANA", last_name="PEREZ", identity_card_number="87654321X",
+                         ss_number="289876543210"))
+    session.add_all([
+        EmployeePeriod(employee_id=1, location_id=1, period_begin_date=date(2024, 1, 1), period_type="alta"),
+        EmployeePeriod(employee_id=2, location_id=2, period_begin_date=date(2025, 1, 1),
+                       period_end_date=date(2025, 2, 10), period_type="baja"),
+    ])
+    session.add_all([
+        make_payroll(1, "2025-01-01", "2025-01-31", devengo=1000),
+        make_payroll(1, "2025-02-01", "2025-02-28", devengo=1100),
+        make_payroll(2, "2025-02-01", "2025-02-10", devengo=400),
+        # No lines: counted as a payroll, contributes no totals
+        make_payroll(2, "2025-01-01", "2025-01-31", devengo=1200),
+    ])
+    session.flush()
+    session.add_all([
+        _line(1, "devengo", "SALARIO BASE", 900),
+        _line(1, "devengo", "PLUS TRANSPORTE", 100),
+        _line(1, "deduccion", "IRPF", 150),
+        _line(2, "devengo", "SALARIO BASE", 1100),
+        _line(3, "aportacion_empresa", "CONTINGENCIAS COMUNES", 95),
+    ])
+    session.commit()
+
+
+REQUESTS = [
+    ("281234567890", "28111111111", "2025-01"),
+    ("28 1234567890", "28111111111", "2025-01-01/2025-02-28"),
+    ("281234567890", "28222222222", "2025-01"),  # No period at that CCC
+    ("289876543210", "28222222222", "2025-01"),
+    ("289876543210", "28222222222", "2025-02"),
+    ("289876543210", "28222222222", "2025-03"),  # Period ended
+    ("280000000000", "28111111111", "2025-01"),  # Unknown employee
+    ("281234567890", "28999999999", "2025-01"),  # Unknown CCC
+]
+
+
+def test_batch_queries_match_single_requests(engine, session, seed_client, make_payroll):
+    _seed(session, seed_client, make_payroll)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    devengo = get_employee_devengo_total_batch(session, REQUESTS + REQUESTS[:2])
+    aggregates = get_payroll_line_aggregates_batch(session, REQUESTS)
+    event.remove(engine, "before_cursor_execute", record)
+    # One statement per batch
+    assert len(statements) == 2
+
+    assert set(devengo) == set(aggregates) == set(REQUESTS)
+    for request in REQUESTS:
+        assert devengo[request] == get_employee_devengo_total(session, *request)
+        assert aggregates[request] == get_payroll_line_aggregates(session, *request)
+        for kwargs in ({"concepto_filter": "salario"}, {"category_type": "aportacion empresa"}):
+            filtered = get_payroll_line_aggregates_batch(session, [request], **kwargs)[request]
+            assert filtered == get_payroll_line_aggregates(session, *request, **kwargs)
+
+    assert aggregates[REQUESTS[1]]["totals"] == {"devengo": Decimal("2100.00"), "deduccion": Decimal("150.00")}
+    # A payroll without lines still counts
+    assert (aggregates[REQUESTS[3]]["payroll_count"], aggregates[REQUESTS[3]]["totals"]) == (1, {})
+    assert aggregates[REQUESTS[4]]["totals"] == {"aportacion_empresa": Decimal("95.00")}
+
+    cccs = ["28111111111", "28222222222", "28999999999"]
+    for period in ("2025-01", "2025-03"):
+        by_ccc = list_employee_ssns_for_company_periods(session, period, cccs)
+        assert {ccc: sorted(ssns) for ccc, ssns in by_ccc.items()} == {
+            ccc: sorted(list_employee_ssns_for_company_period(session, period, ccc)) for ccc in cccs
+        }
+    assert list_employee_ssns_for_company_periods(session, "2025-03", cccs)["28222222222"] == []
@@ -0,0 +1,66 @@
+from datetime import date
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+import scripts.update_employee_birth_dates_from_prod as birth_dates
+from core.models import Employee
+from core.production_models import ProductionBase, ProductionEmployee
+
+
+def _prod_employee(id_, ss_number, birth_date):
+    return ProductionEmployee(
+        id=id_, company_id="c1", first_name="A", last_name="B", identity_card_number=f"{id_}X",
+        ss_number=ss_number, birth_date=birth_date, address="x", phone="x", mail="x",
+        begin_date=date(2024, 1, 1), salary=1000, role="x",
+    )
+
+
+def test_sync_birth_dates_writes_set_based(tmp_path, monkeypatch, make_engine):
+    local = make_engine(f"sqlite:///{tmp_path / 'local.db'}")
+    prod = create_engine(f"sqlite:///{tmp_path / 'prod.db'}")
+    ProductionBase.metadata.create_all(prod, tables=[ProductionEmployee.__table__])
+
+    with Session(prod) as session:
+        session.add_all([
+            _prod_employee(1, "281111111111", date(1980, 5, 1)),
+            _prod_employee(2, "282222222222", date(1985, 6, 2)),
+            _prod_employee(3, "283333333333", None),
+        ])
+        session.commit()
+    with Session(local) as session:
+        session.add_all([
+            Employee(id=1, first_name="A", last_name="B", identity_card_number="1", ss_number="28 1111111111"),
+            Employee(id=2, first_name="A", last_name="B", identity_card_number="2", ss_number="282222222222",
+                     birth_date=date(1985, 6, 2)),
+            Employee(id=3, first_name="A", last_name="B", identity_card_number="3", ss_number="283333333333"),
+            Employee(id=4, first_name="A", last_name="B", identity_card_number="4", ss_number="284444444444",
+                     birth_date=date(1970, 1, 1)),
+            Employee(id=5, first_name="A", last_name="B", identity_card_number="5", ss_number="285555555555"),
+            Employee(id=6, first_name="A", last_name="B", identity_card_number="6"),
+        ])
+        session.commit()
+
+    updates = []
+    event.listen(local, "before_cursor_execute", lambda conn, cursor, statement, *args: (
+        updates.append(statement) if statement.lstrip().upper().startswith(("UPDATE", "WITH")) else None
+    ))
+    monkeypatch.setattr(birth_dates, "get_session", lambda echo=False: Session(local))
+    monkeypatch.setattr(birth_dates, "create_production_session", lambda: Session(prod))
+
+    result = birth_dates.sync_birth_dates(batch_size=2)
+    assert result["success"], result
+    assert (result["updated_from_prod"], result["defaulted"], result["unchanged"]) == (1, 2, 2)
+    assert (result["missing_prod"], result["missing_prod_birth_date"]) == (2, 1)
+    # One VALUES update for the single change, one for the default
+    assert len(updates) == 2
+
+    with Session(local) as session:
+        assert dict(session.query(Employee.id, Employee.birth_date)) == {
+            1: date(1980, 5, 1),
+            2: date(1985, 6, 2),
+            3: birth_dates.DEFAULT_BIRTH_DATE,
+            4: date(1970, 1, 1),
+            5: birth_dates.DEFAULT_BIRTH_DATE,
+            6: None,
+        }
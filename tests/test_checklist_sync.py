@@ -0,0 +1,78 @@
+from datetime import date
+
+from core.checklist import (
+    CREATE_CHECKLIST_UNIQUE_INDEX_SQL,
+    mark_checklist_items_received,
+    sync_missing_payslips_checklist,
+)
+from core.models import ChecklistItem, Employee, EmployeePeriod
+
+
+def _items(session):
+    return sorted(
+        (item.item_type, item.period_year, item.period_month, item.status, item.payroll_id)
+        for item in session.query(ChecklistItem)
+    )
+
+
+def test_checklist_sync_upserts_and_tracks_received_payrolls(engine, session, seed_client, make_payroll):
+    with engine.begin() as conn:
+        conn.execute(CREATE_CHECKLIST_UNIQUE_INDEX_SQL)
+
+    client_id = seed_client(session).id
+    session.add(EmployeePeriod(employee_id=1, location_id=1, period_begin_date=date(2025, 1, 1),
+                               period_end_date=date(2025, 3, 20), period_type="baja"))
+    session.add(make_payroll(1, "2025-01-01", "2025-01-31"))
+    session.commit()
+
+    result = sync_missing_payslips_checklist(session, client_id=client_id, last_month="03/2025")
+    session.commit()
+    assert result["items_upserted"] == 3
+    pending = [
+        ("payslip", 2025, 2, "pending", None),
+        ("payslip", 2025, 3, "pending", None),
+        ("settlement", 2025, 3, "pending", None),
+    ]
+    assert _items(session) == pending
+
+    # Re-running updates in place instead of duplicating
+    sync_missing_payslips_checklist(session, client_id=client_id, last_month="03/2025")
+    session.commit()
+    assert _items(session) == pending
+
+    # A settlement for March covers both the March payslip and the finiquito
+    settlement = make_payroll(1, None, "2025-03-20", type_="settlement")
+    session.add(settlement)
+    session.commit()
+    result = sync_missing_payslips_checklist(session, client_id=client_id, last_month="03/2025")
+    session.commit()
+    assert result["items_received"] == 2
+    assert _items(session) == [
+        ("payslip", 2025, 2, "pending", None),
+        ("payslip", 2025, 3, "received", settlement.id),
+        ("settlement", 2025, 3, "received", settlement.id),
+    ]
+
+    # Items reopen when their payroll goes away
+    session.delete(settlement)
+    session.commit()
+    sync_missing_payslips_checklist(session, client_id=client_id, last_month="03/2025")
+    session.commit()
+    assert _items(session) == pending
+
+
+def test_mark_received_is_scoped_to_the_given_employees(session, seed_client, make_payroll):
+    client_id = seed_client(session).id
+    session.add(Employee(id=2, first_name="ANA", last_name="PEREZ", identity_card_number="87654321X"))
+    for employee_id in (1, 2):
+        session.add(ChecklistItem(client_id=client_id, employee_id=employee_id, item_type="payslip",
+                                  description="Nómina", period_year=2025, period_month=2, status="pending"))
+        session.add(make_payroll(employee_id, "2025-02-01", "2025-02-28"))
+    session.commit()
+
+    assert mark_checklist_items_received(session, employee_ids=[2]) == 1
+    assert mark_checklist_items_received(session, employee_ids=[]) == 0
+    session.commit()
+    assert sorted((item.employee_id, item.status) for item in session.query(ChecklistItem)) == [
+        (1, "pending"), (2, "received"),
+    ]
@@ -0,0 +1,73 @@
+from core.vision_model.document_parser.compact_models import (
+    CompactUnifiedResponse,
+    compact_unified,
+    expand_unified,
+)
+from core.vision_model.payslips.compact_models import CompactPayslipData, expand_payslip
+from core.vision_model.settlements.settlement_models import SettlementData
+
+COMPACT_PAYSLIP = {
+    "e": {"n": "EMPRESA SL", "c": "B12345678"},
+    "w": {"n": "GARCIA LOPEZ JUAN", "d": "12345678Z", "ss": "281234567890"},
+    "p": {"d": "2025-01-01", "h": "2025-01-31", "n": 30},
+    "dv": [["SALARIO BASE", "Salario base", 1500.0, None, "TS"]],
+    "dd": [["IRPF", "IRPF", 150.1, 10.0, ""]],
+    "ap": [["CONT. COMUNES", "Contingencias comunes", 1500.0, 23.6, 354.0]],
+    "t": {"dv": 1500.0, "dd": 150.1, "lq": 1349.9, "ap": 354.0, "fin": False},
+    "fd": "2025-01-31",
+    "wr": [],
+}
+
+
+def test_expand_payslip_rebuilds_full_model():
+    payslip = expand_payslip(CompactPayslipData.model_validate(COMPACT_PAYSLIP))
+
+    assert payslip.trabajador.dni == "12345678Z"
+    assert payslip.periodo.dias == 30
+    devengo = payslip.devengo_items[0]
+    assert devengo.importe == 1500.0
+    assert devengo.item_type.ind_tributa_IRPF is True
+    assert devengo.item_type.ind_cotiza_ss is True
+    assert devengo.item_type.ind_is_especie is False
+    assert payslip.deduccion_items[0].tipo == 10.0
+    assert payslip.aportacion_empresa_items[0].importe == 354.0
+    assert payslip.totales.liquido_a_percibir == 1349.9
+    assert payslip.totales.contains_settlement is False
+
+
+def test_unified_round_trip_is_lossless():
+    full = expand_unified(
+        CompactUnifiedResponse.model_validate(
+            {
+                "docs": [
+                    {"k": "payslip", "d": COMPACT_PAYSLIP},
+                    {
+                        "k": "settlement",
+                        "d": {
+                            "e": {"n": "EMPRESA SL"},
+                            "w": {"d": "12345678Z"},
+                            "fc": "2025-01-31",
+                            "dv": [["VACACIONES NO DISFRUTADAS", "Vacaciones", 300.0, None, "TSF"]],
+                            "t": {"dv": 300.0, "dd": 0.0, "lq": 300.0, "ap": 0.0},
+                        },
+                    },
+                ],
+                "wr": ["two documents"],
+            }
+        )
+    )
+
+    assert [d.type for d in full.logical_documents] == ["payslip", "settlement"]
+    assert isinstance(full.logical_documents[1].data, SettlementData)
+    assert full.logical_documents[1].data.devengo_items[0].item_type.ind_settlement_item is True
+
+    again = expand_unified(compact_unified(full))
+    assert again == full
+    assert len(compact_unified(full).model_dump_json()) < len(full.model_dump_json())
+
+
+def test_missing_positions_default_to_none():
+    compact = dict(COMPACT_PAYSLIP, dv=[["PLUS", "Plus", 10.0]])
+    payslip = expand_payslip(CompactPayslipData.model_validate(compact))
+    assert payslip.devengo_items[0].tipo is None
+    assert payslip.devengo_items[0].item_type is None
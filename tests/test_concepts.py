@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import update
+
+from core.concepts import assign_concept_ids, backfill_concept_ids
+from core.models import Concept, PayrollLine
+
+
+def _line(payroll_id, concept, **kwargs):
+    values = dict(
+        payroll_id=payroll_id, category="devengo", concept=concept, amount=Decimal("10"),
+        is_taxable_income=True, is_taxable_ss=True, is_sickpay=False, is_in_kind=False,
+        is_pay_advance=False, is_seizure=False,
+    )
+    values.update(kwargs)
+    return values
+
+
+@pytest.fixture
+def payroll(session, seed_client, make_payroll):
+    seed_client(session)
+    session.add(make_payroll(1, "2024-01-01", "2024-01-31", id=1))
+    session.commit()
+
+
+def test_lines_share_interned_concept_ids(session, payroll):
+    session.add_all([
+        PayrollLine(**_line(1, "Salario base")),
+        PayrollLine(**_line(1, "SALARIO  BASE")),
+        PayrollLine(**_line(1, "Plus transporte")),
+    ])
+    session.commit()
+
+    rows = [_line(1, "salario base"), _line(1, "Antigüedad"), _line(1, " ")]
+    assign_concept_ids(session, rows)
+    session.execute(PayrollLine.__table__.insert(), rows)
+    session.commit()
+
+    keys = dict(session.query(Concept.id, Concept.key))
+    assert sorted(keys.values()) == ["ANTIGUEDAD", "PLUS TRANSPORTE", "SALARIO BASE"]
+    assert [keys.get(concept_id) for concept_id, in session.query(PayrollLine.concept_id).order_by(PayrollLine.id)] == [
+        "SALARIO BASE", "SALARIO BASE", "PLUS TRANSPORTE", "SALARIO BASE", "ANTIGUEDAD", None,
+    ]
+
+
+def test_backfill_assigns_existing_lines(session, payroll):
+    session.execute(PayrollLine.__table__.insert(), [
+        _line(1, "Salario base"), _line(1, "Salario base"), _line(1, "Plus convenio"), _line(1, "Plus  CONVENIO"),
+    ])
+    session.commit()
+    session.add(PayrollLine(**_line(1, "Horas extra")))
+    session.commit()
+    session.execute(update(PayrollLine).where(PayrollLine.concept == "Horas extra").values(concept_id=None))
+
+    assert backfill_concept_ids(session, batch_size=2) == 4
+    session.commit()
+    assert session.query(PayrollLine).filter(PayrollLine.concept_id.is_(None)).count() == 0
+    assert session.query(Concept).count() == 3
+    assert backfill_concept_ids(session) == 0
@@ -0,0 +1,144 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.orm import Session
+
+from core.database import insert_payroll_if_new
+from core.employee_coverage import deferred_coverage_refresh, ensure_employee_coverage, rebuild_employee_coverage
+from core.missing_payslips import detect_missing_payslips, detect_missing_payslips_for_month
+from core.models import Employee, EmployeeMonthCoverage, EmployeePeriod, Payroll
+
+
+def _coverage(session):
+    return [
+        (row.employee_id, row.month.isoformat(), row.expected, row.has_payslip, row.has_settlement)
+        for row in session.scalars(
+            select(EmployeeMonthCoverage).order_by(EmployeeMonthCoverage.employee_id, EmployeeMonthCoverage.month)
+        )
+    ]
+
+
+def _seed(session, seed_client, make_payroll):
+    seed_client(session)
+    session.add(Employee(id=2, first_name="ANA", last_name="PEREZ", identity_card_number="87654321X"))
+    session.add_all([
+        EmployeePeriod(id=1, employee_id=1, location_id=1, period_begin_date=date(2025, 1, 15),
+                       period_end_date=date(2025, 3, 10), period_type="baja"),
+        EmployeePeriod(id=2, employee_id=2, location_id=1, period_begin_date=date(2025, 2, 1),
+                       period_type="alta"),
+        # Vacation periods never create expected months
+        EmployeePeriod(id=3, employee_id=2, location_id=1, period_begin_date=date(2025, 8, 1),
+                       period_end_date=date(2025, 8, 15), period_type="vacaciones"),
+    ])
+    session.add_all([
+        make_payroll(1, "2025-01-01", "2025-01-31"),
+        make_payroll(1, None, "2025-03-10", type_="settlement"),
+        make_payroll(2, "2025-02-01", "2025-02-28"),
+    ])
+    session.commit()
+
+
+@pytest.fixture
+def seeded(session, seed_client, make_payroll):
+    _seed(session, seed_client, make_payroll)
+
+
+def test_coverage_follows_flushes(engine, session, seeded):
+    employee_1 = [row for row in _coverage(session) if row[0] == 1]
+    assert employee_1 == [
+        (1, "2025-01-01", True, True, False),
+        (1, "2025-02-01", True, False, False),
+        (1, "2025-03-01", True, False, True),
+    ]
+
+    # Deleting a payroll and moving a period end both refresh coverage
+    payroll = session.query(Payroll).filter_by(employee_id=1, type="settlement").one()
+    session.delete(payroll)
+    session.get(EmployeePeriod, 1).period_end_date = date(2025, 2, 10)
+    session.commit()
+    assert [row for row in _coverage(session) if row[0] == 1] == [
+        (1, "2025-01-01", True, True, False),
+        (1, "2025-02-01", True, False, False),
+    ]
+
+    incremental = _coverage(session)
+    session.close()
+    assert incremental == _rebuilt(engine)
+
+
+def _rebuilt(engine):
+    rebuild_employee_coverage(engine)
+    with Session(engine) as session:
+        return _coverage(session)
+
+
+def test_deferred_refresh_runs_once_at_the_end(session, seeded, make_payroll):
+    with deferred_coverage_refresh(session):
+        session.add(make_payroll(2, "2025-03-01", "2025-03-31"))
+        session.flush()
+        assert (2, "2025-03-01", True, True, False) not in _coverage(session)
+    assert (2, "2025-03-01", True, True, False) in _coverage(session)
+
+
+def _payroll_values(make_payroll, desde, hasta):
+    payroll = make_payroll(2, desde, hasta)
+    values = {column.key: getattr(payroll, column.key) for column in Payroll.__table__.columns}
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def test_core_inserts_refresh_coverage(session, seeded, make_payroll):
+    assert insert_payroll_if_new(session, _payroll_values(make_payroll, "2025-03-01", "2025-03-31")) is not None
+    assert (2, "2025-03-01", True, True, False) in _coverage(session)
+
+    # Deferred Core inserts are applied when the batch commits
+    with deferred_coverage_refresh(session):
+        insert_payroll_if_new(session, _payroll_values(make_payroll, "2025-04-01", "2025-04-30"))
+        assert (2, "2025-04-01", True, True, False) not in _coverage(session)
+        session.commit()
+        assert (2, "2025-04-01", True, True, False) in _coverage(session)
+
+
+def test_detection_reads_coverage(session, seeded, client_id):
+    _assert_detection(session, client_id)
+
+
+def _assert_detection(session, client_id):
+    result = detect_missing_payslips(session, client_id=client_id, last_month="04/2025", verbose=False)
+    assert result["success"]
+    by_employee = {item["employee_id"]: item for item in result["missing_payslips"]}
+    assert by_employee[1]["missing_months"] == ["2025-02"]
+    assert by_employee[1]["finiquito_needed"] is False
+    # The open alta period stops at the cutoff
+    assert by_employee[2]["missing_months"] == ["2025-03", "2025-04"]
+    assert by_employee[2]["expected_months"] == 3
+
+    month = detect_missing_payslips_for_month(session, client_id, "03/2025")
+    assert {item["employee_id"] for item in month["missing_payslips"]} == {2}
+    assert month["summary"]["total_finiquitos_satisfied"] == 1
+
+
+def test_unmigrated_database_falls_back_until_coverage_is_built(engine, client_id, seed_client, make_payroll):
+    EmployeeMonthCoverage.__table__.drop(engine)
+    with Session(engine) as session:
+        # Flushes do not fail on a database without the coverage table
+        _seed(session, seed_client, make_payroll)
+        _assert_detection(session, client_id)
+
+    assert ensure_employee_coverage(engine) == 2
+    assert inspect(engine).has_table(EmployeeMonthCoverage.__tablename__)
+    with Session(engine) as session:
+        built = _coverage(session)
+    assert built == _rebuilt(engine)
+    assert ensure_employee_coverage(engine) == 0
+
+
+def test_employees_without_coverage_rows_are_computed(engine, session, seeded, client_id):
+    session.execute(delete(EmployeeMonthCoverage).where(EmployeeMonthCoverage.employee_id == 2))
+    session.commit()
+    _assert_detection(session, client_id)
+    session.close()
+
+    assert ensure_employee_coverage(engine) == 1
+    with Session(engine) as session:
+        assert {row[0] for row in _coverage(session)} == {1, 2}
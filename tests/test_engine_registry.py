@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import event, text
+
+from core.database import create_database_engine, dispose_engines, get_session, get_sessionmaker, session_scope
+from core.production_models import create_production_engine, create_production_session
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    yield f"sqlite:///{tmp_path / 'registry.db'}"
+    dispose_engines()
+
+
+def test_repeated_calls_share_one_engine_and_bounded_connections(db_url):
+    engine = create_database_engine(db_url)
+    connects = []
+    event.listen(engine, "connect", lambda dbapi_connection, record: connects.append(record))
+
+    for _ in range(50):
+        assert create_database_engine(db_url) is engine
+        assert get_sessionmaker(engine) is get_sessionmaker(create_database_engine(db_url))
+        session = get_session(create_database_engine(db_url))
+        session.execute(text("SELECT 1"))
+        session.close()
+        with session_scope(engine) as scoped:
+            scoped.execute(text("SELECT 1"))
+
+    assert len(connects) == 1
+    assert engine.pool.checkedout() == 0
+
+
+def test_session_scope_commits_or_rolls_back(db_url):
+    engine = create_database_engine(db_url)
+    with session_scope(engine) as session:
+        session.execute(text("CREATE TABLE items (name TEXT)"))
+        session.execute(text("INSERT INTO items VALUES ('kept')"))
+
+    with pytest.raises(RuntimeError):
+        with session_scope(engine) as session:
+            session.execute(text("INSERT INTO items VALUES ('dropped')"))
+            raise RuntimeError("boom")
+
+    with session_scope(engine) as session:
+        assert session.execute(text("SELECT name FROM items")).scalars().all() == ["kept"]
+
+
+def test_production_engine_is_cached(db_url):
+    engine = create_production_engine(db_url)
+    assert create_production_engine(db_url) is engine
+    assert engine.pool._pre_ping
+    session = create_production_session(engine)
+    assert session.execute(text("SELECT 1")).scalar() == 1
+    session.close()
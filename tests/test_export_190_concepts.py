@@ -0,0 +1,74 @@
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import scripts.export_190_concepts as export_190_concepts
+from core.models import Client, ClientLocation, Employee, EmployeePeriod, PayrollLine
+
+
+def _line(payroll_id, concept, category="devengo", taxable=True, sickpay=False, in_kind=False):
+    return dict(
+        payroll_id=payroll_id, category=category, concept=concept, amount=Decimal("10"),
+        is_taxable_income=taxable, is_taxable_ss=True, is_sickpay=sickpay, is_in_kind=in_kind,
+        is_pay_advance=False, is_seizure=False,
+    )
+
+
+def test_collect_concepts_aggregates_in_sql(monkeypatch, engine, make_payroll):
+    def payroll(id_, employee_id, month, year=2024):
+        return make_payroll(employee_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-28", id=id_, tipo_irpf=15)
+
+    monkeypatch.setattr(export_190_concepts, "get_session", lambda: Session(engine))
+
+    with Session(engine) as session:
+        clients = [Client(id=uuid.uuid4(), name="A SL", cif="B11111111"), Client(id=uuid.uuid4(), name="B SL", cif="B22222222")]
+        session.add_all(clients)
+        session.flush()
+        session.add_all([
+            ClientLocation(id=1, company_id=clients[0].id, ccc_ss="1"),
+            ClientLocation(id=2, company_id=clients[1].id, ccc_ss="2"),
+        ])
+        for employee_id, location_id in ((1, 1), (2, 2)):
+            session.add(Employee(id=employee_id, first_name="A", last_name="B", identity_card_number=str(employee_id)))
+            session.add(EmployeePeriod(employee_id=employee_id, location_id=location_id,
+                                       period_begin_date=date(2023, 1, 1), period_type="alta"))
+        session.add_all([payroll(1, 1, 1), payroll(2, 1, 2, year=2023), payroll(3, 2, 1)])
+        session.flush()
+        # ORM lines get an interned concept_id on flush
+        session.add_all([
+            PayrollLine(**_line(1, "Salario base")),
+            PayrollLine(**_line(1, "Seguro médico", taxable=False, in_kind=True)),
+            PayrollLine(**_line(2, "SALARIO  BASE", sickpay=True)),
+        ])
+        session.flush()
+        # Core lines without concept_id are normalized from their text
+        session.execute(insert(PayrollLine), [
+            _line(3, "Salario base", category="Devengo"),
+            _line(3, "Cont. comunes", category="deduccion", taxable=False),
+        ])
+        session.commit()
+
+    total, concepts = export_190_concepts._collect_concepts()
+    assert total == 5
+    assert concepts[0] == {
+        "normalized": "SALARIO BASE",
+        "raw_variants": ["SALARIO  BASE", "Salario base"],
+        "count": 3,
+        "category_counts": {"devengo": 3},
+        "taxable_income_count": 3,
+        "sickpay_count": 1,
+        "in_kind_count": 0,
+        "mapping": {"clave": None, "subclave": None, "ss_tax": None},
+    }
+    assert [(entry["normalized"], entry["count"]) for entry in concepts[1:]] == [
+        ("CONT COMUNES", 1), ("SEGURO MEDICO", 1),
+    ]
+    assert concepts[2]["in_kind_count"] == 1
+
+    total, concepts = export_190_concepts._collect_concepts(cif="B11111111", year=2024)
+    assert total == 2
+    assert {entry["normalized"]: entry["count"] for entry in concepts} == {"SALARIO BASE": 1, "SEGURO MEDICO": 1}
+    assert export_190_concepts._collect_concepts(year=2023)[0] == 1
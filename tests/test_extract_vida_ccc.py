@@ -0,0 +1,132 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import core.vida_laboral as vida_laboral
+from core.models import Employee, EmployeePeriod
+from scripts.extract_vida_ccc import (
+    import_vida_laboral,
+    import_vida_laboral_to_db,
+    parse_vida_laboral,
+    parse_vida_laboral_files,
+)
+from scripts.reprocess_vida_laboral import process_vida_laboral_csv
+
+MSJ = """\
+INFORME DE TRABAJADORES EN ALTA
+Codigo Cuenta Cotizacion  28 111111111
+   28 1234567890 10 012345678Z GARCIA LOPEZ JUAN                      100
+      ALTA          01-02-2024 01-02-2024                   100
+      VAC.RETRIB.NO 01-07-2024 15-07-2024
+      BAJA          01-02-2024 01-02-2024 30-09-2024 30-09-2024 100
+   28 9876543210 10 X1234567A PEREZ RUIZ ANA
+      ALTA          01-03-2024 01-03-2024                   401
+TOTAL TRABAJADORES EN ALTA 2
+"""
+
+
+def _msj(tmp_path):
+    path = tmp_path / "vida.msj"
+    path.write_bytes(MSJ.encode("latin1"))
+    return str(path)
+
+
+@pytest.fixture
+def file_engine(make_engine, seed_client):
+    """SQLite file engines with only the EMPRESA SL client; imports add the rest."""
+    def make(path):
+        engine = make_engine(f"sqlite:///{path}")
+        with Session(engine) as session:
+            seed_client(session, location=False, employee=False)
+            session.commit()
+        return engine
+
+    return make
+
+
+def _periods(engine):
+    with Session(engine) as session:
+        return sorted(
+            (p.employee.identity_card_number, p.location.ccc_ss, p.period_type, p.period_begin_date,
+             p.period_end_date, p.tipo_contrato)
+            for p in session.query(EmployeePeriod)
+        )
+
+
+def test_parse_vida_laboral_streams_movements(tmp_path):
+    summary = {}
+    movements = parse_vida_laboral(_msj(tmp_path), summary)
+    assert next(movements) == {
+        "ccc": "28111111111", "naf": "281234567890", "documento": "012345678Z",
+        "nombre": "GARCIA LOPEZ JUAN", "situacion": "ALTA", "f_real_alta": "01-02-2024",
+        "f_efecto_alta": "01-02-2024", "f_real_sit": None, "codigo_contrato": "100",
+    }
+    rest = list(movements)
+    assert [m["situacion"] for m in rest] == ["VAC.RETRIB.NO", "BAJA", "ALTA"]
+    assert summary["total_reportado"] == 2
+    assert summary["documentos"] == {"012345678Z", "X1234567A"}
+
+
+def test_mmap_and_process_pool_parse_identically(tmp_path):
+    paths = []
+    for idx, newline in enumerate(("\n", "\r\n", "\r")):
+        path = tmp_path / f"vida_{idx}.msj"
+        path.write_bytes(MSJ.replace("\n", newline).encode("latin1"))
+        paths.append(path)
+
+    expected = list(parse_vida_laboral(_msj(tmp_path), use_mmap=False))
+    for path in paths:
+        assert list(parse_vida_laboral(str(path), use_mmap=True)) == expected
+
+    pooled = list(parse_vida_laboral_files(paths, workers=2))
+    assert [filepath for filepath, _, _ in pooled] == [str(path) for path in paths]
+    for _, movements, summary in pooled:
+        assert movements == expected
+        assert summary["total_reportado"] == 2
+
+
+def test_streaming_import_matches_csv_round_trip(tmp_path, monkeypatch, file_engine, client_id):
+    msj = _msj(tmp_path)
+
+    streamed = file_engine(tmp_path / "streamed.db")
+    debug_csv = tmp_path / "debug.csv"
+    with Session(streamed) as session:
+        result = import_vida_laboral_to_db(session, msj, client_id, debug_csv=str(debug_csv))
+    assert result["success"]
+    assert result["rows_processed"] == 4
+    assert result["periods_created"] == 3
+
+    csv_db = tmp_path / "csv.db"
+    csv_engine = file_engine(csv_db)
+    monkeypatch.setattr(
+        "scripts.reprocess_vida_laboral.create_database_engine", lambda: create_engine(f"sqlite:///{csv_db}")
+    )
+    csv_path = import_vida_laboral(msj, str(tmp_path))
+    assert process_vida_laboral_csv(csv_path, "B12345678")["success"]
+
+    assert _periods(streamed) == _periods(csv_engine) == [
+        ("12345678Z", "28111111111", "baja", date(2024, 2, 1), date(2024, 9, 30), "100"),
+        ("12345678Z", "28111111111", "vacaciones", date(2024, 7, 1), date(2024, 7, 15), None),
+        ("X1234567A", "28111111111", "alta", date(2024, 3, 1), None, "401"),
+    ]
+    assert debug_csv.read_text(encoding="utf-8") == open(csv_path, encoding="utf-8").read()
+
+
+def test_streaming_import_rolls_back_the_file_on_error(tmp_path, monkeypatch, file_engine, client_id):
+    engine = file_engine(tmp_path / "rollback.db")
+    process_row = vida_laboral.process_row
+
+    def failing_process_row(session, client_id, row, context):
+        if row["situacion"] == "BAJA":
+            raise ValueError("boom")
+        process_row(session, client_id, row, context)
+
+    monkeypatch.setattr(vida_laboral, "process_row", failing_process_row)
+    with Session(engine) as session:
+        result = import_vida_laboral_to_db(session, _msj(tmp_path), client_id)
+    assert not result["success"]
+    assert result["rows_processed"] == 2
+    with Session(engine) as session:
+        assert session.query(Employee).count() == 0
@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from core.field_sync import CLIENT_POSTAL_CODES, EMPLOYEE_SS_NUMBERS, LOCATION_POSTAL_CODES, run_field_sync
+from core.models import Client, ClientLocation, Employee
+from core.production_models import ProductionBase, ProductionCompany, ProductionEmployee, ProductionLocation
+
+T0 = datetime(2024, 1, 1)
+
+
+def _prod_session():
+    prod = create_engine("sqlite:///:memory:")
+    ProductionBase.metadata.create_all(
+        prod, tables=[ProductionCompany.__table__, ProductionLocation.__table__, ProductionEmployee.__table__]
+    )
+    return Session(prod)
+
+
+def test_field_syncs_write_only_changed_fields(session, seed_client, client_id):
+    prod, local = _prod_session(), session
+    prod.add(ProductionCompany(
+        id="c1", name="EMPRESA SL", cif="B12345678", fiscal_address="x", email="x", phone="x",
+        legal_repr_first_name="A", legal_repr_last_name1="B", begin_date=T0, company_postal_code=" 28001 ",
+    ))
+    prod.add_all([
+        ProductionLocation(id=1, company_id="c1", ccc="28111111111", postal_code="28001"),
+        ProductionLocation(id=2, company_id="c1", ccc="28222222222", postal_code="08002"),
+        ProductionLocation(id=3, company_id="c1", ccc="28333333333", postal_code=None),
+        ProductionLocation(id=4, company_id="c1", ccc="28444444444", postal_code="46004", deleted_at=T0),
+    ])
+    for id_, document, ssn in ((1, "12345678Z", "28 1234567890"), (2, "X1234567A", "289876543210")):
+        prod.add(ProductionEmployee(
+            id=id_, company_id="c1", first_name="A", last_name="B", identity_card_number=document, ss_number=ssn,
+            address="x", phone="x", mail="x", begin_date=date(2024, 1, 1), salary=1000, role="x",
+        ))
+    prod.commit()
+
+    seed_client(local, location=False, employee=False)
+    local.add_all([
+        ClientLocation(id=1, company_id=client_id, ccc_ss="28111111111", postal_code="28001"),
+        ClientLocation(id=2, company_id=client_id, ccc_ss="28222222222", postal_code="08001"),
+        ClientLocation(id=3, company_id=client_id, ccc_ss="28333333333", postal_code="41003"),
+        ClientLocation(id=4, company_id=client_id, ccc_ss="28444444444"),
+        ClientLocation(id=5, company_id=client_id, ccc_ss="28555555555"),
+    ])
+    local.add_all([
+        Employee(id=1, first_name="A", last_name="B", identity_card_number="12345678Z"),
+        Employee(id=2, first_name="A", last_name="B", identity_card_number="X1234567A", ss_number="280000000000"),
+    ])
+    local.commit()
+
+    locations = run_field_sync(LOCATION_POSTAL_CODES, prod, local, batch_size=2)
+    assert {k: locations[k] for k in ("matched", "unmatched", "matched_null", "changed", "unchanged")} == {
+        "matched": 3, "unmatched": 2, "matched_null": 1, "changed": 1, "unchanged": 1,
+    }
+    clients = run_field_sync(CLIENT_POSTAL_CODES, prod, local)
+    assert (clients["changed"], clients["fields_changed"]) == (1, {"postal_code": 1})
+    # Only empty SSNs are filled
+    employees = run_field_sync(EMPLOYEE_SS_NUMBERS, prod, local)
+    assert (employees["changed"], employees["unchanged"]) == (1, 1)
+    local.commit()
+
+    assert dict(local.query(ClientLocation.ccc_ss, ClientLocation.postal_code)) == {
+        "28111111111": "28001", "28222222222": "08002", "28333333333": "41003",
+        "28444444444": None, "28555555555": None,
+    }
+    assert local.query(Client.postal_code).scalar() == "28001"
+    assert dict(local.query(Employee.id, Employee.ss_number)) == {1: "281234567890", 2: "280000000000"}
+
+    again = run_field_sync(LOCATION_POSTAL_CODES, prod, local)
+    assert (again["changed"], again["unchanged"]) == (0, 2)
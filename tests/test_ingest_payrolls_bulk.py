@@ -0,0 +1,110 @@
+import copy
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core.database import CREATE_PAYROLL_UNIQUE_INDEX_SQL
+from core.models import Employee, EmployeePeriod, Payroll, PayrollLine
+from scripts.ingest_payrolls_mapped import _ingest_payrolls, _ingest_payrolls_bulk
+
+
+def _line(concept, amount):
+    return {
+        "category": "devengo",
+        "concept": concept,
+        "raw_concept": concept.upper(),
+        "amount": amount,
+        "is_taxable_income": True,
+        "is_taxable_ss": True,
+        "is_sickpay": False,
+        "is_in_kind": False,
+        "is_pay_advance": False,
+        "is_seizure": False,
+    }
+
+
+def _payroll(ss_number, dni, desde, hasta, liquido, cif="B12345678", name="EMPRESA SL", type_="payslip"):
+    return {
+        "type": type_,
+        "empresa": {"cif": cif, "razon_social": name},
+        "trabajador": {"nombre": "GARCIA LOPEZ JUAN", "dni": dni, "ss_number": ss_number},
+        "periodo": {"desde": desde, "hasta": hasta},
+        "devengo_total": liquido,
+        "deduccion_total": 0,
+        "aportacion_empresa_total": 0,
+        "liquido_a_percibir": liquido,
+        "prorrata_pagas_extra": 0,
+        "base_cc": 0,
+        "base_at_ep": 0,
+        "base_irpf": 0,
+        "tipo_irpf": 0,
+        "warnings": ["check"],
+        "payroll_lines": [_line("salario base", liquido), _line("plus", 10)],
+    }
+
+
+PAYROLLS = [
+    _payroll("281234567890", "12345678Z", "2025-01-01", "2025-01-31", 1000),
+    # Matched by DNI when the SSN is unknown
+    _payroll("999999999999", "87654321X", "2025-01-01", "2025-01-31", 900),
+    _payroll("000000000000", "00000000T", "2025-01-01", "2025-01-31", 800),  # employee_not_found
+    _payroll("281234567890", "12345678Z", "2024-01-01", "2024-01-31", 1000),  # before alta
+    _payroll("281234567890", "12345678Z", "2025-02-01", "2025-02-28", 1000, cif="X0000000", name="OTRA SL"),
+    # Unknown CIF falls back to the company name
+    _payroll("281234567890", "12345678Z", "2025-02-01", "2025-02-28", 1000, cif="X0000000"),
+    _payroll("281234567890", "12345678Z", "2025-03-01", "2025-03-31", 1100),  # already in DB
+    _payroll("281234567890", "12345678Z", "2025-01-01", "2025-01-31", 1000),  # duplicate in payload
+    _payroll("281234567890", "12345678Z", None, "2025-04-15", 500, type_="settlement"),
+    _payroll("281234567890", "12345678Z", None, "2025-04-15", 500, type_="settlement"),
+]
+
+
+@pytest.fixture
+def run_ingest(make_engine, seed_client, make_payroll):
+    """Run an ingest function on a freshly seeded database; returns its result and the stored rows."""
+    def run(ingest):
+        engine = make_engine()
+        with engine.begin() as conn:
+            conn.execute(CREATE_PAYROLL_UNIQUE_INDEX_SQL)
+        with Session(engine) as session:
+            seed_client(session)
+            session.add(Employee(id=2, first_name="ANA", last_name="PEREZ", identity_card_number="87654321X"))
+            session.add(EmployeePeriod(employee_id=1, location_id=1, period_begin_date=date(2025, 1, 1),
+                                       period_end_date=None, period_type="alta"))
+            session.add(EmployeePeriod(employee_id=2, location_id=1, period_begin_date=date(2024, 6, 1),
+                                       period_end_date=date(2025, 6, 30), period_type="alta"))
+            session.add(make_payroll(1, "2025-03-01", "2025-03-31", devengo=1100))
+            session.commit()
+
+        with Session(engine) as session:
+            result = ingest(session, copy.deepcopy(PAYROLLS), batch_size=2)
+            payrolls = [
+                (p.employee_id, p.type, p.periodo, p.liquido_a_percibir, p.warnings)
+                for p in session.query(Payroll).order_by(Payroll.id)
+            ]
+            lines = [
+                (l.payroll_id, l.concept, l.raw_concept, l.amount, l.is_taxable_income)
+                for l in session.query(PayrollLine).order_by(PayrollLine.id)
+            ]
+        return result, payrolls, lines
+
+    return run
+
+
+def test_bulk_ingest_matches_row_by_row_ingest(run_ingest):
+    row_result, row_payrolls, row_lines = run_ingest(_ingest_payrolls)
+    bulk_result, bulk_payrolls, bulk_lines = run_ingest(_ingest_payrolls_bulk)
+
+    assert bulk_result == row_result
+    assert bulk_payrolls == row_payrolls
+    assert bulk_lines == row_lines
+
+    created, skipped, lines_created, skipped_records = bulk_result
+    # 3 payslips + 2 settlements without `desde` (never treated as duplicates)
+    assert (created, skipped, lines_created) == (5, 5, 10)
+    assert [(r["index"], r["reason"]) for r in skipped_records] == [
+        (3, "employee_not_found"),
+        (4, "invalid_employee_period"),
+        (5, "invalid_employee_period"),
+    ]
@@ -0,0 +1,42 @@
+import pytest
+
+from core.vision_model.common.json_parsing import (
+    JSON_PARSE_STATS,
+    parse_json_model,
+    parse_json_response,
+)
+from core.vision_model.document_parser.models import UnifiedExtractionResponse
+
+
+def test_valid_json_skips_repair():
+    JSON_PARSE_STATS.reset()
+    data = parse_json_response('```json\n{"a": 1, "b": "ñ"}\n```')
+    assert data == {"a": 1, "b": "ñ"}
+    assert JSON_PARSE_STATS.fast == 1
+    assert JSON_PARSE_STATS.repaired == 0
+
+
+def test_broken_json_is_repaired_and_counted():
+    JSON_PARSE_STATS.reset()
+    data = parse_json_response('{"a": 1, "b": [1, 2,')
+    assert data["a"] == 1
+    assert JSON_PARSE_STATS.repaired == 1
+    assert JSON_PARSE_STATS.repair_rate == 1.0
+
+
+def test_model_fast_path_and_fallback():
+    JSON_PARSE_STATS.reset()
+    parsed = parse_json_model('{"logical_documents": [], "warnings": ["x"]}', UnifiedExtractionResponse)
+    assert parsed.warnings == ["x"]
+    assert JSON_PARSE_STATS.fast == 1
+
+    parsed = parse_json_model('{"logical_documents": [], "warnings": ["x", ', UnifiedExtractionResponse)
+    assert parsed.warnings == ["x"]
+    assert JSON_PARSE_STATS.repaired == 1
+
+
+def test_unrecoverable_model_raises_value_error():
+    JSON_PARSE_STATS.reset()
+    with pytest.raises(ValueError):
+        parse_json_model('{"logical_documents": "nope"}', UnifiedExtractionResponse)
+    assert JSON_PARSE_STATS.failed == 1
@@ -11,6 +11,7 @@ from datetime import date
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core import ValeriaAgent
+from core.employee_coverage import _iter_months
 
 def test_missing_payslip_detection():
     """Test the missing payslip detection system"""
@@ -39,7 +40,7 @@ def test_missing_payslip_detection():
         test_start = date(2024, 6, 15)  # Mid-June 2024
         test_end = date(2024, 12, 31)   # End of December 2024
 
-        expected_months = agent._generate_expected_months(test_start, test_end)
+        expected_months = [(month.year, month.month) for month in _iter_months(test_start, test_end)]
 
         print(f"   📅 Employment period: {test_start} to {test_end}")
         print(f"   📊 Generated {len(expected_months)} expected months:")
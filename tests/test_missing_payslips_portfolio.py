@@ -0,0 +1,64 @@
+import csv
+import json
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core.missing_payslips import generate_portfolio_missing_payslips_report
+from core.models import Client, EmployeePeriod
+
+EMPTY_ID = uuid.UUID("6a1d7b2f-9c8e-4d3b-af40-b2c3d4e5f6a7")
+INACTIVE_ID = uuid.UUID("7b2e8c3a-ad9f-4e4c-b051-c3d4e5f6a7b8")
+
+
+@pytest.fixture
+def portfolio_engine(tmp_path, make_engine, seed_client):
+    # File-backed so the worker threads each get their own connection
+    engine = make_engine(f"sqlite:///{tmp_path / 'portfolio.db'}")
+    with Session(engine) as session:
+        seed_client(session)
+        session.add(Client(id=EMPTY_ID, name="VACIA SL", cif="B87654321"))
+        session.add(Client(id=INACTIVE_ID, name="BAJA SL", cif="B11111111", active=False))
+        session.add(EmployeePeriod(employee_id=1, location_id=1, period_begin_date=date(2025, 1, 1),
+                                   period_type="alta"))
+        session.commit()
+    return engine
+
+
+def test_portfolio_report_streams_jsonl(tmp_path, portfolio_engine):
+    engine = portfolio_engine
+    output = tmp_path / "portfolio.jsonl"
+
+    result = generate_portfolio_missing_payslips_report(
+        engine, output_path=str(output), workers=2, last_month="03/2025", target_seconds=60,
+    )
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    clients = {r["cif"]: r for r in records if r["type"] == "client"}
+    assert set(clients) == {"B12345678", "B87654321"}
+    assert sorted(clients["B12345678"]["missing_items"][0]["missing_payslips"]["months"]) == [
+        "2025-01", "2025-02", "2025-03"
+    ]
+    assert clients["B87654321"]["success"] is False
+    assert records[-1]["type"] == "summary"
+    assert records[-1]["within_target"] is True
+    assert result["summary"]["total_missing_payslips"] == 3
+    assert result["summary"]["clients_failed"] == 1
+
+
+def test_portfolio_report_streams_csv(tmp_path, portfolio_engine):
+    engine = portfolio_engine
+    output = tmp_path / "portfolio.csv"
+
+    generate_portfolio_missing_payslips_report(
+        engine, output_path=str(output), output_format="csv", workers=2, last_month="03/2025",
+    )
+
+    with open(output, newline="") as f:
+        rows = {row["cif"]: row for row in csv.DictReader(f)}
+    assert rows["B12345678"]["dni_nie"] == "12345678Z"
+    assert sorted(rows["B12345678"]["missing_payslips_months"].split("|")) == ["2025-01", "2025-02", "2025-03"]
+    assert rows["B87654321"]["status"].startswith("error")
+    assert rows["B87654321"]["dni_nie"] == ""
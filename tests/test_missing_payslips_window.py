@@ -0,0 +1,70 @@
+import uuid
+from datetime import date
+
+from core.missing_payslips import _parse_report_window, detect_missing_payslips, detect_missing_payslips_set_based
+from core.models import Client, ClientLocation, Employee, EmployeePeriod
+
+
+def test_parse_report_window_valid():
+    cutoff, start, error = _parse_report_window("02/2024", "01/2024")
+    assert error is None
+    assert cutoff == date(2024, 2, 29)
+    assert start == date(2024, 1, 1)
+
+
+def test_parse_report_window_errors():
+    assert _parse_report_window("2024-02", None)[2]["error"] == "Invalid last_month format: 2024-02"
+    error = _parse_report_window("01/2024", "03/2024")[2]
+    assert error["error"].startswith("start_month is after last_month")
+
+
+def test_set_based_engine_matches_coverage_engine(session, seed_client, make_payroll):
+    client_id = seed_client(session, employee=False).id
+    other_client = uuid.uuid4()
+    session.add(Client(id=other_client, name="OTRA SL", cif="B87654321"))
+    session.add_all([
+        ClientLocation(id=2, company_id=client_id, ccc_ss="28222222222"),
+        ClientLocation(id=3, company_id=other_client, ccc_ss="28333333333"),
+    ])
+    session.add_all([
+        Employee(id=employee_id, first_name="JUAN", last_name="GARCIA",
+                 last_name2="LOPEZ" if employee_id % 2 else None, identity_card_number=f"0000000{employee_id}Z")
+        for employee_id in range(1, 6)
+    ])
+    session.add_all([
+        # Starts before the 2025 cap and ends mid-year without a settlement
+        EmployeePeriod(employee_id=1, location_id=1, period_begin_date=date(2024, 10, 1),
+                       period_end_date=date(2025, 3, 10), period_type="baja"),
+        # Overlapping periods at two CCCs, one still open
+        EmployeePeriod(employee_id=2, location_id=1, period_begin_date=date(2025, 2, 1),
+                       period_end_date=date(2025, 5, 31), period_type="baja"),
+        EmployeePeriod(employee_id=2, location_id=2, period_begin_date=date(2025, 4, 1), period_type="alta"),
+        EmployeePeriod(employee_id=2, location_id=2, period_begin_date=date(2025, 7, 1),
+                       period_end_date=date(2025, 7, 15), period_type="vacaciones"),
+        # Ends after the cutoff
+        EmployeePeriod(employee_id=3, location_id=2, period_begin_date=date(2025, 3, 1),
+                       period_end_date=date(2026, 2, 28), period_type="baja"),
+        # Starts after the cutoff
+        EmployeePeriod(employee_id=4, location_id=1, period_begin_date=date(2025, 11, 1), period_type="alta"),
+        # Another client's employee
+        EmployeePeriod(employee_id=5, location_id=3, period_begin_date=date(2025, 1, 1), period_type="alta"),
+    ])
+    session.add_all([
+        make_payroll(1, "2025-01-01", "2025-01-31"),
+        make_payroll(1, "2024-12-01", "2024-12-31"),
+        make_payroll(2, "2025-02-01", "2025-02-28"),
+        make_payroll(2, None, "2025-05-31", type_="settlement"),
+        make_payroll(2, "2025-05-01", "2025-05-31"),
+        make_payroll(3, "2025-03-01", None),
+        make_payroll(3, "2025-06-01", "2025-06-30", type_="hybrid"),
+        make_payroll(5, "2025-01-01", "2025-01-31"),
+    ])
+    session.commit()
+
+    for last_month, start_month in (("06/2025", None), ("09/2025", "05/2025"), ("12/2025", None), (None, None)):
+        kwargs = dict(client_id=client_id, last_month=last_month, start_month=start_month, verbose=False)
+        expected = detect_missing_payslips(session, **kwargs)
+        result = detect_missing_payslips_set_based(session, **kwargs)
+        assert expected["success"] and result["success"]
+        expected["missing_payslips"].sort(key=lambda item: item["employee_id"])
+        assert result == expected
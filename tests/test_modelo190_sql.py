@@ -0,0 +1,89 @@
+import importlib
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from core.models import Client, ClientLocation, Employee, EmployeePeriod, PayrollLine
+
+modelo_190 = importlib.import_module("190")
+
+CIF = "B12345678"
+
+
+def _line(payroll_id, concept, amount, category="devengo", taxable=True, sickpay=False, in_kind=False):
+    return dict(
+        payroll_id=payroll_id, category=category, concept=concept, amount=Decimal(amount),
+        is_taxable_income=taxable, is_taxable_ss=True, is_sickpay=sickpay, is_in_kind=in_kind,
+        is_pay_advance=False, is_seizure=False,
+    )
+
+
+def _generate(session, build, config):
+    perceptors = build(session, CIF, date(2024, 1, 1), date(2024, 12, 31), config)
+    decl = modelo_190.build_declarant_from_cif(
+        session, CIF, 2024, perceptors, "CONTACTO", "600000000", None, "1900000000000", "N", None
+    )
+    return perceptors, modelo_190.generate_190_file(decl, config)
+
+
+def test_sql_engine_matches_python_engine(session, make_payroll):
+    def payroll(id_, employee_id, month, tipo_irpf):
+        return make_payroll(employee_id, f"2024-{month:02d}-01", f"2024-{month:02d}-28", id=id_,
+                            liquido_a_percibir=1000 + id_, tipo_irpf=tipo_irpf)
+
+    client = Client(id=uuid.uuid4(), name="EMPRESA SL", cif=CIF, postal_code="28001")
+    session.add(client)
+    session.flush()
+    session.add_all([
+        ClientLocation(id=1, company_id=client.id, ccc_ss="1", postal_code="08001"),
+        ClientLocation(id=2, company_id=client.id, ccc_ss="2"),
+    ])
+    for employee_id, location_id in ((1, 1), (2, 2)):
+        session.add(Employee(id=employee_id, first_name="Ana", last_name="García", last_name2="Pérez",
+                             identity_card_number=f"0000000{employee_id}Z", birth_date=date(1980, 1, 1)))
+        session.add(EmployeePeriod(employee_id=employee_id, location_id=location_id,
+                                   period_begin_date=date(2023, 1, 1), period_type="alta"))
+    session.add_all([
+        payroll(1, 1, 1, Decimal("12.37")),
+        payroll(2, 1, 2, Decimal("15")),
+        payroll(3, 2, 1, Decimal("7.5")),
+    ])
+    session.flush()
+    # ORM lines are interned on flush
+    session.add_all([PayrollLine(**line) for line in (
+        _line(1, "Salario base", "1500.55"),
+        _line(1, "Dietas", "120.10", taxable=False),
+        _line(1, "Seguro médico", "45.33", in_kind=True),
+        _line(1, "Cont. comunes", "70.12", category="deduccion", taxable=False),
+        _line(2, "Salario base", "1500.55"),
+        _line(2, "Incapacidad temporal", "300.01", sickpay=True),
+        _line(2, "Indemnización", "2000", taxable=False),
+    )])
+    session.flush()
+    # Lines without concept_id (not backfilled) are matched on their text
+    session.execute(insert(PayrollLine), [
+        _line(3, "SALARIO  BASE", "990.99"),
+        _line(3, "DIETAS", "33.33"),
+        _line(3, "Desempleo", "15.87", category="Deduccion", taxable=False),
+    ])
+    session.commit()
+
+    config = modelo_190.MappingConfig(
+        concepts_to_clave_subclave=[
+            modelo_190.ConceptMappingRule("L", "01", ["Dietas"]),
+            modelo_190.ConceptMappingRule("L", "05", ["Indemnización"]),
+        ],
+        ss_tax_concepts=["Cont. comunes", "Desempleo"],
+        gastos_deducibles_allocation="proportional",
+    )
+    perceptors, expected = _generate(session, modelo_190.build_perceptor_inputs, config)
+    sql_perceptors, output = _generate(session, modelo_190.build_perceptor_inputs_sql, config)
+
+    assert [(p.nif_perceptor, p.clave, p.subclave, p.provincia) for p in perceptors] == [
+        ("00000001Z", "A", None, "08"), ("00000001Z", "L", "01", "08"), ("00000001Z", "L", "05", "08"),
+        ("00000002Z", "A", None, "28"), ("00000002Z", "L", "01", "28"),
+    ]
+    assert sql_perceptors == perceptors
+    assert output == expected
@@ -0,0 +1,72 @@
+from datetime import date
+from decimal import Decimal
+
+from core.database import get_employee_devengo_total, get_payroll_line_aggregates
+from core.models import Employee, EmployeePeriod, Payroll, PayrollLine
+from core.normalization import parse_period_date, periodo_bounds
+
+
+def test_parse_period_date_formats():
+    assert parse_period_date("2025-01-31") == date(2025, 1, 31)
+    assert parse_period_date("31-01-2025") == date(2025, 1, 31)
+    assert parse_period_date("31/01/2025") == date(2025, 1, 31)
+    assert parse_period_date("2025-01-31T00:00:00Z") == date(2025, 1, 31)
+    assert parse_period_date("enero") is None
+    assert periodo_bounds({"hasta": "31/01/2025"}) == (None, date(2025, 1, 31))
+    assert periodo_bounds(None) == (None, None)
+
+
+def test_period_columns_follow_periodo_on_write(make_payroll):
+    payroll = make_payroll(1, "01-02-2025", "28-02-2025")
+    assert (payroll.period_start, payroll.period_end) == (date(2025, 2, 1), date(2025, 2, 28))
+
+    payroll.periodo = {"desde": None, "hasta": "2025-03-15"}
+    assert (payroll.period_start, payroll.period_end) == (None, date(2025, 3, 15))
+
+
+def test_period_filters_run_in_sql(session, seed_client, make_payroll):
+    seed_client(session)
+    session.add(EmployeePeriod(employee_id=1, location_id=1, period_begin_date=date(2024, 1, 1),
+                               period_type="alta"))
+    session.add_all([
+        make_payroll(1, "2025-01-01", "2025-01-31", devengo=1000),
+        make_payroll(1, "01-02-2025", "28-02-2025", devengo=1100),
+        # Missing hasta falls back to desde; missing desde is excluded
+        make_payroll(devengo=50, periodo={"desde": "2025-02-15"}),
+        make_payroll(devengo=999, periodo={"hasta": "2025-02-20"}),
+    ])
+    session.flush()
+    session.add(PayrollLine(payroll_id=2, category="devengo", concept="SALARIO", amount=1100,
+                            is_taxable_income=True, is_taxable_ss=True, is_sickpay=False,
+                            is_in_kind=False, is_pay_advance=False, is_seizure=False))
+    session.commit()
+
+    devengo = get_employee_devengo_total(session, "281234567890", "28111111111", "2025-02")
+    assert devengo["payroll_count"] == 2
+    assert devengo["devengo_total"] == Decimal("1150.00")
+
+    aggregates = get_payroll_line_aggregates(session, "281234567890", "28111111111", "2025-02")
+    assert aggregates["payroll_count"] == 2
+    assert aggregates["totals"] == {"devengo": Decimal("1100.00")}
+
+    empty = get_employee_devengo_total(session, "281234567890", "28111111111", "2025-06")
+    assert empty["payroll_count"] == 0
+
+
+def test_create_payroll_rejects_duplicates_on_fresh_schema(session, seed_client):
+    from core.payrolls import create_payroll
+
+    totals = {"devengo_total": 1000, "liquido_a_percibir": 900}
+    lines = [{"category": "devengo", "concept": "SALARIO", "amount": 1000}]
+    seed_client(session)
+    session.commit()
+
+    periodo = {"desde": "2025-01-01", "hasta": "2025-01-31"}
+    assert create_payroll(session, 1, periodo, totals, lines)["success"]
+    session.add(Employee(id=2, first_name="ANA", last_name="PEREZ", identity_card_number="X1234567A"))
+    duplicate = create_payroll(session, 1, periodo, totals, lines)
+    assert not duplicate["success"] and "already exists" in duplicate["error"]
+    # Pending work in the session survives the rejected duplicate
+    session.commit()
+    assert session.query(Employee).count() == 2
+    assert session.query(Payroll).count() == session.query(PayrollLine).count() == 1
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, create_engine, update
+from sqlalchemy.orm import Session
+
+from core.models import Client, ClientLocation, ProdSyncState
+from core.prod_sync import FULL_RECONCILE_INTERVAL, SCOPE_LOCATIONS, WATERMARK_OVERLAP, begin_sync, finish_sync
+from core.production_models import (
+    ProductionBase,
+    ProductionCompany,
+    ProductionLocation,
+    insert_company_locations_into_local_clients,
+    sync_companies,
+)
+
+T0 = datetime(2024, 1, 10, 9, 0)
+
+
+def _prod_session():
+    engine = create_engine("sqlite:///:memory:")
+    ProductionBase.metadata.create_all(engine, tables=[ProductionCompany.__table__, ProductionLocation.__table__])
+    session = Session(engine)
+    session.add(ProductionCompany(
+        id="c1", name="EMPRESA SL", cif="B12345678", fiscal_address="CALLE 1", email="a@b.es", phone="600",
+        legal_repr_first_name="ANA", legal_repr_last_name1="PEREZ", begin_date=T0, payslips="true",
+        status="Active", created_at=T0,
+    ))
+    session.add_all([
+        ProductionLocation(id=1, company_id="c1", ccc="28111111111", postal_code="28001", created_at=T0),
+        ProductionLocation(id=2, company_id="c1", ccc="28222222222", postal_code="28002",
+                           created_at=T0 + timedelta(days=1)),
+    ])
+    session.commit()
+    return session
+
+
+def _sync(prod, local, **kwargs):
+    return insert_company_locations_into_local_clients(prod, "B12345678", local, incremental=True, **kwargs)
+
+
+def test_location_sync_without_updated_at_is_always_full(session):
+    prod, local = _prod_session(), session
+
+    first = _sync(prod, local)
+    assert (first["full_sync"], first["locations_synced"], first["locations_created"]) == (True, 2, 2)
+    state = local.query(ProdSyncState).filter_by(cif="B12345678", scope=SCOPE_LOCATIONS).one()
+    assert state.watermark == T0 + timedelta(days=1)
+
+    # companies has no updated_at, so an in-place rename is only seen by a full pass
+    prod.add(ProductionLocation(id=3, company_id="c1", ccc="28333333333", created_at=T0 + timedelta(days=5)))
+    prod.execute(update(ProductionCompany).values(name="RENAMED SL"))
+    prod.commit()
+
+    second = _sync(prod, local)
+    assert (second["full_sync"], second["locations_synced"], second["locations_created"]) == (True, 3, 1)
+    assert local.query(Client).one().name == "RENAMED SL"
+    assert local.query(ClientLocation).count() == 3
+
+
+def test_sync_window_overlap_and_periodic_reconciliation(session):
+    local = session
+    assert begin_sync(local, "B12345678", SCOPE_LOCATIONS).full
+
+    now = datetime(2024, 2, 1)
+    finish_sync(local, begin_sync(local, "B12345678", SCOPE_LOCATIONS, now=now), T0, rows=5, now=now)
+    window = begin_sync(local, "B12345678", SCOPE_LOCATIONS, now=now + timedelta(days=1))
+    assert window.since == T0 - WATERMARK_OVERLAP
+
+    # Watermarks never move backwards
+    finish_sync(local, window, T0 - timedelta(days=3), rows=0, now=now + timedelta(days=1))
+    assert local.query(ProdSyncState).one().watermark == T0
+
+    assert begin_sync(local, "B12345678", SCOPE_LOCATIONS, now=now + FULL_RECONCILE_INTERVAL).full
+
+    # Tables whose edits don't move a change column can't be synced incrementally
+    tracked = Table("tracked", MetaData(), Column("id", Integer), Column("updated_at", DateTime))
+    assert not begin_sync(local, "B12345678", SCOPE_LOCATIONS, tables=[tracked], now=now + timedelta(days=1)).full
+    untracked = [tracked, ProductionCompany.__table__]
+    assert begin_sync(local, "B12345678", SCOPE_LOCATIONS, tables=untracked, now=now + timedelta(days=1)).full
+
+
+def test_sync_companies_upserts_in_chunks(session):
+    prod, local = _prod_session(), session
+    prod.add(ProductionCompany(
+        id="c2", name="OTRA SL", cif="B87654321", fiscal_address="CALLE 2", email="c@d.es", phone="700",
+        legal_repr_first_name="LUIS", legal_repr_last_name1="SANZ", begin_date=T0, payslips="false",
+        status="churned", created_at=T0,
+    ))
+    prod.add_all([
+        ProductionLocation(id=3, company_id="c2", ccc="28333333333", postal_code="08001", created_at=T0),
+        ProductionLocation(id=4, company_id="c2", ccc="", created_at=T0),
+        ProductionLocation(id=5, company_id="c2", ccc="28444444444", created_at=T0, deleted_at=T0),
+    ])
+    prod.commit()
+    # A pre-existing client and a location that moves to another company
+    insert_company_locations_into_local_clients(prod, "B12345678", local)
+    prod.execute(update(ProductionLocation).where(ProductionLocation.id == 2).values(company_id="c2", postal_code="08002"))
+    prod.commit()
+
+    result = sync_companies(["B87654321", "B12345678", "B00000000"], prod, local, chunk_size=1)
+    assert (result["companies_synced"], result["locations_synced"], result["missing_cifs"]) == (2, 3, ["B00000000"])
+
+    clients = {c.cif: c for c in local.query(Client)}
+    assert (clients["B87654321"].name, clients["B87654321"].payslips) == ("OTRA SL", False)
+    locations = sorted((l.ccc_ss, l.company_id, l.postal_code) for l in local.query(ClientLocation))
+    assert locations == [
+        ("28111111111", clients["B12345678"].id, "28001"),
+        ("28222222222", clients["B87654321"].id, "08002"),
+        ("28333333333", clients["B87654321"].id, "08001"),
+    ]
+
+    again = sync_companies("all", prod, local)
+    assert (again["companies_synced"], again["locations_synced"], again["missing_cifs"]) == (2, 3, [])
+    assert local.query(Client).count() == 2
+    assert local.query(ClientLocation).count() == 3
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core.vision_model.common.pricing_config import (
+    calculate_cost,
+    calculate_usage_cost,
+    get_gemini_pricing,
+    get_openai_pricing,
+)
+from core.vision_model.common.prompt_cache import (
+    GeminiContextCache,
+    cache_hit_ratio,
+    extract_gemini_cached_tokens,
+    extract_openai_cached_tokens,
+    openai_prompt_cache_key,
+)
+
+
+def test_calculate_cost_without_cached_tokens_is_unchanged():
+    assert calculate_cost(1000, 1000, 0.001, 0.01) == pytest.approx(0.011)
+
+
+def test_cached_tokens_are_billed_at_cached_price():
+    pricing = get_openai_pricing("gpt-5.1")
+    usage = {"input_tokens": 10_000, "cached_input_tokens": 8_000, "output_tokens": 1_000}
+    expected = 2 * pricing["input"] + 8 * pricing["cached_input"] + 1 * pricing["output"]
+    assert calculate_usage_cost(usage, pricing) == pytest.approx(expected)
+
+
+def test_missing_cached_price_falls_back_to_input_price():
+    pricing = {"input": 0.001, "output": 0.01}
+    usage = {"input_tokens": 1000, "cached_input_tokens": 1000, "output_tokens": 0}
+    assert calculate_usage_cost(usage, pricing) == pytest.approx(0.001)
+
+
+def test_gemini_models_have_cached_prices():
+    for model in ("gemini-2.5-pro", "gemini-2.5-flash", "gemini-3-flash-preview"):
+        pricing = get_gemini_pricing(model)
+        assert 0 < pricing["cached_input"] < pricing["input"]
+
+
+def test_usage_extractors():
+    openai_usage = SimpleNamespace(input_tokens_details=SimpleNamespace(cached_tokens=512))
+    assert extract_openai_cached_tokens(openai_usage) == 512
+    assert extract_openai_cached_tokens(SimpleNamespace()) == 0
+    assert extract_gemini_cached_tokens(SimpleNamespace(cached_content_token_count=None)) == 0
+    assert extract_gemini_cached_tokens(SimpleNamespace(cached_content_token_count=300)) == 300
+    assert cache_hit_ratio(1000, 250) == 0.25
+    assert cache_hit_ratio(0, 0) == 0.0
+
+
+def test_prompt_cache_key_is_stable():
+    assert openai_prompt_cache_key("abc") == openai_prompt_cache_key("abc")
+    assert openai_prompt_cache_key("abc") != openai_prompt_cache_key("abd")
+
+
+class _FakeCaches:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = 0
+
+    def create(self, model, config):
+        if self.fail:
+            raise RuntimeError("prompt too small")
+        self.created += 1
+        return SimpleNamespace(name=f"cachedContents/{self.created}")
+
+
+def test_gemini_context_cache_is_reused_and_disables_on_failure():
+    client = SimpleNamespace(caches=_FakeCaches())
+    cache = GeminiContextCache(client, "gemini-2.5-flash", "prompt")
+    assert cache.get_name() == "cachedContents/1"
+    assert cache.get_name() == "cachedContents/1"
+    assert client.caches.created == 1
+
+    failing = GeminiContextCache(SimpleNamespace(caches=_FakeCaches(fail=True)), "m", "prompt")
+    assert failing.get_name() is None
+    assert not failing.enabled
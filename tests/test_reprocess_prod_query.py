@@ -0,0 +1,124 @@
+from datetime import date
+
+import pytest
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+import scripts.reprocess_prod_query as reprocess_prod_query
+from core.models import EmployeePeriod
+
+PROD_SCHEMA = """
+CREATE TABLE public.companies (
+    id INTEGER PRIMARY KEY, name TEXT, cif TEXT, begin_date DATE, payslips BOOLEAN, status TEXT
+);
+CREATE TABLE public.company_locations (id INTEGER PRIMARY KEY, ccc TEXT);
+CREATE TABLE public.company_employees (
+    id INTEGER PRIMARY KEY, company_id INTEGER, first_name TEXT, last_name TEXT, last_name2 TEXT,
+    ss_number TEXT, identity_card_number TEXT, begin_date DATE, created_at TIMESTAMP, birth_date DATE,
+    enrollment_confirmation TEXT, employee_status TEXT, contract_code TEXT, end_date DATE,
+    cancel_enrollment_date DATE, irpf TEXT, rlce TEXT, employee_location TEXT, updated_at TIMESTAMP
+);
+INSERT INTO public.companies VALUES (1, 'EMPRESA SL', 'B12345678', '2024-01-01', 1, 'Active');
+INSERT INTO public.company_locations VALUES (10, '28111111111'), (11, '28222222222');
+INSERT INTO public.company_employees VALUES
+    (1, 1, 'JUAN', 'GARCIA', 'LOPEZ', '281234567890', '12345678Z', '2024-02-01', '2024-02-01 09:00:00', '1990-05-01',
+     NULL, 'active', '100', NULL, NULL, NULL, NULL, '10', NULL),
+    (2, 1, 'ANA', 'PEREZ', NULL, '289876543210', 'X1234567A', '2024-03-01', '2024-03-01 09:00:00', NULL,
+     NULL, 'inactive', '401', '2024-09-30', NULL, NULL, NULL, '11', NULL),
+    (3, 1, 'LUIS', 'SANZ', NULL, '280000000001', '23456789D', '2024-04-01', '2024-04-01 09:00:00', NULL,
+     NULL, 'active', '100', NULL, NULL, NULL, NULL, NULL, NULL),
+    (4, 1, 'EVA', 'RUIZ', NULL, '280000000002', '34567890V', '2024-05-01', '2024-05-01 09:00:00', NULL,
+     NULL, 'Test', '100', NULL, NULL, NULL, NULL, '10', NULL),
+    (5, 1, 'EVA', 'MORA', NULL, '280000000003', '45678901G', '2024-06-01', '2024-06-01 09:00:00', NULL,
+     NULL, 'active', '100', NULL, NULL, NULL, NULL, '11', NULL);
+"""
+
+
+def _prod_engine(path):
+    engine = create_engine(f"sqlite:///{path / 'prod_main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_public(dbapi_connection, record):
+        dbapi_connection.execute(f"ATTACH DATABASE '{path / 'prod_public.db'}' AS public")
+
+    with engine.begin() as conn:
+        for statement in PROD_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+    return engine
+
+
+@pytest.fixture
+def target(tmp_path, make_engine, seed_client):
+    target = make_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    with Session(target) as session:
+        seed_client(session, location=False, employee=False)
+        session.commit()
+    return target
+
+
+def _periods(target):
+    with Session(target) as session:
+        return sorted(
+            (p.employee.identity_card_number, p.location.ccc_ss, p.period_type, p.period_begin_date,
+             p.period_end_date)
+            for p in session.query(EmployeePeriod)
+        )
+
+
+def test_process_prod_query_streams_batches_through_the_index(tmp_path, monkeypatch, target):
+    prod = _prod_engine(tmp_path)
+
+    reflections = []
+    event.listen(prod, "before_cursor_execute", lambda conn, cursor, statement, *args: (
+        reflections.append(statement) if "sqlite_master" in statement or "table_info" in statement else None
+    ))
+    monkeypatch.setattr(reprocess_prod_query, "create_database_engine", lambda: target)
+    monkeypatch.setattr(reprocess_prod_query, "create_prod_engine", lambda echo=False: prod)
+    monkeypatch.setattr(reprocess_prod_query, "PROD_BATCH_SIZE", 2)
+    monkeypatch.setattr(reprocess_prod_query, "_REFLECTED_TABLES", {})
+
+    result = reprocess_prod_query.process_prod_query("B12345678")
+    assert result["success"], result
+    assert (result["rows_processed"], result["rows_skipped_missing_location_ccc"]) == (3, 1)
+    assert (result["employees_created"], result["periods_created"]) == (3, 3)
+
+    reflected = len(reflections)
+    assert reflected
+    # Metadata is reflected once per process; a second run reuses it and changes nothing
+    again = reprocess_prod_query.process_prod_query("B12345678")
+    assert (again["employees_created"], again["periods_created"]) == (0, 0)
+    assert len(reflections) == reflected
+
+    assert _periods(target) == [
+        ("12345678Z", "28111111111", "alta", date(2024, 2, 1), None),
+        ("45678901G", "28222222222", "alta", date(2024, 6, 1), None),
+        ("X1234567A", "28222222222", "baja", date(2024, 3, 1), date(2024, 9, 30)),
+    ]
+
+
+def test_incremental_sync_fetches_only_changed_employees(tmp_path, monkeypatch, target):
+    prod = _prod_engine(tmp_path)
+    monkeypatch.setattr(reprocess_prod_query, "create_database_engine", lambda: target)
+    monkeypatch.setattr(reprocess_prod_query, "create_prod_engine", lambda echo=False: prod)
+    monkeypatch.setattr(reprocess_prod_query, "_REFLECTED_TABLES", {})
+
+    first = reprocess_prod_query.process_prod_query("B12345678", incremental=True)
+    assert (first["full_sync"], first["rows_fetched"], first["periods_created"]) == (True, 4, 3)
+
+    # Only the latest row falls inside the watermark overlap
+    second = reprocess_prod_query.process_prod_query("B12345678", incremental=True)
+    assert (second["full_sync"], second["rows_fetched"], second["periods_created"]) == (False, 1, 0)
+
+    with prod.begin() as conn:
+        conn.execute(text(
+            "UPDATE public.company_employees SET employee_status = 'inactive', end_date = '2024-10-31', "
+            "updated_at = '2024-11-02 08:00:00' WHERE id = 1"
+        ))
+    # The updated employee, plus the overlap row again
+    third = reprocess_prod_query.process_prod_query("B12345678", incremental=True)
+    assert (third["full_sync"], third["rows_fetched"]) == (False, 2)
+    assert ("12345678Z", "28111111111", "baja", date(2024, 2, 1), date(2024, 10, 31)) in _periods(target)
+
+    assert reprocess_prod_query.process_prod_query("B12345678", incremental=True, full_reconcile=True)["rows_fetched"] == 4
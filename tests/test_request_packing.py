@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from core.vision_model.process_documents_v2 import (
+    PDF_PAGE_IMAGE_TOKENS,
+    estimate_page_tokens,
+    map_documents_to_pages,
+    plan_page_batches,
+)
+
+
+def test_plan_page_batches_respects_page_limit():
+    assert plan_page_batches([100] * 7, max_pages=3, max_tokens=10_000) == [(0, 2), (3, 5), (6, 6)]
+
+
+def test_plan_page_batches_respects_token_limit():
+    # Oversized page 2 gets its own batch; the rest pack up to the token bound
+    tokens = [400, 400, 5000, 400, 400, 400]
+    assert plan_page_batches(tokens, max_pages=10, max_tokens=1000) == [(0, 1), (2, 2), (3, 4), (5, 5)]
+
+
+def test_plan_page_batches_single_page_mode_and_empty():
+    assert plan_page_batches([100, 100], max_pages=1) == [(0, 0), (1, 1)]
+    assert plan_page_batches([], max_pages=4) == []
+
+
+def test_estimate_page_tokens():
+    assert estimate_page_tokens("") == PDF_PAGE_IMAGE_TOKENS
+    assert estimate_page_tokens("x" * 400) == PDF_PAGE_IMAGE_TOKENS + 100
+
+
+def test_map_documents_to_pages_uses_reported_pages():
+    docs = [SimpleNamespace(pages=[1, 2]), SimpleNamespace(pages=[3, 9])]
+    # Request covers absolute pages 10-12; out-of-range page 9 is dropped
+    assert map_documents_to_pages(docs, 10, 12) == [[10, 11], [12]]
+
+
+def test_map_documents_to_pages_fallbacks():
+    one_per_page = [SimpleNamespace(pages=[]) for _ in range(3)]
+    assert map_documents_to_pages(one_per_page, 4, 6) == [[4], [5], [6]]
+
+    unknown = [SimpleNamespace(pages=[])]
+    assert map_documents_to_pages(unknown, 4, 6) == [[4, 5, 6]]
@@ -0,0 +1,91 @@
+from datetime import date
+
+import pytest
+
+from core.models import EmployeePeriod, VidaLaboralMovement
+from core.vida_laboral import VidaLaboralContext
+from core.vida_laboral_delta import process_rows_delta
+
+
+def _row(situacion, documento, naf, alta="", real_alta="", real_sit="", contrato="100"):
+    return {
+        "ccc": "28111111111", "naf": naf, "documento": documento, "nombre": "GARCIA LOPEZ JUAN",
+        "situacion": situacion, "f_real_alta": real_alta, "f_efecto_alta": alta, "f_real_sit": real_sit,
+        "codigo_contrato": contrato,
+    }
+
+
+JANUARY = [
+    _row("ALTA", "12345678Z", "281234567890", alta="01-02-2024", real_alta="01-02-2024"),
+    _row("VAC.RETRIB.NO", "12345678Z", "281234567890", alta="01-07-2024", real_sit="15-07-2024", contrato=""),
+    _row("ALTA", "X1234567A", "", alta="01-03-2024", real_alta="01-03-2024", contrato=""),
+]
+
+
+@pytest.fixture
+def client(session, seed_client):
+    # No location or employees: the import creates them
+    client = seed_client(session, location=False, employee=False)
+    session.commit()
+    return client
+
+
+def _import(session, client, rows):
+    context = VidaLaboralContext()
+    result = process_rows_delta(session, client.id, rows, context)
+    session.commit()
+    return result, context
+
+
+def test_delta_processes_only_new_and_changed_movements(session, client):
+    result, context = _import(session, client, JANUARY)
+    assert (result["new"], result["changed"], result["unchanged"], result["disappeared"]) == (3, 0, 0, [])
+    assert context.periods_created == 3
+    assert session.query(VidaLaboralMovement).count() == 3
+
+    # Same file again: nothing reaches the handlers
+    result, context = _import(session, client, JANUARY)
+    assert (result["new"], result["changed"], result["unchanged"], result["processed"]) == (0, 0, 3, 0)
+    assert context.periods_created == context.employees_updated == 0
+
+    # Next month: a new BAJA, a corrected contract code, and the vacation is gone
+    february = [
+        JANUARY[0],
+        _row("ALTA", "X1234567A", "", alta="01-03-2024", real_alta="01-03-2024", contrato="401"),
+        _row("BAJA", "12345678Z", "281234567890", alta="01-02-2024", real_alta="01-02-2024",
+             real_sit="31-01-2025"),
+    ]
+    result, context = _import(session, client, february)
+    assert (result["new"], result["changed"], result["unchanged"], result["processed"]) == (1, 1, 1, 2)
+    assert result["disappeared"] == [{
+        "ccc": "28111111111", "naf": "281234567890", "documento": "12345678Z", "situacion": "VAC.RETRIB.NO",
+        "f_real_alta": None, "f_efecto_alta": "01-07-2024", "f_real_sit": "15-07-2024",
+    }]
+
+    periods = sorted(
+        (p.employee.identity_card_number, p.period_type, p.period_begin_date, p.period_end_date, p.tipo_contrato)
+        for p in session.query(EmployeePeriod)
+    )
+    assert periods == [
+        ("12345678Z", "baja", date(2024, 2, 1), date(2025, 1, 31), "100"),
+        ("12345678Z", "vacaciones", date(2024, 7, 1), date(2024, 7, 15), None),
+        # The changed ALTA merges into its period and fills the missing contract code
+        ("X1234567A", "alta", date(2024, 3, 1), None, "401"),
+    ]
+    assert session.query(VidaLaboralMovement).count() == 4
+
+
+def test_delta_records_only_applied_movements(session, client):
+    # Unknown employees are skipped and their movements stay unrecorded
+    context = VidaLaboralContext(create_employees=False)
+    result = process_rows_delta(session, client.id, JANUARY, context)
+    session.commit()
+    assert (result["new"], result["processed"], result["skipped"]) == (3, 3, 3)
+    assert context.employees_not_found == 3
+    assert session.query(VidaLaboralMovement).count() == 0
+
+    # Once the employees can be created, the same file imports everything
+    result, context = _import(session, client, JANUARY)
+    assert (result["new"], result["processed"], result["skipped"]) == (3, 3, 0)
+    assert context.periods_created == 3
+    assert session.query(VidaLaboralMovement).count() == 3
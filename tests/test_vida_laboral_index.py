@@ -0,0 +1,126 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+import core.agent.vida_laboral as query_vida_laboral
+import core.vida_laboral as vida_laboral
+from core.agent.state import ProcessingState, VidaLaboralContext as QueryVidaLaboralContext
+from core.models import Employee, EmployeePeriod
+from core.vida_laboral import VidaLaboralContext
+
+
+def _row(situacion, documento, naf, ccc="28111111111", alta="", real_alta="", real_sit=""):
+    return {
+        "situacion": situacion, "documento": documento, "naf": naf, "nombre": "GARCIA LOPEZ JUAN",
+        "ccc": ccc, "f_efecto_alta": alta, "f_real_alta": real_alta, "f_real_sit": real_sit,
+        "codigo_contrato": "100",
+    }
+
+
+ROWS = [
+    _row("ALTA", "012345678Z", "281234567890", alta="01/02/2024"),
+    # ALTAs inside the open period merge into it
+    _row("ALTA", "012345678Z", "281234567890", alta="01/03/2024"),
+    _row("ALTA", "012345678Z", "281234567890", alta="01/02/2024"),
+    _row("VAC.RETRIB.NO", "012345678Z", "281234567890", alta="01/07/2024", real_sit="15/07/2024"),
+    _row("BAJA", "012345678Z", "281234567890", real_alta="01/02/2024", real_sit="30/09/2024"),
+    _row("BAJA", "012345678Z", "281234567890", real_alta="01/02/2024", real_sit="30/09/2024"),
+    # Existing employee matched by DNI at a new CCC, BAJA without prior ALTA
+    _row("BAJA", "87654321X", "", ccc="28222222222", real_alta="01/01/2024", real_sit="31/05/2024"),
+    # Unknown employee on a vacation row is skipped
+    _row("VAC.RETRIB.NO", "11111111H", "", alta="01/07/2024", real_sit="15/07/2024"),
+    _row("OTRA", "012345678Z", "281234567890"),
+]
+
+
+@pytest.fixture
+def seeded_engine(make_engine, seed_client):
+    """Engines with EMPRESA SL, its first CCC and ANA PEREZ, known by DNI only."""
+    def make():
+        engine = make_engine()
+        with Session(engine) as session:
+            seed_client(session, employee=False)
+            session.add(Employee(id=1, first_name="ANA", last_name="PEREZ", identity_card_number="87654321X"))
+            session.commit()
+        return engine
+
+    return make
+
+
+def _state(engine):
+    with Session(engine) as session:
+        employees = sorted(
+            (e.identity_card_number, e.ss_number) for e in session.query(Employee)
+        )
+        periods = sorted(
+            (p.employee.identity_card_number, p.location.ccc_ss, p.period_type,
+             p.period_begin_date, p.period_end_date)
+            for p in session.query(EmployeePeriod)
+        )
+        return employees, periods
+
+
+def _counters(context):
+    return (context.employees_created, context.employees_updated, context.periods_created,
+            context.vacation_periods_created, context.employees_not_found)
+
+
+def test_process_rows_with_preloaded_index(seeded_engine, client_id):
+    engine = seeded_engine()
+    context = VidaLaboralContext()
+    with Session(engine) as session:
+        assert vida_laboral.process_rows(session, client_id, ROWS, context) == len(ROWS)
+        session.commit()
+
+    employees, periods = _state(engine)
+    assert employees == [("12345678Z", "281234567890"), ("87654321X", None)]
+    assert periods == [
+        ("12345678Z", "28111111111", "baja", date(2024, 2, 1), date(2024, 9, 30)),
+        ("12345678Z", "28111111111", "vacaciones", date(2024, 7, 1), date(2024, 7, 15)),
+        ("87654321X", "28222222222", "baja", date(2024, 1, 1), date(2024, 5, 31)),
+    ]
+    assert _counters(context) == (1, 3, 3, 1, 1)
+
+
+def test_process_rows_matches_row_by_row_processing(seeded_engine, client_id):
+    for create_employees in (True, False):
+        batch_engine = seeded_engine()
+        lazy_engine = seeded_engine()
+
+        batch = VidaLaboralContext(create_employees=create_employees)
+        with Session(batch_engine) as session:
+            vida_laboral.process_rows(session, client_id, ROWS, batch)
+            session.commit()
+
+        lazy = VidaLaboralContext(create_employees=create_employees)
+        with Session(lazy_engine) as session:
+            for row in ROWS:
+                vida_laboral.process_row(session, client_id, row, lazy)
+            session.commit()
+
+        assert _state(batch_engine) == _state(lazy_engine)
+        assert _counters(batch) == _counters(lazy)
+
+
+def test_process_rows_matches_query_based_matching(seeded_engine, client_id):
+    # core.agent.vida_laboral still resolves employees, locations and periods
+    # with one query per lookup; the fixture has CCCs and no birth dates,
+    # where both implementations agree.
+    for create_employees in (True, False):
+        batch_engine = seeded_engine()
+        query_engine = seeded_engine()
+
+        batch = VidaLaboralContext(create_employees=create_employees)
+        with Session(batch_engine) as session:
+            vida_laboral.process_rows(session, client_id, ROWS, batch)
+            session.commit()
+
+        baseline = QueryVidaLaboralContext(ProcessingState(), create_employees=create_employees)
+        with Session(query_engine) as session:
+            for row in ROWS:
+                query_vida_laboral.process_row(session, client_id, row, baseline)
+            session.commit()
+
+        assert _state(batch_engine) == _state(query_engine)
+        assert _counters(batch) == _counters(baseline)